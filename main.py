@@ -1,17 +1,28 @@
 import os
 import asyncio
+import traceback
 
 from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, register
 from astrbot.api import llm_tool
 
-from .src.service import init_server
+from .src.utils.startup_profiler import StartupProfiler
+StartupProfiler.start_import_trace(__package__)
+
+from .src.service import init_server, warm_up
 from .src.service.character_server.character_manager import CharacterManager
 from .src.service.asset_server.asset_manager import AssetManager
 from .src.service.market_server.market_manager import MarketManager
+from .src.service.market_server.marker import MarketHistory
+from .src.service.market_server.history_store import HISTORY_REFRESH_HOUR, HISTORY_REFRESH_MINUTE
 from .src.service.industry_server.industry_manager import IndustryManager
 from .src.service.database_server.connect import DatabaseConectManager
+from .src.service.database_server.writer import CacheWriter
 from .src.service.industry_server.providers import init_providers
+from .src.service.industry_server.cost_worker_pool import CostWorkerPool
+from .src.service.evesso_server.esi_cache import EsiCache
+from .src.service.evesso_server.esi_async import EsiTransport
+from .src.service.log_server import logger
 
 from .src.event.character import CharacterEvent
 from .src.event.price import TypesPriceEvent
@@ -23,9 +34,11 @@ from .filter import AdminFilter, VipMemberFilter, MemberFilter
 
 
 
-from .src.utils import refresh_per_min, run_func_delay_min
+from .src.utils import refresh_per_min, run_func_delay_min, refresh_daily_utc
 from .src.utils import set_debug_qq, unset_debug_qq, DEBUG_QQ
 
+StartupProfiler.stop_import_trace()
+
 # 环境变量
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
@@ -47,19 +60,30 @@ class KahunaBot(Star):
     """
     def __init__(self, context: Context):
         super().__init__(context)
-        # 初始化
+        # 初始化，库存、匹配器、市场等在后台预热或首次使用时初始化
         # asyncio.create_task(self.init_plugin())
-        init_server()
+        init_server(lazy=True)
+        StartupProfiler.mark_loaded()
+        asyncio.create_task(self.warm_up())
         asyncio.create_task(init_providers())
 
-        # 延时初始化
-        asyncio.create_task(refresh_per_min(0, 10, DatabaseConectManager.perform_checkpoint))
+        # 延时初始化，写入缓存数据库的刷新任务在CacheWriter写线程中依次执行
+        asyncio.create_task(refresh_per_min(0, 10, CacheWriter.wrap(DatabaseConectManager.perform_checkpoint)))
         asyncio.create_task(run_func_delay_min(1, CharacterManager.refresh_all_characters_at_init))
-        asyncio.create_task(refresh_per_min(1, 22, MarketManager.refresh_market))
-        asyncio.create_task(refresh_per_min(1, 15, AssetManager.refresh_all_asset))
-        asyncio.create_task(refresh_per_min(2, 11, IndustryManager.refresh_running_status))
-        asyncio.create_task(refresh_per_min(2, 60, IndustryManager.refresh_system_cost))
-        asyncio.create_task(refresh_per_min(2, 120, IndustryManager.refresh_market_price))
+        asyncio.create_task(refresh_per_min(1, 22, CacheWriter.wrap(MarketManager.refresh_market)))
+        asyncio.create_task(refresh_per_min(1, 15, CacheWriter.wrap(AssetManager.refresh_all_asset)))
+        asyncio.create_task(refresh_per_min(2, 11, CacheWriter.wrap(IndustryManager.refresh_running_status)))
+        asyncio.create_task(refresh_per_min(2, 60, CacheWriter.wrap(IndustryManager.refresh_system_cost)))
+        asyncio.create_task(refresh_per_min(2, 120, CacheWriter.wrap(IndustryManager.refresh_market_price)))
+        asyncio.create_task(refresh_per_min(5, 60, CacheWriter.wrap(EsiCache.clean_expired)))
+        asyncio.create_task(refresh_daily_utc(10, HISTORY_REFRESH_HOUR, HISTORY_REFRESH_MINUTE, CacheWriter.wrap(MarketHistory.refresh_all_history)))
+
+    async def warm_up(self):
+        try:
+            await asyncio.to_thread(warm_up)
+        except Exception:
+            traceback.print_exc()
+        logger.info(f'startup profile:\n{StartupProfiler.get_report()}')
 
 
     # @filter.custom_filter(SelfFilter1)
@@ -99,6 +123,22 @@ class KahunaBot(Star):
     async def admin_setpubliccostplan(self, event: AstrMessageEvent, user_qq: int, plan_name: str):
         yield await AdminEvent.setpubliccostplan(event, user_qq, plan_name)
 
+    @admin.command('数据库审计', alias={'dbaudit'})
+    async def admin_dbaudit(self, event: AstrMessageEvent):
+        yield await AdminEvent.dbaudit(event)
+
+    @admin.command('启动耗时', alias={'startup'})
+    async def admin_startup(self, event: AstrMessageEvent):
+        yield AdminEvent.startup(event)
+
+    @admin.command('成本进程', alias={'costpool'})
+    async def admin_costpool(self, event: AstrMessageEvent):
+        yield AdminEvent.costpool(event)
+
+    @admin.command('取消成本计算', alias={'costcancel'})
+    async def admin_costcancel(self, event: AstrMessageEvent):
+        yield await AdminEvent.costcancel(event)
+
     @admin.command('debug')
     async def admin_debug(self, event: AstrMessageEvent, qq: int):
         set_debug_qq(qq)
@@ -185,7 +225,7 @@ class KahunaBot(Star):
     @asset.custom_filter(AdminFilter)
     @asset.command("refall")
     async def asset_refall(self, event: AstrMessageEvent):
-        yield AssetEvent.refall(event)
+        yield await AssetEvent.refall(event)
 
     @asset.group("owner")
     async def asset_owner(self, event: AstrMessageEvent):
@@ -197,7 +237,7 @@ class KahunaBot(Star):
 
     @asset_owner.command("ref")
     async def asset_owner_ref(self, event: AstrMessageEvent, owner_type: str, character_name: str):
-        yield AssetEvent.owner_refresh(event, owner_type, character_name)
+        yield await AssetEvent.owner_refresh(event, owner_type, character_name)
 
     @asset.group('库存', alias={"container"})
     async def asset_container(self, event: AstrMessageEvent):
@@ -310,6 +350,10 @@ class KahunaBot(Star):
     async def Inds_plan_setcycletime(self, event: AstrMessageEvent, plan_name: str, tpye: str, cycle_time: int):
         yield IndsEvent.plan_setcycletime(event, plan_name, tpye, cycle_time)
 
+    @Inds_plan.command('深度估价', alias={"setdepthprice"})
+    async def Inds_plan_setdepthprice(self, event: AstrMessageEvent, plan_name: str, flag: str):
+        yield IndsEvent.plan_setdepthprice(event, plan_name, flag)
+
     # @Inds_plan.command({"setline"})
     # async def Inds_plan_setline(self, event: AstrMessageEvent, plan_name: str, tpye: str, line: int):
     #     yield IndsEvent.plan_set_line(event, plan_name, tpye, line)
@@ -387,7 +431,7 @@ class KahunaBot(Star):
     @Inds.command("refjobs")
     async def Inds_refjobs(self, event: AstrMessageEvent):
         """ 刷新进行中的工作 """
-        yield IndsEvent.refjobs(event)
+        yield await IndsEvent.refjobs(event)
 
     @Inds.command('指南', alias={'help'})
     async def Inds_help(self, event: AstrMessageEvent):
@@ -407,6 +451,14 @@ class KahunaBot(Star):
     async def sde_findtype(self, event: AstrMessageEvent, message: str):
         yield SdeEvent.findtype(event)
 
+    @sde.command("complete", alias={'补全'})
+    async def sde_complete(self, event: AstrMessageEvent, message: str):
+        yield SdeEvent.complete(event)
+
+    @sde.command("pinyin", alias={'拼音'})
+    async def sde_complete_pinyin(self, event: AstrMessageEvent, message: str):
+        yield SdeEvent.complete(event, zh=True)
+
     @sde.command("id")
     async def sde_id(self, event: AstrMessageEvent, tid: int):
         yield SdeEvent.type_id(event, tid)
@@ -465,3 +517,8 @@ class KahunaBot(Star):
     #         None
     #     '''
     #     yield event.plain_result("test_kahuna_func.")
+
+    async def terminate(self):
+        ''' 插件卸载时终止常驻的成本计算进程池与esi连接池 '''
+        CostWorkerPool.close(terminate=True)
+        EsiTransport.close()
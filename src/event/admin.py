@@ -17,13 +17,16 @@ from ..service.industry_server.industry_config import IndustryConfigManager, BPM
 from ..service.industry_server.structure import StructureManager
 from ..service.industry_server.industry_manager import IndustryManager
 from ..service.industry_server.industry_advice import IndustryAdvice
+from ..service.industry_server.cost_worker_pool import CostWorkerPool
 from ..service.sde_service.utils import SdeUtils
 from ..service.feishu_server.feishu_kahuna import FeiShuKahuna
 from ..service.log_server import logger
+from ..service.database_server.query_audit import QueryPlanAudit
 from ..service.picture_render_server.picture_render import PriceResRender
 from ..service.config_server.config import config, update_config
 
 from ..utils import KahunaException
+from ..utils.startup_profiler import StartupProfiler
 
 class AdminEvent:
     @staticmethod
@@ -37,3 +40,21 @@ class AdminEvent:
 
         return event.plain_result(f'已设置{user_qq} 的 {plan_name} 计划为公共成本计算基准。')
 
+    @staticmethod
+    async def dbaudit(event: AstrMessageEvent):
+        report = await asyncio.to_thread(QueryPlanAudit.get_report)
+        return event.plain_result(f'高频查询计划（!为全表扫描）：\n{report}')
+
+    @staticmethod
+    def startup(event: AstrMessageEvent):
+        return event.plain_result(f'启动耗时：\n{StartupProfiler.get_report()}')
+
+    @staticmethod
+    def costpool(event: AstrMessageEvent):
+        return event.plain_result(f'成本计算进程池：\n{CostWorkerPool.get_status()}')
+
+    @staticmethod
+    async def costcancel(event: AstrMessageEvent):
+        # 终止进程池需要等待子进程退出，不阻塞事件循环
+        running = await asyncio.to_thread(CostWorkerPool.cancel)
+        return event.plain_result('已取消正在进行的成本计算。' if running else '没有正在进行的成本计算，进程池已关闭。')
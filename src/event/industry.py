@@ -27,6 +27,7 @@ from ..service.log_server import logger
 from ..service.picture_render_server.picture_render import PriceResRender
 from ..service.industry_server.third_provider import provider_manager as pm
 from ..service.config_server.config import config
+from ..service.database_server.writer import CacheWriter
 
 
 from ..utils import (
@@ -75,8 +76,8 @@ class AssetEvent():
         return owner_id
 
     @classmethod
-    def refall(cls, event: AstrMessageEvent):
-        AssetManager.refresh_all_asset()
+    async def refall(cls, event: AstrMessageEvent):
+        await asyncio.wrap_future(CacheWriter.submit(AssetManager.refresh_all_asset))
 
         return event.plain_result("执行完成")
 
@@ -92,13 +93,13 @@ class AssetEvent():
                                   f"库存条目 {asset.asset_item_count}")
 
     @staticmethod
-    def owner_refresh(event: AstrMessageEvent, owner_type: str, character_name: str):
+    async def owner_refresh(event: AstrMessageEvent, owner_type: str, character_name: str):
         user_qq = get_user(event)
         character = CharacterManager.get_character_by_name_qq(character_name, user_qq)
 
         owner_id = AssetEvent.get_owner_id(owner_type, character_name, character)
 
-        asset = AssetManager.refresh_asset(owner_type, owner_id)
+        asset = await asyncio.wrap_future(CacheWriter.submit(AssetManager.refresh_asset, owner_type, owner_id))
         return event.plain_result("刷新完成")
 
     @staticmethod
@@ -116,6 +117,7 @@ class AssetEvent():
         user_qq = get_user(event)
 
         print_str = "你可访问以下库存：\n"
+        AssetManager.ensure_init()
         for container in AssetManager.container_dict.values():
             if (user_qq == container.asset_owner_qq):
                 logger.info(f'{user_qq} == container.asset_owner_qq')
@@ -190,6 +192,7 @@ class IndsEvent:
     @staticmethod
     def matcher_info(event: AstrMessageEvent, matcher_name: str):
         user_qq = get_user(event)
+        IndustryConfigManager.ensure_init()
         matcher = IndustryConfigManager.matcher_dict.get(matcher_name, None)
         if not matcher or matcher.user_qq != user_qq:
             return event.plain_result("匹配器不存在。")
@@ -383,6 +386,17 @@ class IndsEvent:
 
         return event.plain_result(f"执行完成。计划{plan_name}的{time_type}最长流程时间已设置为{hour}小时")
 
+    @staticmethod
+    def plan_setdepthprice(event: AstrMessageEvent, plan_name: str, flag: str):
+        user_qq = get_user(event)
+        user = UserManager.get_user(user_qq)
+        if flag not in ['on', 'off']:
+            return event.plain_result(f"args: [plan name] [on/off]")
+        user.set_depth_price(plan_name, flag == 'on')
+
+        return event.plain_result(f"执行完成。计划{plan_name}的材料成本"
+                                  f"{'按订单簿深度估算' if flag == 'on' else '按最高收单价估算'}")
+
     @staticmethod
     def plan_set_line(event:AstrMessageEvent, plan_name:str, line_type: str, line_num:int):
         user_qq = get_user(event)
@@ -800,8 +814,8 @@ class IndsEvent:
         return event.chain_result(chain)
 
     @staticmethod
-    def refjobs(event: AstrMessageEvent):
-        IndustryManager.refresh_running_status()
+    async def refjobs(event: AstrMessageEvent):
+        await asyncio.wrap_future(CacheWriter.submit(IndustryManager.refresh_running_status))
 
         return event.plain_result("执行完成")
 
@@ -809,14 +823,12 @@ class IndsEvent:
 class MarketEvent:
     @staticmethod
     async def market_reforder(event: AstrMessageEvent):
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(MarketManager.refresh_market)
+        future = CacheWriter.submit(MarketManager.refresh_market)
+        while not future.done():
+            await asyncio.sleep(1)
 
-            while not future.done():
-                await asyncio.sleep(1)
-
-            res_log = future.result()
-            return event.plain_result(res_log)
+        res_log = future.result()
+        return event.plain_result(res_log)
 
     @staticmethod
     async def market_set_ac(event: AstrMessageEvent):
@@ -860,12 +872,25 @@ class SdeEvent():
     def findtype(event: AstrMessageEvent, ):
         message_str = event.get_message_str()
         type_name = " ".join(message_str.split(" ")[2:])
-        fuzz_list = SdeUtils.fuzz_type(type_name, list_len=10)
+        # 前缀补全在前，模糊匹配补足10个
+        fuzz_list = SdeUtils.complete_type(type_name, list_len=5)
+        fuzz_list += [name for name in SdeUtils.fuzz_type(type_name, list_len=10) if name not in fuzz_list]
+        fuzz_list = fuzz_list[:10]
         if fuzz_list:
             fuzz_rely = (f"你是否在寻找：\n")
             fuzz_rely += '\n'.join(fuzz_list)
             return event.plain_result(fuzz_rely)
 
+    @staticmethod
+    def complete(event: AstrMessageEvent, zh: bool = None):
+        """ 名称前缀补全，zh为True时按中文名称补全，字母前缀按拼音或首字母匹配 """
+        message_str = event.get_message_str()
+        prefix = " ".join(message_str.split(" ")[2:])
+        complete_list = SdeUtils.complete_type(prefix, list_len=10, zh=zh)
+        if not complete_list:
+            return event.plain_result(f'没有以 {prefix} 开头的物品')
+        return event.plain_result('\n'.join(complete_list))
+
     @staticmethod
     def type_id(event: AstrMessageEvent, type_id: int):
         name = SdeUtils.get_name_by_id(type_id)
@@ -1,3 +1,5 @@
+import asyncio
+
 from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
 from astrbot.api.star import Context, Star, register
 from astrbot.api.message_components import Image
@@ -39,7 +41,8 @@ class TypesPriceEvent():
 
         # 准备历史价格数据
         item_id = SdeUtils.get_id_by_name(item_name)
-        await MarketHistory.refresh_forge_market_history([item_id])
+        # 历史在后台按日增量刷新，查询不等待下载
+        MarketHistory.schedule_market_history([item_id], REGION_FORGE_ID)
         history_data = MarketHistory.get_type_region_histpry_data(item_id, REGION_FORGE_ID)
         chart_history_data = [[data[0].strftime("%Y-%m-%d"), data[1]] for data in history_data[:365]]
         if fuzz_list:
@@ -47,10 +50,16 @@ class TypesPriceEvent():
                          f"你是否在寻找：\n")
             fuzz_rely += '\n'.join(fuzz_list)
             return event.plain_result(fuzz_rely)
+        # 指定数量时按订单簿深度估算成交价
+        fill_data = PriceService.get_fill_price(item_name, market, quantity) if quantity > 1 else None
+        trend_data = (await asyncio.to_thread(MarketHistory.get_history_indicator, [item_id], REGION_FORGE_ID)).get(item_id)
         res_path = await PriceResRender.render_price_res_pic(
             item_name,
             [max_buy, mid_price, min_sell, fuzz_list],
-            chart_history_data
+            chart_history_data,
+            quantity=quantity,
+            fill_data=fill_data,
+            trend_data=trend_data
         )
         chain = [
             Image.fromFileSystem(res_path)
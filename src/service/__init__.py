@@ -2,22 +2,51 @@ import sys
 from .asset_server.asset_manager import AssetManager
 from .character_server.character_manager import CharacterManager
 from .database_server.connect import DatabaseConectManager
+from .database_server.migration import SchemaMigration
+from .database_server.writer import CacheWriter
 from .industry_server.industry_config import IndustryConfigManager
+from .industry_server.recipe_index import RecipeIndex
 from .industry_server.structure import StructureManager
 from .market_server.market_manager import MarketManager
+from .market_server.marker import MarketHistory
+from .sde_service.utils import SdeUtils
 from .user_server.user_manager import UserManager
 from .log_server import logger
+from ..utils.startup_profiler import StartupProfiler
 
 init_flag = False
 
-def init_server(log=True):
+def init_server(log=True, lazy=False):
+    """
+    同步初始化数据库、角色、用户与建筑，指令过滤与大部分查询都依赖这些数据。
+    lazy为True时库存、匹配器、市场、配方索引与SDE名称表留到warm_up或首次使用时初始化，
+    只建立索引的数据库迁移总是在warm_up中执行。
+    """
+    global init_flag
     if not log:
         logger.setLevel(sys.maxsize)
-    DatabaseConectManager.init()
-    CharacterManager.init()
-    UserManager.init()
-    StructureManager.init()
-    AssetManager.init()
-    IndustryConfigManager.init()
-    MarketManager.init()
+    with StartupProfiler.measure('DatabaseConectManager'):
+        DatabaseConectManager.init()
+    with StartupProfiler.measure('SchemaMigration'):
+        SchemaMigration.run()
+    with StartupProfiler.measure('CharacterManager'):
+        CharacterManager.init()
+    with StartupProfiler.measure('UserManager'):
+        UserManager.init()
+    with StartupProfiler.measure('StructureManager'):
+        StructureManager.init()
+    if not lazy:
+        warm_up()
     init_flag = True
+
+def warm_up():
+    # 只建立索引的迁移在写线程中执行，不占用启动时间
+    with StartupProfiler.measure('SchemaMigration.deferred'):
+        CacheWriter.run(SchemaMigration.run, deferred=True)
+    AssetManager.ensure_init()
+    IndustryConfigManager.ensure_init()
+    MarketManager.ensure_init()
+    RecipeIndex.ensure_loaded()
+    MarketHistory.build_history_series()
+    SdeUtils.get_invtype_name_list()
+    SdeUtils.get_invtype_name_list(zh=True)
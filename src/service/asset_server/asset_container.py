@@ -136,6 +136,11 @@ class AssetContainer:
         return [container.asset_location_id for container in
                 M_AssetContainer.select().where(M_AssetContainer.asset_owner_qq == qq, M_AssetContainer.tag == tag)]
 
+    @classmethod
+    def get_contain_id_by_qq_tags(cls, qq: int, tag_list: list[str]) -> list[int]:
+        return [container.asset_location_id for container in
+                M_AssetContainer.select().where(M_AssetContainer.asset_owner_qq == qq, M_AssetContainer.tag << tag_list)]
+
     def __str__(self):
         return (f"id: {self.asset_location_id}\n"
                 f"name: {self.asset_name}\n"
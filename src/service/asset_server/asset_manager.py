@@ -1,9 +1,11 @@
 
 import asyncio
+import threading
 
 from .asset_container import AssetContainer, ContainerTag
 from ..database_server.model import (AssetCache as M_AssetCache, Asset as M_Asset,
                                      BlueprintAsset as M_BlueprintAsset, BlueprintAssetCache as M_BlueprintAssetCache)
+from ..database_server.utils import DoubleBuffer
 from ..database_server.connect import DatabaseConectManager
 from .asset_owner import AssetOwner
 from ..character_server.character_manager import CharacterManager
@@ -12,11 +14,15 @@ from ..evesso_server.eveesi import universe_structures_structure
 
 # kahuna KahunaException
 from ...utils import KahunaException
+from ...utils.refresh_signal import RefreshSignal
+from ...utils.startup_profiler import StartupProfiler
 
 # kahuna logger
 from ..log_server import logger
 
 class AssetManager():
+    _init_lock = threading.Lock()
+    inited = False
     init_asset_status = False
     init_container_status = False
     asset_dict: dict[(str, int): AssetOwner] = dict() # {(owner_type, owner_id): Asset}
@@ -29,6 +35,17 @@ class AssetManager():
         cls.init_asset_dict()
         cls.init_container_dict()
 
+    @classmethod
+    def ensure_init(cls):
+        """ 首次使用或后台预热时初始化 """
+        if cls.inited:
+            return
+        with cls._init_lock:
+            if not cls.inited:
+                with StartupProfiler.measure('AssetManager'):
+                    cls.init()
+                cls.inited = True
+
     @classmethod
     def init_asset_dict(cls):
         if not cls.init_asset_status:
@@ -73,40 +90,49 @@ class AssetManager():
             return
 
         asset.insert_to_db()
+        cls.ensure_init()
         cls.asset_dict[(type, owner_id)] = asset
         return asset
 
     @classmethod
-    def copy_to_cache(cls):
-        db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            M_AssetCache.delete().execute()
-            db.execute_sql(f"INSERT INTO {M_AssetCache._meta.table_name} SELECT * FROM {M_Asset._meta.table_name}")
-            logger.info("copy data to cache complete")
-        with db.atomic():
-            M_BlueprintAssetCache.delete().execute()
-            db.execute_sql(f"INSERT INTO {M_BlueprintAssetCache._meta.table_name} SELECT * FROM {M_BlueprintAsset._meta.table_name}")
-            logger.info("copy data to cache complete")
+    def swap_cache(cls):
+        DoubleBuffer.swap(M_Asset, M_AssetCache)
+        DoubleBuffer.swap(M_BlueprintAsset, M_BlueprintAssetCache)
 
     @classmethod
     def refresh_asset(cls, type, owner_id):
+        cls.ensure_init()
         asset: AssetOwner = cls.asset_dict.get((type, owner_id), None)
         if asset is None:
             raise KahunaException("没有找到对应的库存。")
-        asset.delete_asset()
-        asset.get_asset()
-        cls.copy_to_cache()
+        with DoubleBuffer.get_lock(M_Asset):
+            # 其他库存沿用当前快照
+            DoubleBuffer.prepare(M_Asset, M_AssetCache,
+                                 keep=~((M_AssetCache.asset_type == type) & (M_AssetCache.owner_id == owner_id)))
+            DoubleBuffer.prepare(M_BlueprintAsset, M_BlueprintAssetCache,
+                                 keep=~((M_BlueprintAssetCache.owner_type == type) &
+                                        (M_BlueprintAssetCache.owner_id == owner_id)))
+            asset.get_asset()
+            cls.swap_cache()
+        RefreshSignal.publish('asset')
         return asset
 
     @classmethod
     def refresh_all_asset(cls):
-        for asset in cls.asset_dict.values():
-            asset.get_asset()
-        cls.copy_to_cache()
+        cls.ensure_init()
+        with DoubleBuffer.get_lock(M_Asset):
+            DoubleBuffer.prepare(M_Asset, M_AssetCache)
+            DoubleBuffer.prepare(M_BlueprintAsset, M_BlueprintAssetCache)
+            for asset in cls.asset_dict.values():
+                asset.get_asset()
+            cls.swap_cache()
+        RefreshSignal.publish('asset')
 
     @classmethod
     def get_asset_in_container_list(cls, container_list: list):
-        return M_Asset.select().where(M_Asset.location_id.in_(container_list))
+        return (M_AssetCache.select()
+                .where(M_AssetCache.location_id.in_(container_list))
+                .bind(DatabaseConectManager.cache_read_db()))
 
     @classmethod
     def add_container(cls, owner_qq: int, location_id: int, location_type: str, asset_name: str, operate_qq: int, ac_token: str):
@@ -137,6 +163,7 @@ class AssetManager():
         asset_container.solar_system_id = structure_info["solar_system_id"]
 
         asset_container.insert_to_db()
+        cls.ensure_init()
         cls.container_dict[(owner_qq, location_id)] = asset_container
 
         return asset_container
@@ -145,6 +172,7 @@ class AssetManager():
     def set_container_tag(cls, require_list: list[int, int], tag: str):
         if tag not in ContainerTag.__members__:
             raise KahunaException(f"tag must be {ContainerTag.__members__}")
+        cls.ensure_init()
         success_list = []
         for owner_qq, container_id in require_list:
             if (owner_qq, container_id) not in cls.container_dict:
@@ -158,6 +186,7 @@ class AssetManager():
 
     @classmethod
     def get_user_container(cls, owner_qq: int):
+        cls.ensure_init()
         return [container for k, container in cls.container_dict.items() if k[0] == owner_qq]
 
     @classmethod
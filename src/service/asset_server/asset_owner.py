@@ -7,6 +7,7 @@ from ..database_server.model import (Asset as M_Asset,
                                      BlueprintAsset as M_BlueprintAsset,
                                      BlueprintAssetCache as M_BlueprintAssetCache)
 from ..database_server.connect import DatabaseConectManager
+from ..database_server.utils import DoubleBuffer
 from ..evesso_server.eveesi import (characters_character_assets,
                                     corporations_corporation_assets,
                                     characters_character_id_blueprints,
@@ -84,8 +85,19 @@ class AssetOwner():
             self.get_owner_asset(corporations_corporation_assets, self.owner_id)
             self.get_owner_bp_asset(corporations_corporation_id_blueprints, self.owner_id)
 
+    def carry_over_asset(self):
+        # 本次无法刷新，沿用上一份快照
+        DoubleBuffer.carry_over(M_Asset, M_AssetCache,
+                                (M_AssetCache.asset_type == self.owner_type) & (M_AssetCache.owner_id == self.owner_id))
+
+    def carry_over_bp_asset(self):
+        DoubleBuffer.carry_over(M_BlueprintAsset, M_BlueprintAssetCache,
+                                (M_BlueprintAssetCache.owner_type == self.owner_type) &
+                                (M_BlueprintAssetCache.owner_id == self.owner_id))
+
     def get_owner_asset(self, asset_esi, owner_id):
         if not self.access_character:
+            self.carry_over_asset()
             return
         ac_token = self.access_character.ac_token
         if self.owner_type == "character":
@@ -100,6 +112,7 @@ class AssetOwner():
                 f"find max page = 0 when use {asset_esi.__name__} "
                 f"with {self.access_character.character_name} as type {self.owner_type}"
             )
+            self.carry_over_asset()
             return
 
         logger.info("请求资产。")
@@ -119,6 +132,7 @@ class AssetOwner():
 
     def get_owner_bp_asset(self, asset_esi, owner_id):
         if not self.access_character:
+            self.carry_over_bp_asset()
             return
         ac_token = self.access_character.ac_token
         max_page = find_max_page(asset_esi, ac_token, owner_id, begin_page=1, interval=5)
@@ -12,7 +12,8 @@ script_dir = os.path.dirname(script_file_path)
 # 初始化解析器
 config = configparser.ConfigParser()
 config.optionxform = str    # 保持键名大小写
-config_path = os.path.join(script_dir, '../../../config.ini')
+# 环境变量KAHUNA_CONFIG可指定其他配置文件，测试与基准脚本使用临时配置
+config_path = os.environ.get('KAHUNA_CONFIG', os.path.join(script_dir, '../../../config.ini'))
 config.read(config_path)
 
 # 访问配置内容
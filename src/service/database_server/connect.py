@@ -1,3 +1,5 @@
+from pathlib import Path
+
 from peewee import SqliteDatabase, DatabaseProxy, Model
 
 from ...utils import KahunaException
@@ -6,6 +8,11 @@ from ..log_server import logger
 
 config_db = DatabaseProxy()
 cache_db = DatabaseProxy()
+cache_read_db = DatabaseProxy()
+
+# 只读连接的内存映射与页缓存大小
+READ_MMAP_SIZE = 256 * 1024 * 1024
+READ_CACHE_SIZE = -1024 * 32  # 单位为 KB，每个线程一个连接
 class ConfigModel(Model):
     class Meta:
         database = config_db
@@ -17,7 +24,8 @@ class CacheModel(Model):
 class DatabaseConectManager():
     _connect_dict = {
         'config': config_db,
-        'cache': cache_db
+        'cache': cache_db,
+        'cache_read': cache_read_db
     }
     _config_model_list = []
     _cache_model_list = []
@@ -27,6 +35,7 @@ class DatabaseConectManager():
         cls.init_config_database()
         cls.init_cache_database()
         cls.create_default_table()
+        cls.init_cache_read_database()
         # cls.clean_table_not_in_list()
 
     @classmethod
@@ -59,6 +68,22 @@ class DatabaseConectManager():
         else:
             raise KahunaException("bot db open failed")
 
+    @classmethod
+    def init_cache_read_database(cls):
+        """
+        缓存数据库的只读连接，供交互查询使用。
+        peewee按线程各自建立连接，query_only保证不会在读连接上写入，wal模式下读不等待写事务。
+        需要在缓存数据库建表之后初始化。
+        """
+        uri = f"{Path(config['SQLITEDB']['CACHE_DB']).resolve().as_uri()}?mode=ro"
+        db = SqliteDatabase(uri, uri=True, pragmas={
+            'query_only': 1,
+            'mmap_size': READ_MMAP_SIZE,
+            'cache_size': READ_CACHE_SIZE
+        }, timeout=120)
+        cls._connect_dict["cache_read"].initialize(db)
+        logger.info("链接缓存数据库只读连接成功。")
+
     @classmethod
     def perform_checkpoint(cls):
         # wal缓存合并
@@ -78,6 +103,15 @@ class DatabaseConectManager():
     def cache_db(cls) -> DatabaseProxy:
         return cls._connect_dict["cache"]
 
+    @classmethod
+    def cache_read_db(cls) -> DatabaseProxy:
+        """ 只读连接，写入请使用cache_db并在CacheWriter中执行 """
+        return cls._connect_dict["cache_read"]
+
+    @classmethod
+    def get_model_list(cls, db_name: str) -> list:
+        return cls._config_model_list if db_name == 'config' else cls._cache_model_list
+
     @classmethod
     def add_model(cls, model, type: str = "config"):
         if issubclass(model, ConfigModel):
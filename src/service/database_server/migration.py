@@ -0,0 +1,144 @@
+import time
+
+from peewee import Field
+from playhouse.migrate import SqliteMigrator, migrate
+
+from .connect import DatabaseConectManager
+from ..log_server import logger
+
+
+class Migration:
+    def __init__(self, version: int, db_name: str, description: str, func, deferred: bool = False):
+        self.version = version
+        self.db_name = db_name
+        self.description = description
+        self.func = func
+        self.deferred = deferred
+
+
+class SchemaMigration:
+    """
+    数据库结构版本迁移。
+    create_default_table只创建缺失的表，已有数据库上的索引与字段变化由这里按版本执行。
+    每个数据库的版本号保存在 PRAGMA user_version，启动时依次执行高于当前版本的迁移，每个迁移一个事务。
+
+    *_cache表与staging表通过重命名交换(见DoubleBuffer)，索引名会随表互换，
+    因此索引按列判断是否存在，而不是按名称。
+
+    只建立索引的迁移不影响查询结果，标记为deferred，启动时不执行，由warm_up在CacheWriter写线程中补齐；
+    修改字段等其他迁移仍在启动时同步执行。版本按顺序推进，遇到未执行的deferred迁移时其后的迁移也一并推迟。
+    """
+    migration_list = []
+
+    @classmethod
+    def register(cls, version: int, db_name: str, description: str, deferred: bool = False):
+        def decorator(func):
+            cls.migration_list.append(Migration(version, db_name, description, func, deferred))
+            return func
+        return decorator
+
+    @classmethod
+    def get_db(cls, db_name: str):
+        return DatabaseConectManager.config_db() if db_name == 'config' else DatabaseConectManager.cache_db()
+
+    @classmethod
+    def get_version(cls, db) -> int:
+        return db.execute_sql('PRAGMA user_version').fetchone()[0]
+
+    @classmethod
+    def run(cls, deferred: bool = False):
+        """ :param deferred: 是否执行deferred迁移 """
+        for db_name in ('config', 'cache'):
+            db = cls.get_db(db_name)
+            current = cls.get_version(db)
+            pending = sorted([migration for migration in cls.migration_list
+                              if migration.db_name == db_name and migration.version > current],
+                             key=lambda migration: migration.version)
+            for migration in pending:
+                if migration.deferred and not deferred:
+                    logger.info(f"{db_name} 数据库迁移 {migration.version} 推迟到预热时执行: {migration.description}")
+                    break
+                start = time.perf_counter()
+                with db.atomic():
+                    migration.func(db)
+                    db.execute_sql(f'PRAGMA user_version = {int(migration.version)}')
+                logger.info(f"{db_name} 数据库迁移到版本 {migration.version}: {migration.description}，"
+                            f"耗时 {time.perf_counter() - start:.2f}s.")
+
+    """ 迁移操作 """
+    @classmethod
+    def get_index_dict(cls, db, table_name: str) -> dict:
+        """ :return: {(列, ...): (索引名, 是否唯一, 是否可删除)} """
+        res = dict()
+        for _, index_name, unique, origin, _ in db.execute_sql(f'PRAGMA index_list("{table_name}")').fetchall():
+            columns = tuple(row[2] for row in db.execute_sql(f'PRAGMA index_info("{index_name}")').fetchall())
+            # origin为c的索引由CREATE INDEX创建，u/pk为约束自带的索引
+            res[columns] = (index_name, bool(unique), origin == 'c')
+        return res
+
+    @classmethod
+    def get_free_index_name(cls, db, index_name: str) -> str:
+        exist_name = {row[0] for row in db.execute_sql("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()}
+        res = index_name
+        suffix = 1
+        while res in exist_name:
+            res = f"{index_name}_{suffix}"
+            suffix += 1
+        return res
+
+    @classmethod
+    def ensure_index(cls, db, table_name: str, columns: tuple, unique: bool = False):
+        columns = tuple(columns)
+        if columns in cls.get_index_dict(db, table_name):
+            return
+        index_name = cls.get_free_index_name(db, f"{table_name}_{'_'.join(columns)}")
+        db.execute_sql(f'CREATE {"UNIQUE " if unique else ""}INDEX "{index_name}" '
+                       f'ON "{table_name}" ({", ".join(columns)})')
+        logger.info(f"create index {index_name} on {table_name}{columns}.")
+
+    @classmethod
+    def drop_index(cls, db, table_name: str, columns: tuple):
+        index = cls.get_index_dict(db, table_name).get(tuple(columns), None)
+        if index is None or not index[2]:
+            return
+        db.execute_sql(f'DROP INDEX "{index[0]}"')
+        logger.info(f"drop index {index[0]} on {table_name}.")
+
+    @classmethod
+    def add_column(cls, db, table_name: str, column_name: str, field: Field):
+        if column_name in {column.name for column in db.get_columns(table_name)}:
+            return
+        migrate(SqliteMigrator(db).add_column(table_name, column_name, field))
+
+    @classmethod
+    def drop_column(cls, db, table_name: str, column_name: str):
+        if column_name not in {column.name for column in db.get_columns(table_name)}:
+            return
+        migrate(SqliteMigrator(db).drop_column(table_name, column_name))
+
+    @classmethod
+    def get_model_index(cls, model) -> list:
+        """ 模型声明的索引 [(列, ...), 是否唯一] """
+        res = []
+        for index in model._meta.indexes:
+            if isinstance(index, (tuple, list)) and isinstance(index[0], (tuple, list)):
+                res.append((tuple(model._meta.fields[name].column_name for name in index[0]), bool(index[1])))
+        for field in model._meta.sorted_fields:
+            if (field.index or field.unique) and not field.primary_key:
+                res.append(((field.column_name,), bool(field.unique)))
+        return res
+
+    @classmethod
+    def sync_model_index(cls, db, model_list: list):
+        """ 为已存在的表补齐模型中声明的索引 """
+        for model in model_list:
+            table_name = model._meta.table_name
+            if not db.table_exists(table_name):
+                continue
+            for columns, unique in cls.get_model_index(model):
+                cls.ensure_index(db, table_name, columns, unique)
+
+
+@SchemaMigration.register(1, 'cache', '补齐订单、资产、蓝图与工业任务缓存表的二级索引', deferred=True)
+def sync_cache_index(db):
+    SchemaMigration.sync_model_index(db, DatabaseConectManager.get_model_list('cache'))
@@ -81,6 +81,11 @@ class Asset(CacheModel):
     type_id = IntegerField()
     class Meta:
         table_name = 'asset'
+        indexes = (
+            (('location_id',), False),
+            (('item_id',), False),
+            (('owner_id', 'asset_type'), False),
+        )
 DatabaseConectManager.add_model(Asset)
 
 class AssetCache(CacheModel):
@@ -96,6 +101,11 @@ class AssetCache(CacheModel):
     type_id = IntegerField()
     class Meta:
         table_name = 'asset_cache'
+        indexes = (
+            (('location_id',), False),
+            (('item_id',), False),
+            (('owner_id', 'asset_type'), False),
+        )
 DatabaseConectManager.add_model(AssetCache)
 
 class AssetOwner(ConfigModel):
@@ -123,6 +133,10 @@ class MarketOrder(CacheModel):
 
     class Meta:
         table_name = 'market_order'
+        indexes = (
+            (('type_id', 'location_id', 'is_buy_order', 'price'), False),
+            (('location_id',), False),
+        )
 DatabaseConectManager.add_model(MarketOrder)
 
 class MarketOrderCache(CacheModel):
@@ -141,6 +155,10 @@ class MarketOrderCache(CacheModel):
 
     class Meta:
         table_name = 'market_order_cache'
+        indexes = (
+            (('type_id', 'location_id', 'is_buy_order', 'price'), False),
+            (('location_id',), False),
+        )
 DatabaseConectManager.add_model(MarketOrderCache)
 
 class IndustryJobs(CacheModel):
@@ -171,6 +189,10 @@ class IndustryJobs(CacheModel):
 
     class Meta:
         table_name = 'industry_jobs'
+        indexes = (
+            (('installer_id',), False),
+            (('owner_id',), False),
+        )
 DatabaseConectManager.add_model(IndustryJobs)
 
 class IndustryJobsCache(CacheModel):
@@ -200,6 +222,10 @@ class IndustryJobsCache(CacheModel):
     owner_id = IntegerField()
     class Meta:
         table_name = 'industry_jobs_cache'
+        indexes = (
+            (('installer_id',), False),
+            (('owner_id',), False),
+        )
 DatabaseConectManager.add_model(IndustryJobsCache)
 
 class SystemCost(CacheModel):
@@ -242,6 +268,10 @@ class BlueprintAsset(CacheModel):
     owner_type = CharField()
     class Meta:
         table_name = "blueprint_asset"
+        indexes = (
+            (('location_id', 'type_id', 'runs'), False),
+            (('owner_id', 'owner_type'), False),
+        )
 DatabaseConectManager.add_model(BlueprintAsset)
 
 class BlueprintAssetCache(CacheModel):
@@ -258,6 +288,10 @@ class BlueprintAssetCache(CacheModel):
     owner_type = CharField()
     class Meta:
         table_name = "blueprint_asset_cache"
+        indexes = (
+            (('location_id', 'type_id', 'runs'), False),
+            (('owner_id', 'owner_type'), False),
+        )
 DatabaseConectManager.add_model(BlueprintAssetCache)
 
 class InvTypeMap(ConfigModel):
@@ -306,4 +340,45 @@ class MarketHistory(CacheModel):
         indexes = (
             (('region_id', 'type_id', 'date'), True),
         )
-DatabaseConectManager.add_model(MarketHistory)
\ No newline at end of file
+DatabaseConectManager.add_model(MarketHistory)
+
+class MarketHistoryState(CacheModel):
+    region_id = IntegerField()
+    type_id = IntegerField()
+    last_date = DateTimeField(null=True)   # 已入库的最新一天
+    fetch_time = DateTimeField(null=True)  # 最近一次成功请求的utc时间
+    class Meta:
+        table_name = "market_history_state"
+        indexes = (
+            (('region_id', 'type_id'), True),
+        )
+DatabaseConectManager.add_model(MarketHistoryState)
+
+class MarketHistorySummary(CacheModel):
+    region_id = IntegerField()
+    type_id = IntegerField()
+    anchor_date = DateTimeField()  # 统计窗口的最后一天
+    week_flow = DoubleField(default=0)
+    week_volume = IntegerField(default=0)
+    week_highest = DoubleField(default=0)
+    week_lowest = DoubleField(default=0)
+    month_flow = DoubleField(default=0)
+    month_volume = IntegerField(default=0)
+    month_highest = DoubleField(default=0)
+    month_lowest = DoubleField(default=0)
+    class Meta:
+        table_name = "market_history_summary"
+        indexes = (
+            (('region_id', 'type_id'), True),
+        )
+DatabaseConectManager.add_model(MarketHistorySummary)
+
+class EsiResponseCache(CacheModel):
+    cache_key = CharField(primary_key=True)
+    etag = CharField(null=True)
+    expires = DateTimeField(null=True)
+    pages = IntegerField(default=0)
+    body = TextField()
+    class Meta:
+        table_name = "esi_response_cache"
+DatabaseConectManager.add_model(EsiResponseCache)
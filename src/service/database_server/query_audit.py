@@ -0,0 +1,109 @@
+import time
+import sqlite3
+from contextlib import closing
+
+from peewee import fn
+
+from .model import (MarketOrderCache, AssetCache, BlueprintAssetCache, IndustryJobsCache,
+                    MarketHistory, MarketHistorySummary)
+from .connect import DatabaseConectManager
+from ..log_server import logger
+
+# 每条查询计时的执行次数
+AUDIT_REPEAT = 5
+
+
+def sample_value(field, default=0):
+    """ 从表中取一个实际存在的值作为查询参数，空表时使用default """
+    value = field.model.select(field).limit(1).scalar()
+    return default if value is None else value
+
+
+def hot_query_list() -> list:
+    """ 高频查询 [(名称, peewee查询)]，参数取自当前数据 """
+    order_type = sample_value(MarketOrderCache.type_id)
+    order_location = sample_value(MarketOrderCache.location_id)
+    asset_location = sample_value(AssetCache.location_id)
+    asset_owner = sample_value(AssetCache.owner_id)
+    bp_location = sample_value(BlueprintAssetCache.location_id)
+    bp_owner = sample_value(BlueprintAssetCache.owner_id)
+    job_installer = sample_value(IndustryJobsCache.installer_id)
+    history_region = sample_value(MarketHistory.region_id)
+    history_type = sample_value(MarketHistory.type_id)
+    return [
+        ('订单最优价', MarketOrderCache
+            .select(fn.MIN(MarketOrderCache.price))
+            .where((MarketOrderCache.type_id == order_type) &
+                   (MarketOrderCache.location_id == order_location) &
+                   (MarketOrderCache.is_buy_order == False))),
+        ('订单簿加载', MarketOrderCache
+            .select(MarketOrderCache.type_id, MarketOrderCache.is_buy_order,
+                    MarketOrderCache.price, MarketOrderCache.volume_remain)
+            .where(MarketOrderCache.location_id == order_location)),
+        ('容器资产', AssetCache.select().where(AssetCache.location_id.in_([asset_location]))),
+        ('资产位置', AssetCache.select().where(AssetCache.item_id == asset_location)),
+        ('角色资产', AssetCache.select().where(AssetCache.owner_id == asset_owner)),
+        ('容器蓝图', BlueprintAssetCache.select().where(BlueprintAssetCache.location_id.in_([bp_location]))),
+        ('角色蓝图', BlueprintAssetCache.select().where(BlueprintAssetCache.owner_id == bp_owner)),
+        ('运行中任务', IndustryJobsCache.select().where(IndustryJobsCache.installer_id.in_([job_installer]))),
+        ('物品历史', MarketHistory.select()
+            .where((MarketHistory.type_id == history_type) & (MarketHistory.region_id == history_region))
+            .order_by(MarketHistory.date.desc())),
+        ('历史统计', MarketHistorySummary.select()
+            .where((MarketHistorySummary.region_id == history_region) &
+                   (MarketHistorySummary.type_id.in_([history_type])))),
+    ]
+
+
+class QueryPlanAudit:
+    """
+    对高频查询执行 EXPLAIN QUERY PLAN 并计时，标记未使用索引的全表扫描。
+    """
+    @classmethod
+    def is_full_scan(cls, detail: str) -> bool:
+        # SCAN t USING (COVERING) INDEX 为按索引顺序遍历，未使用索引或临时建立自动索引时视为全表扫描
+        if not detail.startswith(('SCAN', 'SEARCH')):
+            return False
+        return 'USING' not in detail or 'AUTOMATIC' in detail
+
+    @classmethod
+    def explain(cls, db, sql: str, params) -> list:
+        """
+        在新连接上执行EXPLAIN QUERY PLAN。
+        EXPLAIN语句不读取表，也就不检查结构版本，长期连接上缓存的EXPLAIN在其他连接建立索引后仍返回旧的计划。
+        """
+        with closing(sqlite3.connect(db.database)) as conn:
+            return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()]
+
+    @classmethod
+    def audit_query(cls, name: str, query, repeat: int = AUDIT_REPEAT) -> dict:
+        db = DatabaseConectManager.cache_read_db()
+        sql, params = query.sql()
+        plan = cls.explain(db, sql, params)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            row_count = len(db.execute_sql(sql, params).fetchall())
+        elapsed = (time.perf_counter() - start) / repeat
+        return {
+            'name': name,
+            'sql': sql,
+            'plan': plan,
+            'scan': any(cls.is_full_scan(detail) for detail in plan),
+            'rows': row_count,
+            'ms': elapsed * 1000
+        }
+
+    @classmethod
+    def audit(cls, repeat: int = AUDIT_REPEAT) -> list:
+        res = [cls.audit_query(name, query, repeat) for name, query in hot_query_list()]
+        for data in res:
+            if data['scan']:
+                logger.warning(f"query audit: {data['name']} full scan, {data['ms']:.2f}ms, plan {data['plan']}")
+        return res
+
+    @classmethod
+    def get_report(cls, repeat: int = AUDIT_REPEAT) -> str:
+        res = cls.audit(repeat)
+        lines = [f"{'!' if data['scan'] else ' '} {data['name']}: {data['ms']:.2f}ms, {data['rows']} rows\n"
+                 f"    {'; '.join(data['plan'])}" for data in res]
+        return '\n'.join(lines)
@@ -0,0 +1,80 @@
+import time
+import threading
+
+from peewee import AutoField
+
+from .connect import DatabaseConectManager
+from ..log_server import logger
+
+
+class DoubleBuffer:
+    """
+    staging表与*_cache表的双缓冲。
+    刷新任务只写staging表，完成后在一个短事务内重命名交换两张表，读者只会看到完整的旧快照或新快照，
+    不再需要整表 DELETE + INSERT SELECT。
+
+    交换后staging表保存的是上一份快照，因此每次刷新开始前调用prepare清空staging表，
+    刷新中被跳过的分区(无权限、请求失败等)调用carry_over从cache表沿用旧数据。
+    同一组表的 prepare -> 写入 -> swap 需要在get_lock返回的锁内完成。
+    直接增量写入cache表的刷新(见OrderDeltaRefresh)不经过staging表，写入后调用clear清空staging表，
+    staging表中不保留过期的快照，之后的整表刷新与carry_over都只读取cache表。
+    """
+    _lock = threading.Lock()
+    lock_dict = dict()  # {staging_table_name: threading.Lock}
+
+    @classmethod
+    def get_lock(cls, staging_model) -> threading.Lock:
+        table_name = staging_model._meta.table_name
+        with cls._lock:
+            if table_name not in cls.lock_dict:
+                cls.lock_dict[table_name] = threading.Lock()
+            return cls.lock_dict[table_name]
+
+    @classmethod
+    def copy_fields(cls, staging_model, cache_model):
+        # 自增主键不复制，避免与staging表中已写入的行冲突
+        staging_fields = [field for field in staging_model._meta.sorted_fields if not isinstance(field, AutoField)]
+        cache_fields = [cache_model._meta.fields[field.name] for field in staging_fields]
+        return staging_fields, cache_fields
+
+    @classmethod
+    def carry_over(cls, staging_model, cache_model, where) -> int:
+        """ 将cache表中满足where的行复制到staging表，where为cache_model上的条件。return: 复制的行数 """
+        staging_fields, cache_fields = cls.copy_fields(staging_model, cache_model)
+        db = DatabaseConectManager.cache_db()
+        with db.atomic():
+            count = (staging_model
+                     .insert_from(cache_model.select(*cache_fields).where(where), staging_fields)
+                     .as_rowcount()
+                     .execute())
+        logger.info(f"{staging_model._meta.table_name} carry over {count} rows from {cache_model._meta.table_name}.")
+        return count
+
+    @classmethod
+    def clear(cls, staging_model):
+        db = DatabaseConectManager.cache_db()
+        with db.atomic():
+            staging_model.delete().execute()
+
+    @classmethod
+    def prepare(cls, staging_model, cache_model, keep=None):
+        """
+        清空staging表开始新一轮刷新。
+        :param keep: 只刷新部分分区时，cache表中需要保留的行的条件
+        """
+        cls.clear(staging_model)
+        if keep is not None:
+            cls.carry_over(staging_model, cache_model, keep)
+
+    @classmethod
+    def swap(cls, staging_model, cache_model):
+        start = time.perf_counter()
+        staging_table = staging_model._meta.table_name
+        cache_table = cache_model._meta.table_name
+        swap_table = f"{cache_table}__swap"
+        db = DatabaseConectManager.cache_db()
+        with db.atomic():
+            db.execute_sql(f'ALTER TABLE "{cache_table}" RENAME TO "{swap_table}"')
+            db.execute_sql(f'ALTER TABLE "{staging_table}" RENAME TO "{cache_table}"')
+            db.execute_sql(f'ALTER TABLE "{swap_table}" RENAME TO "{staging_table}"')
+        logger.info(f"swap {staging_table} -> {cache_table} complete in {time.perf_counter() - start:.3f}s.")
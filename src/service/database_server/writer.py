@@ -0,0 +1,77 @@
+import os
+import time
+import queue
+import threading
+import functools
+from concurrent.futures import Future
+
+from ..log_server import logger
+
+
+class CacheWriter:
+    """
+    缓存数据库的单写线程。
+    定时刷新任务都排入同一个写队列，在一个线程中依次执行，写事务之间不再互相等待busy timeout；
+    交互查询使用DatabaseConectManager.cache_read_db()的只读连接，不受刷新写入影响。
+
+    任务内部等待esi请求时不能等待队列中其他任务的结果，只能submit不等待，
+    esi缓存与历史统计等零散的小写入都以这种方式排入队列，见EsiCache.flush与HistorySummary.update。
+    """
+    _lock = threading.Lock()
+    write_queue = queue.Queue()
+    thread = None
+
+    @classmethod
+    def start(cls):
+        if cls.thread is not None:
+            return
+        with cls._lock:
+            if cls.thread is None:
+                cls.thread = threading.Thread(target=cls.worker, name="cache-writer", daemon=True)
+                cls.thread.start()
+
+    @classmethod
+    def worker(cls):
+        while True:
+            func, args, kwargs, future = cls.write_queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            start = time.perf_counter()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            logger.info(f"cache writer: {getattr(func, '__qualname__', func)} done in "
+                        f"{time.perf_counter() - start:.2f}s, {cls.write_queue.qsize()} pending.")
+
+    @classmethod
+    def submit(cls, func, *args, **kwargs) -> Future:
+        cls.start()
+        future = Future()
+        cls.write_queue.put((func, args, kwargs, future))
+        return future
+
+    @classmethod
+    def run(cls, func, *args, **kwargs):
+        """ 在写线程中执行并等待结果，已在写线程中时直接执行 """
+        if threading.current_thread() is cls.thread:
+            return func(*args, **kwargs)
+        return cls.submit(func, *args, **kwargs).result()
+
+    @classmethod
+    def reset_after_fork(cls):
+        """ fork出的子进程没有写线程，父进程的队列与锁也可能处于占用状态，全部重建 """
+        cls._lock = threading.Lock()
+        cls.write_queue = queue.Queue()
+        cls.thread = None
+
+    @classmethod
+    def wrap(cls, func):
+        """ 供refresh_per_min等定时任务使用 """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return cls.run(func, *args, **kwargs)
+        return wrapper
+
+
+os.register_at_fork(after_in_child=CacheWriter.reset_after_fork)
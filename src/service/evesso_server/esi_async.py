@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from dataclasses import dataclass, field
+
+import aiohttp
+
+from ..config_server.config import config
+from .esi_cache import EsiCache
+from ..log_server import logger
+
+# 同时进行的请求数
+ESI_CONCURRENCY = int(config.get('EVE', 'ESI_CONCURRENCY', fallback='') or 50)
+REQUEST_TIMEOUT = 60
+# 5xx与420重试，退避时间 random(0, min(BACKOFF_CAP, BACKOFF_BASE * 2^attempt))
+RETRY_STATUS = {420, 500, 502, 503, 504}
+MAX_RETRY = 4
+BACKOFF_BASE = 1
+BACKOFF_CAP = 30
+# 剩余错误额度低于该值时暂停全部请求直到窗口重置
+ERROR_LIMIT_THRESHOLD = 20
+
+
+@dataclass
+class EsiRequest:
+    url: str
+    headers: dict = field(default_factory=dict)
+    params: dict = field(default_factory=dict)
+    cache: bool = True
+
+
+class ErrorBudget:
+    """
+    全进程共用的esi错误额度。
+    每个响应的 X-ESI-Error-Limit-Remain / X-ESI-Error-Limit-Reset 更新剩余额度与重置时间，
+    额度不足时所有请求等待到窗口重置，避免触发420封禁。
+    """
+    remain = 100
+    reset_at = 0
+
+    @classmethod
+    def update(cls, headers):
+        remain = headers.get('X-ESI-Error-Limit-Remain', None)
+        reset = headers.get('X-ESI-Error-Limit-Reset', None)
+        if remain is None or reset is None:
+            return
+        cls.remain = int(remain)
+        cls.reset_at = time.monotonic() + int(reset)
+
+    @classmethod
+    def reset(cls):
+        cls.remain = 100
+        cls.reset_at = 0
+
+    @classmethod
+    async def wait(cls):
+        while cls.remain < ERROR_LIMIT_THRESHOLD and (delay := cls.reset_at - time.monotonic()) > 0:
+            logger.warning(f"esi error limit remain {cls.remain}, wait {delay:.0f}s.")
+            await asyncio.sleep(delay)
+        if cls.reset_at <= time.monotonic():
+            cls.remain = max(cls.remain, ERROR_LIMIT_THRESHOLD)
+
+
+class EsiTransport:
+    """
+    基于aiohttp的esi传输层。
+    独立线程运行一个事件循环，所有esi请求共用一个带连接池的ClientSession，
+    由信号量限制并发，5xx/420按抖动退避重试，并受ErrorBudget控制。
+    同步代码通过request / submit / request_many调用，协程中使用request_async。
+    """
+    _lock = threading.Lock()
+    loop = None
+    thread = None
+    session = None
+    semaphore = None
+    capture_local = threading.local()
+
+    @classmethod
+    def get_loop(cls) -> asyncio.AbstractEventLoop:
+        if cls.loop is not None:
+            return cls.loop
+        with cls._lock:
+            if cls.loop is None:
+                loop = asyncio.new_event_loop()
+                cls.thread = threading.Thread(target=loop.run_forever, name="esi-transport", daemon=True)
+                cls.thread.start()
+                asyncio.run_coroutine_threadsafe(cls.open_session(), loop).result()
+                cls.loop = loop
+        return cls.loop
+
+    @classmethod
+    async def open_session(cls):
+        cls.semaphore = asyncio.Semaphore(ESI_CONCURRENCY)
+        cls.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=ESI_CONCURRENCY),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+
+    @classmethod
+    def close(cls):
+        if cls.loop is None:
+            return
+        loop = cls.loop
+        asyncio.run_coroutine_threadsafe(cls.session.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        cls.thread.join()
+        cls.loop = None
+
+    @classmethod
+    def reset_after_fork(cls):
+        """
+        fork出的子进程不继承事件循环线程，父进程的session与信号量也不能在子进程使用，首次请求时重新创建；
+        错误额度由子进程自己的响应更新，不沿用父进程fork时的状态
+        """
+        cls._lock = threading.Lock()
+        cls.loop = None
+        cls.thread = None
+        cls.session = None
+        cls.semaphore = None
+        cls.capture_local = threading.local()
+        ErrorBudget.reset()
+
+    @classmethod
+    def capturing(cls) -> bool:
+        return getattr(cls.capture_local, 'enable', False)
+
+    @classmethod
+    def build_request(cls, esi_func, *args, **kwargs) -> EsiRequest:
+        """ 调用esi函数但不发送请求，get_request在此期间只返回EsiRequest """
+        cls.capture_local.enable = True
+        try:
+            return esi_func(*args, **kwargs)
+        finally:
+            cls.capture_local.enable = False
+
+    @classmethod
+    def get_params(cls, params: dict) -> dict:
+        res = dict()
+        for k, v in params.items():
+            if v is None:
+                continue
+            res[k] = str(v).lower() if isinstance(v, bool) else v
+        return res
+
+    @classmethod
+    def get_backoff(cls, attempt: int) -> float:
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    @classmethod
+    async def fetch(cls, request: EsiRequest) -> tuple:
+        """ :return: (data, pages)，失败时data为None """
+        cache = request.cache and EsiCache.available()
+        key = EsiCache.make_key(request.url, request.params) if cache else None
+        cache_data = await asyncio.to_thread(EsiCache.get, key) if cache else None
+        if cache_data is not None and EsiCache.is_fresh(cache_data):
+            return json.loads(cache_data.body), cache_data.pages
+
+        headers = dict(request.headers)
+        if cache_data is not None and cache_data.etag:
+            headers['If-None-Match'] = cache_data.etag
+        params = cls.get_params(request.params)
+        for attempt in range(MAX_RETRY + 1):
+            await ErrorBudget.wait()
+            try:
+                async with cls.semaphore:
+                    async with cls.session.get(request.url, params=params, headers=headers) as response:
+                        ErrorBudget.update(response.headers)
+                        if response.status == 304 and cache_data is not None:
+                            await asyncio.to_thread(EsiCache.touch, key, response.headers)
+                            return json.loads(cache_data.body), EsiCache.get_pages(response.headers, cache_data.pages)
+                        body = await response.text()
+                        if response.status == 200:
+                            if cache:
+                                await asyncio.to_thread(EsiCache.save, key, response.headers, body)
+                            return json.loads(body), EsiCache.get_pages(response.headers)
+                        if response.status not in RETRY_STATUS:
+                            logger.warning(f"esi {response.status} {request.url}: {body[:200]}")
+                            return None, 0
+                        logger.warning(f"esi {response.status} {request.url}, attempt {attempt + 1}/{MAX_RETRY + 1}.")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"esi request error {request.url}: {e!r}, attempt {attempt + 1}/{MAX_RETRY + 1}.")
+            if attempt < MAX_RETRY:
+                await asyncio.sleep(cls.get_backoff(attempt))
+        return None, 0
+
+    @classmethod
+    def submit(cls, request: EsiRequest):
+        """ 提交到传输层事件循环，返回concurrent.futures.Future """
+        return asyncio.run_coroutine_threadsafe(cls.fetch(request), cls.get_loop())
+
+    @classmethod
+    def request(cls, request: EsiRequest) -> tuple:
+        return cls.submit(request).result()
+
+    @classmethod
+    def request_many(cls, request_list: list) -> list:
+        """ 并发请求，按请求顺序返回[(data, pages)] """
+        async def gather():
+            return await asyncio.gather(*[cls.fetch(request) for request in request_list])
+        return asyncio.run_coroutine_threadsafe(gather(), cls.get_loop()).result()
+
+    @classmethod
+    async def request_async(cls, request: EsiRequest) -> tuple:
+        """ 在其他事件循环中等待请求 """
+        return await asyncio.wrap_future(cls.submit(request))
+
+
+os.register_at_fork(after_in_child=EsiTransport.reset_after_fork)
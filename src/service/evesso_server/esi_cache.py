@@ -0,0 +1,222 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlencode
+
+from peewee import fn
+
+from ..config_server.config import config
+from ..database_server.model import EsiResponseCache
+from ..database_server.connect import DatabaseConectManager
+from ..database_server.writer import CacheWriter
+from ..log_server import logger
+
+# 过期后仍保留的时间，用于携带ETag发起条件请求
+KEEP_EXPIRED_DAYS = 1
+# 响应体总大小上限，超出时按过期时间从早到晚淘汰
+MAX_CACHE_BYTES = int(config.get('EVE', 'ESI_CACHE_MAX_MB', fallback='') or 256) * 1024 * 1024
+# 每条批量写入的条数
+FLUSH_CHUNK = 100
+
+# 最近一次请求的X-Pages，同一线程内由find_max_page读取
+esi_local = threading.local()
+
+
+def set_last_pages(pages: int):
+    esi_local.pages = pages
+
+
+def get_last_pages() -> int:
+    return getattr(esi_local, 'pages', 0)
+
+
+class EsiCache:
+    """
+    ESI响应缓存。
+    按url与参数保存响应体、ETag、Expires与X-Pages，未过期时直接使用缓存，
+    过期后携带If-None-Match请求，304时沿用缓存的响应体并更新过期时间。
+
+    市场订单每次刷新全部页都会变化，响应体又很大，不经过缓存，订单数据只保存在market_order_cache。
+    其他响应体的总大小不超过MAX_CACHE_BYTES，写入量累计到上限的十分之一时检查一次并淘汰。
+
+    读取使用只读连接。保存与304更新先放入内存，由CacheWriter写线程的flush批量写入，
+    写线程忙于刷新任务时积累的响应在任务结束后一次写入，写入前get直接从内存返回。
+    """
+    _lock = threading.Lock()
+    # 等待写入的响应 {cache_key: 行数据}
+    pending_save = dict()
+    # 等待写入的304过期时间 {cache_key: expires}
+    pending_touch = dict()
+    flush_scheduled = False
+    # 上次淘汰检查后写入的响应体大小
+    written_bytes = 0
+
+    @classmethod
+    def available(cls) -> bool:
+        # 数据库初始化前的请求不使用缓存
+        return DatabaseConectManager.cache_db().obj is not None
+
+    @classmethod
+    def make_key(cls, url: str, params: dict) -> str:
+        params = {k: v for k, v in params.items() if v is not None}
+        if not params:
+            return url
+        return f"{url}?{urlencode(sorted(params.items()))}"
+
+    @classmethod
+    def get(cls, key: str):
+        with cls._lock:
+            row = cls.pending_save.get(key, None)
+            touch_expires = cls.pending_touch.get(key, None)
+        if row is not None:
+            return EsiResponseCache(**row)
+        try:
+            cache = (EsiResponseCache.select()
+                     .where(EsiResponseCache.cache_key == key)
+                     .bind(DatabaseConectManager.cache_read_db())
+                     .first())
+        except Exception as e:
+            logger.error(f"esi cache read error: {e}")
+            return None
+        if cache is not None and touch_expires is not None:
+            cache.expires = touch_expires
+        return cache
+
+    @classmethod
+    def get_expires(cls, headers) -> datetime | None:
+        """ Expires转换为不带时区的UTC时间 """
+        expires = headers.get('Expires', None)
+        if not expires:
+            return None
+        try:
+            return parsedate_to_datetime(expires).replace(tzinfo=None)
+        except (TypeError, ValueError):
+            return None
+
+    @classmethod
+    def get_pages(cls, headers, default: int = 0) -> int:
+        pages = headers.get('X-Pages', None)
+        return int(pages) if pages and pages.isdigit() else default
+
+    @classmethod
+    def is_fresh(cls, cache) -> bool:
+        return cache.expires is not None and cache.expires > datetime.utcnow()
+
+    @classmethod
+    def save(cls, key: str, headers, body: str):
+        row = {
+            'cache_key': key,
+            'etag': headers.get('ETag', None),
+            'expires': cls.get_expires(headers),
+            'pages': cls.get_pages(headers),
+            'body': body
+        }
+        with cls._lock:
+            cls.pending_save[key] = row
+            cls.pending_touch.pop(key, None)
+            cls.schedule_flush()
+
+    @classmethod
+    def touch(cls, key: str, headers):
+        """ 304时只更新过期时间 """
+        expires = cls.get_expires(headers)
+        with cls._lock:
+            if key in cls.pending_save:
+                # 替换为新行，正在写入的旧行不受影响
+                cls.pending_save[key] = dict(cls.pending_save[key], expires=expires)
+            else:
+                cls.pending_touch[key] = expires
+            cls.schedule_flush()
+
+    @classmethod
+    def schedule_flush(cls):
+        """ 持有_lock时调用，同一时间只排入一个flush """
+        if not cls.flush_scheduled:
+            cls.flush_scheduled = True
+            CacheWriter.submit(cls.flush)
+
+    @classmethod
+    def flush(cls):
+        """
+        在写线程中批量写入等待的响应。
+        提交后才从内存移除，写入期间get仍从内存读取，不会读到数据库中的旧行。
+        写入期间被再次保存或更新的条目保留，由下一次flush写入。
+        """
+        with cls._lock:
+            save_dict = dict(cls.pending_save)
+            touch_dict = dict(cls.pending_touch)
+            cls.flush_scheduled = False
+        if not save_dict and not touch_dict:
+            return
+        row_list = list(save_dict.values())
+        try:
+            with EsiResponseCache._meta.database.atomic():
+                for start in range(0, len(row_list), FLUSH_CHUNK):
+                    EsiResponseCache.replace_many(row_list[start:start + FLUSH_CHUNK]).execute()
+                for key, expires in touch_dict.items():
+                    (EsiResponseCache
+                     .update(expires=expires)
+                     .where(EsiResponseCache.cache_key == key)
+                     .execute())
+        except Exception as e:
+            logger.error(f"esi cache write error: {e}")
+            return
+        finally:
+            with cls._lock:
+                for key, row in save_dict.items():
+                    if cls.pending_save.get(key, None) is row:
+                        del cls.pending_save[key]
+                for key, expires in touch_dict.items():
+                    if key in cls.pending_touch and cls.pending_touch[key] == expires:
+                        del cls.pending_touch[key]
+        cls.written_bytes += sum(len(row['body']) for row in row_list)
+        if cls.written_bytes >= MAX_CACHE_BYTES // 10:
+            cls.evict()
+
+    @classmethod
+    def reset_after_fork(cls):
+        """ 子进程的写队列已重建，父进程未写入的响应留给父进程 """
+        cls._lock = threading.Lock()
+        cls.pending_save = dict()
+        cls.pending_touch = dict()
+        cls.flush_scheduled = False
+
+    @classmethod
+    def clean_expired(cls):
+        before = datetime.utcnow() - timedelta(days=KEEP_EXPIRED_DAYS)
+        count = EsiResponseCache.delete().where(EsiResponseCache.expires < before).execute()
+        logger.info(f"清理过期esi缓存 {count} 条。")
+        cls.evict()
+
+    @classmethod
+    def get_total_bytes(cls) -> int:
+        return EsiResponseCache.select(fn.SUM(fn.LENGTH(EsiResponseCache.body)).coerce(False)).scalar() or 0
+
+    @classmethod
+    def evict(cls, max_bytes: int = None) -> int:
+        """ 响应体总大小超过上限时，从最早过期的条目开始删除到上限以内。return: 删除条数 """
+        if max_bytes is None:
+            max_bytes = MAX_CACHE_BYTES
+        cls.written_bytes = 0
+        over_bytes = cls.get_total_bytes() - max_bytes
+        if over_bytes <= 0:
+            return 0
+        key_list = []
+        entry_iter = (EsiResponseCache
+                      .select(EsiResponseCache.cache_key, fn.LENGTH(EsiResponseCache.body).coerce(False))
+                      .order_by(EsiResponseCache.expires.asc(nulls='first'))
+                      .tuples())
+        for key, size in entry_iter:
+            if over_bytes <= 0:
+                break
+            key_list.append(key)
+            over_bytes -= size
+        with EsiResponseCache._meta.database.atomic():
+            for start in range(0, len(key_list), 500):
+                EsiResponseCache.delete().where(EsiResponseCache.cache_key << key_list[start:start + 500]).execute()
+        logger.info(f"esi缓存超出{max_bytes // 1024 // 1024}MB，淘汰 {len(key_list)} 条。")
+        return len(key_list)
+
+
+os.register_at_fork(after_in_child=EsiCache.reset_after_fork)
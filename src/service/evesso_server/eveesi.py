@@ -1,69 +1,84 @@
-import requests
 from cachetools import TTLCache, cached
 import traceback
 
+from ..config_server.config import config
+from .esi_cache import set_last_pages
+from .esi_async import EsiTransport, EsiRequest
+
 # kahuna logger
 
+# 可配置为本地esi服务用于测试
+ESI_BASE_URL = (config.get('EVE', 'ESI_BASE_URL', fallback='') or 'https://esi.evetech.net').rstrip('/')
+
 permission_set = set()
 
-def get_request(url, headers=dict(), params=dict()):
-    response = requests.get(url, params=params, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        return data  # 注意：实际的键可能不同，请参考 ESI 文档
-    else:
-        print(response.text)
-        return None
+def get_request(url, headers=dict(), params=dict(), cache: bool = True):
+    """
+    通过EsiTransport请求，cache为True时使用EsiCache：未过期直接返回缓存，过期后携带ETag请求，304沿用缓存。
+    响应的X-Pages通过esi_cache.get_last_pages读取。
+    EsiTransport.build_request期间不发送请求，返回EsiRequest供批量并发。
+    """
+    request = EsiRequest(url, dict(headers), dict(params), cache)
+    if EsiTransport.capturing():
+        return request
+    data, pages = EsiTransport.request(request)
+    set_last_pages(pages)
+    return data
 
 def verify_token(access_token):
+    # 同一url对应不同token，不能缓存
     return get_request(
-        "https://esi.evetech.net/verify/",
-        headers={"Authorization": f"Bearer {access_token}"}
+        f"{ESI_BASE_URL}/verify/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        cache=False
     )
 
 def character_character_id_skills(access_token, character_id):
     return get_request(
-        f"https://esi.evetech.net/latest/characters/{character_id}/skills/",
+        f"{ESI_BASE_URL}/latest/characters/{character_id}/skills/",
         headers={"Authorization": f"Bearer {access_token}"}
     )
 
 def character_character_id_wallet(access_token, character_id):
     return get_request(
-        f"https://esi.evetech.net/latest/characters/{character_id}/wallet/",
+        f"{ESI_BASE_URL}/latest/characters/{character_id}/wallet/",
         headers={"Authorization": f"Bearer {access_token}"}
     )
 
 
 def character_character_id_portrait(access_token, character_id):
     return get_request(
-        f"https://esi.evetech.net/latest/characters/{character_id}/portrait/",
+        f"{ESI_BASE_URL}/latest/characters/{character_id}/portrait/",
         headers={"Authorization": f"Bearer {access_token}"}
     )
 
 def characters_character_id_blueprints(page:int, access_token: str, character_id: int):
     return get_request(
-        f"https://esi.evetech.net/latest/characters/{character_id}/blueprints/",
+        f"{ESI_BASE_URL}/latest/characters/{character_id}/blueprints/",
         headers={"Authorization": f"Bearer {access_token}"},
         params={"page": page}
     )
 
 def industry_systems():
     return get_request(
-        f"https://esi.evetech.net/latest/industry/systems/"
+        f"{ESI_BASE_URL}/latest/industry/systems/"
     )
 
 def markets_structures(page: int, access_token: str, structure_id: int) -> dict:
+    # 订单页不缓存响应体，见EsiCache
     return get_request(
-        f"https://esi.evetech.net/latest/markets/structures/{structure_id}/",
+        f"{ESI_BASE_URL}/latest/markets/structures/{structure_id}/",
         headers={"Authorization": f"Bearer {access_token}"},
-        params={"page": page}
+        params={"page": page},
+        cache=False
     )
 
 def markets_region_orders(page: int, region_id: int, type_id: int =None):
     return get_request(
-        f"https://esi.evetech.net/latest/markets/{region_id}/orders/",
+        f"{ESI_BASE_URL}/latest/markets/{region_id}/orders/",
         headers={},
-        params={"page": page, "type_id": type_id}
+        params={"page": page, "type_id": type_id},
+        cache=False
     )
 
 def characters_character_assets(page: int, access_token: str, character_id: int):
@@ -71,7 +86,7 @@ def characters_character_assets(page: int, access_token: str, character_id: int)
 
     """
     return get_request(
-        f"https://esi.evetech.net/latest/characters/{character_id}/assets/",
+        f"{ESI_BASE_URL}/latest/characters/{character_id}/assets/",
         headers={"Authorization": f"Bearer {access_token}"},
         params={"page": page}
     )
@@ -93,7 +108,7 @@ def characters_character(character_id):
 # title - String
     """
     return get_request(
-        f"https://esi.evetech.net/latest/characters/{character_id}/"
+        f"{ESI_BASE_URL}/latest/characters/{character_id}/"
     )
 
 def corporations_corporation_assets(page: int, access_token: str, corporation_id: int):
@@ -108,20 +123,20 @@ def corporations_corporation_assets(page: int, access_token: str, corporation_id
     # type_id - Integer
     """
     return get_request(
-        f"https://esi.evetech.net/latest/corporations/{corporation_id}/assets/",
+        f"{ESI_BASE_URL}/latest/corporations/{corporation_id}/assets/",
         headers={"Authorization": f"Bearer {access_token}"},
         params={"page": page}
     )
 
 def corporations_corporation_id_roles(access_token: str, corporation_id: int):
     return get_request(
-        f"https://esi.evetech.net/latest/corporations/{corporation_id}/roles/",
+        f"{ESI_BASE_URL}/latest/corporations/{corporation_id}/roles/",
         headers={"Authorization": f"Bearer {access_token}"}
     )
 
 def corporations_corporation_id_industry_jobs(page: int, access_token: str, corporation_id: int, include_completed: bool = False):
     return get_request(
-        f"https://esi.evetech.net/latest/corporations/{corporation_id}/industry/jobs/",
+        f"{ESI_BASE_URL}/latest/corporations/{corporation_id}/industry/jobs/",
         headers={"Authorization": f"Bearer {access_token}"},
         params={
             "page": page,
@@ -131,7 +146,7 @@ def corporations_corporation_id_industry_jobs(page: int, access_token: str, corp
 
 def corporations_corporation_id_blueprints(page: int, access_token: str, corporation_id: int):
     return get_request(
-        f"https://esi.evetech.net/latest/corporations/{corporation_id}/blueprints/",
+        f"{ESI_BASE_URL}/latest/corporations/{corporation_id}/blueprints/",
         headers={"Authorization": f"Bearer {access_token}"},
         params={"page": page}
     )
@@ -148,13 +163,13 @@ def universe_structures_structure(access_token: str, structure_id: int):
     type_id
     """
     return get_request(
-        f"https://esi.evetech.net/latest/universe/structures/{structure_id}/",
+        f"{ESI_BASE_URL}/latest/universe/structures/{structure_id}/",
         headers={"Authorization": f"Bearer {access_token}"}
     )
 
 def universe_stations_station(station_id):
     return get_request(
-        f"https://esi.evetech.net/latest/universe/stations/{station_id}/"
+        f"{ESI_BASE_URL}/latest/universe/stations/{station_id}/"
     )
 
 def characters_character_id_industry_jobs(access_token: str, character_id: int, include_completed: bool = False):
@@ -169,7 +184,7 @@ def characters_character_id_industry_jobs(access_token: str, character_id: int,
         Industry jobs placed by a character
     """
     return get_request(
-        f"https://esi.evetech.net/latest/characters/{character_id}/industry/jobs/",
+        f"{ESI_BASE_URL}/latest/characters/{character_id}/industry/jobs/",
         headers={
             "Authorization": f"Bearer {access_token}"
         },
@@ -181,14 +196,15 @@ def characters_character_id_industry_jobs(access_token: str, character_id: int,
 
 def markets_prices():
     return get_request(
-        f'https://esi.evetech.net/latest/markets/prices/'
+        f'{ESI_BASE_URL}/latest/markets/prices/'
     )
 
 # /markets/{region_id}/history/
-def markets_region_history(region_id: int, type_id: int):
+def markets_region_history(region_id: int, type_id: int, cache: bool = True):
     return get_request(
-        f"https://esi.evetech.net/latest/markets/{region_id}/history/",
+        f"{ESI_BASE_URL}/latest/markets/{region_id}/history/",
         headers={},
-        params={"type_id": type_id, "region_id": region_id}
+        params={"type_id": type_id, "region_id": region_id},
+        cache=cache
     )
 
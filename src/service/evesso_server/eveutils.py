@@ -2,9 +2,12 @@ import functools
 import json
 from datetime import datetime
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait, FIRST_COMPLETED
 from tqdm import tqdm
 
+from .esi_cache import get_last_pages
+from .esi_async import EsiTransport
+
 class DateTimeEncoder(json.JSONEncoder):
     """Custom JSONEncoder subclass to handle datetime objects."""
 
@@ -29,6 +32,12 @@ def find_max_page_binary_search(esi_func, start, end, *args, **kwargs):
 
 
 def find_max_page(esi_func, *args, begin_page: int = 500, interval: int = 500, **kwargs):
+    # 第1页响应头的X-Pages即为总页数，没有该响应头时再逐段探测
+    if not esi_func(1, *args, **kwargs):
+        return 0
+    if (pages := get_last_pages()) > 0:
+        return pages
+
     initial_page = 0
     page = initial_page
 
@@ -42,14 +51,31 @@ def find_max_page(esi_func, *args, begin_page: int = 500, interval: int = 500, *
     return find_max_page_binary_search(esi_func, max(0, page - interval), max(page - interval + 1, page), *args, **kwargs)
 
 def get_multipages_result(esi_func, max_page, *args, **kwargs):
-    with ThreadPoolExecutor(max_workers=100) as executor:
-        futures = [executor.submit(esi_func, page, *args, **kwargs) for
-                   page in range(1, max_page + 1)]
-        results = []
-        count = 1
-        for future in tqdm(futures, desc="请求数据", unit="page", ascii='=-'):
-            result = future.result()
+    request_list = [EsiTransport.build_request(esi_func, page, *args, **kwargs) for page in range(1, max_page + 1)]
+    results = []
+    with tqdm(total=len(request_list), desc="请求数据", unit="page", ascii='=-') as pbar:
+        for result, _ in EsiTransport.request_many(request_list):
             if result:
                 results.append(result)
-            count += 1
-    return results
\ No newline at end of file
+            pbar.update()
+    return results
+
+def iter_multipages_result(esi_func, max_page, *args, max_in_flight: int = 200, **kwargs):
+    """
+    并发请求各页并按完成顺序逐页返回，同时在途的请求不超过max_in_flight，内存占用与总页数无关。
+    """
+    page_iter = iter(range(1, max_page + 1))
+    in_flight = set()
+    for page in page_iter:
+        in_flight.add(EsiTransport.submit(EsiTransport.build_request(esi_func, page, *args, **kwargs)))
+        if len(in_flight) >= max_in_flight:
+            break
+    while in_flight:
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            next_page = next(page_iter, None)
+            if next_page is not None:
+                in_flight.add(EsiTransport.submit(EsiTransport.build_request(esi_func, next_page, *args, **kwargs)))
+            result, _ = future.result()
+            if result:
+                yield result
@@ -31,7 +31,7 @@ class FeiShuClient:
     api = None
     secret_id = None
     _access_token = None
-    expire_time = 0
+    expire_time = datetime.min
     _folder_token = None
     cache = TTLCache(maxsize=10, ttl=15 * 60)
     sheet_info_cache = TTLCache(maxsize=10, ttl=15 * 60)
@@ -40,7 +40,7 @@ class FeiShuClient:
     def __init__(self, app_id, secret_id):
         self.app_id = app_id
         self.secret_id = secret_id
-        self.get_access_token()
+        # token在首次调用接口时获取，模块导入时不访问网络
 
     def get_access_token(self):
         res = api.post_tenant_access_token(self.app_id, self.secret_id)
@@ -0,0 +1,73 @@
+import time
+import threading
+
+from .matcher import Matcher
+from .recipe_index import RecipeIndex
+from ..log_server import logger
+
+
+class BlockIndex:
+    """
+    prod_block匹配器编译后的索引 {type_id: 最小屏蔽等级}。
+    物品匹配任一规则且规则等级 <= bp_block_level 即被屏蔽，因此只需保存所有匹配规则中的最小等级。
+    索引按(matcher_name, version)缓存，匹配器保存后版本号变化，下次使用时自动重新编译。
+    """
+    _lock = threading.Lock()
+    index_dict = dict()  # {matcher_name: ((id(matcher), version), {type_id: level})}
+
+    @classmethod
+    def get_type_level(cls, matcher: Matcher, type_id: int) -> int | None:
+        """ 按bp, market_group, group, meta, category匹配，返回最小等级，未匹配返回None """
+        bp_name, mklist, group, meta, category = Matcher.get_type_match_keys(type_id)
+        matcher_data = matcher.matcher_data
+        level_list = []
+        if bp_name in matcher_data["bp"]:
+            level_list.append(matcher_data["bp"][bp_name])
+        for market_group in mklist:
+            if market_group in matcher_data["market_group"]:
+                level_list.append(matcher_data["market_group"][market_group])
+        if group in matcher_data["group"]:
+            level_list.append(matcher_data["group"][group])
+        if meta in matcher_data["meta"]:
+            level_list.append(matcher_data["meta"][meta])
+        if category in matcher_data["category"]:
+            level_list.append(matcher_data["category"][category])
+        return min(level_list) if level_list else None
+
+    @classmethod
+    def compile(cls, matcher: Matcher) -> dict:
+        start = time.perf_counter()
+        index = dict()
+        for type_id in RecipeIndex.product_ids():
+            level = cls.get_type_level(matcher, type_id)
+            if level is not None:
+                index[type_id] = level
+        logger.info(f'BlockIndex {matcher.matcher_name} v{matcher.version}: '
+                    f'{len(index)} blocked types in {time.perf_counter() - start:.2f}s.')
+        return index
+
+    @classmethod
+    def get_index(cls, matcher: Matcher) -> dict:
+        # 匹配器删除后重建同名匹配器时版本号会归零，同时比较对象id
+        version = (id(matcher), matcher.version)
+        cache = cls.index_dict.get(matcher.matcher_name, None)
+        if cache is not None and cache[0] == version:
+            return cache[1]
+        with cls._lock:
+            cache = cls.index_dict.get(matcher.matcher_name, None)
+            if cache is None or cache[0] != version:
+                cache = (version, cls.compile(matcher))
+                cls.index_dict[matcher.matcher_name] = cache
+        return cache[1]
+
+    @classmethod
+    def get_block_level(cls, matcher: Matcher, type_id: int) -> int | None:
+        if RecipeIndex.has_product(type_id):
+            return cls.get_index(matcher).get(type_id, None)
+        # 不可制造的物品不在索引内，直接匹配
+        return cls.get_type_level(matcher, type_id)
+
+    @classmethod
+    def is_blocked(cls, matcher: Matcher, type_id: int, bp_block_level: int) -> bool:
+        level = cls.get_block_level(matcher, type_id)
+        return level is not None and level <= bp_block_level
@@ -3,36 +3,16 @@ from tokenize import group
 from peewee import DoesNotExist
 
 from ..sde_service import SdeUtils
-from ..sde_service.database import IndustryActivityMaterials, IndustryActivityProducts, IndustryBlueprints
+from .recipe_index import RecipeIndex
 
 class BPManager:
     @classmethod
-    @lru_cache(maxsize=1000)
     def get_bp_materials(cls, type_id: int) -> dict:
-        material_search = (
-            IndustryActivityMaterials
-                .select(IndustryActivityMaterials.materialTypeID, IndustryActivityMaterials.quantity)
-                .join(IndustryActivityProducts,
-                      on=(IndustryActivityMaterials.blueprintTypeID==IndustryActivityProducts.blueprintTypeID))
-                .where((IndustryActivityProducts.productTypeID==type_id) &
-                       (IndustryActivityProducts.blueprintTypeID != 45732) &
-                       ((IndustryActivityMaterials.activityID == 1) | (IndustryActivityMaterials.activityID == 11)))
-        )
-        return {material.materialTypeID: material.quantity for material in material_search}
+        return RecipeIndex.get_materials(type_id)
 
     @classmethod
-    @lru_cache(maxsize=1000)
     def get_bp_product_quantity_typeid(cls, type_id: int) -> int:
-        try:
-            #45732是一个测试用数据，会导致误判，需要特殊处理
-            product_quantity = IndustryActivityProducts.select(IndustryActivityProducts.quantity).where(
-                (IndustryActivityProducts.productTypeID == type_id) &
-                (IndustryActivityProducts.blueprintTypeID != 45732)
-            ).get().quantity
-        except DoesNotExist:
-            product_quantity = 1  # 或者你想要的默认值
-
-        return product_quantity
+        return RecipeIndex.get_product_quantity(type_id)
 
     # @classmethod
     # def get_formula_id_by_prod_typeid(cls, type_id: int, unrefined: bool = False) -> int:
@@ -53,14 +33,8 @@ class BPManager:
     #              .where(IndustryActivityProducts.productTypeID == type_id)).scalar()
 
     @classmethod
-    @lru_cache(maxsize=100)
     def get_bp_id_by_prod_typeid(cls, type_id: int) -> int:
-        return (
-            IndustryActivityProducts
-                 .select(IndustryActivityProducts.blueprintTypeID)
-                 .where((IndustryActivityProducts.productTypeID == type_id) &
-                        (IndustryActivityProducts.blueprintTypeID != 45732)).scalar()
-        )
+        return RecipeIndex.get_bp_id(type_id)
 
     @classmethod
     @lru_cache(maxsize=100)
@@ -68,21 +42,15 @@ class BPManager:
         bp_maybe_type_id = SdeUtils.get_id_by_name(bp_name)
         if not bp_maybe_type_id:
             return None
-        bp_id = (IndustryActivityProducts
-                 .select(IndustryActivityProducts.blueprintTypeID)
-                 .where(IndustryActivityProducts.blueprintTypeID == bp_maybe_type_id)
-                 .scalar())
-        if bp_id:
-            return bp_id
+        if RecipeIndex.is_blueprint(bp_maybe_type_id):
+            return bp_maybe_type_id
         return None
 
     @classmethod
-    @lru_cache(maxsize=1000)
     def check_product_id_existence(cls, product_type_id: int) -> bool:
-        return IndustryActivityProducts.select().where(IndustryActivityProducts.productTypeID == product_type_id).exists()
+        return RecipeIndex.has_product(product_type_id)
 
     @classmethod
-    @lru_cache(maxsize=1000)
     def get_production_time(cls, product_id: int) -> int:
         """
         获取指定产品的制造活动时间（秒）
@@ -91,33 +59,24 @@ class BPManager:
         返回：
             int: 制造活动时间，单位秒。如果未找到返回0
         """
-        details = cls.get_blueprint_details(product_id)
-        if details is None:
+        activity = RecipeIndex.get_activity(product_id)
+        if activity is None:
             return 0
-            
-        for activity in details['activities']:
-            if activity['activityID'] == 1 or activity['activityID'] == 11:  # 制造活动
-                return activity['time']
-        return 0
+        return activity[1]
 
     @classmethod
-    @lru_cache(maxsize=1000)
     def get_action_id(cls, product_id: int) -> int:
         """
-        获取指定产品的制造活动时间（秒）
+        获取指定产品的制造活动id
         参数：
             product_id (int): 产品ID
         返回：
-            int: 制造活动时间，单位秒。如果未找到返回0
+            int: 制造活动id，1为制造，11为反应。如果未找到返回0
         """
-        details = cls.get_blueprint_details(product_id)
-        if details is None:
+        activity = RecipeIndex.get_activity(product_id)
+        if activity is None:
             return 0
-
-        for activity in details['activities']:
-            if activity['activityID'] == 1 or activity['activityID'] == 11:  # 制造活动
-                return activity['activityID']
-        return 0
+        return activity[0]
 
     @classmethod
     @lru_cache(maxsize=1000)
@@ -144,7 +103,7 @@ class BPManager:
         返回：
             dict: 包含蓝图详细信息的字典，包括基本属性、材料和活动时间
         """
-        from ..sde_service.database import InvTypes, IndustryActivityMaterials, IndustryActivities
+        from ..sde_service.database import InvTypes
         
         blueprint_details = {
             'product_info': {},
@@ -165,46 +124,20 @@ class BPManager:
             }
             
             # 获取所有与该产品相关的蓝图活动材料
-            materials = IndustryActivityMaterials.select(
-                    IndustryActivityMaterials.materialTypeID,
-                    IndustryActivityMaterials.quantity  # 
-                ).join(
-                IndustryActivityProducts,
-                on=(IndustryActivityMaterials.blueprintTypeID == 
-                    IndustryActivityProducts.blueprintTypeID)
-            ).where((IndustryActivityProducts.productTypeID == product_id) &
-                    (IndustryActivityProducts.blueprintTypeID != 45732) &
-                    ((IndustryActivityMaterials.activityID == 1) | (IndustryActivityMaterials.activityID == 11)))
-            
-            for material in materials:
+            for material_type_id, quantity in RecipeIndex.get_materials(product_id).items():
                 blueprint_details['materials'].append({
-                    'material_typeID': material.materialTypeID,
-                    'quantity': material.quantity
+                    'material_typeID': material_type_id,
+                    'quantity': quantity
                 })
-            
+
             # 获取所有与该产品相关的蓝图活动信息
-            # 首先通过 IndustryActivityProducts 获取 blueprintTypeID
-            blueprint_type_id = IndustryActivityProducts.select(
-                IndustryActivityProducts.blueprintTypeID
-            ).where(
-                (IndustryActivityProducts.productTypeID == product_id) &
-                (IndustryActivityProducts.blueprintTypeID != 45732)
-            ).get().blueprintTypeID
-            
-            # 然后使用 blueprintTypeID 查询 IndustryActivities
-            activities = IndustryActivities.select(
-                IndustryActivities.activityID,
-                IndustryActivities.time
-            ).where(
-                (IndustryActivities.blueprintTypeID == blueprint_type_id) &
-                (IndustryActivities.blueprintTypeID != 45732)
-            )
-            
-            for activity in activities:
-                blueprint_details['activities'].append({
-                    'activityID': activity.activityID,
-                    'time': activity.time
-                })
+            activity = RecipeIndex.get_activity(product_id)
+            if activity is None:
+                return None
+            blueprint_details['activities'].append({
+                'activityID': activity[0],
+                'time': activity[1]
+            })
 
         except DoesNotExist as e:
             return None
@@ -213,8 +146,7 @@ class BPManager:
 
     @classmethod
     def get_typeid_by_bpid(cls, blueprint_id: int):
-        return (IndustryActivityProducts.select(IndustryActivityProducts.productTypeID)
-                                  .where(IndustryActivityProducts.blueprintTypeID == blueprint_id).scalar())
+        return RecipeIndex.get_product_id(blueprint_id)
 
     @classmethod
     @lru_cache(maxsize=1000)
@@ -224,5 +156,4 @@ class BPManager:
         cate = SdeUtils.get_category_by_id(product_id)
         if meta == 'Faction' and cate == 'Ship':
             return 1
-        return (IndustryBlueprints.select(IndustryBlueprints.maxProductionLimit)
-                                  .where(IndustryBlueprints.blueprintTypeID == blueprint_id).scalar())
\ No newline at end of file
+        return RecipeIndex.get_max_production_limit(blueprint_id)
\ No newline at end of file
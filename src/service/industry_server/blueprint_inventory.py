@@ -0,0 +1,90 @@
+from ..asset_server.asset_container import AssetContainer
+from ..database_server.model import BlueprintAssetCache
+from ..database_server.connect import DatabaseConectManager
+from .blueprint import BPManager
+
+# 蓝图仓库的标签
+BP_CONTAINER_TAGS = ["bp", "manu", "reac"]
+
+
+class BlueprintInventory:
+    """
+    单次分析使用的蓝图库存快照。
+    一次查询读取用户bp/manu/reac仓库内的全部蓝图，按蓝图type_id分组为拷贝与原图，
+    工作序列生成时在内存中分配与释放。
+    实际需求、全体需求等视图各自独立安排同一批蓝图，分配按视图隔离，
+    key为(view, source_id)，只排除同一视图内其他key占用的蓝图。
+    """
+    def __init__(self, owner_qq: int, using_bp: set):
+        self.owner_qq = owner_qq
+        self.using_bp = using_bp
+        # {bp_type_id: [(runs, material_efficiency, time_efficiency, item_id, location_id)]}
+        self.bpc_dict = dict()
+        # {bp_type_id: [(quantity, material_efficiency, time_efficiency, item_id, location_id)]}
+        self.bpo_dict = dict()
+        # {(view, source_id): {item_id}}
+        self.allocated_dict = dict()
+        # {view: {item_id}}
+        self.allocated_item = dict()
+
+    def load(self):
+        container_list = AssetContainer.get_contain_id_by_qq_tags(self.owner_qq, BP_CONTAINER_TAGS)
+        bp_search = (BlueprintAssetCache
+                     .select(BlueprintAssetCache.type_id, BlueprintAssetCache.runs, BlueprintAssetCache.quantity,
+                             BlueprintAssetCache.material_efficiency, BlueprintAssetCache.time_efficiency,
+                             BlueprintAssetCache.item_id, BlueprintAssetCache.location_id)
+                     .where(BlueprintAssetCache.location_id << container_list)
+                     .bind(DatabaseConectManager.cache_read_db())
+                     .tuples())
+        for bp_type_id, runs, quantity, mater_eff, time_eff, item_id, location_id in bp_search:
+            if runs > 0:
+                if bp_type_id not in self.bpc_dict:
+                    self.bpc_dict[bp_type_id] = []
+                self.bpc_dict[bp_type_id].append((runs, mater_eff, time_eff, item_id, location_id))
+            elif runs < 0:
+                if bp_type_id not in self.bpo_dict:
+                    self.bpo_dict[bp_type_id] = []
+                self.bpo_dict[bp_type_id].append((quantity, mater_eff, time_eff, item_id, location_id))
+
+        # 与原先查询结果的顺序无关，排序后保证结果稳定
+        for bpc_list in self.bpc_dict.values():
+            bpc_list.sort(key=lambda x: (x[1], x[0], x[3]), reverse=True)
+        for bpo_list in self.bpo_dict.values():
+            bpo_list.sort(key=lambda x: (x[1], x[3]), reverse=True)
+        return self
+
+    def avaliable(self, item_id: int, view: str) -> bool:
+        return item_id not in self.using_bp and item_id not in self.allocated_item.get(view, ())
+
+    def get_bpc_list(self, bp_type_id: int, view: str) -> list:
+        """ 可用的拷贝，按材料效率、流程数从大到小 [(runs, material_efficiency, time_efficiency, item_id, location_id)] """
+        return [bpc for bpc in self.bpc_dict.get(bp_type_id, []) if self.avaliable(bpc[3], view)]
+
+    def get_bpo_list(self, bp_type_id: int, view: str) -> list:
+        """ 可用的原图，按材料效率从大到小 [(quantity, material_efficiency, time_efficiency, item_id, location_id)] """
+        return [bpo for bpo in self.bpo_dict.get(bp_type_id, []) if self.avaliable(bpo[3], view)]
+
+    def allocate(self, key: tuple, item_id_set: set):
+        """ key: (view, source_id) """
+        self.release(key)
+        self.allocated_dict[key] = set(item_id_set)
+        view = key[0]
+        if view not in self.allocated_item:
+            self.allocated_item[view] = set()
+        self.allocated_item[view] |= self.allocated_dict[key]
+
+    def release(self, key: tuple):
+        item_id_set = self.allocated_dict.pop(key, None)
+        if item_id_set:
+            self.allocated_item[key[0]] -= item_id_set
+
+    def get_signature(self) -> dict:
+        """ 可用蓝图库存的签名 {product_id: frozenset}，用于判断哪些节点的工作序列需要重新安排 """
+        signature = dict()
+        for bp_dict in [self.bpc_dict, self.bpo_dict]:
+            for bp_type_id, bp_list in bp_dict.items():
+                product_id = BPManager.get_typeid_by_bpid(bp_type_id)
+                if product_id not in signature:
+                    signature[product_id] = set()
+                signature[product_id].update((bp, bp[3] in self.using_bp) for bp in bp_list)
+        return {product_id: frozenset(data) for product_id, data in signature.items()}
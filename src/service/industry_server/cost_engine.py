@@ -0,0 +1,153 @@
+import math
+import time
+from collections import deque
+
+from .blueprint import BPManager
+from .industry_utils import IdsUtils as IdsU
+from ..sde_service.utils import SdeUtils
+from ..log_server import logger
+from ...utils import KahunaException
+
+# 成本计算使用的蓝图分配视图，与单产品分析的全体需求一致
+COST_VIEW = 'cost'
+
+
+class CostEngine:
+    """
+    批量成本计算，结果与signal_async_progress_work_type逐个产品分析的全体部分一致。
+
+    所有产品共用一个分析器：蓝图仓库、运行中工作与蓝图库存只读取一次，
+    材料展开、工作序列、单位EIV与材料单价在产品之间复用。
+    每个产品按拓扑序自顶向下计算全体需求，父节点对子节点的贡献与calculate_work_bpnode_quantity相同：
+        按工作序列依次累加流程，每个工作使用自己的材料效率(材料数量为1时不吃加成)，
+        最后一个工作超出需求的部分按比例扣除。
+    """
+    @classmethod
+    def get_children(cls, analyser, type_id: int, memo: dict):
+        """ 可展开节点的材料 {child_id: quantity}，作为材料购买时为None """
+        if type_id not in memo:
+            bp_materials = BPManager.get_bp_materials(type_id)
+            if not bp_materials or not BPManager.get_bp_id_by_prod_typeid(type_id) or analyser.in_pd_block(type_id):
+                bp_materials = None
+            memo[type_id] = bp_materials
+        return memo[type_id]
+
+    @classmethod
+    def get_work_list(cls, analyser, type_id: int, runs: int, memo: dict) -> list:
+        """ 同一节点相同流程数的工作序列只安排一次 """
+        key = (type_id, runs)
+        if key not in memo:
+            memo[key] = analyser.get_runs_list_by_bpasset(runs, type_id, analyser.owner_qq, dict(), COST_VIEW)
+        return memo[key]
+
+    @classmethod
+    def get_contribution(cls, father_id, work_list: list, father_need: float, quantity: int) -> float:
+        """ 父节点需求father_need对子节点的消耗，与calculate_work_bpnode_quantity全体部分的单index计算相同 """
+        if father_need <= 0:
+            return 0
+        product_quantity = BPManager.get_bp_product_quantity_typeid(father_id)
+        production_sum = 0
+        used_sum = 0
+        work_list_len = len(work_list)
+        work_i = 0
+        while production_sum < father_need and work_i < work_list_len:
+            production_sum += work_list[work_i].runs * product_quantity
+            # 如果需求为1，不吃材料加成
+            used_sum += work_list[work_i].runs * quantity * (1 if quantity == 1 else work_list[work_i].mater_eff)
+            if work_i < work_list_len - 1:
+                work_i += 1
+        if production_sum > father_need:
+            bp_used_ratio = (production_sum - father_need) / work_list[work_i].runs / product_quantity
+            less = bp_used_ratio * work_list[work_i].runs * quantity * \
+                (1 if quantity == 1 else work_list[work_i].mater_eff)
+            return used_sum - less
+        if production_sum == father_need:
+            return used_sum
+        raise KahunaException(f"{father_id} work cant cover need.")
+
+    @classmethod
+    def get_topo_order(cls, analyser, type_id: int, children_memo: dict):
+        """
+        产品展开后的节点拓扑序与每个节点的父节点列表，父节点按广度优先首次出现的顺序排列。
+        return: (topo_order, {node: [father_id]})
+        """
+        parent_dict = {type_id: []}
+        bfs_queue = deque([type_id])
+        while bfs_queue:
+            node = bfs_queue.popleft()
+            for child_id in (cls.get_children(analyser, node, children_memo) or ()):
+                if child_id not in parent_dict:
+                    parent_dict[child_id] = []
+                    bfs_queue.append(child_id)
+                parent_dict[child_id].append(node)
+
+        in_degree = {node: len(parent_list) for node, parent_list in parent_dict.items()}
+        ready = deque([type_id])
+        topo_order = []
+        while ready:
+            node = ready.popleft()
+            topo_order.append(node)
+            for child_id in (cls.get_children(analyser, node, children_memo) or ()):
+                in_degree[child_id] -= 1
+                if in_degree[child_id] == 0:
+                    ready.append(child_id)
+        if len(topo_order) != len(parent_dict):
+            raise KahunaException(f'蓝图树存在循环: {SdeUtils.get_name_by_id(type_id)}')
+        return topo_order, parent_dict
+
+    @classmethod
+    def get_product_cost(cls, analyser, type_id: int, quantity: int, memo: dict) -> list:
+        """ return: [material_cost, eiv_cost, total_cost] """
+        topo_order, parent_dict = cls.get_topo_order(analyser, type_id, memo['children'])
+
+        need_dict = {type_id: quantity}
+        work_dict = dict()
+        material_cost = 0
+        eiv_cost = 0
+        for node in topo_order:
+            if node != type_id:
+                need_dict[node] = sum(
+                    cls.get_contribution(father_id, work_dict[father_id], need_dict[father_id],
+                                         memo['children'][father_id][node])
+                    for father_id in parent_dict[node])
+            need = need_dict[node]
+            if memo['children'][node] is None:
+                if analyser.depth_price:
+                    material_cost += analyser.get_buy_cost(node, need)
+                    continue
+                if node not in memo['price']:
+                    memo['price'][node] = analyser.market.get_type_order_rouge(node)[0]
+                material_cost += need * memo['price'][node]
+                continue
+
+            runs = math.ceil(need / BPManager.get_bp_product_quantity_typeid(node))
+            work_dict[node] = cls.get_work_list(analyser, node, runs, memo['work'])
+            if node not in memo['eiv']:
+                memo['eiv'][node] = IdsU.get_eiv_cost(node, 1, analyser.owner_qq, analyser.st_matcher)
+            eiv_cost += memo['eiv'][node] * need
+        return [material_cost, eiv_cost, material_cost + eiv_cost]
+
+    @classmethod
+    def get_cost_data(cls, analyser, plan_list: list) -> dict:
+        """
+        :param plan_list: [[product_name, quantity]]
+        :return: {product_name: [material_cost, eiv_cost, total_cost]}
+        """
+        start = time.perf_counter()
+        # 与单产品分析一致，需要预先获取蓝图仓库、正在使用的蓝图与蓝图库存
+        analyser.get_target_container()
+        analyser.get_running_job()
+        analyser.load_bp_inventory()
+
+        memo = {'children': dict(), 'work': dict(), 'eiv': dict(), 'price': dict()}
+        cost_dict = dict()
+        for product, quantity in plan_list:
+            type_id = SdeUtils.get_id_by_name(product)
+            if not type_id or not BPManager.get_bp_id_by_prod_typeid(type_id):
+                cost_dict[product] = [0, 0, 0]
+                continue
+            cost_dict[product] = cls.get_product_cost(analyser, type_id, quantity, memo)
+
+        logger.info(f'CostEngine: {len(plan_list)} products, {len(memo["children"])} nodes, '
+                    f'{len(memo["work"])} work lists in {time.perf_counter() - start:.2f}s.')
+        return cost_dict
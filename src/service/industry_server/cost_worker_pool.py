@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+import multiprocessing
+
+from ..log_server import logger
+
+# 等待结果的轮询间隔，取消或进程池被终止后最多等待该时间返回
+POLL_INTERVAL = 0.5
+
+
+def _init_worker():
+    """
+    进程初始化，只执行一次：连接数据库，只加载成本计算读取的配方索引、匹配器、建筑与订单簿。
+    不执行warm_up，延后的迁移、历史序列与名称索引都留给主进程，进程内不使用写线程。
+    """
+    from .. import init_server
+    from .recipe_index import RecipeIndex
+    from .industry_config import IndustryConfigManager
+    from ..market_server.market_manager import MarketManager
+    from ..market_server.order_book import OrderBook
+    init_server(log=False, lazy=True)
+    RecipeIndex.ensure_loaded()
+    IndustryConfigManager.ensure_init()
+    MarketManager.ensure_init()
+    for market in MarketManager.market_dict.values():
+        OrderBook.get_book(market.location_id)
+
+
+def _cost_task(args):
+    """ 一组产品的成本，return: [(pid, 耗时, result)] """
+    from .industry_analyse import IndustryAnalyser
+    user, plan_name, plan_chunk = args
+    res = []
+    for plan in plan_chunk:
+        start = time.perf_counter()
+        result = IndustryAnalyser.signal_async_progress_work_type(user, plan_name, [plan])
+        res.append((os.getpid(), time.perf_counter() - start, result))
+    return res
+
+
+class CostWorkerPool:
+    """
+    常驻的成本计算进程池，进程在首次使用时创建并完成初始化，之后的计算复用同一批进程。
+    配置[APP] COST_MODE = pool时IndustryAnalyser.get_cost_data使用该进程池，
+    管理指令可查看进度、每个进程的吞吐并取消正在进行的计算。
+    """
+    _lock = threading.Lock()
+    _pool = None
+    _processes = 0
+    _cancel_event = threading.Event()
+
+    # {pid: {'count': 完成数量, 'seconds': 累计耗时}}
+    throughput = dict()
+    # 正在进行的计算 {'done': 完成数量, 'total': 总数量, 'start': 开始时间}
+    progress = None
+
+    @classmethod
+    def get_pool(cls, processes: int = None):
+        if processes is None:
+            processes = min(6, multiprocessing.cpu_count())
+        with cls._lock:
+            if cls._pool is None:
+                start = time.perf_counter()
+                cls._pool = multiprocessing.Pool(processes=processes, initializer=_init_worker)
+                cls._processes = processes
+                logger.info(f'CostWorkerPool started {processes} workers in {time.perf_counter() - start:.2f}s.')
+            return cls._pool
+
+    @classmethod
+    def imap(cls, user, plan_name: str, plan_list: list, chunksize: int = None, processes: int = None):
+        """
+        按完成顺序返回结果 [product_name, material_cost, eiv_cost, total_cost]
+        调用cancel()后停止返回并终止进程池，结果按POLL_INTERVAL轮询，进程池被终止时不会一直阻塞。
+        """
+        pool = cls.get_pool(processes)
+        cls._cancel_event.clear()
+        if chunksize is None:
+            chunksize = max(1, len(plan_list) // (cls._processes * 4))
+
+        # chunksize大于1时imap_unordered返回普通生成器，不能带超时等待，分组在任务内完成
+        task_list = [(user, plan_name, plan_list[start:start + chunksize])
+                     for start in range(0, len(plan_list), chunksize)]
+        result_iter = pool.imap_unordered(_cost_task, task_list)
+        cls.progress = {'done': 0, 'total': len(plan_list), 'start': time.time()}
+        try:
+            while True:
+                try:
+                    chunk_result = result_iter.next(timeout=POLL_INTERVAL)
+                except multiprocessing.TimeoutError:
+                    if cls._cancel_event.is_set():
+                        logger.info('CostWorkerPool cancelled.')
+                        return
+                    continue
+                except StopIteration:
+                    return
+                for pid, elapsed, result in chunk_result:
+                    if cls._cancel_event.is_set():
+                        logger.info('CostWorkerPool cancelled.')
+                        return
+                    if pid not in cls.throughput:
+                        cls.throughput[pid] = {'count': 0, 'seconds': 0}
+                    cls.throughput[pid]['count'] += 1
+                    cls.throughput[pid]['seconds'] += elapsed
+                    cls.progress['done'] += 1
+                    yield result
+        finally:
+            cls.progress = None
+
+    @classmethod
+    def cancel(cls) -> bool:
+        """ 终止正在进行的计算，下次使用时重新创建进程池。return: 是否有正在进行的计算 """
+        running = cls.progress is not None
+        cls._cancel_event.set()
+        cls.close(terminate=True)
+        return running
+
+    @classmethod
+    def cancelled(cls) -> bool:
+        return cls._cancel_event.is_set()
+
+    @classmethod
+    def close(cls, terminate: bool = False):
+        with cls._lock:
+            if cls._pool is None:
+                return
+            if terminate:
+                cls._pool.terminate()
+            else:
+                cls._pool.close()
+            cls._pool.join()
+            cls._pool = None
+
+    @classmethod
+    def get_throughput(cls) -> dict:
+        """ return: {pid: (count, seconds, count_per_second)} """
+        return {pid: (data['count'], data['seconds'],
+                      data['count'] / data['seconds'] if data['seconds'] else 0)
+                for pid, data in cls.throughput.items()}
+
+    @classmethod
+    def get_status(cls) -> str:
+        status = f'进程池：{"运行中 " + str(cls._processes) + " 进程" if cls._pool is not None else "未启动"}\n'
+        progress = cls.progress
+        if progress is not None:
+            status += (f'进行中：{progress["done"]}/{progress["total"]}，'
+                       f'已用时 {time.time() - progress["start"]:.0f}s\n')
+        for pid, (count, seconds, rate) in cls.get_throughput().items():
+            status += f'  pid {pid}: {count} 个，{seconds:.1f}s，{rate:.2f} 个/s\n'
+        return status.rstrip()
@@ -7,7 +7,7 @@ from ..sde_service.utils import SdeUtils
 from ..user_server.user_manager import UserManager
 from ..user_server.user import User
 from ...utils import KahunaException
-from ..market_server.marker import MarketHistory
+from ..market_server.marker import MarketHistory, REGION_VALE_ID
 from ..market_server.market_manager import MarketManager
 
 class IndustryAdvice:
@@ -24,9 +24,18 @@ class IndustryAdvice:
         t2_cost_data = [[name] + value for name, value in t2_cost_data.items()]
         t2ship_data = []
         t2ship_dict = {}
+        # 一次批量读取全部物品的滚动统计
+        vale_summary = MarketHistory.get_history_summary(
+            [SdeUtils.get_id_by_name(data[0]) for data in t2_cost_data], REGION_VALE_ID
+        )
+        # 7/30日均线趋势与30日波动率
+        vale_indicator = MarketHistory.get_history_indicator(
+            [SdeUtils.get_id_by_name(data[0]) for data in t2_cost_data], REGION_VALE_ID
+        )
         for data in t2_cost_data:
             tid = SdeUtils.get_id_by_name(data[0])
-            vale_mk_his_data, forge_mk_his_data = MarketHistory.get_type_history_detale(tid)
+            vale_mk_his_data = vale_summary[tid]
+            indicator = vale_indicator.get(tid, {})
             frt_buy, frt_sell = vale_mk.get_type_order_rouge(tid)
             jita_buy, jita_sell = jita_mk.get_type_order_rouge(tid)
 
@@ -59,7 +68,9 @@ class IndustryAdvice:
                 'jita_sell': jita_sell,
                 'month_flow': vale_mk_his_data['monthflow'],
                 'month_volume': vale_mk_his_data['month_volume'],
-                'meta': SdeUtils.get_metaname_by_typeid(tid)
+                'meta': SdeUtils.get_metaname_by_typeid(tid),
+                'trend': indicator.get('trend', 0),
+                'volatility': indicator.get('volatility', 0)
             }
 
             t2ship_data.append(market_data)
@@ -104,13 +115,13 @@ class IndustryAdvice:
             34: {34: 1}, 35: {35: 1}, 36: {36: 1}, 37: {37: 1}, 38: {38: 1}, 39: {39: 1}, 40: {40: 1}, 11399: {11399: 1}
         }
         target_price_index = 0 if material_flag == 'buy' else 1
-        target_price = {
-            target: jita_market.get_type_order_rouge(target)[target_price_index] for target in ref_target
-        }
+        target_list = list(ref_target)
+        target_price = dict(zip(
+            target_list, jita_market.get_type_order_rouge_array(target_list)[target_price_index].tolist()))
         source_price_index = 0 if compress_flag == 'buy' else 1
-        source_price = {
-            source: jita_market.get_type_order_rouge(source)[source_price_index] for source in ref_source_dict.keys()
-        }
+        source_list = list(ref_source_dict.keys())
+        source_price = dict(zip(
+            source_list, jita_market.get_type_order_rouge_array(source_list)[source_price_index].tolist()))
 
 
         # 预先计算考虑效率系数的产出
@@ -1,4 +1,5 @@
 import multiprocessing
+import time
 import queue
 from asyncio import gather
 from errno import ECHILD
@@ -6,6 +7,8 @@ from importlib.util import source_hash
 from datetime import timedelta
 import networkx as nx
 import math
+import json
+from collections import deque
 from cachetools import TTLCache
 from tqdm import tqdm
 from queue import Queue
@@ -13,24 +16,33 @@ from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from .running_job import RunningJobOwner
 from .structure import StructureManager
-from ..asset_server.asset_container import AssetContainer
 from ..asset_server.asset_manager import AssetManager
 from ..character_server.character_manager import CharacterManager
-from ..database_server.model import BlueprintAssetCache
 from .industry_config import IndustryConfigManager, MANU_SKILL_TIME_EFF, REAC_SKILL_TIME_EFF
 from ..user_server.user_manager import UserManager
 from ..market_server.market_manager import MarketManager
 from ..market_server.price import PriceService
+from ..config_server.config import config
 from ..log_server import logger
 
 from .industry_utils import IdsUtils as IdsU
 
 from .blueprint import BPManager
+from .cost_engine import CostEngine
+from .cost_worker_pool import CostWorkerPool
+from .vector_rollup import VectorRollup
+from .block_index import BlockIndex
+from .blueprint_inventory import BlueprintInventory
 from ..sde_service.utils import SdeUtils
 from ...utils import roundup, KahunaException
+from ...utils.refresh_signal import RefreshSignal
 
 HOUR_SECONDS = 3600
 DAY_SECONDS = 24 * HOUR_SECONDS
+# 批量成本计算方式，engine为共享分析器的CostEngine，pool为逐个产品的常驻进程池
+COST_MODE = config.get('APP', 'COST_MODE', fallback='') or 'engine'
+# 只需要全体需求(global_graph)的分析使用的计算方式，work为逐节点计算，vector为VectorRollup向量化计算
+ROLLUP_MODE = config.get('APP', 'ROLLUP_MODE', fallback='') or 'work'
 
 class Work():
     """
@@ -73,7 +85,7 @@ class Work():
 
 
 class IndustryAnalyser():
-    analyser_cache = TTLCache(maxsize=10, ttl=60 * 60) # {plan_name: analyser}
+    analyser_cache = TTLCache(maxsize=10, ttl=60 * 60) # {(owner_qq, plan_name): analyser}
 
     def __init__(self, owner_qq: int = 0, cal_type="work"):
         self.cal_type = cal_type
@@ -82,7 +94,6 @@ class IndustryAnalyser():
 
         # 运行中使用的设置
         self.bp_graph: nx.DiGraph = nx.MultiDiGraph()
-        self.anaed_set = set()
         self.bp_node_actually_need_quantity_dict = dict()
         self.bp_node_total_need_quantity_dict = dict()
         self.actually_need_work_list_dict = dict()
@@ -97,13 +108,22 @@ class IndustryAnalyser():
         self.have_bpo = dict()
 
         self.job_asset_check_dict = dict()
+        self.bp_inventory = None
 
         self.global_graph = nx.MultiDiGraph()
         self.work_graph = nx.MultiDiGraph()
 
         self.analysed_status = False
+        self.phase_timing = dict()
+        # 增量更新使用的分析时状态
+        self.analysed_block_level = None
+        self.signal_version = None
+        self.bp_asset_signature = dict()
+        self.plan_signature = None
 
         self.bp_block_level = 2
+        # 材料成本按订单簿深度计算成交价，否则按最高收单价
+        self.depth_price = False
 
         # 需要持久化的设置
         self.plan_name = None
@@ -129,42 +149,7 @@ class IndustryAnalyser():
         matcher = self.pd_block_matcher
         if matcher is None:
             raise KahunaException("pd_block matcher must be set.")
-
-        structure_id = None
-        invType_data = SdeUtils.get_invtpye_node_by_id(type_id)
-        if not invType_data:
-            raise KahunaException(f"{type_id} 不存在于数据库，请联系管理员。")
-
-        # bp
-        bp_id = BPManager.get_bp_id_by_prod_typeid(type_id)
-        bp_name = SdeUtils.get_name_by_id(bp_id)
-        if bp_name in matcher.matcher_data["bp"] and matcher.matcher_data["bp"][bp_name] <= self.bp_block_level:
-            return True
-
-        # 找到符合条件的最小市场分类
-        mklist = SdeUtils.get_market_group_list(type_id)
-        mk_block = False
-        largest_index = 0
-        for market_group, _ in matcher.matcher_data["market_group"].items():
-            if market_group in mklist and matcher.matcher_data["market_group"][market_group] <= self.bp_block_level:
-                mk_block = mk_block or True
-        if mk_block:
-            return True
-
-        group = SdeUtils.get_groupname_by_id(type_id)
-        if group in matcher.matcher_data["group"] and matcher.matcher_data["group"][group] <= self.bp_block_level:
-            return True
-
-        meta = SdeUtils.get_metaname_by_typeid(type_id)
-        if meta in matcher.matcher_data["meta"] and matcher.matcher_data["meta"][meta] <= self.bp_block_level:
-            return True
-
-        category = SdeUtils.get_category_by_id(type_id)
-        if category in matcher.matcher_data["category"] and matcher.matcher_data["category"][category] <= self.bp_block_level:
-            return True
-
-        return False
-        raise KahunaException(f"typeid: {type_id} 无建筑分配，请配置匹配器。")
+        return BlockIndex.is_blocked(matcher, type_id, self.bp_block_level)
 
     def get_running_job(self):
         if not self.target_container:
@@ -217,69 +202,87 @@ class IndustryAnalyser():
             [("root", data[0], {"index": index, "quantity": data[1]})
              for index, data in enumerate(work_list)])
 
+        start = time.perf_counter()
         self.bfs_bp_tree(bfs_queue, dg)
-        memo = dict()
-        root_depth = self.longest_path_dag('root', memo)
-        self.update_layer_depth('root')
+        self.phase_timing['tree'] = time.perf_counter() - start
+        self.update_layer_depth(dg)
+        logger.info(f'get_work_tree: {dg.number_of_nodes()} nodes, {dg.number_of_edges()} edges, '
+                    + ', '.join(f'{k} {v:.3f}s' for k, v in self.phase_timing.items()))
         return dg
 
-    # 递归计算最长路径，并添加备忘录优化
-    def longest_path_dag(self, node, memo):
-        if node in memo:  # 如果已经计算过，直接返回
-            return memo[node]
-
-        # 如果是叶子节点（出度为 0），深度为 0
-        if self.bp_graph.out_degree(node) == 0:
-            memo[node] = 1
-            self.bp_graph.nodes[node]['depth'] = 1
-            return 1
-
-        # 计算所有子节点中的最大路径
-        max_depth = 0
-        for succ in self.bp_graph.successors(node):
-            try:
-                max_depth = max(max_depth, self.longest_path_dag(succ, memo))
-            except RecursionError:
-                raise KahunaException(f'node: {node}')
-
-        # 加入自身节点长度，然后存入备忘录
-        memo[node] = max_depth + 1
-        self.bp_graph.nodes[node]['depth'] = memo[node]
-        return memo[node]
-
-    def update_layer_depth(self, node):
-        if node != 'root' and self.bp_graph.nodes[node]['depth'] != 1:
-            depth= 100
-            for pre in self.bp_graph.predecessors(node):
-                depth = min(depth, self.bp_graph.nodes[pre]['depth'])
-            self.bp_graph.nodes[node]['depth'] = depth - 1
-
-        for suss in self.bp_graph.successors(node):
-            self.update_layer_depth(suss)
+    def update_layer_depth(self, dg: nx.DiGraph):
+        """
+        基于拓扑排序计算节点层级，O(V+E)。
+        1. 逆拓扑序计算最长路径深度，叶子节点为1
+        2. 拓扑序将非叶子节点上提到父节点的下一层：depth = min(父节点depth) - 1
+        """
+        start = time.perf_counter()
+        try:
+            topo_order = list(nx.topological_sort(dg))
+        except nx.NetworkXUnfeasible:
+            raise KahunaException(f'蓝图树存在循环，无法计算层级: {nx.find_cycle(dg)}')
+
+        for node in reversed(topo_order):
+            depth = 0
+            for succ in dg.successors(node):
+                depth = max(depth, dg.nodes[succ]['depth'])
+            dg.nodes[node]['depth'] = depth + 1
+        self.phase_timing['longest_path'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for node in topo_order:
+            if node == 'root' or dg.nodes[node]['depth'] == 1:
+                continue
+            dg.nodes[node]['depth'] = min(dg.nodes[pre]['depth'] for pre in dg.predecessors(node)) - 1
+        self.phase_timing['pull_up'] = time.perf_counter() - start
 
     def bfs_bp_tree(self, bfs_queue: list, dg: nx.DiGraph = None):
         """
-        递归处理生成蓝图节点。
-        每个节点代表一种材料，每种target需要的材料存储在节点与节点之间的边关系
+        广度优先展开蓝图节点。
+        每个节点代表一种材料，每种target需要的材料存储在节点与节点之间的边关系。
+        每种type只展开一次，index只记录在边上；同一type被新的index引用时，只为新的index补充边并向下传递。
+        :param bfs_queue: [(index, type_id, quantity)]
         """
-        while bfs_queue:
-            index, type_id, quantity = bfs_queue.pop(0)
+        work_queue = deque()
+        type_index_dict = dict()  # {type_id: {index}}
+        expand_dict = dict()  # {type_id: bp_materials}，不展开的为None
+
+        def push(type_id, index_set):
+            if type_id not in type_index_dict:
+                type_index_dict[type_id] = set()
+            new_index = index_set - type_index_dict[type_id]
+            if new_index:
+                type_index_dict[type_id] |= new_index
+                work_queue.append((type_id, new_index))
+
+        for index, type_id, _ in bfs_queue:
+            push(type_id, {index})
+
+        while work_queue:
+            type_id, new_index = work_queue.popleft()
             dg.add_node(type_id)
-            # 没有蓝图信息 或 在分解黑名单
-            if (bp_materials := BPManager.get_bp_materials(type_id)) is None or self.in_pd_block(type_id):
-                self.anaed_set.add((index, type_id))
+            if type_id not in expand_dict:
+                # 没有蓝图信息 或 在分解黑名单
+                bp_materials = BPManager.get_bp_materials(type_id)
+                if not bp_materials or self.in_pd_block(type_id):
+                    bp_materials = None
+                expand_dict[type_id] = bp_materials
+            bp_materials = expand_dict[type_id]
+            if not bp_materials:
                 continue
-            dg.add_nodes_from([child_id for child_id in bp_materials.keys()])
+
             dg.add_edges_from(
                 [(type_id, child_id, {"index": index, "quantity": quantity})
-                 for child_id, quantity in bp_materials.items()]
+                 for index in sorted(new_index) for child_id, quantity in bp_materials.items()]
             )
+            for child_id in bp_materials.keys():
+                push(child_id, new_index)
 
-            bfs_queue = bfs_queue + [(index, child_id, quantity) for child_id, quantity in bp_materials.items()
-                                     if (index, child_id) not in self.anaed_set]
-            self.anaed_set.update([(index, child) for child in bp_materials.keys()])
-
-    def get_runs_list_by_bpasset(self, total_runs_needed: int, source_id: int, user_qq: int, work_cache: dict) -> list:
+    def get_runs_list_by_bpasset(self, total_runs_needed: int, source_id: int, user_qq: int, work_cache: dict,
+                                 view: str = 'total') -> list:
+        """
+        :param view: 蓝图分配所属的视图，'actually'实际需求，'total'全体需求，不同视图间互不占用蓝图
+        """
         # 缓存
         if source_id in work_cache:
             return work_cache[source_id]
@@ -297,49 +300,31 @@ class IndustryAnalyser():
             raise KahunaException("暂不支持制造和反应外的流程安排。")
 
         # 1. 分配建筑
-        structure_id = IndustryConfigManager.allocate_structure(source_id, self.st_matcher)
-        structure = StructureManager.get_structure(structure_id)
-        st_mater_eff, st_time_eff = IndustryConfigManager.get_structure_mater_time_eff(structure.type_id)
-        st_mater_rig_eff, st_time_rig_eff = IndustryConfigManager.get_structure_rig_mater_time_eff(structure)
+        structure_id, st_mater_eff, st_time_eff, _ = IndustryConfigManager.get_allocation(source_id, self.st_matcher)
+        if st_mater_eff is None:
+            raise KahunaException(f"建筑 {structure_id} 不存在，请先添加建筑信息。")
 
         # 2. 蓝图统计
-        # owner_qq可用的蓝图仓库，即container_tag为bp的仓库，需要存在于目标建筑?
-        bp_container_list = AssetContainer.get_contain_id_by_qq_tag(user_qq, "bp")
-        manu_container_list = AssetContainer.get_contain_id_by_qq_tag(user_qq, "manu")
-        reac_container_list = AssetContainer.get_contain_id_by_qq_tag(user_qq, "reac")
-        bp_container_list += manu_container_list
-        bp_container_list += reac_container_list
-        bp_container_list = [container for container in bp_container_list]
-
-        # 根据source_id获得user_qq所属的所有蓝图
-        owner_id_set = set(character.character_id for character in CharacterManager.get_user_all_characters(user_qq))
-        for character in CharacterManager.get_user_all_characters(user_qq):
-            if character.director:
-                owner_id_set.add(character.corp_id)
+        # owner_qq可用的蓝图仓库，即container_tag为bp/manu/reac的仓库内的蓝图
+        if self.bp_inventory is None:
+            self.load_bp_inventory()
         bp_id = BPManager.get_bp_id_by_prod_typeid(source_id)
-        avalable_bpc_asset = BlueprintAssetCache.select().where((BlueprintAssetCache.location_id << bp_container_list) &
-                                                                (BlueprintAssetCache.type_id == bp_id) &
-                                                                (BlueprintAssetCache.runs > 0))
-        avaliable_bpo_asset = BlueprintAssetCache.select().where((BlueprintAssetCache.location_id << bp_container_list) &
-                                                                 (BlueprintAssetCache.type_id == bp_id) &
-                                                                 (BlueprintAssetCache.runs < 0))
-
-        # 可用的拷贝序列 [(runs, material_efficiency, time_efficiency, item_id, structure_id, location_id)]
-        avaliable_bpc_list = [(bp.runs, bp.material_efficiency, bp.time_efficiency, bp.item_id, bp.location_id, structure_id)\
-                              for bp in avalable_bpc_asset if bp.item_id not in self.using_bp]
-        avaliable_bpc_list.sort(key=lambda x: (x[1], x[0]), reverse=True)
-
-        # 可用的原图序列 [(quantity, material_efficiency, time_efficiency, structure_id, location_id)]
+        allocate_key = (view, source_id)
+        self.bp_inventory.release(allocate_key)
+
+        # 可用的拷贝序列 [(runs, material_efficiency, time_efficiency, item_id, location_id, structure_id)]
+        avaliable_bpc_list = [bpc + (structure_id, ) for bpc in self.bp_inventory.get_bpc_list(bp_id, view)]
+
+        # 可用的原图序列 [(quantity, material_efficiency, time_efficiency, location_id, structure_id)]
         avaliable_bpo_count = dict()
-        for bpo in avaliable_bpo_asset:
-            if bpo.item_id in self.using_bp:
-                continue
-            if (bpo.material_efficiency, bpo.time_efficiency, bpo.location_id) not in avaliable_bpo_count:
-                avaliable_bpo_count[(bpo.material_efficiency, bpo.time_efficiency, bpo.location_id)] = 0
-            if bpo.quantity < 0:
-                avaliable_bpo_count[(bpo.material_efficiency, bpo.time_efficiency, bpo.location_id)] += 1
-            else:
-                avaliable_bpo_count[(bpo.material_efficiency, bpo.time_efficiency, bpo.location_id)] += bpo.quantity
+        bpo_item_dict = dict()
+        for quantity, bpo_mater_eff, bpo_time_eff, item_id, location_id in self.bp_inventory.get_bpo_list(bp_id, view):
+            bpo_key = (bpo_mater_eff, bpo_time_eff, location_id)
+            if bpo_key not in avaliable_bpo_count:
+                avaliable_bpo_count[bpo_key] = 0
+                bpo_item_dict[bpo_key] = []
+            avaliable_bpo_count[bpo_key] += 1 if quantity < 0 else quantity
+            bpo_item_dict[bpo_key].append(item_id)
 
         avaliable_bpo_count_list = [[v, k[0], k[1], k[2], structure_id] for k, v in avaliable_bpo_count.items()]
         avaliable_bpo_count_list.sort(key=lambda x: x[1], reverse=True)
@@ -358,18 +343,21 @@ class IndustryAnalyser():
         # 材料系数包含 建筑[建筑+插件] 蓝图
         # 默认蓝图效率
         default_bp_meter_eff, default_bp_time_eff = IndustryConfigManager.get_default_bp_mater_time_eff(source_id)
-        time_eff = st_time_eff * st_time_rig_eff * (manu_skill_time_eff if active_id != 11 else reac_skill_time_eff)
-        mater_eff = st_mater_eff * st_mater_rig_eff
+        time_eff = st_time_eff * (manu_skill_time_eff if active_id != 11 else reac_skill_time_eff)
+        mater_eff = st_mater_eff
         production_time = BPManager.get_production_time(source_id)
         max_runs = math.ceil((cycle_time / time_eff) / production_time)
 
 
         work_list = []
         used_bp = set()
+        allocated_item = set()
         # 使用优先级：
         # 按照最大周期使用蓝图直到蓝图归零或流程归零
         # 流程未归零则创造虚空流程
         for bpo in avaliable_bpo_count_list:
+            if bpo[0] > 0 and total_runs_needed > 0:
+                allocated_item.update(bpo_item_dict[(bpo[1], bpo[2], bpo[3])])
             w_time_eff = time_eff * (1 - bpo[2] / 100)
             max_runs = math.ceil((cycle_time / w_time_eff) / production_time)
             while bpo[0] > 0 and total_runs_needed > 0:
@@ -401,11 +389,13 @@ class IndustryAnalyser():
                                       bpc[0], bpc[4], bpc[5]))
                 total_runs_needed -= bpc[0]
                 used_bp.add(bpc[3])
+                allocated_item.add(bpc[3])
         avaliable_bpc_list.sort(key=lambda x: x[0])
         for bpc in avaliable_bpc_list:
             if bpc[3] in used_bp:
                 continue
             if total_runs_needed > 0:
+                allocated_item.add(bpc[3])
                 if bpc[0] < total_runs_needed:
                     work_list.append(Work(source_id,
                                           mater_eff * (1 - bpc[1] / 100),
@@ -437,9 +427,15 @@ class IndustryAnalyser():
                 total_runs_needed = 0
 
         work_list.sort(key=lambda x: x.runs)
+        # 记录本次安排占用的蓝图
+        self.bp_inventory.allocate(allocate_key, allocated_item)
         work_cache[source_id] = work_list
         return work_list
 
+    def load_bp_inventory(self):
+        self.bp_inventory = BlueprintInventory(self.owner_qq, self.using_bp).load()
+        return self.bp_inventory
+
     def calculate_work_bpnode_quantity(self, child_id: int, cache_dict: dict):
         """
         计算工作蓝图节点数量（实际执行模式）
@@ -635,8 +631,10 @@ class IndustryAnalyser():
             child_actually_total_runs = math.ceil(child_actually_total_quantity / child_product_quantity)
             child_total_runs = math.ceil(child_total_quantity / child_product_quantity)
 
-            child_actually_worklist = self.get_runs_list_by_bpasset(child_actually_total_runs, child_id, self.owner_qq, self.actually_need_work_list_dict)
-            child_total_worklist = self.get_runs_list_by_bpasset(child_total_runs, child_id, self.owner_qq, self.total_need_work_list_dict)
+            child_actually_worklist = self.get_runs_list_by_bpasset(child_actually_total_runs, child_id, self.owner_qq,
+                                                                    self.actually_need_work_list_dict, 'actually')
+            child_total_worklist = self.get_runs_list_by_bpasset(child_total_runs, child_id, self.owner_qq,
+                                                                 self.total_need_work_list_dict, 'total')
         else:
             child_actually_worklist = []
             child_total_worklist = []
@@ -669,12 +667,17 @@ class IndustryAnalyser():
             'is_material': is_material
         })
         if self.global_graph.nodes[child_id]['is_material']:
-            self.global_graph.nodes[child_id].update({'buy_cost': child_total_quantity * self.market.get_type_order_rouge(child_id)[0]})
+            self.global_graph.nodes[child_id].update({'buy_cost': self.get_buy_cost(child_id, child_total_quantity)})
         else:
             self.global_graph.nodes[child_id].update({'eiv_cost': child_eiv_cost})
 
         return self.work_graph.nodes[child_id], self.global_graph.nodes[child_id]
 
+    def get_buy_cost(self, type_id: int, quantity: int) -> float:
+        if self.depth_price:
+            return self.market.get_type_fill_cost(type_id, quantity, 'buy')
+        return quantity * self.market.get_type_order_rouge(type_id)[0]
+
     def update_work_avaliable(self):
         asset_dict = self.job_asset_check_dict
         work_check_dict = dict()
@@ -699,10 +702,11 @@ class IndustryAnalyser():
         if not self.bp_matcher or not self.st_matcher or not self.pd_block_matcher:
             raise KahunaException("matcher must be set in BpAnalyser.")
 
-        # 获取目标库存、正在运行的工作、库存内的资产
+        # 获取目标库存、正在运行的工作、库存内的资产、蓝图库存
         self.get_target_container()
         self.get_running_job()
         self.get_asset_in_container()
+        self.load_bp_inventory()
 
         accept_worklist = []
         for work in work_list:
@@ -720,12 +724,137 @@ class IndustryAnalyser():
         ''' 更新工作流的材料是否满足 '''
         self.update_work_avaliable()
 
+        self.signal_version = RefreshSignal.snapshot()
+        self.bp_asset_signature = self.bp_inventory.get_signature()
+        self.analysed_block_level = self.bp_block_level
+        self.analysed_status = True
+        return res_dict
+
+    def refresh_analyse(self):
+        """
+        增量更新已完成的分析。
+        蓝图树与层级不变，只重新计算库存、运行中工作、蓝图库存发生变化的节点及其全部子节点，
+        仅价格变化时只更新材料节点的购买成本。
+        更新过程中出错时变化的节点已从图中移除，清空分析，下次使用时完整重新分析。
+        """
+        signal_version = RefreshSignal.snapshot()
+        if signal_version == self.signal_version:
+            return
+        try:
+            self.refresh_changed_node(signal_version)
+        except Exception:
+            self.clean_analyser()
+            raise
+
+    def refresh_changed_node(self, signal_version: dict):
+        start = time.perf_counter()
+
+        dirty = set()
+        if (signal_version['asset'] != self.signal_version['asset'] or
+                signal_version['running_job'] != self.signal_version['running_job']):
+            old_asset_dict = self.asset_dict
+            old_running_job = self.running_job
+            old_bp_asset_signature = self.bp_asset_signature
+
+            self.asset_dict = dict()
+            self.job_asset_check_dict = dict()
+            self.get_target_container()
+            self.get_running_job()
+            self.get_asset_in_container()
+            self.load_bp_inventory()
+            self.bp_asset_signature = self.bp_inventory.get_signature()
+
+            for type_id in set(old_asset_dict) | set(self.asset_dict):
+                if old_asset_dict.get(type_id, 0) != self.asset_dict.get(type_id, 0):
+                    dirty.add(type_id)
+            for type_id in set(old_running_job) | set(self.running_job):
+                if old_running_job.get(type_id, 0) != self.running_job.get(type_id, 0):
+                    dirty.add(type_id)
+            for type_id in set(old_bp_asset_signature) | set(self.bp_asset_signature):
+                if old_bp_asset_signature.get(type_id, None) != self.bp_asset_signature.get(type_id, None):
+                    dirty.add(type_id)
+
+        # 变化节点的子节点需求依赖父节点的工作安排，一并重新计算
+        dirty = set(node for node in dirty if node in self.bp_graph)
+        affected = set(dirty)
+        for node in dirty:
+            affected |= nx.descendants(self.bp_graph, node)
+        for node in affected:
+            if node in self.work_graph:
+                self.work_graph.remove_node(node)
+            if node in self.global_graph:
+                self.global_graph.remove_node(node)
+            self.actually_need_work_list_dict.pop(node, None)
+            self.total_need_work_list_dict.pop(node, None)
+            self.bp_quantity_dict.pop(node, None)
+            self.bp_runs_dict.pop(node, None)
+            self.have_bpo.pop(node, None)
+
+        if affected:
+            cache_dict = dict()
+            for node in [node for node, degree in self.bp_graph.out_degree() if degree == 0]:
+                self.calculate_work_bpnode_quantity(node, cache_dict)
+
+        if signal_version['market'] != self.signal_version['market']:
+            # 只更新最优价变化的材料，深度估价时挂单量的变化也会影响成本，全部更新
+            market_changed = None if self.depth_price else \
+                RefreshSignal.changes_since('market', self.signal_version['market'])
+            for node, data in self.global_graph.nodes(data=True):
+                if node == 'root' or node in affected or not data.get('is_material', False):
+                    continue
+                if market_changed is not None and node not in market_changed:
+                    continue
+                data['buy_cost'] = self.get_buy_cost(node, data['quantity'])
+
+        # 材料满足状态需要按最新库存整体重新判断
+        for node, data in self.work_graph.nodes(data=True):
+            for work in data.get('work_list', []):
+                work.avaliable = True
+        self.job_asset_check_dict = dict(self.asset_dict)
+        self.update_work_avaliable()
+
+        self.signal_version = signal_version
+        logger.info(f'refresh_analyse {self.plan_name}: {len(affected)}/{self.bp_graph.number_of_nodes()} nodes '
+                    f'recomputed in {time.perf_counter() - start:.2f}s.')
+
+    def analyse_progress_vector(self, work_list: list[list[str, int]]) -> dict:
+        """
+        全体需求与成本的向量化计算模式，结果写入global_graph节点，与analyse_progress_work_type的全体部分一致。
+        return: {type_id: global_node_data}
+        """
+        if not self.bp_matcher or not self.st_matcher or not self.pd_block_matcher:
+            raise KahunaException("matcher must be set in BpAnalyser.")
+
+        self.get_target_container()
+        self.get_running_job()
+        self.get_asset_in_container()
+        self.load_bp_inventory()
+
+        accept_worklist = []
+        for work in work_list:
+            if SdeUtils.get_id_by_name(work[0]) and BPManager.get_bp_id_by_prod_typeid(SdeUtils.get_id_by_name(work[0])):
+                accept_worklist.append(work)
+
+        self.get_work_tree(accept_worklist, self.bp_graph)
+        rollup = VectorRollup(self)
+        res_dict = rollup.rollup([(SdeUtils.get_id_by_name(target), quantity) for target, quantity in accept_worklist])
+        for node, data in res_dict.items():
+            self.global_graph.add_node(node, **data)
+        for father, child in self.bp_graph.edges():
+            if not self.global_graph.has_edge(father, child):
+                self.global_graph.add_edge(father, child)
+
         self.analysed_status = True
         return res_dict
 
+    def analyse_progress_global(self, work_list: list[list[str, int]]):
+        """ 成本等只使用global_graph的分析，按ROLLUP_MODE选择计算方式 """
+        if ROLLUP_MODE == 'vector':
+            return self.analyse_progress_vector(work_list)
+        return self.analyse_progress_work_type(work_list)
+
     def clean_analyser(self):
         self.bp_graph.clear()
-        self.anaed_set.clear()
         self.bp_node_actually_need_quantity_dict.clear()
         self.bp_node_total_need_quantity_dict.clear()
         self.actually_need_work_list_dict.clear()
@@ -733,6 +862,7 @@ class IndustryAnalyser():
         self.running_job.clear()
         self.target_container.clear()
         self.asset_dict.clear()
+        self.job_asset_check_dict.clear()
 
         self.global_graph.clear()
         self.work_graph.clear()
@@ -742,6 +872,9 @@ class IndustryAnalyser():
         self.have_bpo.clear()
 
         self.analysed_status = False
+        self.signal_version = None
+        self.bp_asset_signature = dict()
+        self.bp_inventory = None
 
     def set_plan_list(self, plan_list):
         self.plan_list = plan_list
@@ -754,23 +887,46 @@ class IndustryAnalyser():
         prod_block_matcher = IndustryConfigManager.get_matcher_of_user_by_name(plan_dict["prod_block_matcher"], user.user_qq)
 
         analyser = IndustryAnalyser(user.user_qq, "work")
+        analyser.plan_name = plan_name
         analyser.set_matchers(bp_matcher, st_matcher, prod_block_matcher)
         analyser.set_plan_list(plan_dict["plan"])
         analyser.manu_cycle_time = plan_dict['manucycletime']
         analyser.reac_cycle_time = plan_dict["reaccycletime"]
         analyser.hide_container = set(plan_dict["container_block"])
+        analyser.depth_price = plan_dict.get("depth_price", False)
         # analyser.manu_lines = plan_dict["manulinenum"]
         # analyser.reac_lines = plan_dict["reaclinenum"]
 
         return analyser
 
+    @classmethod
+    def get_plan_signature(cls, user, plan_name: str) -> str:
+        """ 计划内容与匹配器版本，任一变化都需要重建分析 """
+        plan_dict = user.user_data.plan[plan_name]
+        matcher_version = [
+            IndustryConfigManager.get_matcher_of_user_by_name(plan_dict[matcher_key], user.user_qq).version
+            for matcher_key in ["bp_matcher", "st_matcher", "prod_block_matcher"]
+        ]
+        return json.dumps([plan_dict, matcher_version], sort_keys=True, default=str)
+
     @classmethod
     def get_analyser_by_plan(cls, user, plan_name):
-        return cls.create_analyser_by_plan(user, plan_name)
+        """ 计划未变化时复用缓存的分析，之后由get_work_tree_data增量更新 """
+        plan_signature = cls.get_plan_signature(user, plan_name)
+        analyser = cls.analyser_cache.get((user.user_qq, plan_name), None)
+        if analyser is not None and analyser.plan_signature == plan_signature:
+            return analyser
+
+        analyser = cls.create_analyser_by_plan(user, plan_name)
+        analyser.plan_signature = plan_signature
+        cls.analyser_cache[(user.user_qq, plan_name)] = analyser
+        return analyser
 
     def get_work_tree_data(self):
-        self.clean_analyser()
-        if not self.analysed_status:
+        if self.analysed_status and self.analysed_block_level == self.bp_block_level:
+            self.refresh_analyse()
+        else:
+            self.clean_analyser()
             self.analyse_progress_work_type(self.plan_list)
 
         result_dict = {
@@ -1109,10 +1265,10 @@ class IndustryAnalyser():
     def signal_async_progress_work_type(cls, user, plan_name, plan_list):
         from .. import init_server, init_flag
         if not init_flag:
-            init_server(log=False)
+            init_server(log=False, lazy=True)
         analyser = cls.create_analyser_by_plan(user, plan_name)
         analyser.bp_block_level = 1
-        material_dict = analyser.analyse_progress_work_type(plan_list)
+        analyser.analyse_progress_global(plan_list)
         material_cost = 0
         for node in [node for node, degree in analyser.global_graph.out_degree() if degree == 0]:
             if node == 'root':
@@ -1130,37 +1286,37 @@ class IndustryAnalyser():
 
     cost_data_cache = TTLCache(maxsize=1000, ttl=60 * 60)
     @classmethod
-    def get_cost_data(cls, user, plan_name: str, plan_list, batch_size=None):
-        """ 如何在緩存内，直接提取 """
+    def get_cost_data(cls, user, plan_name: str, plan_list, batch_size=None, use_engine=None):
+        """
+        计算planlist中的材料成本，用于批量计算。
+        use_engine为None时按配置COST_MODE选择：共享分析器的批量成本计算，或逐个产品的进程池计算。
+        """
+        # 如果在缓存内，直接提取
         if (user.user_qq, plan_name, str(plan_list)) in cls.cost_data_cache:
             return cls.cost_data_cache[(user.user_qq, plan_name, str(plan_list))]
-        """ 计算planlist中的材料成本，用于批量计算 """
-        def chunks(lst, n):
-            """按指定大小将列表分块"""
-            for i in range(0, len(lst), n):
-                yield lst[i:i + n]
-
-        cpu_count = multiprocessing.cpu_count()
-        # 如果没有指定batch_size，根据CPU数量和列表长度计算合适的批次大小
-        if batch_size is None:
-            batch_size = max(2, cpu_count - 1)
+        if use_engine is None:
+            use_engine = COST_MODE != 'pool'
+        if use_engine:
+            analyser = cls.create_analyser_by_plan(user, plan_name)
+            analyser.bp_block_level = 1
+            cost_dict = CostEngine.get_cost_data(analyser, plan_list)
+            cls.cost_data_cache[(user.user_qq, plan_name, str(plan_list))] = cost_dict
+            return cost_dict
+
         logger.info(f'get_cost_data: batch_size = {batch_size}')
+        start = time.perf_counter()
         cost_dict = dict()
         total_plans = len(plan_list)
 
         with tqdm(total=total_plans, desc="成本计算", unit="个", ascii='=-') as pbar:
-            for batch in chunks(plan_list, batch_size):
-                with ProcessPoolExecutor(max_workers=min(6, cpu_count)) as executor:
-                    futures = [
-                        executor.submit(cls.signal_async_progress_work_type, user, plan_name, [plan])
-                        for plan in batch
-                    ]
-
-                    for future in futures:
-                        result = future.result()
-                        cost_dict[result[0]] = result[1:]
-                        pbar.update()
-
+            for result in CostWorkerPool.imap(user, plan_name, plan_list, batch_size):
+                cost_dict[result[0]] = result[1:]
+                pbar.update()
+        if CostWorkerPool.cancelled():
+            raise KahunaException(f'成本计算已取消，完成 {len(cost_dict)}/{total_plans}。')
+
+        logger.info(f'get_cost_data: {total_plans} plans in {time.perf_counter() - start:.2f}s. '
+                    f'worker throughput: {CostWorkerPool.get_throughput()}')
         cls.cost_data_cache[(user.user_qq, plan_name, str(plan_list))] = cost_dict
         return cost_dict
 
@@ -1168,7 +1324,7 @@ class IndustryAnalyser():
     def get_cost_detail(cls, user, plan_name: str, product: str):
         analyser = cls.create_analyser_by_plan(user, plan_name)
         analyser.bp_block_level = 1
-        analyser.analyse_progress_work_type([[product, 1]])
+        analyser.analyse_progress_global([[product, 1]])
 
         res = {'material': dict(), 'group_detail': dict()}
 
@@ -1,5 +1,7 @@
 import asyncio
 import json
+import time
+import threading
 from enum import Enum
 import asyncio
 
@@ -7,8 +9,10 @@ from .blueprint import BPManager
 from ..sde_service import SdeUtils
 from ..database_server.model import Matcher as M_Matcher
 from ..log_server import logger
-from .structure import Structure
+from .structure import Structure, StructureManager
+from .recipe_index import RecipeIndex
 from ...utils import KahunaException
+from ...utils.startup_profiler import StartupProfiler
 from .matcher import Matcher
 
 
@@ -59,11 +63,15 @@ class EffStructUreType(Enum):
     T1_SOTIYO = 3
 
 class IndustryConfigManager():
+    _init_lock = threading.Lock()
+    inited = False
     init_matcher_status = False
     config_owner_qq = "default"
     matcher_type_set = {"bp", "structure", "prod_block", "sell"}
     # {name: Matcher}
     matcher_dict = dict()
+    # {matcher_name: (version, {type_id: (structure_id, mater_eff, time_eff, eiv_cost_eff)})}
+    allocation_table_dict = dict()
     # 最终材料效率为：
     #   蓝图效率 * 建筑效率
     # 蓝图效率获取优先级：
@@ -138,6 +146,17 @@ class IndustryConfigManager():
     def init(cls):
         cls.init_matcher_dict()
 
+    @classmethod
+    def ensure_init(cls):
+        """ 首次使用或后台预热时初始化 """
+        if cls.inited:
+            return
+        with cls._init_lock:
+            if not cls.inited:
+                with StartupProfiler.measure('IndustryConfigManager'):
+                    cls.init()
+                cls.inited = True
+
     @classmethod
     def init_matcher_dict(cls):
         if not cls.init_matcher_status:
@@ -150,6 +169,7 @@ class IndustryConfigManager():
 
     @classmethod
     def add_matcher(cls, matcher_name: str, user_qq: int, matcher_type: str) -> Matcher:
+        cls.ensure_init()
         if matcher_name in cls.matcher_dict:
             raise KeyError(f'Matcher {matcher_name} already exists')
 
@@ -160,6 +180,7 @@ class IndustryConfigManager():
 
     @classmethod
     def delete_matcher(cls, matcher_name: str, user_qq: int) -> Matcher:
+        cls.ensure_init()
         if matcher_name not in cls.matcher_dict:
             raise KeyError(f'Matcher {matcher_name} does not exist')
 
@@ -169,6 +190,7 @@ class IndustryConfigManager():
 
     @classmethod
     def get_user_matcher(cls, user_qq: int) -> list[Matcher]:
+        cls.ensure_init()
         res = [matcher for matcher in cls.matcher_dict.values() if matcher.user_qq == user_qq]
         return res
 
@@ -241,55 +263,96 @@ class IndustryConfigManager():
         return structure_mater_eff, structure_time_eff
 
     @classmethod
-    def allocate_structure(cls, source_id: int, st_matcher: Matcher) -> int | None:
+    def match_structure(cls, source_id: int, st_matcher: Matcher) -> int | None:
         """
-        input: source_id, matcher
         根据source_id的物品属性，按照"bp", "market_group", "group", "meta", "category"的顺序从matcher_data中匹配
-    
-        return: [structure_id , mater_eff , time_eff]
+        market_group使用符合条件的最小市场分类
         """
-        structure_id = None
-        invType_data = SdeUtils.get_invtpye_node_by_id(source_id)
-        if not invType_data:
-            raise KahunaException(f"{source_id} 不存在于数据库，请联系管理员。")
-
-        # bp
-        bp_id = BPManager.get_bp_id_by_prod_typeid(source_id)
-        bp_name = SdeUtils.get_name_by_id(bp_id)
+        bp_name, mklist, group, meta, category = Matcher.get_type_match_keys(source_id)
         if bp_name in st_matcher.matcher_data["bp"]:
             return st_matcher.matcher_data["bp"][bp_name]
 
-        # 找到符合条件的最小市场分类
-        mklist = SdeUtils.get_market_group_list(source_id)
-        mk_structure_id = None
-        largest_index = 0
-        for market_group, structure_id in st_matcher.matcher_data["market_group"].items():
-            if market_group in mklist:
-                if not mk_structure_id:
-                    mk_structure_id = structure_id
-                    largest_index = mklist.index(market_group)
-                    continue
-                index = mklist.index(market_group)
-                if index > largest_index:
-                    mk_structure_id = structure_id
-                    largest_index = index
-        if mk_structure_id:
-            return mk_structure_id
-
-        group = SdeUtils.get_groupname_by_id(source_id)
+        for market_group in reversed(mklist):
+            if market_group in st_matcher.matcher_data["market_group"]:
+                return st_matcher.matcher_data["market_group"][market_group]
+
         if group in st_matcher.matcher_data["group"]:
             return st_matcher.matcher_data["group"][group]
-
-        meta = SdeUtils.get_metaname_by_typeid(source_id)
         if meta in st_matcher.matcher_data["meta"]:
             return st_matcher.matcher_data["meta"][meta]
-
-        category = SdeUtils.get_category_by_id(source_id)
         if category in st_matcher.matcher_data["category"]:
             return st_matcher.matcher_data["category"][category]
+        return None
+
+    @classmethod
+    def get_structure_eff(cls, structure_id: int) -> tuple | None:
+        """ return: (mater_eff, time_eff, eiv_cost_eff)，建筑与插件合并后的系数 """
+        structure = StructureManager.get_structure(structure_id)
+        if not structure:
+            return None
+        st_mater_eff, st_time_eff = cls.get_structure_mater_time_eff(structure.type_id)
+        st_mater_rig_eff, st_time_rig_eff = cls.get_structure_rig_mater_time_eff(structure)
+        return (st_mater_eff * st_mater_rig_eff,
+                st_time_eff * st_time_rig_eff,
+                cls.get_structure_EIV_cost_eff(structure.type_id))
+
+    @classmethod
+    def compile_allocation_table(cls, st_matcher: Matcher) -> dict:
+        """ {type_id: (structure_id, mater_eff, time_eff, eiv_cost_eff)}，未匹配的物品不在表内 """
+        start = time.perf_counter()
+        structure_eff_dict = dict()
+        table = dict()
+        for type_id in RecipeIndex.product_ids():
+            structure_id = cls.match_structure(type_id, st_matcher)
+            if structure_id is None:
+                continue
+            if structure_id not in structure_eff_dict:
+                structure_eff_dict[structure_id] = cls.get_structure_eff(structure_id)
+            eff = structure_eff_dict[structure_id]
+            table[type_id] = (structure_id,) + (eff if eff else (None, None, None))
+        logger.info(f'Allocation table {st_matcher.matcher_name} v{st_matcher.version}: '
+                    f'{len(table)} types in {time.perf_counter() - start:.2f}s.')
+        return table
+
+    @classmethod
+    def get_allocation_table(cls, st_matcher: Matcher) -> dict:
+        # 匹配器或建筑数据变化后重新编译
+        version = (id(st_matcher), st_matcher.version, StructureManager.version)
+        cache = cls.allocation_table_dict.get(st_matcher.matcher_name, None)
+        if cache is None or cache[0] != version:
+            cache = (version, cls.compile_allocation_table(st_matcher))
+            cls.allocation_table_dict[st_matcher.matcher_name] = cache
+        return cache[1]
+
+    @classmethod
+    def get_allocation(cls, source_id: int, st_matcher: Matcher) -> tuple:
+        """
+        return: (structure_id, mater_eff, time_eff, eiv_cost_eff)
+        建筑不在已知建筑中时效率为None
+        """
+        if RecipeIndex.has_product(source_id):
+            allocation = cls.get_allocation_table(st_matcher).get(source_id, None)
+        else:
+            if not SdeUtils.get_invtpye_node_by_id(source_id):
+                raise KahunaException(f"{source_id} 不存在于数据库，请联系管理员。")
+            structure_id = cls.match_structure(source_id, st_matcher)
+            allocation = None
+            if structure_id is not None:
+                eff = cls.get_structure_eff(structure_id)
+                allocation = (structure_id,) + (eff if eff else (None, None, None))
+        if allocation is None:
+            raise KahunaException(f"typeid: {source_id} 无建筑分配，请配置匹配器。")
+        return allocation
 
-        raise KahunaException(f"typeid: {source_id} 无建筑分配，请配置匹配器。")
+    @classmethod
+    def allocate_structure(cls, source_id: int, st_matcher: Matcher) -> int | None:
+        """
+        input: source_id, matcher
+        根据source_id的物品属性，按照"bp", "market_group", "group", "meta", "category"的顺序从matcher_data中匹配
 
+        return: structure_id
+        """
+        return cls.get_allocation(source_id, st_matcher)[0]
 
     @classmethod
     def get_default_bp_mater_time_eff(cls, type_id: int) -> [int, int]:
@@ -5,6 +5,7 @@ from .system_cost import SystemCost
 from .market_price import MarketPrice
 from ..character_server.character_manager import CharacterManager
 from ...utils import KahunaException
+from ...utils.refresh_signal import RefreshSignal
 from .industry_analyse import IndustryAnalyser
 from .industry_config import IndustryConfigManager
 
@@ -24,12 +25,14 @@ class IndustryManager:
                 corp_list_id_list.append((character.corp_id, character))
                 exist_corp_set.add(character.corp_id)
 
-        for character in character_list:
-            RunningJobOwner.refresh_character_running_job(character)
-        for corp_id, character in corp_list_id_list:
-            RunningJobOwner.refresh_corp_running_job(corp_id, character)
-
-        RunningJobOwner.copy_to_cache()
+        with RunningJobOwner.get_lock():
+            RunningJobOwner.prepare()
+            for character in character_list:
+                RunningJobOwner.refresh_character_running_job(character)
+            for corp_id, character in corp_list_id_list:
+                RunningJobOwner.refresh_corp_running_job(corp_id, character)
+            RunningJobOwner.swap_cache()
+        RefreshSignal.publish('running_job')
         logger.info("refresh running status complete.")
 
     @classmethod
@@ -44,20 +47,11 @@ class IndustryManager:
     # 调起工业分析
     @classmethod
     def create_plan_analyser(cls, user, plan_name: str):
+        """ 与get_analyser_by_plan共用缓存，计划内容或匹配器版本变化时重新分析 """
         if plan_name not in user.user_data.plan:
             raise KahunaException("plan not found.")
-        if plan_name in IndustryAnalyser.analyser_cache:
-            return IndustryAnalyser.analyser_cache[plan_name]
-        analyser = IndustryAnalyser(user.user_qq, "work")
-        # 配置匹配器
-        bp_matcher = IndustryConfigManager.get_matcher_of_user_by_name(user.user_data.plan[plan_name]["bp_matcher"], user.user_qq)
-        st_matcher = IndustryConfigManager.get_matcher_of_user_by_name(user.user_data.plan[plan_name]["st_matcher"], user.user_qq)
-        prod_block_matcher = IndustryConfigManager.get_matcher_of_user_by_name(user.user_data.plan[plan_name]["prod_block_matcher"], user.user_qq)
-        analyser.set_matchers(bp_matcher, st_matcher, prod_block_matcher)
-        # 导入计划表
-        plan = user.user_data.plan[plan_name]["plan"]
-        work_list = [[product, quantity] for product, quantity in plan.items()]
-        analyser.analyse_progress_work_type(work_list)
-
-        IndustryAnalyser.analyser_cache[plan_name] = analyser
+        analyser = IndustryAnalyser.get_analyser_by_plan(user, plan_name)
+        if not analyser.analysed_status:
+            analyser.analyse_progress_work_type(analyser.plan_list)
+        return analyser
 
@@ -53,9 +53,10 @@ class IdsUtils:
         """ 获取系数成本 """
         character_id = UserManager.get_main_character_id(owner_qq)
         character = CharacterManager.get_character_by_id(character_id)
-        structure_id = IndustryConfigManager.allocate_structure(child_id, st_matcher)
+        structure_id, _, _, eiv_cost_eff = IndustryConfigManager.get_allocation(child_id, st_matcher)
         structure = StructureManager.get_structure(structure_id, character.ac_token)
-        eiv_cost_eff = IndustryConfigManager.get_structure_EIV_cost_eff(structure.type_id)
+        if eiv_cost_eff is None:
+            eiv_cost_eff = IndustryConfigManager.get_structure_EIV_cost_eff(structure.type_id)
         sys_manu_cost, sys_reac_cost = SdeUtils.get_system_cost(structure.solar_system_id)
         child_eiv = cls.get_eiv(child_id) * child_total_quantity
         action_id = BPManager.get_action_id(child_id)
@@ -2,6 +2,7 @@
 from ..database_server.model import MarketPrice as M_MarketPrice, MarketPriceCache as M_MarketPriceCache
 from ..evesso_server.eveesi import markets_prices
 from ..database_server.connect import DatabaseConectManager
+from ..database_server.utils import DoubleBuffer
 from ...utils import chunks
 
 # kahuna logger
@@ -12,18 +13,13 @@ class MarketPrice:
     def refresh_market_price(cls):
         results = markets_prices()
         db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            M_MarketPrice.delete().execute()
-            for chunk in chunks(results, 1000):
-                M_MarketPrice.insert_many(chunk).execute()
-
-        cls.copy_to_cache()
+        with DoubleBuffer.get_lock(M_MarketPrice):
+            with db.atomic():
+                M_MarketPrice.delete().execute()
+                for chunk in chunks(results, 1000):
+                    M_MarketPrice.insert_many(chunk).execute()
+            cls.swap_cache()
 
     @classmethod
-    def copy_to_cache(cls):
-        db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            M_MarketPriceCache.delete().execute()
-            db.execute_sql("INSERT INTO market_price_cache SELECT * FROM market_price")
-            logger.info("market_price copy data to cache complete")
-
+    def swap_cache(cls):
+        DoubleBuffer.swap(M_MarketPrice, M_MarketPriceCache)
@@ -1,6 +1,9 @@
 import json
+from functools import lru_cache
 
 from ..database_server.model import Matcher as M_Matcher
+from ..sde_service import SdeUtils
+from .blueprint import BPManager
 
 MATCHER_KEY = ["bp", "market_group", "group", "meta", "category"]
 
@@ -9,12 +12,29 @@ class Matcher:
     user_qq = 0
     matcher_type = ""
     matcher_data = {matcher_k: dict() for matcher_k in MATCHER_KEY}
+    # 每次保存后自增，用于使依赖匹配器的计算缓存失效
+    version = 0
 
     def __init__(self, matcher_name, user_qq, matcher_type):
         self.matcher_name = matcher_name
         self.user_qq = user_qq
         self.matcher_type = matcher_type
         self.matcher_data = {matcher_k: dict() for matcher_k in MATCHER_KEY}
+        self.version = 0
+
+    @classmethod
+    @lru_cache(maxsize=20000)
+    def get_type_match_keys(cls, type_id: int) -> tuple:
+        """
+        物品用于匹配的各级属性，按匹配顺序
+        return: (bp_name, market_group_list, group, meta, category)
+        """
+        bp_id = BPManager.get_bp_id_by_prod_typeid(type_id)
+        return (SdeUtils.get_name_by_id(bp_id),
+                tuple(SdeUtils.get_market_group_list(type_id)),
+                SdeUtils.get_groupname_by_id(type_id),
+                SdeUtils.get_metaname_by_typeid(type_id),
+                SdeUtils.get_category_by_id(type_id))
 
     @classmethod
     def init_from_db_data(cls, data: M_Matcher):
@@ -37,6 +57,7 @@ class Matcher:
         obj.matcher_data = json.dumps(self.matcher_data)
 
         obj.save()
+        self.version += 1
 
     def delete_from_db(self):
         M_Matcher.delete().where(M_Matcher.matcher_name == self.matcher_name).execute()
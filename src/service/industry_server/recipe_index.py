@@ -0,0 +1,182 @@
+import time
+import threading
+from array import array
+
+import numpy as np
+
+from ..sde_service.snapshot import SdeSnapshot, NULL_LIMIT
+from ..log_server import logger
+from ...utils.startup_profiler import StartupProfiler
+
+# 45732是一个测试用数据，会导致误判，需要特殊处理
+TEST_BLUEPRINT_ID = 45732
+# 制造与反应
+PRODUCTION_ACTIVITY_ID = (1, 11)
+
+
+class RecipeIndex:
+    """
+    SDE蓝图配方的内存索引，启动时从SdeSnapshot的配方表一次性加载。
+
+    product -> blueprint    产品对应的蓝图与单流程产出数量
+    blueprint -> materials  材料以CSR形式保存在两个int数组中，_mat_offset记录每个蓝图的区间
+    blueprint -> time       制造/反应活动的时间与活动id
+    blueprint -> limit      蓝图最大生产流程数
+    """
+    _lock = threading.Lock()
+    loaded = False
+
+    _product_bp = dict()            # {product_id: blueprint_id}
+    _product_quantity = dict()      # {product_id: quantity}
+    _product_bp_list = dict()       # {product_id: [blueprint_id]}
+    _bp_product = dict()            # {blueprint_id: product_id}
+    _bp_activity = dict()           # {blueprint_id: (activity_id, time)}
+    _bp_max_limit = dict()          # {blueprint_id: maxProductionLimit}
+    _mat_offset = dict()            # {blueprint_id: (start, end)}
+    _mat_type = array('q')
+    _mat_quantity = array('q')
+
+    @classmethod
+    def init(cls):
+        cls.ensure_loaded()
+
+    @classmethod
+    def ensure_loaded(cls):
+        if cls.loaded:
+            return
+        with cls._lock:
+            if not cls.loaded:
+                with StartupProfiler.measure('RecipeIndex'):
+                    cls.load()
+
+    @classmethod
+    def load(cls):
+        start = time.perf_counter()
+        snapshot = SdeSnapshot.get()
+        product_bp = dict()
+        product_quantity = dict()
+        product_bp_list = dict()
+        bp_product = dict()
+        products = snapshot.section['products']
+        product_search = zip(products['blueprint_id'].tolist(), products['product_id'].tolist(),
+                             products['quantity'].tolist())
+        for bp_id, product_id, quantity in product_search:
+            if bp_id == TEST_BLUEPRINT_ID:
+                continue
+            if product_id not in product_bp:
+                product_bp[product_id] = bp_id
+                product_quantity[product_id] = quantity if quantity else 1
+                product_bp_list[product_id] = []
+            product_bp_list[product_id].append(bp_id)
+            if bp_id not in bp_product:
+                bp_product[bp_id] = product_id
+
+        # 材料按蓝图分组后压平为CSR数组
+        bp_materials = dict()
+        materials = snapshot.section['materials']
+        materials = materials[np.isin(materials['activity_id'], PRODUCTION_ACTIVITY_ID)]
+        material_search = zip(materials['blueprint_id'].tolist(), materials['material_id'].tolist(),
+                              materials['quantity'].tolist())
+        for bp_id, material_id, quantity in material_search:
+            bp_materials.setdefault(bp_id, []).append((material_id, quantity))
+
+        mat_offset = dict()
+        mat_type = array('q')
+        mat_quantity = array('q')
+        for bp_id, materials in bp_materials.items():
+            mat_offset[bp_id] = (len(mat_type), len(mat_type) + len(materials))
+            for material_id, quantity in materials:
+                mat_type.append(material_id)
+                mat_quantity.append(quantity)
+
+        bp_activity = dict()
+        activities = snapshot.section['activities']
+        activities = activities[np.isin(activities['activity_id'], PRODUCTION_ACTIVITY_ID)]
+        activity_search = zip(activities['blueprint_id'].tolist(), activities['activity_id'].tolist(),
+                              activities['time'].tolist())
+        for bp_id, activity_id, activity_time in activity_search:
+            if bp_id not in bp_activity:
+                bp_activity[bp_id] = (activity_id, activity_time)
+
+        blueprints = snapshot.section['blueprints']
+        bp_max_limit = {bp_id: None if limit == NULL_LIMIT else limit for bp_id, limit in
+                        zip(blueprints['blueprint_id'].tolist(), blueprints['max_limit'].tolist())}
+
+        cls._product_bp = product_bp
+        cls._product_quantity = product_quantity
+        cls._product_bp_list = product_bp_list
+        cls._bp_product = bp_product
+        cls._bp_activity = bp_activity
+        cls._bp_max_limit = bp_max_limit
+        cls._mat_offset = mat_offset
+        cls._mat_type = mat_type
+        cls._mat_quantity = mat_quantity
+        cls.loaded = True
+        logger.info(f'RecipeIndex loaded: {len(product_bp)} products, {len(mat_type)} materials '
+                    f'in {time.perf_counter() - start:.2f}s.')
+
+    @classmethod
+    def get_bp_id(cls, product_id: int) -> int | None:
+        cls.ensure_loaded()
+        return cls._product_bp.get(product_id, None)
+
+    @classmethod
+    def has_product(cls, product_id: int) -> bool:
+        cls.ensure_loaded()
+        return product_id in cls._product_bp
+
+    @classmethod
+    def is_blueprint(cls, bp_id: int) -> bool:
+        cls.ensure_loaded()
+        return bp_id in cls._bp_product
+
+    @classmethod
+    def product_ids(cls) -> list[int]:
+        cls.ensure_loaded()
+        return list(cls._product_bp.keys())
+
+    @classmethod
+    def get_product_quantity(cls, product_id: int) -> int:
+        cls.ensure_loaded()
+        return cls._product_quantity.get(product_id, 1)
+
+    @classmethod
+    def get_product_id(cls, bp_id: int) -> int | None:
+        cls.ensure_loaded()
+        return cls._bp_product.get(bp_id, None)
+
+    @classmethod
+    def get_bp_materials_by_bpid(cls, bp_id: int) -> dict:
+        cls.ensure_loaded()
+        if bp_id not in cls._mat_offset:
+            return dict()
+        start, end = cls._mat_offset[bp_id]
+        return dict(zip(cls._mat_type[start:end], cls._mat_quantity[start:end]))
+
+    @classmethod
+    def get_materials(cls, product_id: int) -> dict:
+        """ 产品所有配方的制造/反应材料，与原先join查询的结果一致 """
+        cls.ensure_loaded()
+        bp_list = cls._product_bp_list.get(product_id, None)
+        if not bp_list:
+            return dict()
+        if len(bp_list) == 1:
+            return cls.get_bp_materials_by_bpid(bp_list[0])
+        materials = dict()
+        for bp_id in bp_list:
+            materials.update(cls.get_bp_materials_by_bpid(bp_id))
+        return materials
+
+    @classmethod
+    def get_activity(cls, product_id: int) -> tuple[int, int] | None:
+        """ return: (activity_id, time) """
+        cls.ensure_loaded()
+        bp_id = cls._product_bp.get(product_id, None)
+        if bp_id is None:
+            return None
+        return cls._bp_activity.get(bp_id, None)
+
+    @classmethod
+    def get_max_production_limit(cls, bp_id: int) -> int | None:
+        cls.ensure_loaded()
+        return cls._bp_max_limit.get(bp_id, None)
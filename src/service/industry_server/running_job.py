@@ -5,6 +5,7 @@ from ..character_server.character import Character
 from ..evesso_server.eveesi import characters_character_id_industry_jobs, corporations_corporation_id_industry_jobs
 from ..evesso_server.eveutils import find_max_page, get_multipages_result
 from ..database_server.connect import DatabaseConectManager
+from ..database_server.utils import DoubleBuffer
 
 # kahuna logger
 from ..log_server import logger
@@ -13,6 +14,11 @@ class RunningJobOwner:
     @classmethod
     def refresh_character_running_job(cls, character: Character):
         character_running_job = characters_character_id_industry_jobs(character.ac_token, character.character_id)
+        if character_running_job is None:
+            # 请求失败，沿用上一份快照
+            DoubleBuffer.carry_over(M_IndustryJobs, M_IndustryJobsCache,
+                                    M_IndustryJobsCache.owner_id == character.character_id)
+            return
         if not character_running_job:
             return
 
@@ -41,22 +47,28 @@ class RunningJobOwner:
                     M_IndustryJobs.insert_many(result).execute()
 
     @classmethod
-    def copy_to_cache(cls):
-        M_IndustryJobsCache.delete().execute()
-        db = DatabaseConectManager.cache_db()
-        db.execute_sql(
-            f"INSERT INTO {M_IndustryJobsCache._meta.table_name} SELECT * FROM {M_IndustryJobs._meta.table_name}")
-        logger.info("copy data to cache complete")
+    def get_lock(cls):
+        return DoubleBuffer.get_lock(M_IndustryJobs)
+
+    @classmethod
+    def prepare(cls):
+        DoubleBuffer.prepare(M_IndustryJobs, M_IndustryJobsCache)
+
+    @classmethod
+    def swap_cache(cls):
+        DoubleBuffer.swap(M_IndustryJobs, M_IndustryJobsCache)
 
     @classmethod
     def get_job_with_starter(cls, character_id_list: list):
-        res = M_IndustryJobsCache.select().where(M_IndustryJobsCache.installer_id.in_(character_id_list))
+        res = (M_IndustryJobsCache.select()
+               .where(M_IndustryJobsCache.installer_id.in_(character_id_list))
+               .bind(DatabaseConectManager.cache_read_db()))
 
         return res
 
     @classmethod
     def get_using_bp_set(cls):
-        res = M_IndustryJobsCache.select(M_IndustryJobsCache.blueprint_id)
+        res = M_IndustryJobsCache.select(M_IndustryJobsCache.blueprint_id).bind(DatabaseConectManager.cache_read_db())
         bp_set = set()
         for job in res:
             bp_set.add(job.blueprint_id)
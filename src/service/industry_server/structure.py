@@ -43,6 +43,7 @@ class Structure:
         obj.time_rig_level = self.time_rig_level
 
         obj.save()
+        StructureManager.version += 1
 
     def __iter__(self):
         yield 'structure_id', self.structure_id
@@ -58,6 +59,8 @@ class Structure:
 class StructureManager():
     structure_dict = dict()
     init_status = False
+    # 建筑数据保存后自增，用于使建筑分配表失效
+    version = 0
 
     @classmethod
     def init(cls):
@@ -2,6 +2,7 @@
 from ..database_server.model import SystemCost as M_SystemCost, SystemCostCache as M_SystemCostCache
 from ..evesso_server.eveesi import industry_systems
 from ..database_server.connect import DatabaseConectManager
+from ..database_server.utils import DoubleBuffer
 from ...utils import chunks
 
 # kahuna logger
@@ -21,17 +22,13 @@ class SystemCost:
             insert_data.append(data)
 
         db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            M_SystemCost.delete().execute()
-            for chunk in chunks(insert_data, 1000):
-                M_SystemCost.insert_many(chunk).execute()
-
-        cls.copy_to_cache()
+        with DoubleBuffer.get_lock(M_SystemCost):
+            with db.atomic():
+                M_SystemCost.delete().execute()
+                for chunk in chunks(insert_data, 1000):
+                    M_SystemCost.insert_many(chunk).execute()
+            cls.swap_cache()
 
     @classmethod
-    def copy_to_cache(cls):
-        db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            M_SystemCostCache.delete().execute()
-            db.execute_sql("INSERT INTO system_cost_cache SELECT * FROM system_cost")
-            logger.info("system_cost copy data to cache complete")
+    def swap_cache(cls):
+        DoubleBuffer.swap(M_SystemCost, M_SystemCostCache)
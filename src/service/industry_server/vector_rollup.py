@@ -0,0 +1,186 @@
+import math
+import time
+import networkx as nx
+import numpy as np
+
+from .blueprint import BPManager
+from .industry_utils import IdsUtils as IdsU
+from ..log_server import logger
+from ...utils import KahunaException
+
+
+class VectorRollup:
+    """
+    全体需求(global_graph)的向量化计算。
+    节点映射为连续整数下标，材料关系保存为COO形式的三组数组(src, dst, quantity)，
+    按最长路径深度自顶向下逐层用np.bincount累加子节点需求。
+
+    与calculate_work_bpnode_quantity的全体部分一致：
+        流程数 = ceil(需求 / 单流程产出)
+        按工作序列依次累加流程，每个工作使用自己的材料效率，最后一个工作超出需求的部分按比例扣除
+    父节点的工作序列确定后，对任一子节点的消耗都是 材料数量 * 系数：
+        材料数量为1时不吃加成，系数 = 需求 / 单流程产出
+        否则系数 = sum(工作流程 * 材料效率) - 超出流程 * 最后工作的材料效率
+    每层先逐个节点计算系数，再按边向量化累加。
+    """
+    def __init__(self, analyser):
+        self.analyser = analyser
+        self.bp_graph = analyser.bp_graph
+
+        self.node_list = []
+        self.node_index = dict()
+        self.depth = None
+        self.edge_src = None
+        self.edge_dst = None
+        self.edge_quantity = None
+
+        self.phase_timing = dict()
+
+    @staticmethod
+    def get_runs_coefficient(work_list: list, need: float, product_quantity: int) -> tuple[float, float]:
+        """
+        与calculate_work_bpnode_quantity全体部分相同的工作遍历。
+        return: (材料数量不为1时的系数, 材料数量为1时的系数)
+        """
+        if need <= 0:
+            return 0, 0
+        production_sum = 0
+        eff_runs = 0
+        plain_runs = 0
+        work_list_len = len(work_list)
+        work_i = 0
+        while production_sum < need and work_i < work_list_len:
+            production_sum += work_list[work_i].runs * product_quantity
+            eff_runs += work_list[work_i].runs * work_list[work_i].mater_eff
+            plain_runs += work_list[work_i].runs
+            if work_i < work_list_len - 1:
+                work_i += 1
+        if production_sum < need:
+            raise KahunaException("安排的工作无法覆盖需求")
+        # 超出部分按最后一个工作的效率扣除
+        excess_runs = (production_sum - need) / product_quantity
+        return eff_runs - excess_runs * work_list[work_i].mater_eff, plain_runs - excess_runs
+
+    def compile(self):
+        start = time.perf_counter()
+        try:
+            topo_order = list(nx.topological_sort(self.bp_graph))
+        except nx.NetworkXUnfeasible:
+            raise KahunaException(f'蓝图树存在循环: {nx.find_cycle(self.bp_graph)}')
+        self.node_list = topo_order
+        self.node_index = {node: index for index, node in enumerate(topo_order)}
+
+        # 多重边按(父, 子)去重，index只影响分index统计，不影响全体需求
+        edge_dict = dict()
+        for father, child, data in self.bp_graph.edges(data=True):
+            if father == 'root':
+                continue
+            edge_dict[(self.node_index[father], self.node_index[child])] = data['quantity']
+        self.edge_src = np.fromiter((k[0] for k in edge_dict.keys()), dtype=np.int64, count=len(edge_dict))
+        self.edge_dst = np.fromiter((k[1] for k in edge_dict.keys()), dtype=np.int64, count=len(edge_dict))
+        self.edge_quantity = np.fromiter(edge_dict.values(), dtype=np.float64, count=len(edge_dict))
+
+        # 逆拓扑序计算最长路径深度，叶子为1
+        depth = np.ones(len(topo_order), dtype=np.int64)
+        for node in reversed(topo_order):
+            index = self.node_index[node]
+            for succ in self.bp_graph.successors(node):
+                depth[index] = max(depth[index], depth[self.node_index[succ]] + 1)
+        self.depth = depth
+        self.phase_timing['compile'] = time.perf_counter() - start
+
+    def rollup(self, work_list: list) -> dict:
+        """
+        :param work_list: [(type_id, quantity)]，与get_work_tree的输入一致
+        :return: {type_id: {quantity, runs, work_list, is_material, buy_cost | eiv_cost}}
+        """
+        if not self.node_list:
+            self.compile()
+        analyser = self.analyser
+        start = time.perf_counter()
+        node_count = len(self.node_list)
+
+        quantity = np.zeros(node_count, dtype=np.float64)
+        for type_id, need in work_list:
+            quantity[self.node_index[type_id]] += need
+
+        product_quantity = np.ones(node_count, dtype=np.float64)
+        eff_runs = np.zeros(node_count, dtype=np.float64)
+        plain_runs = np.zeros(node_count, dtype=np.float64)
+        runs = np.zeros(node_count, dtype=np.int64)
+        is_material = np.zeros(node_count, dtype=bool)
+        buildable = np.zeros(node_count, dtype=bool)
+        node_work_list = dict()
+        for index, node in enumerate(self.node_list):
+            if node == 'root':
+                continue
+            if not BPManager.get_bp_id_by_prod_typeid(node) or analyser.in_pd_block(node):
+                is_material[index] = True
+            else:
+                buildable[index] = True
+                product_quantity[index] = BPManager.get_bp_product_quantity_typeid(node)
+
+        edge_depth = self.depth[self.edge_src]
+        for layer in range(int(self.depth.max()), 1, -1):
+            layer_nodes = np.nonzero((self.depth == layer) & buildable)[0]
+            if layer_nodes.size == 0:
+                continue
+            runs[layer_nodes] = np.ceil(quantity[layer_nodes] / product_quantity[layer_nodes]).astype(np.int64)
+
+            # 工作序列依赖蓝图库存，只能逐个获取
+            for index in layer_nodes:
+                node = self.node_list[index]
+                node_works = analyser.get_runs_list_by_bpasset(int(runs[index]), node, analyser.owner_qq,
+                                                               analyser.total_need_work_list_dict, 'total')
+                node_work_list[node] = node_works
+                eff_runs[index], plain_runs[index] = self.get_runs_coefficient(
+                    node_works, float(quantity[index]), int(product_quantity[index]))
+
+            layer_edge = edge_depth == layer
+            src = self.edge_src[layer_edge]
+            dst = self.edge_dst[layer_edge]
+            edge_quantity = self.edge_quantity[layer_edge]
+            # 如果需求为1，不吃材料加成
+            contribution = edge_quantity * np.where(edge_quantity == 1, plain_runs[src], eff_runs[src])
+            quantity += np.bincount(dst, weights=contribution, minlength=node_count)
+        self.phase_timing['quantity'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        unit_price = np.zeros(node_count, dtype=np.float64)
+        unit_eiv = np.zeros(node_count, dtype=np.float64)
+        material_index = [index for index in np.flatnonzero(is_material) if self.node_list[index] != 'root']
+        if material_index:
+            unit_price[material_index] = analyser.market.get_type_order_rouge_array(
+                [self.node_list[index] for index in material_index])[0]
+        for index, node in enumerate(self.node_list):
+            if node == 'root':
+                continue
+            if not is_material[index] and buildable[index]:
+                unit_eiv[index] = IdsU.get_eiv_cost(node, 1, analyser.owner_qq, analyser.st_matcher)
+        buy_cost = quantity * unit_price
+        if analyser.depth_price:
+            # 按深度成交价与数量不成线性，逐个材料在订单簿上查询
+            for index in material_index:
+                buy_cost[index] = analyser.get_buy_cost(self.node_list[index], math.ceil(quantity[index]))
+        eiv_cost = quantity * unit_eiv
+        self.phase_timing['cost'] = time.perf_counter() - start
+
+        res = dict()
+        for index, node in enumerate(self.node_list):
+            if node == 'root':
+                continue
+            node_data = {
+                'quantity': float(quantity[index]),
+                'runs': int(runs[index]),
+                'work_list': node_work_list.get(node, []),
+                'is_material': bool(is_material[index]),
+            }
+            if is_material[index]:
+                node_data['buy_cost'] = float(buy_cost[index])
+            else:
+                node_data['eiv_cost'] = float(eiv_cost[index])
+            res[node] = node_data
+
+        logger.info(f'VectorRollup: {node_count} nodes, {self.edge_src.size} edges, '
+                    + ', '.join(f'{k} {v:.3f}s' for k, v in self.phase_timing.items()))
+        return res
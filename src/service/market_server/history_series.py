@@ -0,0 +1,236 @@
+import time
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from ..database_server.model import MarketHistory as M_MarketHistory
+from ..database_server.connect import DatabaseConectManager
+from .history_summary import HistorySummary
+from ..log_server import logger
+
+SERIES_DAYS = 365
+MA_SHORT = 7
+MA_LONG = 30
+EMA_SPAN = 20
+VOLATILITY_DAYS = 30
+# 成交量分位使用的滚动窗口
+VOLUME_WINDOW = 7
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class HistorySeries:
+    """
+    区域市场历史的numpy时间序列。
+    一次读取区域内最近SERIES_DAYS天的历史，组成 物品×日期 的均价与成交量矩阵，
+    无成交的日期沿用上一个成交日的均价，全部物品的均线、EMA、波动率、成交量分位与日涨跌一次向量化计算。
+    按日更日期缓存，每日刷新后由refresh在锁外重新建立再替换，查询在建立期间继续使用旧的序列；
+    交互查询单独下载的物品由update_types只读取这些物品的历史并合并到已建立的序列中。
+    """
+    _lock = threading.Lock()
+    series_dict = dict()  # {region_id: HistorySeries}
+
+    def __init__(self, region_id: int, anchor_date):
+        self.region_id = region_id
+        self.anchor_date = anchor_date
+        self.dates = [anchor_date - timedelta(days=SERIES_DAYS - 1 - day) for day in range(SERIES_DAYS)]
+        # 排序后的type_id，行下标由searchsorted得到
+        self.type_ids = np.zeros(0, dtype=np.int64)
+        self.price = np.zeros((0, SERIES_DAYS), dtype=np.float64)
+        self.volume = np.zeros((0, SERIES_DAYS), dtype=np.float64)
+        self.ma_short = self.price
+        self.ma_long = self.price
+        self.ema = self.price
+        self.volatility = np.zeros(0, dtype=np.float64)
+        self.volume_pct = np.zeros(0, dtype=np.float64)
+        self.change = np.zeros(0, dtype=np.float64)
+        self.build_time = None
+
+    def load(self, type_id_list: list = None):
+        """ :param type_id_list: 只读取这些物品，None时读取区域内全部物品 """
+        start = time.perf_counter()
+        first_date = self.dates[0]
+        params = [first_date.strftime(DATE_FORMAT), self.region_id,
+                  first_date.strftime(DATE_FORMAT), self.anchor_date.strftime(DATE_FORMAT)]
+        type_filter = ''
+        if type_id_list is not None:
+            type_id_list = list(type_id_list)
+            type_filter = f" AND type_id IN ({', '.join('?' * len(type_id_list))})"
+            params += type_id_list
+        db = DatabaseConectManager.cache_read_db()
+        cursor = db.execute_sql(
+            f"SELECT type_id, CAST(ROUND(julianday(date) - julianday(?)) AS INTEGER), average, volume "
+            f"FROM {M_MarketHistory._meta.table_name} "
+            f"WHERE region_id = ? AND date >= ? AND date <= ?{type_filter}",
+            params
+        )
+        data = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+        type_col = data[:, 0].astype(np.int64)
+        day_col = data[:, 1].astype(np.int64)
+        self.type_ids = np.unique(type_col)
+        row_col = np.searchsorted(self.type_ids, type_col)
+
+        raw_price = np.full((len(self.type_ids), SERIES_DAYS), np.nan, dtype=np.float64)
+        raw_price[row_col, day_col] = data[:, 2]
+        self.volume = np.zeros((len(self.type_ids), SERIES_DAYS), dtype=np.float64)
+        self.volume[row_col, day_col] = data[:, 3]
+        self.price = self.forward_fill(raw_price)
+        self.calculate()
+        self.build_time = time.perf_counter() - start
+        logger.info(f'HistorySeries {self.region_id}: {len(self.type_ids)} types x {SERIES_DAYS} days '
+                    f'in {self.build_time:.2f}s.')
+        return self
+
+    @staticmethod
+    def forward_fill(matrix: np.ndarray) -> np.ndarray:
+        """ 每行的nan沿用左侧最近的有效值，首个有效值之前保持nan """
+        index = np.where(~np.isnan(matrix), np.arange(matrix.shape[1]), 0)
+        np.maximum.accumulate(index, axis=1, out=index)
+        return matrix[np.arange(matrix.shape[0])[:, None], index]
+
+    @staticmethod
+    def rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+        """ 按行滚动均值，忽略nan，窗口不足时使用已有的部分 """
+        valid = ~np.isnan(matrix)
+        value_sum = np.cumsum(np.pad(np.where(valid, matrix, 0), ((0, 0), (1, 0))), axis=1)
+        count_sum = np.cumsum(np.pad(valid, ((0, 0), (1, 0))), axis=1)
+        begin = np.maximum(np.arange(matrix.shape[1]) + 1 - window, 0)
+        total = value_sum[:, 1:] - value_sum[:, begin]
+        count = count_sum[:, 1:] - count_sum[:, begin]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(count > 0, total / count, np.nan)
+
+    @staticmethod
+    def exp_mean(matrix: np.ndarray, span: int) -> np.ndarray:
+        """ 按行EMA，逐日向量化递推 """
+        alpha = 2 / (span + 1)
+        res = np.empty_like(matrix)
+        prev = matrix[:, 0].copy()
+        res[:, 0] = prev
+        for day in range(1, matrix.shape[1]):
+            current = matrix[:, day]
+            prev = np.where(np.isnan(prev), current,
+                            np.where(np.isnan(current), prev, alpha * current + (1 - alpha) * prev))
+            res[:, day] = prev
+        return res
+
+    def calculate(self):
+        self.ma_short = self.rolling_mean(self.price, MA_SHORT)
+        self.ma_long = self.rolling_mean(self.price, MA_LONG)
+        self.ema = self.exp_mean(self.price, EMA_SPAN)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # 最近VOLATILITY_DAYS天日对数收益率的标准差
+            returns = np.diff(np.log(self.price[:, -VOLATILITY_DAYS - 1:]), axis=1)
+            valid = ~np.isnan(returns)
+            count = valid.sum(axis=1)
+            mean = np.where(valid, returns, 0).sum(axis=1) / count
+            variance = np.where(valid, (returns - mean[:, None]) ** 2, 0).sum(axis=1) / count
+            self.volatility = np.nan_to_num(np.sqrt(variance))
+
+            # 最近VOLUME_WINDOW天成交量在一年内滚动成交量中的分位
+            volume_sum = np.cumsum(np.pad(self.volume, ((0, 0), (1, 0))), axis=1)
+            rolling_volume = volume_sum[:, VOLUME_WINDOW:] - volume_sum[:, :-VOLUME_WINDOW]
+            self.volume_pct = (rolling_volume <= rolling_volume[:, -1:]).mean(axis=1) \
+                if rolling_volume.shape[1] else np.zeros(len(self.type_ids))
+
+            self.change = np.nan_to_num(self.price[:, -1] / self.price[:, -2] - 1)
+
+    def merge(self, part: 'HistorySeries') -> 'HistorySeries':
+        """ part中的物品行替换或插入到新的序列中，原序列不变 """
+        row, exist = self.get_row(part.type_ids)
+        new = ~exist
+        insert_at = np.searchsorted(self.type_ids, part.type_ids[new])
+        merged = HistorySeries(self.region_id, self.anchor_date)
+        merged.type_ids = np.insert(self.type_ids, insert_at, part.type_ids[new])
+        for attr in ['price', 'volume', 'ma_short', 'ma_long', 'ema', 'volatility', 'volume_pct', 'change']:
+            value = getattr(self, attr).copy()
+            value[row[exist]] = getattr(part, attr)[exist]
+            if new.any():
+                value = np.insert(value, insert_at, getattr(part, attr)[new], axis=0)
+            setattr(merged, attr, value)
+        merged.build_time = self.build_time
+        return merged
+
+    def get_row(self, type_id_list) -> tuple[np.ndarray, np.ndarray]:
+        """ :return: (行下标, 是否存在) """
+        type_ids = np.asarray(list(type_id_list), dtype=np.int64)
+        row = np.minimum(np.searchsorted(self.type_ids, type_ids), max(len(self.type_ids) - 1, 0))
+        exist = (self.type_ids[row] == type_ids) if len(self.type_ids) else np.zeros(len(type_ids), dtype=bool)
+        return row, exist
+
+    def get_indicator_dict(self, type_id_list) -> dict:
+        """ :return: {type_id: 指标字典}，没有历史的物品不返回 """
+        type_id_list = [type_id for type_id in type_id_list if type_id is not None]
+        if not type_id_list:
+            return dict()
+        row, exist = self.get_row(type_id_list)
+        row = row[exist]
+        ma_short = self.ma_short[row, -1]
+        ma_long = self.ma_long[row, -1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            trend = ma_short / ma_long - 1
+        column_dict = {
+            'last_price': self.price[row, -1],
+            'ma_short': ma_short,
+            'ma_long': ma_long,
+            'ema': self.ema[row, -1],
+            'trend': trend,
+            'volatility': self.volatility[row],
+            'volume_pct': self.volume_pct[row],
+            'change': self.change[row]
+        }
+        column_dict = {key: np.nan_to_num(value).tolist() for key, value in column_dict.items()}
+        return {type_id: {key: value[index] for key, value in column_dict.items()}
+                for index, type_id in enumerate(np.asarray(type_id_list)[exist].tolist())}
+
+    @classmethod
+    def get(cls, region_id: int):
+        """ 当日已建立的序列，日更日期变化或历史刷新后重新建立 """
+        anchor = HistorySummary.get_anchor_date()
+        series = cls.series_dict.get(region_id, None)
+        if series is not None and series.anchor_date == anchor:
+            return series
+        with cls._lock:
+            series = cls.series_dict.get(region_id, None)
+            if series is None or series.anchor_date != anchor:
+                series = HistorySeries(region_id, anchor).load()
+                cls.series_dict[region_id] = series
+            return series
+
+    @classmethod
+    def refresh(cls, region_id: int):
+        """ 重新读取区域历史，建立完成后替换 """
+        series = HistorySeries(region_id, HistorySummary.get_anchor_date()).load()
+        with cls._lock:
+            cls.series_dict[region_id] = series
+        return series
+
+    @classmethod
+    def update_types(cls, region_id: int, type_id_list):
+        """
+        重新读取type_id_list的历史并合并到已建立的序列，耗时与物品数量成正比。
+        序列未建立或日更日期已变化时不处理，留给get或每日刷新重新建立。
+        """
+        series = cls.series_dict.get(region_id, None)
+        type_id_list = list(type_id_list)
+        if series is None or not type_id_list or series.anchor_date != HistorySummary.get_anchor_date():
+            return None
+        part = HistorySeries(region_id, series.anchor_date).load(type_id_list)
+        with cls._lock:
+            series = cls.series_dict.get(region_id, None)
+            if series is None or series.anchor_date != part.anchor_date:
+                return None
+            series = series.merge(part)
+            cls.series_dict[region_id] = series
+            return series
+
+    @classmethod
+    def get_indicator(cls, region_id: int, type_id: int):
+        return cls.get(region_id).get_indicator_dict([type_id]).get(type_id, None)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls.series_dict.clear()
@@ -0,0 +1,150 @@
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+
+from peewee import fn
+
+from ..database_server.model import MarketHistory as M_MarketHistory, MarketHistoryState
+from ..database_server.connect import DatabaseConectManager
+from ..evesso_server import eveesi
+from ..evesso_server.esi_async import EsiTransport
+from ..log_server import logger
+
+# esi市场历史在每日维护后更新，utc 11:05之后才能取到前一天的数据
+HISTORY_ROLLOVER_HOUR = 11
+HISTORY_ROLLOVER_MINUTE = 5
+# 每日批量刷新的时间，比日更晚一些避免取到未更新的数据
+HISTORY_REFRESH_HOUR = 11
+HISTORY_REFRESH_MINUTE = 30
+# 每批并发请求的物品数量
+REQUEST_BATCH_SIZE = 500
+# 每批写入的行数
+WRITE_BATCH_SIZE = 500
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class HistoryStore:
+    """
+    市场历史增量存储。
+    market_history_state记录每个(region, type)已入库的最新日期与最近一次请求时间，
+    只请求上次日更之后还没有请求过的物品，只写入比已入库日期更新的行。
+    请求失败的物品不更新请求时间，下次刷新时重试。
+    滚动统计由调用方以本次请求成功的物品更新，见HistorySummary。
+    """
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_rollover_time(cls, now: datetime = None) -> datetime:
+        """ 最近一次esi历史日更的utc时间 """
+        now = now or utc_now()
+        rollover = now.replace(hour=HISTORY_ROLLOVER_HOUR, minute=HISTORY_ROLLOVER_MINUTE, second=0, microsecond=0)
+        if now < rollover:
+            rollover -= timedelta(days=1)
+        return rollover
+
+    @classmethod
+    def track(cls, type_id_list: list, region_id: int):
+        """ 登记需要维护历史的物品，已有历史数据的物品以库中最新日期为起点 """
+        type_id_set = {type_id for type_id in type_id_list if type_id is not None}
+        if not type_id_set:
+            return
+        tracked = {state.type_id for state in
+                   MarketHistoryState.select(MarketHistoryState.type_id)
+                   .where((MarketHistoryState.region_id == region_id) &
+                          (MarketHistoryState.type_id.in_(list(type_id_set))))}
+        new_type = list(type_id_set - tracked)
+        if not new_type:
+            return
+        last_date_dict = dict(
+            M_MarketHistory.select(M_MarketHistory.type_id, fn.MAX(M_MarketHistory.date))
+            .where((M_MarketHistory.region_id == region_id) & (M_MarketHistory.type_id.in_(new_type)))
+            .group_by(M_MarketHistory.type_id)
+            .tuples()
+        )
+        state_list = [{'region_id': region_id, 'type_id': type_id, 'last_date': last_date_dict.get(type_id, None)}
+                      for type_id in new_type]
+        db = DatabaseConectManager.cache_db()
+        with db.atomic():
+            for index in range(0, len(state_list), WRITE_BATCH_SIZE):
+                MarketHistoryState.insert_many(state_list[index:index + WRITE_BATCH_SIZE]).on_conflict_ignore().execute()
+
+    @classmethod
+    def get_stale_type(cls, region_id: int, type_id_list: list = None) -> dict:
+        """ :return: {type_id: last_date}，上次日更之后还没有请求过的物品 """
+        rollover = cls.get_rollover_time()
+        query = MarketHistoryState.select().where(
+            (MarketHistoryState.region_id == region_id) &
+            (MarketHistoryState.fetch_time.is_null() | (MarketHistoryState.fetch_time < rollover))
+        )
+        if type_id_list is not None:
+            query = query.where(MarketHistoryState.type_id.in_(list(type_id_list)))
+        return {state.type_id: state.last_date for state in query}
+
+    @classmethod
+    def get_region_list(cls) -> list:
+        return [state.region_id for state in MarketHistoryState.select(MarketHistoryState.region_id).distinct()]
+
+    @classmethod
+    def refresh(cls, region_id: int, type_id_list: list = None) -> set:
+        """
+        刷新过期的物品历史。
+        :param type_id_list: None时刷新该区域全部已登记的物品
+        :return: 本次请求成功的type_id集合
+        """
+        with cls._lock:
+            stale_dict = cls.get_stale_type(region_id, type_id_list)
+            if not stale_dict:
+                return set()
+            start = time.perf_counter()
+            type_ids = list(stale_dict.keys())
+            insert_count = 0
+            fetched = set()
+            for index in range(0, len(type_ids), REQUEST_BATCH_SIZE):
+                chunk = type_ids[index:index + REQUEST_BATCH_SIZE]
+                # 新鲜度由state表维护，不再写入EsiCache
+                request_list = [EsiTransport.build_request(eveesi.markets_region_history, region_id, type_id, cache=False)
+                                for type_id in chunk]
+                results = EsiTransport.request_many(request_list)
+                result_dict = {type_id: result for type_id, (result, _) in zip(chunk, results) if result is not None}
+                insert_count += cls.save(region_id, result_dict, stale_dict)
+                fetched.update(result_dict.keys())
+            logger.info(f'market history {region_id}: {len(fetched)}/{len(type_ids)} types, {insert_count} new rows '
+                        f'in {time.perf_counter() - start:.2f}s.')
+            return fetched
+
+    @classmethod
+    def refresh_tracked(cls) -> dict:
+        """ :return: {region_id: 请求成功的type_id集合} """
+        return {region_id: cls.refresh(region_id) for region_id in cls.get_region_list()}
+
+    @classmethod
+    def save(cls, region_id: int, result_dict: dict, last_date_dict: dict) -> int:
+        fetch_time = utc_now()
+        row_list = []
+        state_list = []
+        for type_id, result in result_dict.items():
+            last_date = last_date_dict.get(type_id, None)
+            new_row = []
+            for res in result:
+                date = datetime.strptime(res['date'], '%Y-%m-%d')
+                if last_date is None or date > last_date:
+                    new_row.append(dict(res, date=date, type_id=type_id, region_id=region_id))
+            if new_row:
+                last_date = max(row['date'] for row in new_row)
+            row_list.extend(new_row)
+            state_list.append({'region_id': region_id, 'type_id': type_id,
+                               'last_date': last_date, 'fetch_time': fetch_time})
+
+        db = DatabaseConectManager.cache_db()
+        with db.atomic():
+            for index in range(0, len(row_list), WRITE_BATCH_SIZE):
+                M_MarketHistory.insert_many(row_list[index:index + WRITE_BATCH_SIZE]).on_conflict_ignore().execute()
+            for index in range(0, len(state_list), WRITE_BATCH_SIZE):
+                (MarketHistoryState.insert_many(state_list[index:index + WRITE_BATCH_SIZE])
+                 .on_conflict(conflict_target=[MarketHistoryState.region_id, MarketHistoryState.type_id],
+                              preserve=[MarketHistoryState.last_date, MarketHistoryState.fetch_time])
+                 .execute())
+        return len(row_list)
@@ -0,0 +1,128 @@
+import time
+from datetime import timedelta
+
+from peewee import fn, Case
+
+from ..database_server.model import MarketHistory as M_MarketHistory, MarketHistorySummary
+from ..database_server.connect import DatabaseConectManager
+from ..database_server.writer import CacheWriter
+from .history_store import HistoryStore
+from ..log_server import logger
+
+WEEK_DAYS = 7
+MONTH_DAYS = 30
+# 每条分组查询与写入的物品数量
+BATCH_SIZE = 500
+
+
+class HistorySummary:
+    """
+    市场历史的7日与30日滚动统计。
+    每个(region, type)在market_history_summary中保存一行，以最近一个日更日期为窗口终点，
+    历史写入后由一次GROUP BY查询更新本次请求过的物品，窗口终点变化后读取时再批量重算。
+    批量查询只需一次select，不再逐个物品分别查询周、月数据。
+    统计使用只读连接计算，保存在CacheWriter写线程中执行，交互查询补算缺失的物品时不等待写入。
+    """
+
+    @classmethod
+    def get_anchor_date(cls):
+        """ 当前可取得的最新历史日期 """
+        return (HistoryStore.get_rollover_time() - timedelta(days=1)).replace(hour=0, minute=0)
+
+    @classmethod
+    def calculate(cls, region_id: int, type_id_list) -> list:
+        """ 计算物品的滚动统计，return: market_history_summary的行数据 """
+        anchor = cls.get_anchor_date()
+        week_start = anchor - timedelta(days=WEEK_DAYS)
+        month_start = anchor - timedelta(days=MONTH_DAYS)
+        mkhist = M_MarketHistory
+        in_week = mkhist.date > week_start
+        flow = mkhist.average * mkhist.volume
+
+        type_ids = list(type_id_list)
+        row_list = []
+        for index in range(0, len(type_ids), BATCH_SIZE):
+            chunk = type_ids[index:index + BATCH_SIZE]
+            query = (mkhist
+                     .select(mkhist.type_id,
+                             fn.SUM(Case(None, [(in_week, flow)], 0)).coerce(False),
+                             fn.SUM(Case(None, [(in_week, mkhist.volume)], 0)).coerce(False),
+                             fn.AVG(Case(None, [(in_week, mkhist.highest)])).coerce(False),
+                             fn.AVG(Case(None, [(in_week, mkhist.lowest)])).coerce(False),
+                             fn.SUM(flow).coerce(False),
+                             fn.SUM(mkhist.volume).coerce(False),
+                             fn.AVG(mkhist.highest).coerce(False),
+                             fn.AVG(mkhist.lowest).coerce(False))
+                     .where((mkhist.region_id == region_id) & (mkhist.type_id.in_(chunk)) &
+                            (mkhist.date > month_start) & (mkhist.date <= anchor))
+                     .group_by(mkhist.type_id)
+                     .bind(DatabaseConectManager.cache_read_db())
+                     .tuples())
+            data_dict = {data[0]: data[1:] for data in query}
+            for type_id in chunk:
+                data = [value or 0 for value in data_dict.get(type_id, [0] * 8)]
+                row_list.append({
+                    'region_id': region_id, 'type_id': type_id, 'anchor_date': anchor,
+                    'week_flow': data[0], 'week_volume': data[1], 'week_highest': data[2], 'week_lowest': data[3],
+                    'month_flow': data[4], 'month_volume': data[5], 'month_highest': data[6], 'month_lowest': data[7]
+                })
+        return row_list
+
+    @classmethod
+    def save(cls, row_list: list):
+        db = DatabaseConectManager.cache_db()
+        with db.atomic():
+            for index in range(0, len(row_list), BATCH_SIZE):
+                MarketHistorySummary.replace_many(row_list[index:index + BATCH_SIZE]).execute()
+
+    @classmethod
+    def update(cls, region_id: int, type_id_list, wait: bool = True) -> dict:
+        """
+        重算并保存物品的滚动统计，返回 {type_id: MarketHistorySummary}
+        :param wait: 是否等待写入完成，历史刷新后需要等待，交互查询不等待
+        """
+        start = time.perf_counter()
+        row_list = cls.calculate(region_id, type_id_list)
+        if wait:
+            CacheWriter.run(cls.save, row_list)
+        else:
+            CacheWriter.submit(cls.save, row_list)
+        logger.info(f'market history summary {region_id}: {len(row_list)} types '
+                    f'in {time.perf_counter() - start:.2f}s.')
+        return {row['type_id']: MarketHistorySummary(**row) for row in row_list}
+
+    @classmethod
+    def get_summary(cls, region_id: int, type_id_list) -> dict:
+        """
+        批量读取滚动统计，缺失或窗口已过期的物品先重算。
+        :return: {type_id: get_type_history_detale格式的统计字典}
+        """
+        type_id_set = {type_id for type_id in type_id_list if type_id is not None}
+        if not type_id_set:
+            return dict()
+        anchor = cls.get_anchor_date()
+        summary_dict = {
+            summary.type_id: summary for summary in
+            MarketHistorySummary.select().where(
+                (MarketHistorySummary.region_id == region_id) &
+                (MarketHistorySummary.type_id.in_(list(type_id_set))) &
+                (MarketHistorySummary.anchor_date == anchor)
+            ).bind(DatabaseConectManager.cache_read_db())
+        }
+        missing = type_id_set - summary_dict.keys()
+        if missing:
+            summary_dict.update(cls.update(region_id, missing, wait=False))
+        return {type_id: cls.to_detale(summary) for type_id, summary in summary_dict.items()}
+
+    @classmethod
+    def to_detale(cls, summary: MarketHistorySummary) -> dict:
+        return {
+            'weekflow': summary.week_flow,
+            'week_highset_aver': summary.week_highest,
+            'week_lowest_aver': summary.week_lowest,
+            'week_volume': summary.week_volume,
+            'monthflow': summary.month_flow,
+            'month_highset_aver': summary.month_highest,
+            'month_lowest_aver': summary.month_lowest,
+            'month_volume': summary.month_volume
+        }
@@ -1,9 +1,7 @@
-from concurrent.futures import ThreadPoolExecutor
-from tqdm import tqdm
+import numpy as np
 from peewee import fn
 import asyncio
 from cachetools import TTLCache, cached
-from datetime import datetime, timedelta
 
 
 from ..database_server.model import MarketOrder as M_MarketOrder, MarketOrderCache as M_MarketOrderCache
@@ -12,7 +10,15 @@ from ..database_server.connect import DatabaseConectManager
 from ..evesso_server.eveesi import markets_region_orders
 from ..evesso_server.eveesi import markets_structures
 from ..evesso_server import eveesi
-from ..evesso_server.eveutils import find_max_page, get_multipages_result
+from ..evesso_server.eveutils import find_max_page, get_multipages_result, iter_multipages_result
+from .order_ingest import OrderIngestPipeline
+from ..database_server.utils import DoubleBuffer
+from ..database_server.writer import CacheWriter
+from .order_book import OrderBook
+from .order_delta import OrderDeltaRefresh
+from .history_store import HistoryStore
+from .history_summary import HistorySummary
+from .history_series import HistorySeries
 from ..sde_service import SdeUtils
 
 from ...utils import KahunaException
@@ -49,6 +55,7 @@ class Market:
             self.get_frt_order()
 
     def check_structure_access(self):
+        # 校验的是角色权限，订单页不经过缓存，每次都实际请求
         res = eveesi.markets_structures(1, self.access_character.ac_token, FRT_4H_STRUCTURE_ID)
         if not res:
             return False
@@ -56,87 +63,124 @@ class Market:
 
     def get_frt_order(self):
         if not self.access_character:
+            # 无法刷新时沿用上一份快照
+            DoubleBuffer.carry_over(M_MarketOrder, M_MarketOrderCache,
+                                    M_MarketOrderCache.location_id == FRT_4H_STRUCTURE_ID)
             return
         ac_token = self.access_character.ac_token
         max_page = find_max_page(markets_structures, ac_token, FRT_4H_STRUCTURE_ID, begin_page=20, interval=10)
-        # with db.atomic() as txn:
-        results = get_multipages_result(markets_structures, max_page, self.access_character.ac_token, FRT_4H_STRUCTURE_ID)
-
-        db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            M_MarketOrder.delete().where(M_MarketOrder.location_id == FRT_4H_STRUCTURE_ID).execute()
-            with tqdm(total=len(results), desc="写入数据库", unit="page", ascii='=-') as pbar:
-                for i, result in enumerate(results):
-                    # result = [order for order in result if order["location_id"] == JITA_TRADE_HUB_STRUCTURE_ID]
-                    M_MarketOrder.insert_many(result).execute()
-                    pbar.update()
+        if max_page == 0:
+            logger.warning(f"find max page = 0 when refresh frt market with {self.access_character.character_name}")
+            DoubleBuffer.carry_over(M_MarketOrder, M_MarketOrderCache,
+                                    M_MarketOrderCache.location_id == FRT_4H_STRUCTURE_ID)
+            return
+
+        logger.info("请求市场。")
+        page_iter = iter_multipages_result(markets_structures, max_page, ac_token, FRT_4H_STRUCTURE_ID)
+        return OrderIngestPipeline(M_MarketOrder, FRT_4H_STRUCTURE_ID).run(page_iter)
 
     def get_jita_order(self):
         max_page = find_max_page(markets_region_orders, REGION_FORGE_ID, begin_page=350, interval=50)
-        # with db.atomic() as txn:
 
         logger.info("请求市场。")
-        results = get_multipages_result(markets_region_orders, max_page, REGION_FORGE_ID)
-        # with ThreadPoolExecutor(max_workers=100) as executor:
-        #     futures = [executor.submit(markets_region_orders, page, REGION_FORGE_ID) for page in range(1, max_page+1)]
-        #     results = []
-        #     count = 1
-        #     for future in tqdm(futures, desc="请求市场数据", unit="page"):
-        #         result = future.result()
-        #         results.append(result)
-        #         count += 1
-
-        db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            M_MarketOrder.delete().where(M_MarketOrder.location_id == JITA_TRADE_HUB_STRUCTURE_ID).execute()
-            with tqdm(total=len(results), desc="写入数据库", unit="page", ascii='=-') as pbar:
-                for i, result in enumerate(results):
-                    result = [order for order in result if order["location_id"] == JITA_TRADE_HUB_STRUCTURE_ID]
-                    M_MarketOrder.insert_many(result).execute()
-                    pbar.update()
+        # 逐页过滤出吉他订单并分批写入，不在内存中保留整个星域的订单
+        page_iter = iter_multipages_result(markets_region_orders, max_page, REGION_FORGE_ID)
+        return OrderIngestPipeline(M_MarketOrder, JITA_TRADE_HUB_STRUCTURE_ID).run(page_iter)
+
+    def get_market_order_delta(self) -> set:
+        """ 增量刷新缓存表中本市场的订单，返回订单有变化的type_id集合 """
+        if self.market_type == "jita":
+            max_page = find_max_page(markets_region_orders, REGION_FORGE_ID, begin_page=350, interval=50)
+            page_iter = iter_multipages_result(markets_region_orders, max_page, REGION_FORGE_ID)
+        else:
+            if not self.access_character:
+                return set()
+            ac_token = self.access_character.ac_token
+            max_page = find_max_page(markets_structures, ac_token, FRT_4H_STRUCTURE_ID, begin_page=20, interval=10)
+            if max_page == 0:
+                logger.warning(f"find max page = 0 when refresh frt market with {self.access_character.character_name}")
+                return set()
+            page_iter = iter_multipages_result(markets_structures, max_page, ac_token, FRT_4H_STRUCTURE_ID)
+
+        logger.info("增量请求市场。")
+        return OrderDeltaRefresh(M_MarketOrderCache, self.location_id).run(page_iter, max_page)
 
     def get_market_detail(self) -> tuple[int, int, int, int]:
         if self.market_type == "jita":
             target_location = JITA_TRADE_HUB_STRUCTURE_ID
         else:
             target_location = FRT_4H_STRUCTURE_ID
+        read_db = DatabaseConectManager.cache_read_db()
 
         # 统计总数据数量，并按照is_buy_order进行求和统计
-        total_count = (M_MarketOrder
-                       .select(fn.COUNT(M_MarketOrder.id))
-                       .where(M_MarketOrder.location_id == target_location)
+        total_count = (M_MarketOrderCache
+                       .select(fn.COUNT(M_MarketOrderCache.id))
+                       .where(M_MarketOrderCache.location_id == target_location)
+                       .bind(read_db)
                        .scalar())
 
-        buy_count = (M_MarketOrder
-                     .select(fn.COUNT(M_MarketOrder.id))
-                     .where((M_MarketOrder.location_id == target_location) &
-                            (M_MarketOrder.is_buy_order == True))
+        buy_count = (M_MarketOrderCache
+                     .select(fn.COUNT(M_MarketOrderCache.id))
+                     .where((M_MarketOrderCache.location_id == target_location) &
+                            (M_MarketOrderCache.is_buy_order == True))
+                     .bind(read_db)
                      .scalar())
 
-        sell_count = (M_MarketOrder
-                      .select(fn.COUNT(M_MarketOrder.id))
-                      .where((M_MarketOrder.location_id == target_location) &
-                             (M_MarketOrder.is_buy_order == False))
+        sell_count = (M_MarketOrderCache
+                      .select(fn.COUNT(M_MarketOrderCache.id))
+                      .where((M_MarketOrderCache.location_id == target_location) &
+                             (M_MarketOrderCache.is_buy_order == False))
+                      .bind(read_db)
                       .scalar())
 
         # 统计不同的类型数量
-        distinct_type_count = (M_MarketOrder
-                               .select(M_MarketOrder.type_id)
-                               .where(M_MarketOrder.location_id == target_location)
+        distinct_type_count = (M_MarketOrderCache
+                               .select(M_MarketOrderCache.type_id)
+                               .where(M_MarketOrderCache.location_id == target_location)
                                .distinct()
+                               .bind(read_db)
                                .count())
 
         return total_count, buy_count, sell_count, distinct_type_count
 
+    def get_type_order_rouge(self, type_id: int):
+        book = OrderBook.get_book(self.location_id)
+        if book is not None:
+            return book.get_rouge(type_id)
+        return self.get_type_order_rouge_from_db(type_id)
+
+    def get_type_order_rouge_array(self, type_id_list: list):
+        """ 批量查价，返回(收单价数组, 出单价数组) """
+        book = OrderBook.get_book(self.location_id)
+        if book is not None:
+            return book.get_rouge_array(type_id_list)
+        rouge_list = [self.get_type_order_rouge_from_db(type_id) for type_id in type_id_list]
+        return (np.array([rouge[0] for rouge in rouge_list], dtype=np.float64),
+                np.array([rouge[1] for rouge in rouge_list], dtype=np.float64))
+
+    def get_type_fill_price(self, type_id: int, quantity: int, side: str = 'buy') -> tuple[float, float, int]:
+        """ 按深度成交quantity个的(均价, 边际价格, 可成交数量)，side: buy 买入 / sell 卖出 """
+        book = OrderBook.get_book(self.location_id)
+        if book is not None:
+            return book.fill_price(type_id, quantity, side)
+        max_buy, min_sell = self.get_type_order_rouge_from_db(type_id)
+        price = min_sell if side == 'buy' else max_buy
+        return price, price, quantity if price else 0
+
+    def get_type_fill_cost(self, type_id: int, quantity: int, side: str = 'buy') -> float:
+        average, marginal, filled = self.get_type_fill_price(type_id, quantity, side)
+        return average * filled + marginal * (quantity - filled)
+
     order_rouge_cache = TTLCache(maxsize=3000, ttl=20*60)
     @cached(order_rouge_cache)
-    def get_type_order_rouge(self, type_id: int):
+    def get_type_order_rouge_from_db(self, type_id: int):
         if self.market_type == "jita":
             target_location = JITA_TRADE_HUB_STRUCTURE_ID
         else:
             target_location = FRT_4H_STRUCTURE_ID
         
         target_id , target_location = type_id, target_location  # replace with actual values
+        read_db = DatabaseConectManager.cache_read_db()
         
         # 获取 is_buy_order=1 的最高价格
         max_price_buy = (M_MarketOrderCache
@@ -144,6 +188,7 @@ class Market:
                          .where((M_MarketOrderCache.type_id == target_id) &
                                 (M_MarketOrderCache.location_id == target_location) &
                                 (M_MarketOrderCache.is_buy_order == True))
+                         .bind(read_db)
                          .scalar())
         
         # 获取 is_buy_order=0 的最低价格
@@ -152,6 +197,7 @@ class Market:
                           .where((M_MarketOrderCache.type_id == target_id) &
                                  (M_MarketOrderCache.location_id == target_location) &
                                  (M_MarketOrderCache.is_buy_order == False))
+                          .bind(read_db)
                           .scalar())
         if not max_price_buy or not min_price_sell:
             logger.info(f'{type_id},{SdeUtils.get_name_by_id(type_id)}: order data not exist in cache.')
@@ -169,132 +215,82 @@ class MarketHistory:
 
     @classmethod
     async def refresh_market_history(cls, type_id_list: list, region_id: int):
-        logger.info(f'刷新t2常规历史订单信息')
-        with ThreadPoolExecutor(max_workers=100) as executor:
-            with tqdm(total=len(type_id_list), desc="刷新市场历史", unit="page", ascii='=-') as pbar:
-                futures = []
-                for type_id in type_id_list:
-                    futures.append(executor.submit(cls.refresh_type_history_in_region, type_id, region_id))
-                    await asyncio.sleep(0.05)
-                    pbar.update()
-                for future in futures:
-                    try:
-                        future.result()
-                    except Exception as e:
-                        logger.error(f"refresh_type_history_in_region error: "
-                                     f"{type_id} {SdeUtils.get_name_by_id(type_id)} {e}")
+        """ 只请求上次日更后还没有请求过的物品，只写入新的日期 """
+        await asyncio.wrap_future(CacheWriter.submit(cls.refresh_type_history, type_id_list, region_id))
+
+    @classmethod
+    def refresh_type_history(cls, type_id_list: list, region_id: int):
+        HistoryStore.track(type_id_list, region_id)
+        fetched = HistoryStore.refresh(region_id, type_id_list)
+        if fetched:
+            HistorySummary.update(region_id, fetched)
+            cls.type_region_histpry_data_cache.clear()
+            # 整个区域的序列只在每日刷新时重新建立，这里只合并本次下载的物品
+            HistorySeries.update_types(region_id, fetched)
 
     @classmethod
     def refresh_type_history_in_region(cls, type_id: int, region_id: int):
-        result = eveesi.markets_region_history(region_id, type_id)
-        if not result:
-            return
-        [res.update({"type_id": type_id, 'region_id': region_id}) for res in result]
+        cls.refresh_type_history([type_id], region_id)
 
-        model.MarketHistory.insert_many(result).on_conflict_ignore().execute()
+    @classmethod
+    def refresh_all_history(cls):
+        """ 每日定时任务，批量刷新全部已登记的物品 """
+        for region_id, fetched in HistoryStore.refresh_tracked().items():
+            if fetched:
+                HistorySummary.update(region_id, fetched)
+        cls.type_region_histpry_data_cache.clear()
+        cls.build_history_series()
+
+    @classmethod
+    def build_history_series(cls):
+        """ 启动预热与每日刷新后重新建立常用星域的历史序列，交互查询不再等待建立 """
+        for region_id in [REGION_VALE_ID, REGION_FORGE_ID]:
+            HistorySeries.refresh(region_id)
+
+    background_task = set()
+    @classmethod
+    def schedule_market_history(cls, type_id_list: list, region_id: int):
+        """ 交互查询使用，后台刷新不等待，本次查询使用库中已有的历史 """
+        async def refresh():
+            try:
+                await cls.refresh_market_history(type_id_list, region_id)
+            except Exception as e:
+                logger.error(f"schedule_market_history error: {type_id_list} {region_id} {e}")
+        task = asyncio.create_task(refresh())
+        cls.background_task.add(task)
+        task.add_done_callback(cls.background_task.discard)
+
+    @classmethod
+    def clear_history_cache(cls):
+        cls.type_region_histpry_data_cache.clear()
+        HistorySeries.clear()
 
     type_region_histpry_data_cache = TTLCache(maxsize=3000, ttl=24 * 60 * 60)
     @classmethod
     @cached(type_region_histpry_data_cache)
     def get_type_region_histpry_data(cls, type_id: int, region_id: int) -> list:
-        region_year_data = model.MarketHistory.select().where((model.MarketHistory.type_id == type_id) & (model.MarketHistory.region_id == region_id)).order_by(model.MarketHistory.date.desc())
+        region_year_data = (model.MarketHistory.select()
+                            .where((model.MarketHistory.type_id == type_id) & (model.MarketHistory.region_id == region_id))
+                            .order_by(model.MarketHistory.date.desc())
+                            .bind(DatabaseConectManager.cache_read_db()))
         region_year_data_list = [[res.date, res.average] for res in region_year_data]
 
         return region_year_data_list
 
-    type_history_detale_cache = TTLCache(maxsize=3000, ttl=24 * 60 * 60)
     @classmethod
-    @cached(type_history_detale_cache)
     def get_type_history_detale(cls, type_id: int):
-        mkhist = model.MarketHistory
-        week_ago = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=9)
-        month_ago = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=32)
-
-        vale_week_data = mkhist.select().where((mkhist.date >= week_ago) & (mkhist.region_id == REGION_VALE_ID) & (mkhist.type_id == type_id)).order_by(mkhist.date.desc())
-        vale_month_data = mkhist.select().where((mkhist.date >= month_ago) & (mkhist.region_id == REGION_VALE_ID) & (mkhist.type_id == type_id)).order_by(mkhist.date.desc())
-        vale_week_data_list = [[res.average, res.highest, res.lowest, res.order_count, res.volume] for res in vale_week_data]
-        vale_month_data_list = [[res.average, res.highest, res.lowest, res.order_count, res.volume] for res in vale_month_data]
-
-        forge_week_data = mkhist.select().where((mkhist.date >= week_ago) & (mkhist.region_id == REGION_FORGE_ID) & (mkhist.type_id == type_id)).order_by(mkhist.date.desc())
-        forge_month_data = mkhist.select().where((mkhist.date >= month_ago) & (mkhist.region_id == REGION_FORGE_ID) & (mkhist.type_id == type_id)).order_by(mkhist.date.desc())
-        forge_week_data_list = [[res.average, res.highest, res.lowest, res.order_count, res.volume] for res in forge_week_data]
-        forge_month_data_list = [[res.average, res.highest, res.lowest, res.order_count, res.volume] for res in forge_month_data]
-
-        vale_res ={}
-        forge_res = {}
-
-        count = 0
-        flow = 0
-        highest_average = 0
-        lowest_average = 0
-        total_volume = 0
-        for data in vale_week_data_list:
-            flow += data[0] * data[4]
-            count += 1
-            total_volume += data[4]
-            highest_average += data[1]
-            lowest_average += data[2]
-        vale_res.update({
-            'weekflow': flow,
-            'week_highset_aver': highest_average / count if count else 0,
-            'week_lowest_aver': lowest_average / count if count else 0,
-            'week_volume': total_volume
-        })
-
-        count = 0
-        flow = 0
-        highest_average = 0
-        lowest_average = 0
-        total_volume = 0
-        for data in vale_month_data_list:
-            flow += data[0] * data[4]
-            count += 1
-            total_volume += data[4]
-            highest_average += data[1]
-            lowest_average += data[2]
-        vale_res.update({
-            'monthflow': flow,
-            'month_highset_aver': highest_average / count if count else 0,
-            'month_lowest_aver': lowest_average / count if count else 0,
-            'month_volume': total_volume
-        })
-
-        count = 0
-        flow = 0
-        highest_average = 0
-        lowest_average = 0
-        total_volume = 0
-        for data in forge_week_data_list:
-            flow += data[0] * data[4]
-            count += 1
-            total_volume += data[4]
-            highest_average += data[1]
-            lowest_average += data[2]
-        forge_res.update({
-            'weekflow': flow,
-            'week_highset_aver': highest_average / count if count else 0,
-            'week_lowest_aver': lowest_average / count if count else 0,
-            'week_volume': total_volume
-        })
-
-        count = 0
-        flow = 0
-        highest_average = 0
-        lowest_average = 0
-        total_volume = 0
-        for data in forge_month_data_list:
-            flow += data[0] * data[4]
-            count += 1
-            total_volume += data[4]
-            highest_average += data[1]
-            lowest_average += data[2]
-        forge_res.update({
-            'monthflow': flow,
-            'month_highset_aver': highest_average / count if count else 0,
-            'month_lowest_aver': lowest_average / count if count else 0,
-            'month_volume': total_volume
-        })
-
-        return vale_res, forge_res
+        """ :return: (4h所在星域统计, 伏尔戈统计) """
+        return (HistorySummary.get_summary(REGION_VALE_ID, [type_id]).get(type_id),
+                HistorySummary.get_summary(REGION_FORGE_ID, [type_id]).get(type_id))
+
+    @classmethod
+    def get_history_summary(cls, type_id_list: list, region_id: int) -> dict:
+        """ 批量读取滚动统计 {type_id: 统计字典} """
+        return HistorySummary.get_summary(region_id, type_id_list)
+
+    @classmethod
+    def get_history_indicator(cls, type_id_list: list, region_id: int) -> dict:
+        """ 批量读取均线、波动率等趋势指标 {type_id: 指标字典} """
+        return HistorySeries.get(region_id).get_indicator_dict(type_id_list)
 
 
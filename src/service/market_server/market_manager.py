@@ -3,29 +3,48 @@ import asyncio
 import time
 import threading
 from datetime import datetime
+from cachetools.keys import hashkey
 
-from ..database_server.model import MarketOrderCache
-from ..database_server.connect import DatabaseConectManager
+from ..database_server.model import MarketOrder, MarketOrderCache
+from ..database_server.utils import DoubleBuffer
 from .marker import Market
+from .order_book import OrderBook
 from ..character_server.character_manager import CharacterManager
 from ..config_server.config import config, update_config
 #import Exception
 from ...utils import KahunaException
+from ...utils.refresh_signal import RefreshSignal
+from ...utils.startup_profiler import StartupProfiler
 
 # kahuna logger
 from ..log_server import logger
 
 class MarketManager():
+    _init_lock = threading.Lock()
+    inited = False
     init_status = False
     market_dict = dict()
     monitor_process = None
     refresh_signal_flag = False
     last_refresh_time = None
+    # 按order_id增量刷新缓存表，False时每次整表重建后交换
+    delta_refresh = True
 
     @classmethod
     def init(cls):
         cls.init_market()
 
+    @classmethod
+    def ensure_init(cls):
+        """ 首次使用或后台预热时初始化 """
+        if cls.inited:
+            return
+        with cls._init_lock:
+            if not cls.inited:
+                with StartupProfiler.measure('MarketManager'):
+                    cls.init()
+                cls.inited = True
+
     @classmethod
     def init_market(cls):
         if not cls.init_status:
@@ -53,31 +72,67 @@ class MarketManager():
         update_config("EVE", "MARKET_AC_CHARACTER_ID", ac_character_id)
 
     @classmethod
-    def copy_to_cache(cls):
-        db = DatabaseConectManager.cache_db()
-        with db.atomic():
-            MarketOrderCache.delete().execute()
-            db.execute_sql("INSERT INTO market_order_cache SELECT * FROM market_order")
-            logger.info("copy data to cache complete")
+    def swap_cache(cls):
+        DoubleBuffer.swap(MarketOrder, MarketOrderCache)
 
     # 监视器，定时刷新
     @classmethod
-    def refresh_market(cls):
+    def refresh_market(cls, full: bool = False):
         logger.info("开始刷新市场数据。")
-        for market in cls.market_dict.values():
-            market.get_market_order()
-        cls.copy_to_cache()
+        cls.ensure_init()
+        location_list = [market.location_id for market in cls.market_dict.values()]
+        old_book_dict = {location_id: OrderBook.get_book(location_id) for location_id in location_list}
+        with DoubleBuffer.get_lock(MarketOrder):
+            if full or not cls.delta_refresh:
+                DoubleBuffer.prepare(MarketOrder, MarketOrderCache)
+                for market in cls.market_dict.values():
+                    market.get_market_order()
+                cls.swap_cache()
+                changed = None
+            else:
+                changed = set()
+                for market in cls.market_dict.values():
+                    changed |= market.get_market_order_delta()
+                # 增量刷新直接写入缓存表，staging表中上一次整表刷新的快照已过期
+                DoubleBuffer.clear(MarketOrder)
+        OrderBook.refresh(location_list)
+        moved = OrderBook.get_moved_type(old_book_dict, changed)
+        cls.invalidate_price_cache(moved)
+        cls.invalidate_cost_cache(changed)
+        RefreshSignal.publish('market', moved)
+        logger.info(f"最优价变化物品: {'全部' if moved is None else len(moved)}")
 
         log = cls.get_markets_detal()
         logger.info(log)
         return log
 
+    @classmethod
+    def invalidate_price_cache(cls, type_set: set | None):
+        """ 只清除最优价变化的物品，None时全部清除 """
+        if type_set is None:
+            Market.order_rouge_cache.clear()
+            return
+        cls.ensure_init()
+        for market in cls.market_dict.values():
+            for type_id in type_set:
+                Market.order_rouge_cache.pop(hashkey(market, type_id), None)
+
+    @classmethod
+    def invalidate_cost_cache(cls, type_set: set | None):
+        """ 批量成本缓存按计划保存，深度估价也受挂单量影响，订单有变化或全部可能变化(None)时全部清除 """
+        if type_set is not None and not type_set:
+            return
+        from ..industry_server.industry_analyse import IndustryAnalyser
+        IndustryAnalyser.cost_data_cache.clear()
+
     @classmethod
     def get_market_by_type(cls, type: str) -> Market:
+        cls.ensure_init()
         return cls.market_dict.get(type, None)
 
     @classmethod
     def get_markets_detal(cls) -> str:
+        cls.ensure_init()
         res = {}
         for market in cls.market_dict.values():
             res[market.market_type] = market.get_market_detail()
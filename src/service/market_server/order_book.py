@@ -0,0 +1,197 @@
+import time
+import threading
+
+import numpy as np
+
+from ..database_server.model import MarketOrderCache
+from ..database_server.connect import DatabaseConectManager
+from ..log_server import logger
+
+
+class OrderBook:
+    """
+    单个市场位置的订单簿快照。
+    市场刷新后从market_order_cache一次读取该位置的全部订单，建立以type_id为下标的
+    最高收单价、最低出单价、挂单量与订单数数组。单个查价为数组下标访问，批量查价为一次numpy索引。
+
+    收单与出单分别按(type_id, 价格由优到劣)排序保存，并记录每个type内的累计数量与累计金额，
+    成交N个的均价与边际价格只需在该type的累计数量上二分查找。
+    """
+    _lock = threading.Lock()
+    book_dict = dict()  # {location_id: OrderBook}
+
+    def __init__(self, location_id: int):
+        self.location_id = location_id
+        self.size = 0
+        self.best_bid = np.zeros(0, dtype=np.float64)
+        self.best_ask = np.zeros(0, dtype=np.float64)
+        self.bid_volume = np.zeros(0, dtype=np.int64)
+        self.ask_volume = np.zeros(0, dtype=np.int64)
+        self.bid_count = np.zeros(0, dtype=np.int64)
+        self.ask_count = np.zeros(0, dtype=np.int64)
+        # 排序后的单边订单 (type起始下标[size + 1], 价格, type内累计数量, type内累计金额)
+        self.bid_side = None
+        self.ask_side = None
+        self.order_count = 0
+        self.build_time = None
+
+    def load(self):
+        start = time.perf_counter()
+        db = DatabaseConectManager.cache_read_db()
+        cursor = db.execute_sql(
+            f"SELECT type_id, is_buy_order, CAST(price AS REAL), volume_remain "
+            f"FROM {MarketOrderCache._meta.table_name} WHERE location_id = ?",
+            (self.location_id,)
+        )
+        data = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+        type_ids = data[:, 0].astype(np.int64)
+        is_buy = data[:, 1] != 0
+        price = data[:, 2]
+        volume = data[:, 3].astype(np.int64)
+
+        self.size = int(type_ids.max()) + 1 if len(type_ids) else 0
+        # 收单价格取负，统一按从小到大排序即为由优到劣
+        self.bid_side = self.build_side(type_ids[is_buy], -price[is_buy], volume[is_buy])
+        self.ask_side = self.build_side(type_ids[~is_buy], price[~is_buy], volume[~is_buy])
+        self.best_bid = -self.get_best_price(self.bid_side)
+        self.best_ask = self.get_best_price(self.ask_side)
+        self.bid_volume = np.bincount(type_ids[is_buy], weights=volume[is_buy], minlength=self.size).astype(np.int64)
+        self.ask_volume = np.bincount(type_ids[~is_buy], weights=volume[~is_buy], minlength=self.size).astype(np.int64)
+        self.bid_count = np.diff(self.bid_side[0])
+        self.ask_count = np.diff(self.ask_side[0])
+        self.order_count = len(type_ids)
+        self.build_time = time.perf_counter() - start
+        logger.info(f'OrderBook {self.location_id}: {self.order_count} orders, '
+                    f'{int(np.count_nonzero(self.bid_count | self.ask_count))} types in {self.build_time:.2f}s.')
+        return self
+
+    def build_side(self, type_ids, sort_price, volume):
+        order = np.lexsort((sort_price, type_ids))
+        sorted_type = type_ids[order]
+        sorted_price = sort_price[order]
+        sorted_volume = volume[order]
+        start = np.searchsorted(sorted_type, np.arange(self.size + 1))
+        # 全局前缀和减去每个type起点之前的部分，得到type内的累计值
+        cum_volume = np.cumsum(sorted_volume)
+        cum_cost = np.cumsum(sorted_volume * np.abs(sorted_price))
+        if len(order):
+            first = start[sorted_type]
+            cum_volume -= np.r_[0, cum_volume][first]
+            cum_cost -= np.r_[0, cum_cost][first]
+        return start, sorted_price, cum_volume, cum_cost
+
+    def get_best_price(self, side):
+        start, sorted_price = side[0], side[1]
+        best = np.full(self.size, np.nan, dtype=np.float64)
+        has_order = start[1:] > start[:-1]
+        best[has_order] = sorted_price[start[:-1][has_order]]
+        return best
+
+    def get_rouge(self, type_id: int) -> tuple[float, float]:
+        """ (最高收单价, 最低出单价)，任一方向无订单时返回(0, 0)，与数据库查价一致 """
+        if type_id is None or not 0 <= type_id < self.size:
+            return 0, 0
+        bid = self.best_bid[type_id]
+        ask = self.best_ask[type_id]
+        if np.isnan(bid) or np.isnan(ask):
+            return 0, 0
+        return float(bid), float(ask)
+
+    def get_rouge_array(self, type_id_list) -> tuple[np.ndarray, np.ndarray]:
+        type_ids = np.asarray(type_id_list, dtype=np.int64)
+        bid = np.zeros(len(type_ids), dtype=np.float64)
+        ask = np.zeros(len(type_ids), dtype=np.float64)
+        in_range = (type_ids >= 0) & (type_ids < self.size)
+        bid[in_range] = self.best_bid[type_ids[in_range]]
+        ask[in_range] = self.best_ask[type_ids[in_range]]
+        missing = ~in_range | np.isnan(bid) | np.isnan(ask)
+        bid[missing] = 0
+        ask[missing] = 0
+        return bid, ask
+
+    def get_depth(self, type_id: int) -> tuple[int, int, int, int]:
+        """ (收单挂单量, 出单挂单量, 收单订单数, 出单订单数) """
+        if type_id is None or not 0 <= type_id < self.size:
+            return 0, 0, 0, 0
+        return (int(self.bid_volume[type_id]), int(self.ask_volume[type_id]),
+                int(self.bid_count[type_id]), int(self.ask_count[type_id]))
+
+    def fill_price(self, type_id: int, quantity: int, side: str = 'buy') -> tuple[float, float, int]:
+        """
+        按订单簿深度成交quantity个的价格。
+        :param side: buy 从出单买入，sell 卖给收单
+        :return: (成交均价, 最后一笔成交的边际价格, 可成交数量)，深度不足时只计算可成交的部分
+        """
+        order_side = self.ask_side if side == 'buy' else self.bid_side
+        if quantity <= 0 or order_side is None or type_id is None or not 0 <= type_id < self.size:
+            return 0, 0, 0
+        start, sorted_price, cum_volume, cum_cost = order_side
+        begin, end = start[type_id], start[type_id + 1]
+        if begin == end:
+            return 0, 0, 0
+        type_cum_volume = cum_volume[begin:end]
+        level = int(np.searchsorted(type_cum_volume, quantity, side='left'))
+        if level >= end - begin:
+            filled = int(type_cum_volume[-1])
+            return float(cum_cost[end - 1] / filled), float(abs(sorted_price[end - 1])), filled
+        before_volume = type_cum_volume[level - 1] if level > 0 else 0
+        before_cost = cum_cost[begin + level - 1] if level > 0 else 0
+        marginal = abs(sorted_price[begin + level])
+        cost = before_cost + (quantity - before_volume) * marginal
+        return float(cost / quantity), float(marginal), int(quantity)
+
+    def get_fill_cost(self, type_id: int, quantity: int, side: str = 'buy') -> float:
+        """ 成交quantity个的总金额，深度不足的部分按边际价格计算 """
+        average, marginal, filled = self.fill_price(type_id, quantity, side)
+        return average * filled + marginal * (quantity - filled)
+
+    def get_best_array(self, type_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """ 各自方向的最优价，无订单为0 """
+        bid = np.zeros(len(type_ids), dtype=np.float64)
+        ask = np.zeros(len(type_ids), dtype=np.float64)
+        in_range = (type_ids >= 0) & (type_ids < self.size)
+        bid[in_range] = np.nan_to_num(self.best_bid[type_ids[in_range]])
+        ask[in_range] = np.nan_to_num(self.best_ask[type_ids[in_range]])
+        return bid, ask
+
+    @classmethod
+    def get_moved_type(cls, old_book_dict: dict, candidate: set | None) -> set | None:
+        """
+        对比刷新前后的订单簿，返回候选type中最优价有变化的集合。
+        :param old_book_dict: 刷新前的 {location_id: OrderBook}
+        :param candidate: 订单有变化的type_id，None表示全部可能变化
+        """
+        if candidate is None:
+            return None
+        type_ids = np.fromiter(candidate, dtype=np.int64, count=len(candidate))
+        moved = np.zeros(len(type_ids), dtype=bool)
+        for location_id, old_book in old_book_dict.items():
+            new_book = cls.book_dict.get(location_id, None)
+            if old_book is None or new_book is None:
+                return None
+            old_bid, old_ask = old_book.get_best_array(type_ids)
+            new_bid, new_ask = new_book.get_best_array(type_ids)
+            moved |= (old_bid != new_bid) | (old_ask != new_ask)
+        return set(type_ids[moved].tolist())
+
+    @classmethod
+    def refresh(cls, location_id_list: list):
+        for location_id in location_id_list:
+            book = OrderBook(location_id).load()
+            with cls._lock:
+                cls.book_dict[location_id] = book
+
+    @classmethod
+    def get_book(cls, location_id: int):
+        """ 未建立时从当前缓存表建立，失败返回None，调用方回退到数据库查价 """
+        book = cls.book_dict.get(location_id, None)
+        if book is not None:
+            return book
+        with cls._lock:
+            if location_id not in cls.book_dict:
+                try:
+                    cls.book_dict[location_id] = OrderBook(location_id).load()
+                except Exception as e:
+                    logger.error(f'OrderBook {location_id} load error: {e}')
+                    return None
+            return cls.book_dict[location_id]
@@ -0,0 +1,93 @@
+import time
+
+from ..database_server.connect import DatabaseConectManager
+from ..log_server import logger
+
+# 每批写入的订单数量
+WRITE_BATCH_SIZE = 1000
+
+
+class OrderDeltaRefresh:
+    """
+    市场订单增量刷新。
+    以order_id比对新请求的订单与缓存表中当前位置的订单，只写入新增、价格或剩余数量变化、以及已消失的订单，
+    全部变更在一个事务内提交，读者不会看到写入一半的快照。
+    请求有页面失败时无法判断订单是否已消失，本次只写入新增与变化。
+    """
+    def __init__(self, model, location_id: int):
+        self.model = model
+        self.location_id = location_id
+        # {order_id: (row_id, type_id, price, volume_remain)}
+        self.snapshot = dict()
+
+        self.page_count = 0
+        self.fetch_row_count = 0
+        self.insert_list = []
+        self.update_list = []  # [(price, volume_remain, issued, row_id)]
+        self.delete_list = []  # [row_id]
+        self.changed_type = set()
+
+    def load_snapshot(self):
+        db = DatabaseConectManager.cache_db()
+        cursor = db.execute_sql(
+            f"SELECT id, CAST(order_id AS INTEGER), type_id, CAST(price AS REAL), volume_remain "
+            f"FROM {self.model._meta.table_name} WHERE location_id = ?",
+            (self.location_id,)
+        )
+        self.snapshot = {order_id: (row_id, type_id, price, volume_remain)
+                         for row_id, order_id, type_id, price, volume_remain in cursor.fetchall()}
+
+    def diff(self, page_iter, max_page: int):
+        seen_order = set()
+        for page in page_iter:
+            self.page_count += 1
+            self.fetch_row_count += len(page)
+            for order in page:
+                if order["location_id"] != self.location_id:
+                    continue
+                order_id = int(order["order_id"])
+                seen_order.add(order_id)
+                old = self.snapshot.get(order_id, None)
+                if old is None:
+                    self.insert_list.append(order)
+                    self.changed_type.add(order["type_id"])
+                elif old[2] != float(order["price"]) or old[3] != order["volume_remain"]:
+                    self.update_list.append((order["price"], order["volume_remain"], order["issued"], old[0]))
+                    self.changed_type.add(old[1])
+
+        if self.page_count < max_page:
+            logger.warning(f'{self.model._meta.table_name} {self.location_id}: '
+                           f'{self.page_count}/{max_page} pages fetched, skip deleting orders.')
+            return
+        for order_id, (row_id, type_id, _, _) in self.snapshot.items():
+            if order_id not in seen_order:
+                self.delete_list.append(row_id)
+                self.changed_type.add(type_id)
+
+    def apply(self):
+        table_name = self.model._meta.table_name
+        db = DatabaseConectManager.cache_db()
+        with db.atomic():
+            cursor = db.cursor()
+            for index in range(0, len(self.delete_list), WRITE_BATCH_SIZE):
+                chunk = self.delete_list[index:index + WRITE_BATCH_SIZE]
+                cursor.execute(f"DELETE FROM {table_name} WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            if self.update_list:
+                cursor.executemany(
+                    f"UPDATE {table_name} SET price = ?, volume_remain = ?, issued = ? WHERE id = ?",
+                    self.update_list
+                )
+            for index in range(0, len(self.insert_list), WRITE_BATCH_SIZE):
+                self.model.insert_many(self.insert_list[index:index + WRITE_BATCH_SIZE]).execute()
+
+    def run(self, page_iter, max_page: int) -> set:
+        """ :return: 订单有变化的type_id集合 """
+        start = time.perf_counter()
+        self.load_snapshot()
+        self.diff(page_iter, max_page)
+        self.apply()
+        logger.info(f'{self.model._meta.table_name} {self.location_id} delta: {self.page_count} pages, '
+                    f'{self.fetch_row_count} rows, +{len(self.insert_list)} ~{len(self.update_list)} '
+                    f'-{len(self.delete_list)} orders, {len(self.changed_type)} types '
+                    f'in {time.perf_counter() - start:.2f}s.')
+        return self.changed_type
@@ -0,0 +1,107 @@
+import time
+import queue
+import threading
+
+try:
+    import resource
+except ImportError:
+    # windows下没有resource模块
+    resource = None
+
+from ..database_server.connect import DatabaseConectManager
+from ..log_server import logger
+
+# 每批写入的订单数量
+WRITE_BATCH_SIZE = 1000
+# 等待写入的批次上限，超出后请求方阻塞
+WRITE_QUEUE_SIZE = 8
+
+
+def get_peak_rss_mb() -> float:
+    if resource is None:
+        return 0
+    # linux下单位为KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class OrderIngestPipeline:
+    """
+    市场订单流式写入。
+    请求方逐页过滤出目标位置的订单放入有界队列，独立的写入线程按固定批次写入数据库，
+    内存占用只与在途页数和队列长度有关。
+    """
+    def __init__(self, model, location_id: int, batch_size: int = WRITE_BATCH_SIZE):
+        self.model = model
+        self.location_id = location_id
+        self.batch_size = batch_size
+        self.write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self.writer_error = None
+
+        self.page_count = 0
+        self.fetch_row_count = 0
+        self.write_row_count = 0
+
+    def writer(self):
+        db = DatabaseConectManager.cache_db()
+        while True:
+            batch = self.write_queue.get()
+            if batch is None:
+                break
+            if self.writer_error:
+                continue
+            try:
+                with db.atomic():
+                    self.model.insert_many(batch).execute()
+                self.write_row_count += len(batch)
+            except Exception as e:
+                # 保留错误，继续消费队列避免请求方阻塞
+                self.writer_error = e
+
+    def run(self, page_iter, clean: bool = True) -> dict:
+        """
+        :param page_iter: 逐页返回订单列表的迭代器
+        :param clean: 写入前删除该位置的旧订单
+        """
+        start = time.perf_counter()
+        if clean:
+            db = DatabaseConectManager.cache_db()
+            with db.atomic():
+                self.model.delete().where(self.model.location_id == self.location_id).execute()
+
+        writer_thread = threading.Thread(target=self.writer, daemon=True)
+        writer_thread.start()
+        batch = []
+        try:
+            for page in page_iter:
+                self.page_count += 1
+                self.fetch_row_count += len(page)
+                for order in page:
+                    if order["location_id"] != self.location_id:
+                        continue
+                    batch.append(order)
+                    if len(batch) >= self.batch_size:
+                        self.write_queue.put(batch)
+                        batch = []
+            if batch:
+                self.write_queue.put(batch)
+        finally:
+            self.write_queue.put(None)
+            writer_thread.join()
+        if self.writer_error:
+            raise self.writer_error
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            'pages': self.page_count,
+            'fetch_rows': self.fetch_row_count,
+            'write_rows': self.write_row_count,
+            'seconds': elapsed,
+            'pages_per_second': self.page_count / elapsed if elapsed else 0,
+            'rows_per_second': self.write_row_count / elapsed if elapsed else 0,
+            'peak_rss_mb': get_peak_rss_mb()
+        }
+        logger.info(f'{self.model._meta.table_name} {self.location_id}: {stats["pages"]} pages, '
+                    f'{stats["write_rows"]}/{stats["fetch_rows"]} rows in {elapsed:.2f}s, '
+                    f'{stats["pages_per_second"]:.1f} pages/s, {stats["rows_per_second"]:.0f} rows/s, '
+                    f'peak rss {stats["peak_rss_mb"]:.0f}MB')
+        return stats
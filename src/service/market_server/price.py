@@ -9,6 +9,7 @@ class PriceService:
         # 可能的模糊匹配
 
         if market_str == "jita" or market_str == "frt":
+            MarketManager.ensure_init()
             market = MarketManager.market_dict[market_str]
         else:
             raise KahunaException("market_server not define.")
@@ -29,6 +30,23 @@ class PriceService:
 
             return max_buy, mid_price, min_sell, None
 
+    @staticmethod
+    def get_fill_price(item_str: str, market_str: str, quantity: int) -> dict | None:
+        """
+        按订单簿深度估算成交quantity个的价格。
+        :return: {'buy': (均价, 边际价格, 可成交数量), 'sell': (...)}，物品不存在时返回None
+        """
+        if market_str == "jita" or market_str == "frt":
+            MarketManager.ensure_init()
+            market = MarketManager.market_dict[market_str]
+        else:
+            raise KahunaException("market_server not define.")
 
-
-
+        if item_str in SdeUtils.item_map_dict:
+            item_str = SdeUtils.item_map_dict[item_str]
+        if (type_id := SdeUtils.get_id_by_name(item_str)) is None:
+            return None
+        return {
+            'buy': market.get_type_fill_price(type_id, quantity, 'buy'),
+            'sell': market.get_type_fill_price(type_id, quantity, 'sell')
+        }
@@ -44,9 +44,33 @@ class PriceResRender():
             os.makedirs(TMP_PATH)
 
     @classmethod
-    async def render_price_res_pic(cls, item_name: str, price_data: list, history_data: list):
+    async def render_price_res_pic(cls, item_name: str, price_data: list, history_data: list,
+                                   quantity: int = 1, fill_data: dict = None, trend_data: dict = None):
         # 准备实时价格数据
         max_buy, mid_price, min_sell, fuzz_list = price_data
+        # 按深度成交的价格 {side: [均价, 边际价格, 可成交数量]}
+        fill_price = None
+        if fill_data:
+            fill_price = {
+                side: {
+                    'average': f"{average:,.2f}",
+                    'marginal': f"{marginal:,.2f}",
+                    'total': f"{average * filled:,.2f}",
+                    'filled': f"{filled:,}",
+                    'enough': filled >= quantity
+                } for side, (average, marginal, filled) in fill_data.items()
+            }
+        # 历史趋势指标，见HistorySeries.get_indicator_dict
+        trend = None
+        if trend_data:
+            trend = {
+                'ma_short': f"{trend_data['ma_short']:,.2f}",
+                'ma_long': f"{trend_data['ma_long']:,.2f}",
+                'trend': f"{trend_data['trend']:+.2%}",
+                'change': f"{trend_data['change']:+.2%}",
+                'volatility': f"{trend_data['volatility']:.2%}",
+                'volume_pct': f"{trend_data['volume_pct']:.0%}"
+            }
 
         cls.check_tmp_dir()
 
@@ -69,7 +93,10 @@ class PriceResRender():
                 mid_price=f"{mid_price:,.2f}",
                 min_sell=f"{min_sell:,.2f}",
                 item_image_base64=item_image_base64,
-                price_history=history_data  # 添加这一行，格式为 [[date, price], ...]
+                price_history=history_data,  # 添加这一行，格式为 [[date, price], ...]
+                quantity=f"{quantity:,}",
+                fill_price=fill_price,
+                trend=trend
             )
         except jinja2.exceptions.TemplateNotFound as e:
             logger.error(f"模板文件不存在: {e}")
@@ -80,7 +107,8 @@ class PriceResRender():
         output_path = os.path.abspath(os.path.join((TMP_PATH), "price_res.jpg"))
 
         # 增加等待时间到5秒，确保图表有足够时间渲染
-        pic_path = await cls.render_pic(output_path, html_content, width=550, height=720, wait_time=120)
+        height = 720 + (180 if fill_price else 0) + (150 if trend else 0)
+        pic_path = await cls.render_pic(output_path, html_content, width=550, height=height, wait_time=120)
 
         if not pic_path:
             raise KahunaException("pic_path not exist.")
@@ -207,9 +235,9 @@ class PriceResRender():
             ]
             """
         jita_mk = MarketManager.get_market_by_type('jita')
+        buy_array, sell_array = jita_mk.get_type_order_rouge_array([asset.type_id for asset in sell_asset_list])
         items = []
-        for asset in sell_asset_list:
-            buy, sell = jita_mk.get_type_order_rouge(asset.type_id)
+        for asset, buy, sell in zip(sell_asset_list, buy_array.tolist(), sell_array.tolist()):
             if price_type == 'mid':
                 price = (buy + sell) / 2
             elif price_type == 'buy':
@@ -5,4 +5,5 @@ from .database import InvTypes, InvGroups, InvCategories
 from .database import MetaGroups
 from .database import IndustryActivityMaterials
 from .database import IndustryActivityProducts
-from .utils import SdeUtils
\ No newline at end of file
+from .utils import SdeUtils
+from .snapshot import SdeSnapshot
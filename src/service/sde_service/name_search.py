@@ -0,0 +1,210 @@
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+from thefuzz import fuzz, process, utils
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:
+    # 未安装pypinyin时不建立拼音索引
+    lazy_pinyin = None
+
+from .snapshot import SdeSnapshot
+from ..log_server import logger
+from ...utils.startup_profiler import StartupProfiler
+
+# 英文名称与拼音使用的字符n-gram长度
+NGRAM = 3
+# 进入打分的候选数量上限，按gram的Dice相似度取前若干个
+MAX_CANDIDATES = 300
+# 查询词是某个英文单词的前缀时额外计入的命中数
+TOKEN_BONUS = 2
+
+
+def normalize(text: str) -> str:
+    """ 与thefuzz打分前的处理一致：小写，非字母数字替换为空格 """
+    return utils.full_process(text)
+
+
+def get_ngram_set(text: str, size: int = NGRAM) -> set:
+    padded = f' {text} '
+    if len(padded) <= size:
+        return {padded}
+    return {padded[index:index + size] for index in range(len(padded) - size + 1)}
+
+
+def get_zh_gram_set(text: str) -> set:
+    """ 中文名称的单字与双字gram """
+    text = text.replace(' ', '')
+    return set(text) | {text[index:index + 2] for index in range(len(text) - 1)}
+
+
+def get_prefix_range(key_list: list, prefix: str) -> tuple[int, int]:
+    """ 有序列表中以prefix开头的区间 """
+    start = bisect_left(key_list, prefix)
+    end = bisect_left(key_list, prefix + '\uffff', lo=start)
+    return start, end
+
+
+class InvertedIndex:
+    """ gram -> 名称下标 的倒排表，命中计数由np.bincount一次完成 """
+    def __init__(self, gram_set_list: list):
+        posting = defaultdict(list)
+        for row, gram_set in enumerate(gram_set_list):
+            for gram in gram_set:
+                posting[gram].append(row)
+        self.posting = {gram: np.array(row_list, dtype=np.int32) for gram, row_list in posting.items()}
+        self.size = len(gram_set_list)
+
+    def get_gram_size(self) -> np.ndarray:
+        return np.bincount(np.concatenate(list(self.posting.values())), minlength=self.size) \
+            if self.posting else np.zeros(self.size, dtype=np.int64)
+
+    def count(self, gram_set: set) -> np.ndarray:
+        array_list = [self.posting[gram] for gram in gram_set if gram in self.posting]
+        if not array_list:
+            return np.zeros(self.size, dtype=np.int64)
+        return np.bincount(np.concatenate(array_list), minlength=self.size)
+
+
+class PrefixIndex:
+    """ 按key排序的(key, 名称下标)，二分查找前缀 """
+    def __init__(self, key_list: list):
+        order = sorted(range(len(key_list)), key=key_list.__getitem__)
+        self.key_list = [key_list[row] for row in order]
+        self.row_list = order
+
+    def get_rows(self, prefix: str) -> list:
+        start, end = get_prefix_range(self.key_list, prefix)
+        return self.row_list[start:end]
+
+
+class NameSearch:
+    """
+    物品名称的模糊搜索索引，替代对全部名称逐个打分的process.extract。
+    英文名称建立单词前缀与字符3-gram倒排表，中文名称建立单字/双字倒排表，
+    安装pypinyin时中文索引另建立全拼与首字母的3-gram倒排表，字母输入查找中文名称时按拼音匹配，
+    英文名称的搜索不混入拼音结果。
+    查询时先按gram的Dice相似度取MAX_CANDIDATES个候选，避免长名称因命中数多而挤占候选，
+    再用与原先相同的token_sort_ratio打分。
+    """
+    _lock = threading.Lock()
+    index_dict = dict()     # {zh: NameSearch}
+
+    def __init__(self, name_list: list, zh: bool):
+        start = time.perf_counter()
+        self.zh = zh
+        self.name_list = name_list
+        self.norm_list = [normalize(name) for name in name_list]
+        self.prefix = PrefixIndex(self.norm_list)
+        self.token_prefix = None
+        self.pinyin_index = None
+        if zh:
+            self.gram_index = InvertedIndex([get_zh_gram_set(name) for name in self.norm_list])
+            self.gram_size = self.gram_index.get_gram_size()
+            if lazy_pinyin is not None:
+                self.init_pinyin()
+        else:
+            self.gram_index = InvertedIndex([get_ngram_set(name) for name in self.norm_list])
+            self.gram_size = self.gram_index.get_gram_size()
+            token_row = [(token, row) for row, name in enumerate(self.norm_list) for token in set(name.split())]
+            token_row.sort()
+            self.token_prefix = ([token for token, _ in token_row],
+                                 np.array([row for _, row in token_row], dtype=np.int32))
+        logger.info(f'NameSearch {"zh" if zh else "en"}: {len(name_list)} names '
+                    f'in {time.perf_counter() - start:.2f}s.')
+
+    def init_pinyin(self):
+        self.pinyin_list = [''.join(lazy_pinyin(name)).lower() for name in self.norm_list]
+        self.initial_list = [''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower() for name in self.norm_list]
+        self.pinyin_index = InvertedIndex([get_ngram_set(pinyin) | get_ngram_set(initial)
+                                           for pinyin, initial in zip(self.pinyin_list, self.initial_list)])
+        self.pinyin_size = self.pinyin_index.get_gram_size()
+        self.pinyin_prefix = PrefixIndex(self.pinyin_list)
+        self.initial_prefix = PrefixIndex(self.initial_list)
+
+    @classmethod
+    def get(cls, zh=False):
+        if zh not in cls.index_dict:
+            with cls._lock:
+                if zh not in cls.index_dict:
+                    with StartupProfiler.measure('NameSearch.zh' if zh else 'NameSearch.en'):
+                        cls.index_dict[zh] = NameSearch(SdeSnapshot.get().get_market_name_list(zh), zh)
+        return cls.index_dict[zh]
+
+    @staticmethod
+    def get_candidate(count: np.ndarray, gram_size: np.ndarray, query_size: int) -> np.ndarray:
+        """ Dice相似度 2|A∩B|/(|A|+|B|) 最高的MAX_CANDIDATES个下标 """
+        hit = np.flatnonzero(count)
+        if len(hit) > MAX_CANDIDATES:
+            similarity = count[hit] / (gram_size[hit] + query_size)
+            hit = hit[np.argpartition(similarity, -MAX_CANDIDATES)[-MAX_CANDIDATES:]]
+        return hit
+
+    def get_name_candidate(self, query: str) -> np.ndarray:
+        if self.zh:
+            gram_set = get_zh_gram_set(query)
+            return self.get_candidate(self.gram_index.count(gram_set), self.gram_size, len(gram_set))
+        gram_set = get_ngram_set(query)
+        count = self.gram_index.count(gram_set)
+        token_list, token_row = self.token_prefix
+        for token in set(query.split()):
+            start, end = get_prefix_range(token_list, token)
+            count[token_row[start:end]] += TOKEN_BONUS
+        return self.get_candidate(count, self.gram_size, len(gram_set))
+
+    def search_name(self, query: str, limit: int) -> list[tuple[str, int]]:
+        norm = normalize(query)
+        if not norm:
+            return []
+        candidate = self.get_name_candidate(norm)
+        choice = {row: self.name_list[row] for row in candidate.tolist()}
+        return [(name, score) for name, score, _ in
+                process.extract(query, choice, scorer=fuzz.token_sort_ratio, limit=limit)]
+
+    def search_pinyin(self, query: str, limit: int) -> list[tuple[str, int]]:
+        """ 英文字母输入按全拼或首字母匹配中文名称 """
+        norm = normalize(query).replace(' ', '')
+        if self.pinyin_index is None or not norm:
+            return []
+        gram_set = get_ngram_set(norm)
+        candidate = self.get_candidate(self.pinyin_index.count(gram_set), self.pinyin_size, len(gram_set))
+        scored = [(self.name_list[row], max(fuzz.ratio(norm, self.pinyin_list[row]),
+                                            fuzz.ratio(norm, self.initial_list[row])))
+                  for row in candidate.tolist()]
+        scored.sort(key=lambda data: data[1], reverse=True)
+        return scored[:limit]
+
+    def complete_name(self, prefix: str, limit: int) -> list[str]:
+        norm = normalize(prefix)
+        if not norm:
+            return []
+        row_list = self.prefix.get_rows(norm)
+        if self.pinyin_index is not None and norm.isascii():
+            norm = norm.replace(' ', '')
+            row_list = row_list + self.pinyin_prefix.get_rows(norm) + self.initial_prefix.get_rows(norm)
+        # 较短的名称优先
+        row_list = sorted(set(row_list), key=lambda row: (len(self.norm_list[row]), self.norm_list[row]))
+        return [self.name_list[row] for row in row_list[:limit]]
+
+    @classmethod
+    def search(cls, query: str, limit: int = 5, zh=False) -> list[tuple[str, int]]:
+        """
+        :param zh: 在中文名称中查找，字母输入同时按拼音或首字母匹配
+        :return: [(名称, 分数0-100)]，按分数从高到低
+        """
+        index = cls.get(zh)
+        res = index.search_name(query, limit)
+        if zh and query.isascii():
+            res += [data for data in index.search_pinyin(query, limit) if data[0] not in {name for name, _ in res}]
+            res.sort(key=lambda data: data[1], reverse=True)
+            res = res[:limit]
+        return res
+
+    @classmethod
+    def complete(cls, prefix: str, limit: int = 10, zh=False) -> list[str]:
+        """ 以prefix开头的名称，zh时中文名称也可用拼音或首字母前缀 """
+        return cls.get(zh).complete_name(prefix, limit)
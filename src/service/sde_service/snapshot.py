@@ -0,0 +1,360 @@
+import os
+import json
+import mmap
+import time
+import struct
+import hashlib
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+from . import database as en_model, database_cn as zh_model
+from ..config_server.config import config
+from ..log_server import logger
+from ...utils.path import TMP_PATH
+from ...utils.startup_profiler import StartupProfiler
+
+SNAPSHOT_MAGIC = b'KAHUNSDE'
+# 文件结构或字段变化时增加版本号，旧快照会被重新编译
+SNAPSHOT_VERSION = 1
+SNAPSHOT_META = os.path.join(TMP_PATH, 'sde_snapshot.json')
+HASH_CHUNK = 1024 * 1024
+ALIGN = 8
+
+TYPE_DTYPE = np.dtype([('type_id', '<i4'), ('group_id', '<i4'), ('category_id', '<i4'),
+                       ('meta_group_id', '<i4'), ('market_group_id', '<i4'), ('portion_size', '<i4'),
+                       ('volume', '<f8'), ('packaged_volume', '<f8')])
+GROUP_DTYPE = np.dtype([('group_id', '<i4'), ('category_id', '<i4')])
+ID_DTYPE = np.dtype([('id', '<i4')])
+MARKET_GROUP_DTYPE = np.dtype([('market_group_id', '<i4'), ('parent_id', '<i4')])
+PRODUCT_DTYPE = np.dtype([('blueprint_id', '<i4'), ('activity_id', '<i4'),
+                          ('product_id', '<i4'), ('quantity', '<i4')])
+MATERIAL_DTYPE = np.dtype([('blueprint_id', '<i4'), ('activity_id', '<i4'),
+                           ('material_id', '<i4'), ('quantity', '<i4')])
+ACTIVITY_DTYPE = np.dtype([('blueprint_id', '<i4'), ('activity_id', '<i4'), ('time', '<i4')])
+BLUEPRINT_DTYPE = np.dtype([('blueprint_id', '<i4'), ('max_limit', '<i4')])
+
+# 字符串表，第i行对应记录表的第i条记录
+STRING_TABLE = ('en_type_name', 'zh_type_name', 'en_group_name', 'zh_group_name',
+                'en_category_name', 'zh_category_name', 'meta_name',
+                'en_market_group_name', 'zh_market_group_name')
+# 需要按名称查id的字符串表，额外保存按名称排序的行号
+NAME_INDEX_TABLE = ('en_type_name', 'zh_type_name')
+# 空值在记录中的取值
+NULL_ID = 0
+NULL_LIMIT = -1
+
+
+def get_sde_path_list() -> list:
+    return [config['SQLITEDB']['SDEDB'], config['SQLITEDB']['CN_SDEDB']]
+
+
+def get_sde_stat(path_list) -> list:
+    return [[os.path.getsize(path), os.stat(path).st_mtime_ns] for path in path_list]
+
+
+def get_sde_hash(path_list) -> str:
+    sha = hashlib.sha1()
+    for path in path_list:
+        with open(path, 'rb') as file:
+            while chunk := file.read(HASH_CHUNK):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_snapshot_path(sde_hash: str) -> str:
+    return os.path.join(TMP_PATH, f'sde_snapshot_{sde_hash[:16]}.bin')
+
+
+def to_id(value) -> int:
+    return NULL_ID if value is None else value
+
+
+def to_float(value) -> float:
+    return np.nan if value is None else value
+
+
+def pack_string_table(value_list) -> dict:
+    """ 字符串表：utf-8拼接为一个字节数组，offset记录每一行的起止 """
+    data = [(value or '').encode('utf-8') for value in value_list]
+    offset = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in data], out=offset[1:])
+    return {'offset': offset, 'data': np.frombuffer(b''.join(data), dtype=np.uint8), 'bytes': data}
+
+
+class SdeSnapshot:
+    """
+    SDE的只读二进制快照。
+    中英文SDE中用到的物品、组、分类、元组、市场分组与配方表编译为定长记录数组与utf-8字符串表，
+    写入TMP_PATH下的单个文件，主进程与成本计算子进程都以mmap映射，numpy数组直接引用映射内存，不再复制。
+
+    文件名带SDE文件的sha1，SDE变化后才重新编译；sde_snapshot.json记录SDE文件的大小与修改时间，
+    二者未变时不再计算哈希，启动时只需打开映射。
+    """
+    _lock = threading.Lock()
+    snapshot = None
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        version, header_len = struct.unpack_from('<II', self.buffer, len(SNAPSHOT_MAGIC))
+        if self.buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.buffer.close()
+            raise ValueError(f'{path} is not a sde snapshot of version {SNAPSHOT_VERSION}.')
+        header_start = len(SNAPSHOT_MAGIC) + 8
+        self.header = json.loads(bytes(self.buffer[header_start:header_start + header_len]))
+        self.sde_hash = self.header['sde_hash']
+
+        self.section = dict()
+        for name, (dtype, offset, count) in self.header['sections'].items():
+            # 结构化dtype在json中保存为[[字段, 类型], ...]
+            dtype = np.dtype([tuple(field) for field in dtype] if isinstance(dtype, list) else dtype)
+            self.section[name] = np.frombuffer(self.buffer, dtype=dtype, count=count, offset=offset)
+        self.types = self.section['types']
+        self.type_ids = self.types['type_id']
+        self.group_ids = self.section['groups']['group_id']
+        self.category_ids = self.section['categories']['id']
+        self.meta_group_ids = self.section['meta_groups']['id']
+        self.market_group_ids = self.section['market_groups']['market_group_id']
+
+    """ 编译 """
+    @classmethod
+    def build(cls, sde_hash: str, path: str):
+        start = time.perf_counter()
+        en_db = en_model.db
+        zh_db = zh_model.db
+
+        def fetch(db, model, *columns, where=''):
+            return db.execute_sql(f'SELECT {", ".join(columns)} FROM "{model._meta.table_name}" {where}').fetchall()
+
+        # 物品：中英文SDE的并集，按type_id排序，记录字段以英文SDE为准
+        type_columns = ('typeID', 'groupID', 'metaGroupID', 'marketGroupID', 'portionSize',
+                        'volume', 'packagedVolume', 'typeName')
+        zh_type = {row[0]: row for row in fetch(zh_db, zh_model.InvTypes, *type_columns)}
+        en_type = {row[0]: row for row in fetch(en_db, en_model.InvTypes, *type_columns)}
+        type_id_list = sorted(en_type.keys() | zh_type.keys())
+
+        group_data = fetch(en_db, en_model.InvGroups, 'groupID', 'categoryID', 'groupName', where='ORDER BY groupID')
+        zh_group_name = dict(fetch(zh_db, zh_model.InvGroups, 'groupID', 'groupName'))
+        group_category = {row[0]: row[1] for row in group_data}
+        category_data = fetch(en_db, en_model.InvCategories, 'categoryID', 'categoryName', where='ORDER BY categoryID')
+        zh_category_name = dict(fetch(zh_db, zh_model.InvCategories, 'categoryID', 'categoryName'))
+        meta_data = fetch(en_db, en_model.MetaGroups, 'metaGroupID', 'nameID', where='ORDER BY metaGroupID')
+        market_group_data = fetch(en_db, en_model.MarketGroups, 'marketGroupID', 'parentGroupID', 'nameID',
+                                  where='ORDER BY marketGroupID')
+        zh_market_group_name = dict(fetch(zh_db, zh_model.MarketGroups, 'marketGroupID', 'nameID'))
+
+        types = np.zeros(len(type_id_list), dtype=TYPE_DTYPE)
+        for index, type_id in enumerate(type_id_list):
+            row = en_type.get(type_id, None) or zh_type[type_id]
+            types[index] = (type_id, to_id(row[1]), to_id(group_category.get(row[1], None)), to_id(row[2]),
+                            to_id(row[3]), to_id(row[4]), to_float(row[5]), to_float(row[6]))
+
+        sections = {
+            'types': types,
+            'groups': np.array([(row[0], to_id(row[1])) for row in group_data], dtype=GROUP_DTYPE),
+            'categories': np.array([(row[0],) for row in category_data], dtype=ID_DTYPE),
+            'meta_groups': np.array([(row[0],) for row in meta_data], dtype=ID_DTYPE),
+            'market_groups': np.array([(row[0], to_id(row[1])) for row in market_group_data],
+                                      dtype=MARKET_GROUP_DTYPE),
+            # 配方表保持SDE中的行顺序，RecipeIndex按原查询顺序取第一个蓝图
+            'products': np.array(
+                [tuple(to_id(value) for value in row) for row in fetch(
+                    en_db, en_model.IndustryActivityProducts,
+                    'blueprintTypeID', 'activityID', 'productTypeID', 'quantity')], dtype=PRODUCT_DTYPE),
+            'materials': np.array(
+                [tuple(to_id(value) for value in row) for row in fetch(
+                    en_db, en_model.IndustryActivityMaterials,
+                    'blueprintTypeID', 'activityID', 'materialTypeID', 'quantity')], dtype=MATERIAL_DTYPE),
+            'activities': np.array(
+                [tuple(to_id(value) for value in row) for row in fetch(
+                    en_db, en_model.IndustryActivities, 'blueprintTypeID', 'activityID', 'time')],
+                dtype=ACTIVITY_DTYPE),
+            'blueprints': np.array(
+                [(row[0], NULL_LIMIT if row[1] is None else row[1]) for row in fetch(
+                    en_db, en_model.IndustryBlueprints, 'blueprintTypeID', 'maxProductionLimit')],
+                dtype=BLUEPRINT_DTYPE),
+        }
+        string_value = {
+            'en_type_name': [en_type[type_id][7] if type_id in en_type else None for type_id in type_id_list],
+            'zh_type_name': [zh_type[type_id][7] if type_id in zh_type else None for type_id in type_id_list],
+            'en_group_name': [row[2] for row in group_data],
+            'zh_group_name': [zh_group_name.get(row[0], None) for row in group_data],
+            'en_category_name': [row[1] for row in category_data],
+            'zh_category_name': [zh_category_name.get(row[0], None) for row in category_data],
+            'meta_name': [row[1] for row in meta_data],
+            'en_market_group_name': [row[2] for row in market_group_data],
+            'zh_market_group_name': [zh_market_group_name.get(row[0], None) for row in market_group_data],
+        }
+        for name in STRING_TABLE:
+            table = pack_string_table(string_value[name])
+            sections[f'{name}.offset'] = table['offset']
+            sections[f'{name}.data'] = table['data']
+            if name in NAME_INDEX_TABLE:
+                # 同名物品保持type_id顺序，查找时取type_id最小的一个，与SDE查询结果一致
+                sections[f'{name}.order'] = np.array(
+                    sorted(range(len(table['bytes'])), key=table['bytes'].__getitem__), dtype=np.int32)
+
+        cls.write(path, sde_hash, sections)
+        logger.info(f'SdeSnapshot built: {len(types)} types, {len(sections["materials"])} materials, '
+                    f'{os.path.getsize(path) / 1024 / 1024:.1f}MB in {time.perf_counter() - start:.2f}s.')
+
+    @classmethod
+    def write(cls, path: str, sde_hash: str, sections: dict):
+        # 先确定各段偏移再写头部，段起点按8字节对齐以便numpy直接映射
+        header = {'sde_hash': sde_hash, 'build_time': time.time(), 'sections': dict()}
+        header_size = 4096
+        while True:
+            offset = len(SNAPSHOT_MAGIC) + 8 + header_size
+            for name, array in sections.items():
+                offset += -offset % ALIGN
+                header['sections'][name] = (array.dtype.descr if array.dtype.names else array.dtype.str,
+                                            offset, len(array))
+                offset += array.nbytes
+            header_bytes = json.dumps(header).encode('utf-8')
+            if len(header_bytes) <= header_size:
+                break
+            header_size *= 2
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC)
+            file.write(struct.pack('<II', SNAPSHOT_VERSION, len(header_bytes)))
+            file.write(header_bytes.ljust(header_size, b' '))
+            for name, array in sections.items():
+                file.seek(header['sections'][name][1])
+                file.write(array.tobytes())
+        os.replace(tmp_path, path)
+
+    """ 加载 """
+    @classmethod
+    def get(cls):
+        if cls.snapshot is not None:
+            return cls.snapshot
+        with cls._lock:
+            if cls.snapshot is None:
+                with StartupProfiler.measure('SdeSnapshot'):
+                    cls.snapshot = cls.load()
+            return cls.snapshot
+
+    @classmethod
+    def load(cls):
+        start = time.perf_counter()
+        path_list = get_sde_path_list()
+        stat = get_sde_stat(path_list)
+        meta = dict()
+        if os.path.exists(SNAPSHOT_META):
+            with open(SNAPSHOT_META, 'r') as file:
+                meta = json.load(file)
+
+        # SDE文件未变化时直接映射已有快照，否则按内容哈希查找或重新编译
+        if meta.get('stat', None) == stat and meta.get('version', None) == SNAPSHOT_VERSION:
+            sde_hash = meta['sde_hash']
+        else:
+            sde_hash = get_sde_hash(path_list)
+        path = get_snapshot_path(sde_hash)
+        try:
+            snapshot = SdeSnapshot(path)
+        except (OSError, ValueError):
+            if not os.path.exists(TMP_PATH):
+                os.makedirs(TMP_PATH)
+            cls.build(sde_hash, path)
+            snapshot = SdeSnapshot(path)
+        if meta.get('sde_hash', None) != sde_hash or meta.get('stat', None) != stat:
+            cls.clean(sde_hash)
+            with open(SNAPSHOT_META, 'w') as file:
+                json.dump({'version': SNAPSHOT_VERSION, 'sde_hash': sde_hash, 'stat': stat}, file)
+        logger.info(f'SdeSnapshot mapped {os.path.basename(path)} in {(time.perf_counter() - start) * 1000:.1f}ms.')
+        return snapshot
+
+    @classmethod
+    def clean(cls, sde_hash: str):
+        """ 删除其他SDE版本的快照，仍被其他进程映射的文件跳过 """
+        keep = os.path.basename(get_snapshot_path(sde_hash))
+        for file_name in os.listdir(TMP_PATH):
+            if file_name.startswith('sde_snapshot_') and file_name.endswith('.bin') and file_name != keep:
+                try:
+                    os.remove(os.path.join(TMP_PATH, file_name))
+                except OSError:
+                    pass
+
+    """ 查询 """
+    def get_string(self, table: str, row: int) -> str | None:
+        offset = self.section[f'{table}.offset']
+        value = self.section[f'{table}.data'][offset[row]:offset[row + 1]].tobytes()
+        return value.decode('utf-8') if value else None
+
+    def get_string_list(self, table: str, row_list=None) -> list:
+        offset = self.section[f'{table}.offset'].tolist()
+        data = self.section[f'{table}.data'].tobytes()
+        if row_list is None:
+            row_list = range(len(offset) - 1)
+        return [data[offset[row]:offset[row + 1]].decode('utf-8') for row in row_list]
+
+    @staticmethod
+    def get_row(id_array: np.ndarray, value: int) -> int:
+        """ 在有序id数组中的下标，不存在时返回-1 """
+        if value is None:
+            return -1
+        row = int(np.searchsorted(id_array, value))
+        return row if row < len(id_array) and id_array[row] == value else -1
+
+    def get_type(self, type_id: int):
+        row = self.get_row(self.type_ids, type_id)
+        return None if row < 0 else self.types[row]
+
+    def get_type_name(self, type_id: int, zh=False) -> str | None:
+        row = self.get_row(self.type_ids, type_id)
+        return None if row < 0 else self.get_string('zh_type_name' if zh else 'en_type_name', row)
+
+    def get_type_id(self, name: str, zh=False) -> int | None:
+        """ 按名称精确查找，二分查找按名称排序的行号 """
+        table = 'zh_type_name' if zh else 'en_type_name'
+        order = self.section[f'{table}.order']
+        offset = self.section[f'{table}.offset']
+        data = self.section[f'{table}.data']
+        if not name:
+            return None
+        target = name.encode('utf-8')
+
+        def key(index):
+            row = order[index]
+            return data[offset[row]:offset[row + 1]].tobytes()
+        index = bisect_left(range(len(order)), target, key=key)
+        if index < len(order) and key(index) == target:
+            return int(self.type_ids[order[index]])
+        return None
+
+    def get_market_type_ids(self) -> np.ndarray:
+        return self.type_ids[self.types['market_group_id'] != NULL_ID]
+
+    def get_market_name_list(self, zh=False) -> list:
+        """ 有市场分组的物品名称 """
+        table = 'zh_type_name' if zh else 'en_type_name'
+        row_list = np.flatnonzero(self.types['market_group_id'] != NULL_ID).tolist()
+        return [name for name in self.get_string_list(table, row_list) if name]
+
+    def get_group_name(self, group_id: int, zh=False) -> str | None:
+        row = self.get_row(self.group_ids, group_id)
+        return None if row < 0 else self.get_string('zh_group_name' if zh else 'en_group_name', row)
+
+    def get_category_name(self, category_id: int, zh=False) -> str | None:
+        row = self.get_row(self.category_ids, category_id)
+        return None if row < 0 else self.get_string('zh_category_name' if zh else 'en_category_name', row)
+
+    def get_meta_name(self, meta_group_id: int) -> str | None:
+        row = self.get_row(self.meta_group_ids, meta_group_id)
+        return None if row < 0 else self.get_string('meta_name', row)
+
+    def get_market_group_name(self, market_group_id: int, zh=False) -> str | None:
+        row = self.get_row(self.market_group_ids, market_group_id)
+        return None if row < 0 else self.get_string('zh_market_group_name' if zh else 'en_market_group_name', row)
+
+    def get_market_group_parent(self, market_group_id: int) -> int | None:
+        row = self.get_row(self.market_group_ids, market_group_id)
+        if row < 0:
+            return None
+        parent_id = int(self.section['market_groups']['parent_id'][row])
+        return None if parent_id == NULL_ID else parent_id
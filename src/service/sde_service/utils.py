@@ -1,20 +1,15 @@
 from functools import lru_cache
 import networkx as nx
-from thefuzz import fuzz, process
-from peewee import DoesNotExist
 from cachetools import TTLCache, cached
 
-from ..sde_service import database as en_model, database_cn as zh_model
 from ...service.sde_service.database import InvTypes, InvGroups, InvCategories
 from ...service.sde_service.database import MetaGroups, MarketGroups
 from ..log_server import logger
 from ..database_server.model import InvTypeMap, AssetCache
 from ..database_server.model import MarketPriceCache, SystemCostCache
 
-from .database_cn import InvTypes as InvTypes_zh
-
-en_invtype_name_list = [res.typeName for res in InvTypes.select(InvTypes.typeName).where(InvTypes.marketGroupID != 0)]
-zh_invtype_name_list = [res.typeName for res in InvTypes_zh.select(InvTypes_zh.typeName).where(InvTypes_zh.marketGroupID != 0)]
+from .snapshot import SdeSnapshot
+from .name_search import NameSearch
 
 
 
@@ -96,23 +91,10 @@ class SdeUtils:
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_groupname_by_id(invtpye_id: int, zh=False) -> str:
-        if zh:
-            model = zh_model
-        else:
-            model = en_model
-
-        InvTypes = model.InvTypes
-        InvGroups = model.InvGroups
-
-        try:
-            return (
-                InvTypes.select(InvGroups.groupName)
-                .join(InvGroups, on=(InvTypes.groupID == InvGroups.groupID))
-                .switch(InvTypes)
-                .where(InvTypes.typeID == invtpye_id).scalar()
-            )
-        except InvTypes.DoesNotExist:
+        snapshot = SdeSnapshot.get()
+        if (record := snapshot.get_type(invtpye_id)) is None:
             return None
+        return snapshot.get_group_name(int(record['group_id']), zh)
 
     @staticmethod
     @lru_cache(maxsize=1000)
@@ -132,10 +114,10 @@ class SdeUtils:
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_invtype_packagedvolume_by_id(invtpye_id: int) -> float:
-        try:
-            return InvTypes.get(InvTypes.typeID == invtpye_id).packagedVolume
-        except InvTypes.DoesNotExist:
+        if (record := SdeSnapshot.get().get_type(invtpye_id)) is None:
             return 0
+        packaged_volume = float(record['packaged_volume'])
+        return None if packaged_volume != packaged_volume else packaged_volume
 
     @staticmethod
     @lru_cache(maxsize=1000)
@@ -148,15 +130,10 @@ class SdeUtils:
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_metaname_by_typeid(typeid: int) -> int:
-        try:
-            return (InvTypes.select(MetaGroups.nameID)
-                       .join(MetaGroups, on=(InvTypes.metaGroupID == MetaGroups.metaGroupID))
-                       .switch(InvTypes)
-                       .where(InvTypes.typeID == typeid)
-                       .scalar()
-            )
-        except DoesNotExist:
+        snapshot = SdeSnapshot.get()
+        if (record := snapshot.get_type(typeid)) is None:
             return None
+        return snapshot.get_meta_name(int(record['meta_group_id']))
 
     @staticmethod
     @lru_cache(maxsize=1000)
@@ -169,36 +146,22 @@ class SdeUtils:
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_id_by_name(name) -> int:
-        try:
-            if SdeUtils.maybe_chinese(name):
-                return InvTypes_zh.get(InvTypes_zh.typeName == name).typeID
-            return InvTypes.get(InvTypes.typeName == name).typeID
-        except DoesNotExist:
-            return None
+        return SdeSnapshot.get().get_type_id(name, zh=SdeUtils.maybe_chinese(name))
 
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_name_by_id(type_id) -> str:
-        try:
-            return InvTypes.get(InvTypes.typeID == type_id).typeName
-        except DoesNotExist:
-            return None
+        return SdeSnapshot.get().get_type_name(type_id)
 
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_id_by_cn_name(name) -> int:
-        try:
-            return InvTypes_zh.get(InvTypes_zh.typeName == name).typeID
-        except InvTypes_zh.DoesNotExist:
-            return None
+        return SdeSnapshot.get().get_type_id(name, zh=True)
 
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_cn_name_by_id(type_id) -> str:
-        try:
-            return InvTypes_zh.get(InvTypes_zh.typeID == type_id).typeName
-        except InvTypes_zh.DoesNotExist:
-            return None
+        return SdeSnapshot.get().get_type_name(type_id, zh=True)
 
     @classmethod
     def get_market_group_tree(cls):
@@ -217,13 +180,7 @@ class SdeUtils:
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_market_group_name_by_groupid(market_group_id, zh=False) -> str:
-        if zh:
-            model = zh_model
-        else:
-            model = en_model
-        name = model.MarketGroups.get(model.MarketGroups.marketGroupID == market_group_id).nameID
-
-        return name
+        return SdeSnapshot.get().get_market_group_name(market_group_id, zh)
 
     @staticmethod
     @lru_cache(maxsize=1000)
@@ -236,17 +193,16 @@ class SdeUtils:
     @lru_cache(maxsize=1000)
     def get_market_group_list(cls, type_id: int, zh=False) -> list[str]:
         try:
-            market_tree = cls.get_market_group_tree()
-            market_group_id = cls.get_invtpye_node_by_id(type_id).marketGroupID
+            snapshot = SdeSnapshot.get()
+            market_group_id = int(snapshot.get_type(type_id)['market_group_id'])
             market_group_list = []
             if market_group_id:
                 market_group_list = [cls.get_name_by_id(type_id), cls.get_market_group_name_by_groupid(market_group_id, zh)]
-                parent_nodes = [parent_id for parent_id in market_tree.predecessors(market_group_id)]
-                while parent_nodes:
-                    parent_node = parent_nodes[0]
+                parent_node = snapshot.get_market_group_parent(market_group_id)
+                while parent_node:
                     parent_name = cls.get_market_group_name_by_groupid(parent_node, zh)
                     market_group_list.append(parent_name)
-                    parent_nodes = [parent_id for parent_id in market_tree.predecessors(parent_node)]
+                    parent_node = snapshot.get_market_group_parent(parent_node)
                 market_group_list.reverse()
             return market_group_list
         except Exception as e:
@@ -269,20 +225,10 @@ class SdeUtils:
     @staticmethod
     @lru_cache(maxsize=1000)
     def get_category_by_id(type_id: int, zh=False) -> str:
-        if zh:
-            model = zh_model
-        else:
-            model = en_model
-        try:
-            return (
-                model.InvTypes.select(InvCategories.categoryName)
-                .join(InvGroups, on=(InvTypes.groupID == InvGroups.groupID))
-                .join(InvCategories, on=(InvGroups.categoryID == InvCategories.categoryID))
-                .where(InvTypes.typeID == type_id)
-                .scalar()
-            )
-        except model.InvTypes.DoesNotExist:
+        snapshot = SdeSnapshot.get()
+        if (record := snapshot.get_type(type_id)) is None:
             return None
+        return snapshot.get_category_name(int(record['category_id']), zh)
 
     # @classmethod
     # def get_structure_info(cls, ac_token: str, structure_id: int) -> dict:
@@ -312,19 +258,20 @@ class SdeUtils:
                 en_count += 1
         return cn_count > en_count
 
+    @classmethod
+    def get_invtype_name_list(cls, zh=False) -> list[str]:
+        """ 模糊匹配的候选名称，首次使用或后台预热时建立索引 """
+        return NameSearch.get(zh).name_list
+
     @lru_cache(maxsize=200)
     @staticmethod
     def fuzz_en_type(item_name, list_len) -> list[str]:
-        choice = en_invtype_name_list
-        result = process.extract(item_name, choice, scorer=fuzz.token_sort_ratio, limit=list_len)
-        return [res[0] for res in result]
+        return [res[0] for res in NameSearch.search(item_name, list_len)]
 
     @lru_cache(maxsize=200)
     @staticmethod
     def fuzz_zh_type(item_name, list_len) -> list[str]:
-        choice = zh_invtype_name_list
-        result = process.extract(item_name, choice, scorer=fuzz.token_sort_ratio, limit=list_len)
-        return [res[0] for res in result]
+        return [res[0] for res in NameSearch.search(item_name, list_len, zh=True)]
 
     @staticmethod
     def fuzz_type(item_name, list_len = 5) -> list[str]:
@@ -333,6 +280,21 @@ class SdeUtils:
         else:
             return SdeUtils.fuzz_en_type(item_name, list_len)
 
+    @staticmethod
+    def fuzz_type_with_score(item_name, list_len = 5) -> list[tuple[str, int]]:
+        """ :return: [(名称, 分数0-100)] """
+        return NameSearch.search(item_name, list_len, zh=SdeUtils.maybe_chinese(item_name))
+
+    @staticmethod
+    def complete_type(prefix, list_len = 10, zh = None) -> list[str]:
+        """
+        名称前缀补全
+        :param zh: 补全中文名称，字母前缀按拼音或首字母匹配；None时按输入判断
+        """
+        if zh is None:
+            zh = SdeUtils.maybe_chinese(prefix)
+        return NameSearch.complete(prefix, list_len, zh=zh)
+
     type_stucture_cache = TTLCache(maxsize=1000, ttl=60 * 60 * 24)
     @staticmethod
     def get_structure_id_from_location_id(location_id, location_flag = None):
@@ -387,6 +349,4 @@ class SdeUtils:
 
     @staticmethod
     def get_all_type_id_in_market():
-        result = InvTypes.select(InvTypes.typeID).where(InvTypes.marketGroupID.is_null(False))
-
-        return [res.typeID for res in result]
+        return SdeSnapshot.get().get_market_type_ids().tolist()
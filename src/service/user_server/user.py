@@ -205,6 +205,12 @@ class User():
         self.user_data.plan[plan_name]["manucycletime"] = cycle_time
         self.user_data.insert_to_db()
 
+    def set_depth_price(self, plan_name: str, depth_price: bool):
+        if plan_name not in self.user_data.plan:
+            raise KahunaException("plan not found.")
+        self.user_data.plan[plan_name]["depth_price"] = depth_price
+        self.user_data.insert_to_db()
+
     def set_reac_cycle_time(self, plan_name: str, cycle_time: int):
         if plan_name not in self.user_data.plan:
             raise KahunaException("plan not found.")
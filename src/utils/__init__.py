@@ -1,7 +1,7 @@
 import math
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timedelta
+import traceback
+from datetime import datetime, timedelta, timezone
 
 
 # import transformers
@@ -29,19 +29,35 @@ class PluginMeta(type):  # 定义元类
 
 async def run_func_delay_min(start_delay, func, *args, **kwargs):
     await asyncio.sleep(start_delay * 60)
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(func, *args, **kwargs)
-        while not future.done():
-            await asyncio.sleep(1)
+    try:
+        await asyncio.to_thread(func, *args, **kwargs)
+    except Exception:
+        traceback.print_exc()
 
 async def refresh_per_min(start_delay, interval, func):
+    # esi请求由EsiTransport的事件循环完成，这里只在线程中执行数据库写入部分
     await asyncio.sleep(start_delay * 60)
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        while True:
-            future = executor.submit(func)
-            while not future.done():
-                await asyncio.sleep(5)
-            await asyncio.sleep(interval * 60)
+    while True:
+        try:
+            await asyncio.to_thread(func)
+        except Exception:
+            # 单次失败不影响之后的定时刷新
+            traceback.print_exc()
+        await asyncio.sleep(interval * 60)
+
+async def refresh_daily_utc(start_delay, hour, minute, func):
+    # 启动后先执行一次补齐停机期间错过的刷新，之后每天utc hour:minute执行
+    await asyncio.sleep(start_delay * 60)
+    while True:
+        try:
+            await asyncio.to_thread(func)
+        except Exception:
+            traceback.print_exc()
+        now = datetime.now(timezone.utc)
+        next_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_time <= now:
+            next_time += timedelta(days=1)
+        await asyncio.sleep((next_time - now).total_seconds())
 
 def get_user_tmp_cache_prefix(user_qq: int):
     return f"cache_{user_qq}_"
@@ -84,4 +100,4 @@ def unset_debug_qq():
 #
 # def check_context_token_count(input: str, context_token_limit: int):
 #     result = get_chat_token_count(input)
-#     return result <= context_token_limit
\ No newline at end of file
+#     return result <= context_token_limit
@@ -0,0 +1,61 @@
+import threading
+from collections import deque
+
+# 保留的变更记录数量，超出后无法给出精确的变更集合
+HISTORY_LENGTH = 32
+
+
+class RefreshSignal:
+    """
+    数据刷新信号。
+    刷新任务完成后调用publish递增对应topic的版本号，可附带本次变更的type_id集合。
+    依赖这些数据的缓存记录计算时的版本号，之后据此判断是否需要更新、需要更新哪些部分。
+
+    topic:
+        asset       库存与蓝图库存
+        running_job 正在运行的工作
+        market      市场订单
+    """
+    _lock = threading.Lock()
+    version = {'asset': 0, 'running_job': 0, 'market': 0}
+    history = {topic: deque(maxlen=HISTORY_LENGTH) for topic in version}  # {topic: deque[(version, changed)]}
+
+    @classmethod
+    def publish(cls, topic: str, changed: set = None):
+        """ changed为None表示全部可能变化 """
+        with cls._lock:
+            if topic not in cls.version:
+                cls.version[topic] = 0
+                cls.history[topic] = deque(maxlen=HISTORY_LENGTH)
+            cls.version[topic] += 1
+            cls.history[topic].append((cls.version[topic], None if changed is None else frozenset(changed)))
+            return cls.version[topic]
+
+    @classmethod
+    def get_version(cls, topic: str) -> int:
+        return cls.version.get(topic, 0)
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        with cls._lock:
+            return dict(cls.version)
+
+    @classmethod
+    def changes_since(cls, topic: str, since_version: int) -> set | None:
+        """
+        since_version之后的变更集合的并集，无变化返回空集合，
+        无法确定(记录被覆盖或有全量变更)时返回None。
+        """
+        with cls._lock:
+            current = cls.version.get(topic, 0)
+            if current == since_version:
+                return set()
+            records = [record for record in cls.history.get(topic, []) if record[0] > since_version]
+            if len(records) != current - since_version:
+                return None
+            res = set()
+            for _, changed in records:
+                if changed is None:
+                    return None
+                res |= changed
+            return res
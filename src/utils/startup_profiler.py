@@ -0,0 +1,115 @@
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+
+# 插件加载(导入与同步初始化)的目标耗时，超出时输出警告
+STARTUP_BUDGET = 3.0
+# 报告中列出的模块数量
+REPORT_TOP = 15
+
+
+class ImportTimer(MetaPathFinder):
+    """
+    统计包内每个模块的导入耗时。
+    只负责给找到的模块计时，查找仍交给sys.meta_path中的其他finder。
+    累计耗时包含模块执行期间导入的子模块，自身耗时扣除子模块。
+    """
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != self.prefix and not fullname.startswith(f'{self.prefix}.'):
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader.exec_module = self.wrap(fullname, spec.loader.exec_module)
+        return spec
+
+    def wrap(self, fullname: str, exec_module):
+        def timed_exec_module(module):
+            stack = self.local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                total = time.perf_counter() - start
+                child = stack.pop()
+                if stack:
+                    stack[-1] += total
+                StartupProfiler.import_time[fullname] = (total, total - child)
+        return timed_exec_module
+
+
+class StartupProfiler:
+    """
+    插件启动耗时统计。
+    import_time 记录插件包内每个模块的导入耗时，init_time 记录各服务的初始化耗时，
+    同步初始化可在启动时完成，其余服务的首次使用或后台预热耗时也记录在init_time中。
+    """
+    _lock = threading.Lock()
+    import_time = dict()    # {module: (累计耗时, 自身耗时)}
+    init_time = dict()      # {name: 耗时}
+    finder = None
+    start_time = None
+    load_time = None
+
+    @classmethod
+    def start_import_trace(cls, package: str):
+        cls.start_time = time.perf_counter()
+        if cls.finder is None and package:
+            cls.finder = ImportTimer(package)
+            sys.meta_path.insert(0, cls.finder)
+
+    @classmethod
+    def stop_import_trace(cls):
+        if cls.finder in sys.meta_path:
+            sys.meta_path.remove(cls.finder)
+        cls.finder = None
+
+    @classmethod
+    @contextmanager
+    def measure(cls, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with cls._lock:
+                cls.init_time[name] = cls.init_time.get(name, 0) + time.perf_counter() - start
+
+    @classmethod
+    def mark_loaded(cls):
+        """ 插件加载完成，记录从开始导入到此时的耗时，超出预算时警告 """
+        from ..service.log_server import logger
+        if cls.start_time is None:
+            return
+        cls.load_time = time.perf_counter() - cls.start_time
+        if cls.load_time > STARTUP_BUDGET:
+            logger.warning(f'plugin load {cls.load_time:.2f}s exceeds budget {STARTUP_BUDGET:.2f}s.\n{cls.get_report()}')
+        else:
+            logger.info(f'plugin load {cls.load_time:.2f}s.')
+
+    @classmethod
+    def get_report(cls, top: int = REPORT_TOP) -> str:
+        lines = []
+        if cls.load_time is not None:
+            lines.append(f'插件加载: {cls.load_time:.2f}s (预算 {STARTUP_BUDGET:.2f}s)')
+        if cls.import_time:
+            total = max(data[0] for data in cls.import_time.values())
+            lines.append(f'导入: {total:.2f}s，{len(cls.import_time)} 个模块，自身耗时最高:')
+            import_list = sorted(cls.import_time.items(), key=lambda item: item[1][1], reverse=True)[:top]
+            lines += [f'  {name}: {data[1] * 1000:.1f}ms (累计 {data[0] * 1000:.1f}ms)' for name, data in import_list]
+        if cls.init_time:
+            lines.append('初始化:')
+            lines += [f'  {name}: {seconds * 1000:.1f}ms' for name, seconds in cls.init_time.items()]
+        return '\n'.join(lines)
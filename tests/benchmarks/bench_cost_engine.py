@@ -0,0 +1,41 @@
+"""
+批量成本：逐个产品建立分析器(signal_async_progress_work_type)与CostEngine共享分析器的对比。
+python -m tests.benchmarks.bench_cost_engine
+"""
+from tests import world
+from tests.benchmarks.common import setup, measure, report
+
+SHIP_COUNT = 300
+CAPITAL_COUNT = 50
+
+
+def main():
+    data = setup(ship_count=SHIP_COUNT, capital_count=CAPITAL_COUNT)
+    from src.service.industry_server.cost_engine import CostEngine
+    from src.service.industry_server.industry_analyse import IndustryAnalyser
+
+    user = world.get_user()
+    plan_list = [[row[1], 5] for row in data['type_list'] if row[3] in {324, 485}]
+
+    def signal():
+        return {product: IndustryAnalyser.signal_async_progress_work_type(user, world.PLAN_NAME,
+                                                                          [[product, quantity]])[1:]
+                for product, quantity in plan_list}
+
+    def engine():
+        analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+        analyser.bp_block_level = 1
+        return CostEngine.get_cost_data(analyser, plan_list)
+
+    signal_result = signal()
+    engine_result = engine()
+    max_diff = max(abs(engine_result[product][2] - signal_result[product][2]) / signal_result[product][2]
+                   for product, _ in plan_list)
+    report(f'批量成本 {len(plan_list)} 个产品，最大相对误差 {max_diff:.2e}', [
+        ('signal_async_progress_work_type x N', measure(signal, repeat=1)),
+        ('CostEngine', measure(engine, repeat=3)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+5000个物品 x 一年的区域历史：逐物品查询计算均线与HistorySeries一次建立矩阵的对比，
+以及交互查询下载单个物品后合并到已建立序列的耗时。
+python -m tests.benchmarks.bench_history_series
+"""
+import random
+from datetime import timedelta
+
+from tests import world
+from tests.benchmarks.common import setup, measure, report
+
+TYPE_COUNT = 5000
+REGION_ID = 10000099
+LEGACY_SAMPLE = 200
+
+
+def insert_history(anchor):
+    from src.service.database_server.model import MarketHistory as M_MarketHistory
+
+    rng = random.Random(7)
+    date_list = [anchor - timedelta(days=day) for day in range(365)]
+    with M_MarketHistory._meta.database.atomic():
+        for type_id in range(1, TYPE_COUNT + 1):
+            price = rng.uniform(10, 1e6)
+            row_list = []
+            for date in date_list:
+                # 约两成日期没有成交
+                if rng.random() < 0.2:
+                    continue
+                price *= rng.uniform(0.97, 1.03)
+                row_list.append((REGION_ID, type_id, date, int(price), int(price), int(price), 1,
+                                 rng.randint(1, 1000)))
+            M_MarketHistory.insert_many(row_list, fields=[
+                M_MarketHistory.region_id, M_MarketHistory.type_id, M_MarketHistory.date,
+                M_MarketHistory.average, M_MarketHistory.highest, M_MarketHistory.lowest,
+                M_MarketHistory.order_count, M_MarketHistory.volume]).execute()
+
+
+def legacy_indicator(type_id: int):
+    """ 逐物品读取历史并在python中计算7/30日均价 """
+    from src.service.database_server.model import MarketHistory as M_MarketHistory
+    from src.service.database_server.connect import DatabaseConectManager
+
+    data = [row.average for row in (M_MarketHistory.select()
+                                    .where((M_MarketHistory.type_id == type_id) &
+                                           (M_MarketHistory.region_id == REGION_ID))
+                                    .order_by(M_MarketHistory.date.desc())
+                                    .bind(DatabaseConectManager.cache_read_db()))]
+    ma_short = sum(data[:7]) / len(data[:7])
+    ma_long = sum(data[:30]) / len(data[:30])
+    return ma_short / ma_long - 1
+
+
+def main():
+    setup()
+    from src.service.market_server.history_series import HistorySeries
+    from src.service.market_server.history_summary import HistorySummary
+
+    anchor = HistorySummary.get_anchor_date()
+    insert_history(anchor)
+    type_id_list = list(range(1, TYPE_COUNT + 1))
+    series = HistorySeries.refresh(REGION_ID)
+
+    legacy_ms = measure(lambda: [legacy_indicator(type_id) for type_id in type_id_list[:LEGACY_SAMPLE]], repeat=3)
+    report(f'区域历史 {len(series.type_ids)} 个物品 x 365 天', [
+        ('HistorySeries.refresh (读取+矩阵+指标)', measure(lambda: HistorySeries.refresh(REGION_ID), repeat=3)),
+        ('HistorySeries.update_types 单个物品', measure(lambda: HistorySeries.update_types(REGION_ID, [34]))),
+        ('get_indicator_dict 全部物品', measure(lambda: series.get_indicator_dict(type_id_list))),
+        ('get_indicator_dict 单个物品', measure(lambda: series.get_indicator_dict([34]), number=100)),
+        (f'逐物品查询 (按{LEGACY_SAMPLE}个外推到全部)', legacy_ms * TYPE_COUNT / LEGACY_SAMPLE),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+物品名称模糊搜索：原先对全部市场名称逐个打分的process.extract与NameSearch索引的对比，每条查询的耗时。
+python -m tests.benchmarks.bench_name_search
+"""
+import random
+
+from thefuzz import fuzz, process
+
+from tests.benchmarks.common import setup, measure, report
+
+FILLER_COUNT = 20000
+QUERY_COUNT = 300
+
+
+def make_typo(rng: random.Random, name: str) -> str:
+    """ 删除一个字符并打乱单词顺序 """
+    index = rng.randrange(len(name))
+    word_list = (name[:index] + name[index + 1:]).split()
+    rng.shuffle(word_list)
+    return ' '.join(word_list)
+
+
+def main():
+    setup(filler_count=FILLER_COUNT)
+    from pypinyin import lazy_pinyin
+    from src.service.sde_service.name_search import NameSearch
+
+    rng = random.Random(11)
+    en_index = NameSearch.get(False)
+    zh_index = NameSearch.get(True)
+    en_query = [make_typo(rng, name) for name in rng.sample(en_index.name_list, QUERY_COUNT)]
+    zh_query = [make_typo(rng, name) for name in rng.sample(zh_index.name_list, QUERY_COUNT)]
+    pinyin_query = [''.join(lazy_pinyin(name)) for name in rng.sample(zh_index.name_list, QUERY_COUNT)]
+    prefix_query = [name[:4] for name in rng.sample(en_index.name_list, QUERY_COUNT)]
+
+    def legacy(query_list, name_list):
+        # 原先的fuzz_type
+        return lambda: [process.extract(query, name_list, scorer=fuzz.token_sort_ratio, limit=5)
+                        for query in query_list]
+
+    def search(query_list, zh):
+        return lambda: [NameSearch.search(query, 5, zh=zh) for query in query_list]
+
+    def top_match(query_list, index, zh) -> float:
+        same = sum(NameSearch.search(query, 1, zh=zh)[0][1] ==
+                   process.extract(query, index.name_list, scorer=fuzz.token_sort_ratio, limit=1)[0][1]
+                   for query in query_list)
+        return same / len(query_list)
+
+    def per_query(func):
+        return measure(func, repeat=3) / QUERY_COUNT
+
+    report(f'{len(en_index.name_list)} 英文 / {len(zh_index.name_list)} 中文名称，{QUERY_COUNT} 条查询，'
+           f'最高分一致 英文 {top_match(en_query, en_index, False):.0%} '
+           f'中文 {top_match(zh_query, zh_index, True):.0%}，单条查询耗时', [
+        ('英文 process.extract', per_query(legacy(en_query, en_index.name_list))),
+        ('英文 NameSearch', per_query(search(en_query, False))),
+        ('中文 process.extract', per_query(legacy(zh_query, zh_index.name_list))),
+        ('中文 NameSearch', per_query(search(zh_query, True))),
+        ('中文 NameSearch 全拼', per_query(search(pinyin_query, True))),
+        ('英文 前缀补全', per_query(lambda: [NameSearch.complete(query) for query in prefix_query])),
+        ('中文 拼音前缀补全', per_query(lambda: [NameSearch.complete(query[:4], zh=True)
+                                          for query in pinyin_query])),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+高频查询在迁移前(无二级索引)与迁移后的耗时对比，查询与计时见QueryPlanAudit。
+python -m tests.benchmarks.bench_query_audit
+"""
+import random
+from datetime import datetime, timedelta
+
+from tests import world
+from tests.benchmarks.common import setup
+
+ORDER_COUNT = 400000
+ASSET_COUNT = 300000
+BLUEPRINT_COUNT = 150000
+JOB_COUNT = 100000
+HISTORY_TYPE_COUNT = 2000
+HISTORY_DAYS = 300
+
+
+def insert_data():
+    from src.service.database_server import model
+
+    rng = random.Random(7)
+    now = datetime(2026, 1, 1)
+    with model.MarketOrderCache._meta.database.atomic():
+        world.insert_chunk(model.MarketOrderCache, [
+            {'duration': 90, 'is_buy_order': index % 2 == 0, 'issued': now, 'min_volume': 1,
+             'location_id': rng.choice([world.JITA_LOCATION_ID, 1035466617946]), 'order_id': 7000000000 + index,
+             'price': rng.uniform(1, 1e6), 'range': 'region', 'system_id': 30000142,
+             'type_id': rng.randint(1, 20000), 'volume_remain': 10, 'volume_total': 10}
+            for index in range(ORDER_COUNT)])
+        world.insert_chunk(model.AssetCache, [
+            {'asset_type': rng.randint(0, 1), 'owner_id': rng.randint(1, 200), 'is_blueprint_copy': False,
+             'is_singleton': False, 'item_id': 9000000000 + index, 'location_flag': 'Hangar',
+             'location_id': rng.randint(1, 5000), 'location_type': 'item', 'quantity': 1,
+             'type_id': rng.randint(1, 20000)}
+            for index in range(ASSET_COUNT)])
+        world.insert_chunk(model.BlueprintAssetCache, [
+            {'item_id': 9500000000 + index, 'location_flag': 'Hangar', 'location_id': rng.randint(1, 5000),
+             'material_efficiency': 10, 'quantity': -1, 'runs': -1, 'time_efficiency': 20,
+             'type_id': rng.randint(1, 20000), 'owner_id': rng.randint(1, 200), 'owner_type': 'character'}
+            for index in range(BLUEPRINT_COUNT)])
+        world.insert_chunk(model.IndustryJobsCache, [
+            {'activity_id': 1, 'blueprint_id': index, 'blueprint_location_id': 1, 'blueprint_type_id': 1,
+             'duration': 3600, 'end_date': now, 'facility_id': 1, 'installer_id': rng.randint(1, 500),
+             'job_id': 100 + index, 'location_id': 1, 'output_location_id': 1, 'runs': 1, 'start_date': now,
+             'status': 'active', 'owner_id': rng.randint(1, 500)}
+            for index in range(JOB_COUNT)])
+        world.insert_chunk(model.MarketHistory, [
+            {'region_id': 10000002, 'type_id': type_id, 'date': now - timedelta(days=day), 'average': 100,
+             'highest': 100, 'lowest': 100, 'order_count': 1, 'volume': 1}
+            for type_id in range(1, HISTORY_TYPE_COUNT + 1) for day in range(HISTORY_DAYS)])
+    model.MarketOrderCache._meta.database.execute_sql('ANALYZE')
+
+
+def main():
+    setup()
+    from src.service.database_server.migration import SchemaMigration
+    from src.service.database_server.query_audit import QueryPlanAudit
+
+    insert_data()
+    dropped = world.drop_secondary_index()
+    before = QueryPlanAudit.audit()
+    SchemaMigration.run(deferred=True)
+    after = QueryPlanAudit.audit()
+
+    print(f'{ORDER_COUNT} 订单 / {ASSET_COUNT} 资产 / {BLUEPRINT_COUNT} 蓝图 / {JOB_COUNT} 任务 / '
+          f'{HISTORY_TYPE_COUNT * HISTORY_DAYS} 历史，迁移前删除 {len(dropped)} 个索引')
+    for old, new in zip(before, after):
+        print(f"  {old['name']:<8} {old['rows']:>7} 行  {old['ms']:>9.3f} ms -> {new['ms']:>8.3f} ms  "
+              f"全表扫描 {'是' if old['scan'] else '否'} -> {'是' if new['scan'] else '否'}")
+
+
+if __name__ == '__main__':
+    main()
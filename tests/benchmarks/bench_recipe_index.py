@@ -0,0 +1,46 @@
+"""
+配方查询：原先每次调用的SQL join与RecipeIndex内存索引的对比。
+python -m tests.benchmarks.bench_recipe_index
+"""
+from tests.benchmarks.common import setup, measure, report
+
+
+def sql_get_bp_materials(type_id: int) -> dict:
+    """ RecipeIndex之前BPManager.get_bp_materials的查询 """
+    from src.service.sde_service.database import IndustryActivityMaterials, IndustryActivityProducts
+    material_search = (
+        IndustryActivityMaterials
+            .select(IndustryActivityMaterials.materialTypeID, IndustryActivityMaterials.quantity)
+            .join(IndustryActivityProducts,
+                  on=(IndustryActivityMaterials.blueprintTypeID == IndustryActivityProducts.blueprintTypeID))
+            .where((IndustryActivityProducts.productTypeID == type_id) &
+                   (IndustryActivityProducts.blueprintTypeID != 45732) &
+                   ((IndustryActivityMaterials.activityID == 1) | (IndustryActivityMaterials.activityID == 11)))
+    )
+    return {material.materialTypeID: material.quantity for material in material_search}
+
+
+def sql_get_product_quantity(type_id: int) -> int:
+    from src.service.sde_service.database import IndustryActivityProducts
+    row = (IndustryActivityProducts.select(IndustryActivityProducts.quantity)
+           .where((IndustryActivityProducts.productTypeID == type_id) &
+                  (IndustryActivityProducts.blueprintTypeID != 45732)).first())
+    return row.quantity if row else 1
+
+
+def main():
+    data = setup(ship_count=500, capital_count=200)
+    from src.service.industry_server.recipe_index import RecipeIndex
+
+    product_list = list(data['recipe'])
+    report(f'配方查询 {len(product_list)} 个产品 (材料 + 单流程产出)', [
+        ('SQL join', measure(lambda: [(sql_get_bp_materials(product_id), sql_get_product_quantity(product_id))
+                                      for product_id in product_list], repeat=3)),
+        ('RecipeIndex', measure(lambda: [(RecipeIndex.get_materials(product_id),
+                                          RecipeIndex.get_product_quantity(product_id))
+                                         for product_id in product_list])),
+    ])
+
+
+if __name__ == '__main__':
+    main()
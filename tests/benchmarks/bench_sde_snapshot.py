@@ -0,0 +1,58 @@
+"""
+SDE快照与原先逐次SQL查询的对比：编译、映射、市场名称表、按名称/id查找与组名查找。
+python -m tests.benchmarks.bench_sde_snapshot
+"""
+import os
+import random
+import tempfile
+
+from tests.benchmarks.common import setup, measure, report
+
+FILLER_COUNT = 50000
+LOOKUP_COUNT = 1000
+
+
+def main():
+    data = setup(filler_count=FILLER_COUNT)
+    from src.service.sde_service import database as en_model
+    from src.service.sde_service.snapshot import SdeSnapshot
+
+    InvTypes = en_model.InvTypes
+    InvGroups = en_model.InvGroups
+    rng = random.Random(7)
+    sample = rng.sample([(row[0], row[1]) for row in data['type_list']], LOOKUP_COUNT)
+
+    def sql_name_list():
+        return [res.typeName for res in InvTypes.select(InvTypes.typeName).where(InvTypes.marketGroupID != 0)]
+
+    def sql_lookup():
+        for type_id, name in sample:
+            assert InvTypes.get(InvTypes.typeName == name).typeID == type_id
+            InvTypes.get(InvTypes.typeID == type_id).typeName
+            (InvTypes.select(InvGroups.groupName)
+             .join(InvGroups, on=(InvTypes.groupID == InvGroups.groupID))
+             .where(InvTypes.typeID == type_id).scalar())
+
+    snapshot = SdeSnapshot.get()
+
+    def snapshot_lookup():
+        for type_id, name in sample:
+            assert snapshot.get_type_id(name) == type_id
+            snapshot.get_type_name(type_id)
+            snapshot.get_group_name(int(snapshot.get_type(type_id)['group_id']))
+
+    path = os.path.join(tempfile.mkdtemp(prefix='kahuna_bench_'), 'sde_snapshot_bench.bin')
+    assert sorted(sql_name_list()) == sorted(snapshot.get_market_name_list())
+    report(f'SDE {len(snapshot.type_ids)} 物品，{len(snapshot.section["materials"])} 条材料，'
+           f'快照 {os.path.getsize(snapshot.path) / 1024 / 1024:.1f}MB', [
+        ('编译快照', measure(lambda: SdeSnapshot.build('bench', path), repeat=3)),
+        ('映射已有快照', measure(lambda: SdeSnapshot(path), number=20)),
+        ('市场名称表 SQL', measure(sql_name_list)),
+        ('市场名称表 快照', measure(snapshot.get_market_name_list)),
+        (f'{LOOKUP_COUNT}次 名称->id + id->名称 + 组名 SQL', measure(sql_lookup, repeat=3)),
+        (f'{LOOKUP_COUNT}次 名称->id + id->名称 + 组名 快照', measure(snapshot_lookup, repeat=3)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
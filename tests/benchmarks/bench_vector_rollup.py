@@ -0,0 +1,41 @@
+"""
+全体需求：analyse_progress_work_type逐节点计算与analyse_progress_vector向量化计算的对比。
+python -m tests.benchmarks.bench_vector_rollup
+"""
+from tests import world
+from tests.benchmarks.common import setup, measure, report
+
+CAPITAL_COUNT = 60
+SHIP_COUNT = 140
+
+
+def main():
+    data = setup(ship_count=SHIP_COUNT, capital_count=CAPITAL_COUNT)
+    from src.service.industry_server.industry_analyse import IndustryAnalyser
+
+    user = world.get_user()
+    plan_list = [[row[1], 2] for row in data['type_list'] if row[3] in {324, 485}]
+
+    def analyse(vector: bool):
+        analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+        analyser.bp_block_level = 1
+        if vector:
+            analyser.analyse_progress_vector(plan_list)
+        else:
+            analyser.analyse_progress_work_type(plan_list)
+        return analyser.global_graph
+
+    work_graph = analyse(False)
+    vector_graph = analyse(True)
+    max_diff = max(abs(vector_graph.nodes[node]['quantity'] - quantity) / quantity
+                   for node, quantity in work_graph.nodes(data='quantity')
+                   if node != 'root' and quantity)
+    report(f'全体需求 {len(plan_list)} 个产品 ({CAPITAL_COUNT + 2} 无畏舰)，'
+           f'{work_graph.number_of_nodes()} 节点，最大相对误差 {max_diff:.2e}', [
+        ('analyse_progress_work_type', measure(lambda: analyse(False), repeat=3)),
+        ('analyse_progress_vector', measure(lambda: analyse(True), repeat=3)),
+    ])
+
+
+if __name__ == '__main__':
+    main()
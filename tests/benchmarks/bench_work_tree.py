@@ -0,0 +1,70 @@
+"""
+蓝图树展开：原先按(index, type)逐个展开、每步拼接队列的bfs与现在按type去重的deque展开的对比。
+python -m tests.benchmarks.bench_work_tree
+"""
+import networkx as nx
+
+from tests import world
+from tests.benchmarks.common import setup, measure, report
+
+PLAN_LINES = 200
+
+
+def legacy_bfs_bp_tree(analyser, bfs_queue: list, dg: nx.DiGraph):
+    """ 改动前的bfs_bp_tree """
+    from src.service.industry_server.blueprint import BPManager
+    anaed_set = set()
+    while bfs_queue:
+        index, type_id, quantity = bfs_queue.pop(0)
+        dg.add_node(type_id)
+        if (bp_materials := BPManager.get_bp_materials(type_id)) is None or analyser.in_pd_block(type_id):
+            anaed_set.add((index, type_id))
+            continue
+        dg.add_nodes_from([child_id for child_id in bp_materials.keys()])
+        dg.add_edges_from(
+            [(type_id, child_id, {"index": index, "quantity": quantity})
+             for child_id, quantity in bp_materials.items()]
+        )
+        bfs_queue = bfs_queue + [(index, child_id, quantity) for child_id, quantity in bp_materials.items()
+                                 if (index, child_id) not in anaed_set]
+        anaed_set.update([(index, child) for child in bp_materials.keys()])
+
+
+def main():
+    data = setup(ship_count=150, capital_count=50)
+    from src.service.industry_server.industry_analyse import IndustryAnalyser
+    from src.service.sde_service.utils import SdeUtils
+
+    user = world.get_user()
+    product_list = [row[1] for row in data['type_list'] if row[3] in {324, 485}]
+    plan_list = [[product_list[index % len(product_list)], 1] for index in range(PLAN_LINES)]
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+
+    def legacy():
+        dg = nx.MultiDiGraph()
+        bfs_queue = [(index, SdeUtils.get_id_by_name(target), 1) for index, (target, _) in enumerate(plan_list)]
+        legacy_bfs_bp_tree(analyser, bfs_queue, dg)
+        return dg
+
+    def current():
+        dg = nx.MultiDiGraph()
+        bfs_queue = [(index, SdeUtils.get_id_by_name(target), 1) for index, (target, _) in enumerate(plan_list)]
+        analyser.bfs_bp_tree(bfs_queue, dg)
+        return dg
+
+    def edge_set(dg):
+        return sorted((father, child, data['index'], data['quantity']) for father, child, data in dg.edges(data=True))
+
+    legacy_graph = legacy()
+    current_graph = current()
+    assert edge_set(legacy_graph) == edge_set(current_graph)
+    report(f'蓝图树展开 {PLAN_LINES} 行计划，{current_graph.number_of_nodes()} 节点，'
+           f'{current_graph.number_of_edges()} 边', [
+        ('bfs (list.pop(0) + 拼接, 按index展开)', measure(legacy, repeat=3)),
+        ('bfs_bp_tree (deque, 按type去重)', measure(current, repeat=5)),
+        ('get_work_tree (含层级计算)', measure(lambda: analyser.get_work_tree(plan_list, nx.MultiDiGraph()))),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+基准脚本共用：在导入src之前写入临时配置，建立指定规模的合成数据。
+用法: python -m tests.benchmarks.bench_xxx
+"""
+import time
+import statistics
+
+from tests import world
+
+world.configure()
+
+
+def setup(**scale):
+    return world.build_world(**scale)
+
+
+def measure(func, repeat: int = 5, number: int = 1) -> float:
+    """ 返回每次调用耗时的中位数，单位ms """
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        result.append((time.perf_counter() - start) / number * 1000)
+    return statistics.median(result)
+
+
+def report(title: str, row_list: list):
+    """ row_list: [(名称, ms)] """
+    print(title)
+    for name, ms in row_list:
+        print(f'  {name:<40} {ms:>10.3f} ms')
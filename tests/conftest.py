@@ -0,0 +1,19 @@
+"""
+测试在临时目录中建立合成数据，见tests/world.py。
+配置文件路径在导入src之前写入环境变量。
+"""
+import pytest
+
+from tests import world
+
+world.configure()
+
+
+@pytest.fixture(scope='session')
+def kahuna_world():
+    return world.build_world()
+
+
+@pytest.fixture(scope='session')
+def user(kahuna_world):
+    return world.get_user()
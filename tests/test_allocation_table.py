@@ -0,0 +1,123 @@
+import pytest
+
+from src.service.industry_server.blueprint import BPManager
+from src.service.industry_server.industry_config import IndustryConfigManager
+from src.service.industry_server.recipe_index import RecipeIndex
+from src.service.industry_server.structure import StructureManager
+from src.service.sde_service.utils import SdeUtils
+from src.utils import KahunaException
+
+from tests import world
+
+
+def legacy_allocate_structure(source_id: int, st_matcher) -> int:
+    """ 编译分配表之前逐次匹配的allocate_structure """
+    bp_name = SdeUtils.get_name_by_id(BPManager.get_bp_id_by_prod_typeid(source_id))
+    if bp_name in st_matcher.matcher_data["bp"]:
+        return st_matcher.matcher_data["bp"][bp_name]
+
+    mklist = SdeUtils.get_market_group_list(source_id)
+    mk_structure_id = None
+    largest_index = 0
+    for market_group, structure_id in st_matcher.matcher_data["market_group"].items():
+        if market_group in mklist:
+            index = mklist.index(market_group)
+            if not mk_structure_id or index > largest_index:
+                mk_structure_id = structure_id
+                largest_index = index
+    if mk_structure_id:
+        return mk_structure_id
+
+    for key, value in [("group", SdeUtils.get_groupname_by_id(source_id)),
+                       ("meta", SdeUtils.get_metaname_by_typeid(source_id)),
+                       ("category", SdeUtils.get_category_by_id(source_id))]:
+        if value in st_matcher.matcher_data[key]:
+            return st_matcher.matcher_data[key][value]
+    raise KahunaException(f"typeid: {source_id} 无建筑分配，请配置匹配器。")
+
+
+def legacy_allocation(source_id: int, st_matcher) -> tuple:
+    """ 原先get_runs_list_by_bpasset与get_eiv_cost中逐次计算的建筑与插件系数 """
+    structure_id = legacy_allocate_structure(source_id, st_matcher)
+    structure = StructureManager.get_structure(structure_id)
+    st_mater_eff, st_time_eff = IndustryConfigManager.get_structure_mater_time_eff(structure.type_id)
+    st_mater_rig_eff, st_time_rig_eff = IndustryConfigManager.get_structure_rig_mater_time_eff(structure)
+    return (structure_id, st_mater_eff * st_mater_rig_eff, st_time_eff * st_time_rig_eff,
+            IndustryConfigManager.get_structure_EIV_cost_eff(structure.type_id))
+
+
+@pytest.fixture
+def st_matcher(kahuna_world):
+    return IndustryConfigManager.get_matcher_of_user_by_name(world.ST_MATCHER, world.USER_QQ)
+
+
+def check_table(st_matcher):
+    table = IndustryConfigManager.get_allocation_table(st_matcher)
+    assert table
+    for type_id in RecipeIndex.product_ids():
+        try:
+            expect = legacy_allocation(type_id, st_matcher)
+        except KahunaException:
+            assert type_id not in table
+            continue
+        assert table[type_id] == pytest.approx(expect, rel=1e-12), type_id
+        assert IndustryConfigManager.get_allocation(type_id, st_matcher) == table[type_id]
+    return table
+
+
+def test_table_matches_legacy(st_matcher):
+    table = check_table(st_matcher)
+    # 两个建筑都装有插件，材料效率包含插件系数
+    by_structure = {allocation[0]: allocation for allocation in table.values()}
+    assert set(by_structure) == {world.SOTIYO_ID, world.TATARA_ID}
+    for structure_id, (_, mater_eff, time_eff, _) in by_structure.items():
+        structure = StructureManager.get_structure(structure_id)
+        st_mater_eff, st_time_eff = IndustryConfigManager.get_structure_mater_time_eff(structure.type_id)
+        rig_mater_eff, rig_time_eff = IndustryConfigManager.get_structure_rig_mater_time_eff(structure)
+        assert rig_mater_eff < 1 and rig_time_eff < 1
+        assert mater_eff == pytest.approx(st_mater_eff * rig_mater_eff)
+        assert time_eff == pytest.approx(st_time_eff * rig_time_eff)
+
+    # 不在配方索引中的物品逐次匹配
+    assert not RecipeIndex.has_product(34)
+    assert IndustryConfigManager.get_allocation(34, st_matcher) == pytest.approx(legacy_allocation(34, st_matcher))
+    with pytest.raises(KahunaException):
+        IndustryConfigManager.get_allocation(999999999, st_matcher)
+
+
+def test_matcher_version_recompiles(st_matcher):
+    wolf_id = SdeUtils.get_id_by_name('Wolf')
+    table = IndustryConfigManager.get_allocation_table(st_matcher)
+    assert table[wolf_id][0] == world.SOTIYO_ID
+    assert IndustryConfigManager.get_allocation_table(st_matcher) is table
+
+    st_matcher.matcher_data['bp'][SdeUtils.get_name_by_id(BPManager.get_bp_id_by_prod_typeid(wolf_id))] = \
+        world.TATARA_ID
+    st_matcher.insert_to_db()
+    try:
+        assert IndustryConfigManager.get_allocation_table(st_matcher) is not table
+        assert IndustryConfigManager.get_allocation(wolf_id, st_matcher)[0] == world.TATARA_ID
+        check_table(st_matcher)
+    finally:
+        st_matcher.matcher_data['bp'].clear()
+        st_matcher.insert_to_db()
+    assert IndustryConfigManager.get_allocation(wolf_id, st_matcher) == table[wolf_id]
+
+
+def test_structure_version_recompiles(st_matcher):
+    structure = StructureManager.get_structure(world.SOTIYO_ID)
+    wolf_id = SdeUtils.get_id_by_name('Wolf')
+    old_allocation = IndustryConfigManager.get_allocation(wolf_id, st_matcher)
+    rig_level = (structure.mater_rig_level, structure.time_rig_level)
+
+    structure.mater_rig_level, structure.time_rig_level = 0, 0
+    structure.insert_to_db()
+    try:
+        allocation = IndustryConfigManager.get_allocation(wolf_id, st_matcher)
+        assert allocation[1] > old_allocation[1]
+        assert allocation == pytest.approx(legacy_allocation(wolf_id, st_matcher))
+        check_table(st_matcher)
+    finally:
+        structure.mater_rig_level, structure.time_rig_level = rig_level
+        structure.insert_to_db()
+    assert IndustryConfigManager.get_allocation(wolf_id, st_matcher) == old_allocation
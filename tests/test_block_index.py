@@ -0,0 +1,86 @@
+import pytest
+
+from src.service.industry_server.blueprint import BPManager
+from src.service.industry_server.block_index import BlockIndex
+from src.service.industry_server.industry_config import IndustryConfigManager
+from src.service.industry_server.matcher import Matcher
+from src.service.industry_server.recipe_index import RecipeIndex
+from src.service.sde_service.utils import SdeUtils
+
+from tests import world
+
+BLOCK_LEVEL_LIST = list(range(6))
+
+
+def legacy_check_pd_block(matcher: Matcher, type_id: int, bp_block_level: int) -> bool:
+    """ 编译索引之前逐节点执行的check_pd_block """
+    bp_name = SdeUtils.get_name_by_id(BPManager.get_bp_id_by_prod_typeid(type_id))
+    if bp_name in matcher.matcher_data["bp"] and matcher.matcher_data["bp"][bp_name] <= bp_block_level:
+        return True
+
+    mklist = SdeUtils.get_market_group_list(type_id)
+    for market_group, level in matcher.matcher_data["market_group"].items():
+        if market_group in mklist and level <= bp_block_level:
+            return True
+
+    for key, value in [("group", SdeUtils.get_groupname_by_id(type_id)),
+                       ("meta", SdeUtils.get_metaname_by_typeid(type_id)),
+                       ("category", SdeUtils.get_category_by_id(type_id))]:
+        if value in matcher.matcher_data[key] and matcher.matcher_data[key][value] <= bp_block_level:
+            return True
+    return False
+
+
+@pytest.fixture
+def block_matcher(kahuna_world):
+    """ 各类规则互相重叠，同一物品匹配多条不同等级的规则 """
+    matcher = Matcher('test_block_index', world.USER_QQ, 'prod_block')
+    matcher.matcher_data.update({
+        'bp': {'Nitrogen Fuel Block Blueprint': 3, 'Crystalline Carbonide Reaction Formula': 0},
+        'market_group': {'Frigates': 2, 'Components': 4, 'Capital Ship Components': 5},
+        'group': {'Fuel Block': 1, 'Intermediate Materials': 3, 'Composite': 5},
+        'meta': {'Tech II': 4},
+        'category': {'Commodity': 5},
+    })
+    yield matcher
+    BlockIndex.index_dict.pop(matcher.matcher_name, None)
+
+
+def check_parity(matcher: Matcher, type_id_list: list):
+    for bp_block_level in BLOCK_LEVEL_LIST:
+        for type_id in type_id_list:
+            assert BlockIndex.is_blocked(matcher, type_id, bp_block_level) == \
+                   legacy_check_pd_block(matcher, type_id, bp_block_level), (type_id, bp_block_level)
+
+
+def test_is_blocked_matches_legacy(block_matcher):
+    product_list = list(RecipeIndex.product_ids())
+    # 不可制造的物品不在索引内
+    material_list = [34, 35, 36, 37]
+    assert not any(RecipeIndex.has_product(type_id) for type_id in material_list)
+    check_parity(block_matcher, product_list + material_list)
+
+    # 每个等级下屏蔽的物品数量不同，各等级均被覆盖
+    blocked_count = [sum(BlockIndex.is_blocked(block_matcher, type_id, bp_block_level) for type_id in product_list)
+                     for bp_block_level in BLOCK_LEVEL_LIST]
+    assert blocked_count == sorted(blocked_count)
+    assert len(set(blocked_count)) == len(BLOCK_LEVEL_LIST)
+    assert blocked_count[-1] < len(product_list)
+
+
+def test_world_matcher_matches_legacy(kahuna_world):
+    matcher = IndustryConfigManager.get_matcher_of_user_by_name(world.BLOCK_MATCHER, world.USER_QQ)
+    check_parity(matcher, list(RecipeIndex.product_ids()))
+
+
+def test_version_bump_recompiles(block_matcher):
+    wolf_id = SdeUtils.get_id_by_name('Wolf')
+    index = BlockIndex.get_index(block_matcher)
+    assert BlockIndex.get_index(block_matcher) is index
+    assert not BlockIndex.is_blocked(block_matcher, wolf_id, 1)
+
+    block_matcher.matcher_data['bp'][SdeUtils.get_name_by_id(BPManager.get_bp_id_by_prod_typeid(wolf_id))] = 1
+    block_matcher.version += 1
+    assert BlockIndex.get_index(block_matcher) is not index
+    assert BlockIndex.is_blocked(block_matcher, wolf_id, 1)
+    check_parity(block_matcher, list(RecipeIndex.product_ids()))
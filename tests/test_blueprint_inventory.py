@@ -0,0 +1,50 @@
+from src.service.industry_server.blueprint_inventory import BlueprintInventory
+from src.service.industry_server.industry_analyse import IndustryAnalyser
+from src.service.industry_server.running_job import RunningJobOwner
+
+from tests import world
+
+PLATE_BP = 11543 + world.BP_OFFSET
+WOLF_BP = 11371 + world.BP_OFFSET
+
+
+def get_inventory():
+    return BlueprintInventory(world.USER_QQ, RunningJobOwner.get_using_bp_set()).load()
+
+
+def test_load_groups_and_sorts(kahuna_world):
+    inventory = get_inventory()
+    assert [bpo[3] for bpo in inventory.bpo_dict[PLATE_BP]] == [9001, 9002]
+    assert [bpc[3] for bpc in inventory.bpc_dict[11551 + world.BP_OFFSET]] == [9003, 9004]
+    # 运行中工作占用的拷贝不可用
+    assert [bpc[3] for bpc in inventory.get_bpc_list(WOLF_BP, 'total')] == [9006, 9005]
+
+
+def test_allocation_is_isolated_by_view(kahuna_world):
+    inventory = get_inventory()
+    inventory.allocate(('actually', 11543), {9001})
+    assert [bpo[3] for bpo in inventory.get_bpo_list(PLATE_BP, 'actually')] == [9002]
+    assert [bpo[3] for bpo in inventory.get_bpo_list(PLATE_BP, 'total')] == [9001, 9002]
+
+    # 同一key重新分配时先释放自己占用的蓝图
+    inventory.allocate(('actually', 11543), {9002})
+    assert [bpo[3] for bpo in inventory.get_bpo_list(PLATE_BP, 'actually')] == [9001]
+    inventory.release(('actually', 11543))
+    assert [bpo[3] for bpo in inventory.get_bpo_list(PLATE_BP, 'actually')] == [9001, 9002]
+
+
+def test_total_view_gets_owned_bpo(kahuna_world, user):
+    """ 实际需求先安排工作后，全体需求仍能使用同一张原图与拷贝 """
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    analyser.analyse_progress_work_type([['Wolf', 10]])
+
+    for graph in [analyser.work_graph, analyser.global_graph]:
+        plate_work = graph.nodes[11543]['work_list']
+        assert plate_work and not any(work.void_bp for work in plate_work)
+        assert {work.location_id for work in plate_work} == {world.LOC_BP}
+        wolf_work = graph.nodes[11371]['work_list']
+        assert sorted(work.runs for work in wolf_work if not work.void_bp) == [1, 3]
+
+    actually_eff = {work.mater_eff for work in analyser.work_graph.nodes[11543]['work_list']}
+    total_eff = {work.mater_eff for work in analyser.global_graph.nodes[11543]['work_list']}
+    assert actually_eff == total_eff
@@ -0,0 +1,63 @@
+import pytest
+
+from src.service.industry_server.cost_engine import CostEngine
+from src.service.industry_server.industry_analyse import IndustryAnalyser
+
+from tests import world
+
+# 多层计划：T2舰船(拷贝+反应三层)、无畏舰(旗舰组件原图)、T1船体、组件、燃料块
+PLAN_LIST = [['Wolf', 10], ['Hawk', 4], ['Revelation', 3], ['Naglfar', 1], ['Rifter', 7],
+             ['Tungsten Carbide Armor Plate', 250], ['Fusion Thruster', 55], ['Nitrogen Fuel Block', 1000],
+             ['Crystalline Carbonide', 30000]]
+
+
+def signal_cost(user, product, quantity, depth_price=False):
+    """ 与signal_async_progress_work_type相同的逐个产品分析 """
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    analyser.bp_block_level = 1
+    analyser.depth_price = depth_price
+    analyser.analyse_progress_work_type([[product, quantity]])
+    graph = analyser.global_graph
+    material_cost = sum(graph.nodes[node]['buy_cost'] for node, degree in graph.out_degree()
+                        if degree == 0 and node != 'root')
+    eiv_cost = sum(graph.nodes[node]['eiv_cost'] for node, degree in graph.out_degree()
+                   if degree != 0 and node != 'root')
+    return [material_cost, eiv_cost, material_cost + eiv_cost]
+
+
+def engine_cost(user, plan_list, depth_price=False):
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    analyser.bp_block_level = 1
+    analyser.depth_price = depth_price
+    return CostEngine.get_cost_data(analyser, plan_list)
+
+
+def test_signal_helper_matches_signal_async(kahuna_world, user):
+    result = IndustryAnalyser.signal_async_progress_work_type(user, world.PLAN_NAME, [['Wolf', 10]])
+    assert result[1:] == signal_cost(user, 'Wolf', 10)
+
+
+@pytest.mark.parametrize('depth_price', [False, True])
+def test_engine_matches_single_product_analysis(kahuna_world, user, depth_price):
+    cost_dict = engine_cost(user, PLAN_LIST, depth_price)
+    for product, quantity in PLAN_LIST:
+        assert cost_dict[product] == pytest.approx(signal_cost(user, product, quantity, depth_price), rel=1e-9)
+
+
+def test_engine_uses_owned_blueprint_efficiency(kahuna_world, user):
+    """ 不同数量会用到不同效率的蓝图，单位成本不能按首个工作线性放大 """
+    cost_dict = engine_cost(user, [['Wolf', 1]])
+    cost_dict.update({'Wolf 10': engine_cost(user, [['Wolf', 10]])['Wolf']})
+    assert cost_dict['Wolf 10'][0] != pytest.approx(cost_dict['Wolf'][0] * 10, rel=1e-6)
+    assert cost_dict['Wolf 10'] == pytest.approx(signal_cost(user, 'Wolf', 10), rel=1e-9)
+
+
+def test_get_cost_data_defaults_to_engine(kahuna_world, user):
+    IndustryAnalyser.cost_data_cache.clear()
+    cost_dict = IndustryAnalyser.get_cost_data(user, world.PLAN_NAME, [['Hawk', 4]])
+    assert cost_dict['Hawk'] == pytest.approx(signal_cost(user, 'Hawk', 4), rel=1e-9)
+
+
+def test_unknown_product(kahuna_world, user):
+    assert engine_cost(user, [['Tritanium', 5], ['No Such Item', 1]]) == {
+        'Tritanium': [0, 0, 0], 'No Such Item': [0, 0, 0]}
@@ -0,0 +1,110 @@
+import time
+import threading
+import multiprocessing
+
+import pytest
+
+from src.service.database_server.writer import CacheWriter
+from src.service.evesso_server.esi_async import EsiTransport
+from src.service.industry_server import cost_worker_pool
+from src.service.industry_server.cost_worker_pool import CostWorkerPool
+from src.service.industry_server.industry_analyse import IndustryAnalyser
+
+from tests import world
+
+PLAN_LIST = [['Wolf', 10], ['Hawk', 4], ['Revelation', 1], ['Rifter', 3], ['Fusion Thruster', 55]]
+
+
+@pytest.fixture
+def pool(kahuna_world):
+    yield CostWorkerPool
+    CostWorkerPool.close(terminate=True)
+
+
+def test_pool_matches_engine(pool, user):
+    IndustryAnalyser.cost_data_cache.clear()
+    engine_dict = IndustryAnalyser.get_cost_data(user, world.PLAN_NAME, PLAN_LIST, use_engine=True)
+    CostWorkerPool.get_pool(processes=2)
+    IndustryAnalyser.cost_data_cache.clear()
+    pool_dict = IndustryAnalyser.get_cost_data(user, world.PLAN_NAME, PLAN_LIST, use_engine=False)
+    assert set(pool_dict) == set(engine_dict)
+    for product, cost in engine_dict.items():
+        assert pool_dict[product] == pytest.approx(cost, rel=1e-9)
+    assert sum(count for count, _, _ in CostWorkerPool.get_throughput().values()) >= len(PLAN_LIST)
+    assert '进程池：运行中 2 进程' in CostWorkerPool.get_status()
+
+
+def test_cancel_does_not_hang(pool, user, monkeypatch):
+    monkeypatch.setattr(cost_worker_pool, 'POLL_INTERVAL', 0.1)
+    plan_list = [['Revelation', 1]] * 400
+    received = []
+
+    def consume():
+        for result in CostWorkerPool.imap(user, world.PLAN_NAME, plan_list, chunksize=50, processes=2):
+            received.append(result)
+            if len(received) == 1:
+                threading.Thread(target=CostWorkerPool.cancel).start()
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    assert 0 < len(received) < len(plan_list)
+    assert CostWorkerPool.cancelled()
+    assert CostWorkerPool.progress is None
+
+
+def check_after_fork(conn):
+    conn.send((EsiTransport.loop is None, EsiTransport.session is None, CacheWriter.thread is None,
+               CacheWriter.run(lambda: 42)))
+
+
+def test_fork_resets_transport_and_writer(kahuna_world):
+    EsiTransport.get_loop()
+    CacheWriter.start()
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.get_context('fork').Process(target=check_after_fork, args=(child_conn, ))
+    process.start()
+    assert parent_conn.poll(30)
+    assert parent_conn.recv() == (True, True, True, 42)
+    process.join(timeout=10)
+    assert EsiTransport.loop is not None and CacheWriter.thread is not None
+
+
+def check_worker_init(conn):
+    """ 子进程中执行进程初始化，记录是否使用写线程或执行warm_up """
+    from src import service
+    from src.service.industry_server.industry_config import IndustryConfigManager
+    from src.service.industry_server.recipe_index import RecipeIndex
+    from src.service.market_server.market_manager import MarketManager
+    from src.service.market_server.order_book import OrderBook
+    submitted = []
+    CacheWriter.submit = classmethod(lambda cls, func, *args, **kwargs: submitted.append(func))
+    service.warm_up = lambda: submitted.append('warm_up')
+    RecipeIndex.loaded = False
+    IndustryConfigManager.inited = False
+    MarketManager.inited = False
+    OrderBook.book_dict.clear()
+    cost_worker_pool._init_worker()
+    conn.send((submitted, CacheWriter.thread is None, RecipeIndex.loaded, IndustryConfigManager.inited,
+               MarketManager.inited, sorted(OrderBook.book_dict) == sorted(
+                   market.location_id for market in MarketManager.market_dict.values())))
+
+
+def test_worker_init_skips_writer(kahuna_world):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.get_context('fork').Process(target=check_worker_init, args=(child_conn, ))
+    process.start()
+    assert parent_conn.poll(60)
+    assert parent_conn.recv() == ([], True, True, True, True, True)
+    process.join(timeout=10)
+
+
+def test_cost_mode_selects_pool(pool, user, monkeypatch):
+    from src.service.industry_server import industry_analyse
+    monkeypatch.setattr(industry_analyse, 'COST_MODE', 'pool')
+    CostWorkerPool.get_pool(processes=2)
+    CostWorkerPool.throughput.clear()
+    IndustryAnalyser.cost_data_cache.clear()
+    IndustryAnalyser.get_cost_data(user, world.PLAN_NAME, [['Rifter', 2]])
+    assert sum(count for count, _, _ in CostWorkerPool.get_throughput().values()) == 1
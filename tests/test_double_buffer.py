@@ -0,0 +1,108 @@
+import pytest
+from peewee import IntegerField
+
+from src.service.database_server.connect import DatabaseConectManager, CacheModel
+from src.service.database_server.migration import SchemaMigration
+from src.service.database_server.utils import DoubleBuffer
+
+
+class BufferRow(CacheModel):
+    location_id = IntegerField()
+    type_id = IntegerField()
+    value = IntegerField()
+
+    class Meta:
+        table_name = 'test_buffer'
+        indexes = (
+            (('type_id', 'location_id'), False),
+            (('location_id',), False),
+        )
+
+
+class BufferRowCache(CacheModel):
+    location_id = IntegerField()
+    type_id = IntegerField()
+    value = IntegerField()
+
+    class Meta:
+        table_name = 'test_buffer_cache'
+        indexes = (
+            (('type_id', 'location_id'), False),
+            (('location_id',), False),
+        )
+
+
+@pytest.fixture
+def buffer(kahuna_world):
+    """ cache表中位置1、2各有旧数据，staging表为空 """
+    db = DatabaseConectManager.cache_db()
+    db.create_tables([BufferRow, BufferRowCache])
+    BufferRowCache.insert_many([{'location_id': location_id, 'type_id': type_id, 'value': 1}
+                                for location_id in [1, 2] for type_id in range(10)]).execute()
+    yield db
+    db.drop_tables([BufferRow, BufferRowCache])
+
+
+def read_rows(model) -> set:
+    """ 使用交互查询的只读连接读取 """
+    return {(row.location_id, row.type_id, row.value)
+            for row in model.select().bind(DatabaseConectManager.cache_read_db())}
+
+
+def test_swap_publishes_staging(buffer):
+    old_rows = read_rows(BufferRowCache)
+    with DoubleBuffer.get_lock(BufferRow):
+        DoubleBuffer.prepare(BufferRow, BufferRowCache)
+        BufferRow.insert_many([{'location_id': location_id, 'type_id': type_id, 'value': 2}
+                               for location_id in [1, 2] for type_id in range(5)]).execute()
+        # 交换前读者仍看到旧快照
+        assert read_rows(BufferRowCache) == old_rows
+        DoubleBuffer.swap(BufferRow, BufferRowCache)
+    assert read_rows(BufferRowCache) == {(location_id, type_id, 2) for location_id in [1, 2] for type_id in range(5)}
+    # staging表保存上一份快照，下次prepare时清空
+    assert read_rows(BufferRow) == old_rows
+    DoubleBuffer.prepare(BufferRow, BufferRowCache)
+    assert BufferRow.select().count() == 0
+
+
+def test_partial_refresh_carries_over(buffer):
+    """ 只刷新位置1，位置2沿用cache表中的旧数据 """
+    with DoubleBuffer.get_lock(BufferRow):
+        DoubleBuffer.prepare(BufferRow, BufferRowCache, keep=BufferRowCache.location_id == 2)
+        BufferRow.insert_many([{'location_id': 1, 'type_id': type_id, 'value': 3} for type_id in range(3)]).execute()
+        DoubleBuffer.swap(BufferRow, BufferRowCache)
+    assert read_rows(BufferRowCache) == ({(1, type_id, 3) for type_id in range(3)} |
+                                         {(2, type_id, 1) for type_id in range(10)})
+
+    # 刷新中途跳过的分区单独carry_over
+    with DoubleBuffer.get_lock(BufferRow):
+        DoubleBuffer.prepare(BufferRow, BufferRowCache)
+        BufferRow.insert_many([{'location_id': 2, 'type_id': 0, 'value': 4}]).execute()
+        assert DoubleBuffer.carry_over(BufferRow, BufferRowCache, BufferRowCache.location_id == 1) == 3
+        DoubleBuffer.swap(BufferRow, BufferRowCache)
+    assert read_rows(BufferRowCache) == {(1, type_id, 3) for type_id in range(3)} | {(2, 0, 4)}
+    # 自增主键不复制，交换后的行id不冲突
+    assert len({row.id for row in BufferRowCache.select()}) == BufferRowCache.select().count()
+
+
+def test_index_found_after_swap(buffer):
+    """ 索引名随表互换，按列查找的迁移在交换后仍能找到已有索引，不重复建立 """
+    db = buffer
+    before = {table_name: SchemaMigration.get_index_dict(db, table_name)
+              for table_name in ['test_buffer', 'test_buffer_cache']}
+    for _ in range(2):
+        DoubleBuffer.prepare(BufferRow, BufferRowCache)
+        DoubleBuffer.swap(BufferRow, BufferRowCache)
+        SchemaMigration.sync_model_index(db, [BufferRow, BufferRowCache])
+        for table_name in ['test_buffer', 'test_buffer_cache']:
+            index_dict = SchemaMigration.get_index_dict(db, table_name)
+            assert set(index_dict) == set(before[table_name])
+            assert {('type_id', 'location_id'), ('location_id',)} <= set(index_dict)
+    # 交换一次后索引名互换，交换两次后恢复
+    assert SchemaMigration.get_index_dict(db, 'test_buffer_cache') == before['test_buffer_cache']
+
+    DoubleBuffer.swap(BufferRow, BufferRowCache)
+    assert SchemaMigration.get_index_dict(db, 'test_buffer_cache')[('location_id',)][0] == \
+        before['test_buffer'][('location_id',)][0]
+    plan = db.execute_sql('EXPLAIN QUERY PLAN SELECT * FROM test_buffer_cache WHERE location_id = 1').fetchall()
+    assert 'USING INDEX' in ' '.join(str(row[-1]) for row in plan)
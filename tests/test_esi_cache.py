@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta
+
+from src.service.database_server.model import EsiResponseCache
+from src.service.database_server.writer import CacheWriter
+from src.service.evesso_server import eveesi
+from src.service.evesso_server.esi_async import EsiTransport
+from src.service.evesso_server.esi_cache import EsiCache
+
+
+def get_headers(expires: datetime) -> dict:
+    return {'ETag': '"etag"', 'Expires': expires.strftime('%a, %d %b %Y %H:%M:%S GMT'), 'X-Pages': '3'}
+
+
+def test_order_endpoints_bypass_cache():
+    assert EsiTransport.build_request(eveesi.markets_region_orders, 1, 10000002).cache is False
+    assert EsiTransport.build_request(eveesi.markets_structures, 1, 'token', 1035466617946).cache is False
+    assert EsiTransport.build_request(eveesi.markets_region_history, 10000002, 34).cache is True
+
+
+def test_evict_oldest_over_limit(kahuna_world):
+    EsiResponseCache.delete().execute()
+    now = datetime.utcnow()
+    body = 'x' * 1000
+    for index in range(10):
+        EsiCache.save(f'test/{index}', get_headers(now + timedelta(minutes=index)), body)
+    CacheWriter.run(EsiCache.flush)
+    assert EsiCache.get_total_bytes() == 10000
+
+    assert EsiCache.evict(max_bytes=20000) == 0
+    assert EsiCache.evict(max_bytes=3500) == 7
+    assert EsiCache.get_total_bytes() <= 3500
+    # 保留最晚过期的条目
+    assert sorted(EsiResponseCache.select(EsiResponseCache.cache_key).tuples()) == [
+        ('test/7',), ('test/8',), ('test/9',)]
+    cache = EsiCache.get('test/9')
+    assert cache.pages == 3 and cache.body == body
+    EsiResponseCache.delete().execute()
+
+
+def test_write_through_writer_thread(kahuna_world):
+    EsiResponseCache.delete().execute()
+    now = datetime.utcnow()
+    # 写线程被占用时保存的响应先从内存读取
+    busy = CacheWriter.submit(time.sleep, 0.2)
+    EsiCache.save('test/a', get_headers(now + timedelta(minutes=5)), '[1]')
+    assert EsiCache.get('test/a').body == '[1]'
+    assert EsiResponseCache.get_or_none(EsiResponseCache.cache_key == 'test/a') is None
+    busy.result()
+    CacheWriter.run(lambda: None)
+    assert EsiResponseCache.get(EsiResponseCache.cache_key == 'test/a').body == '[1]'
+
+    # 304只更新过期时间，写入前读取也使用新的过期时间
+    expires = now + timedelta(minutes=30)
+    EsiCache.touch('test/a', get_headers(expires))
+    assert EsiCache.get('test/a').expires == expires.replace(microsecond=0)
+    CacheWriter.run(lambda: None)
+    assert EsiResponseCache.get(EsiResponseCache.cache_key == 'test/a').expires == expires.replace(microsecond=0)
+    assert not EsiCache.pending_save and not EsiCache.pending_touch
+    EsiResponseCache.delete().execute()
+
+
+def test_readable_while_flushing(kahuna_world, monkeypatch):
+    """ flush写入提交之前，get仍从内存读取；写入期间的304更新留给下一次flush """
+    EsiResponseCache.delete().execute()
+    now = datetime.utcnow()
+    expires = now + timedelta(minutes=30)
+    read_list = []
+    replace_many = EsiResponseCache.replace_many
+
+    def replace_during_read(row_list):
+        read_list.append(EsiCache.get('test/b'))
+        EsiCache.touch('test/b', get_headers(expires))
+        return replace_many(row_list)
+
+    monkeypatch.setattr(EsiResponseCache, 'replace_many', replace_during_read)
+    EsiCache.save('test/b', get_headers(now + timedelta(minutes=5)), '[2]')
+    CacheWriter.run(lambda: None)
+    assert read_list[0].body == '[2]'
+    assert EsiCache.get('test/b').expires == expires.replace(microsecond=0)
+
+    monkeypatch.setattr(EsiResponseCache, 'replace_many', replace_many)
+    CacheWriter.run(lambda: None)
+    assert not EsiCache.pending_save and not EsiCache.pending_touch
+    assert EsiResponseCache.get(EsiResponseCache.cache_key == 'test/b').expires == expires.replace(microsecond=0)
+    EsiResponseCache.delete().execute()
@@ -0,0 +1,183 @@
+import json
+import time
+import asyncio
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+
+import pytest
+from aiohttp import web
+
+from src.service.evesso_server import esi_async, eveesi
+from src.service.evesso_server.esi_async import EsiTransport, EsiRequest, ErrorBudget, MAX_RETRY
+from src.service.evesso_server.esi_cache import EsiCache
+
+
+class LocalEsi:
+    """
+    本地esi服务，每个路径按顺序返回预设的响应，最后一个响应重复使用。
+    response: (status, headers, body)
+    """
+    def __init__(self):
+        self.response_dict = dict()
+        self.request_dict = dict()  # {path: [(请求时间, headers, query)]}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.runner = None
+        self.port = None
+
+    async def handle(self, request: web.Request):
+        request_list = self.request_dict.setdefault(request.path, [])
+        request_list.append((time.monotonic(), dict(request.headers), dict(request.query)))
+        response_list = self.response_dict[request.path]
+        status, headers, body = response_list[min(len(request_list), len(response_list)) - 1]
+        return web.Response(status=status, headers=headers, text=body)
+
+    async def start_site(self):
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.start_site(), self.loop).result()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def url(self, path: str) -> str:
+        return f'http://127.0.0.1:{self.port}{path}'
+
+    def set(self, path: str, *response_list):
+        self.response_dict[path] = list(response_list)
+        self.request_dict.pop(path, None)
+        return self.url(path)
+
+    def requests(self, path: str) -> list:
+        return self.request_dict.get(path, [])
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = LocalEsi().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    """ 记录每次退避的上限，不实际等待 """
+    backoff_list = []
+
+    def uniform(low, high):
+        backoff_list.append((low, high))
+        return 0
+
+    monkeypatch.setattr(esi_async.random, 'uniform', uniform)
+    ErrorBudget.reset()
+    yield backoff_list
+    ErrorBudget.reset()
+
+
+def fetch(url: str, cache: bool = False, **params) -> tuple:
+    return EsiTransport.request(EsiRequest(url, params=params, cache=cache))
+
+
+def http_date(date: datetime) -> str:
+    return date.strftime('%a, %d %b %Y %H:%M:%S GMT')
+
+
+@pytest.mark.parametrize('status', [420, 500, 502, 503, 504])
+def test_retry_then_success(server, fast_backoff, status):
+    url = server.set(f'/retry/{status}/', (status, {}, 'error'), (status, {}, 'error'),
+                     (200, {'X-Pages': '4'}, '[1, 2]'))
+    assert fetch(url) == ([1, 2], 4)
+    assert len(server.requests(f'/retry/{status}/')) == 3
+    # 抖动退避的上限按次数翻倍
+    assert fast_backoff == [(0, esi_async.BACKOFF_BASE), (0, esi_async.BACKOFF_BASE * 2)]
+
+
+def test_retry_gives_up(server, fast_backoff):
+    url = server.set('/retry/always/', (503, {}, 'error'))
+    assert fetch(url) == (None, 0)
+    assert len(server.requests('/retry/always/')) == MAX_RETRY + 1
+    assert fast_backoff == [(0, min(esi_async.BACKOFF_CAP, esi_async.BACKOFF_BASE * 2 ** attempt))
+                            for attempt in range(MAX_RETRY)]
+
+
+def test_client_error_not_retried(server, fast_backoff):
+    url = server.set('/missing/', (404, {}, '{"error": "not found"}'))
+    assert fetch(url) == (None, 0)
+    assert len(server.requests('/missing/')) == 1
+    assert fast_backoff == []
+
+
+def test_backoff_cap():
+    for attempt in range(12):
+        assert 0 <= EsiTransport.get_backoff(attempt) <= min(esi_async.BACKOFF_CAP, esi_async.BACKOFF_BASE * 2 ** attempt)
+
+
+def test_etag_not_modified_reuses_cache(kahuna_world, server, fast_backoff):
+    expired = http_date(datetime.utcnow() - timedelta(minutes=1))
+    fresh = http_date(datetime.utcnow() + timedelta(minutes=5))
+    url = server.set('/etag/', (200, {'ETag': '"v1"', 'Expires': expired, 'X-Pages': '2'}, '{"value": 1}'),
+                     (304, {'ETag': '"v1"', 'Expires': fresh}, ''))
+    assert fetch(url, cache=True, type_id=34) == ({'value': 1}, 2)
+    # 已过期，携带ETag重新请求，304时沿用缓存的响应体与页数
+    assert fetch(url, cache=True, type_id=34) == ({'value': 1}, 2)
+    request_list = server.requests('/etag/')
+    assert 'If-None-Match' not in request_list[0][1]
+    assert request_list[1][1]['If-None-Match'] == '"v1"'
+    assert request_list[1][2] == {'type_id': '34'}
+
+    # 304更新了过期时间，之后直接使用缓存
+    assert EsiCache.is_fresh(EsiCache.get(EsiCache.make_key(url, {'type_id': 34})))
+    assert fetch(url, cache=True, type_id=34) == ({'value': 1}, 2)
+    assert len(server.requests('/etag/')) == 2
+
+
+def test_error_budget_pauses_requests(server, fast_backoff):
+    budget_headers = {'X-ESI-Error-Limit-Remain': '5', 'X-ESI-Error-Limit-Reset': '1'}
+    url = server.set('/budget/', (404, budget_headers, 'error'))
+    ok_url = server.set('/budget/ok/', (200, {}, '[]'))
+    assert fetch(url) == (None, 0)
+    assert ErrorBudget.remain == 5
+
+    # 剩余额度低于阈值，等待窗口重置后才发出请求
+    start = time.monotonic()
+    assert fetch(ok_url) == ([], 0)
+    assert server.requests('/budget/ok/')[0][0] - start >= 0.9
+    assert ErrorBudget.remain >= esi_async.ERROR_LIMIT_THRESHOLD
+
+
+def test_base_url_points_to_local_server(server, fast_backoff, monkeypatch):
+    monkeypatch.setattr(eveesi, 'ESI_BASE_URL', server.url(''))
+    server.set('/latest/markets/10000002/history/', (200, {}, json.dumps([{'average': 5}])))
+    assert eveesi.markets_region_history(10000002, 34, cache=False) == [{'average': 5}]
+    assert server.requests('/latest/markets/10000002/history/')[0][2] == {'type_id': '34', 'region_id': '10000002'}
+
+
+def check_budget_after_fork(conn):
+    conn.send((ErrorBudget.remain, ErrorBudget.reset_at))
+
+
+def test_fork_resets_error_budget():
+    ErrorBudget.remain = 3
+    ErrorBudget.reset_at = time.monotonic() + 60
+    try:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.get_context('fork').Process(target=check_budget_after_fork, args=(child_conn, ))
+        process.start()
+        assert parent_conn.poll(30)
+        assert parent_conn.recv() == (100, 0)
+        process.join(timeout=10)
+        assert ErrorBudget.remain == 3
+    finally:
+        ErrorBudget.reset()
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from src.service.database_server.model import MarketHistory as M_MarketHistory
+from src.service.market_server.history_series import HistorySeries, SERIES_DAYS
+from src.service.market_server.history_summary import HistorySummary
+from src.service.market_server.marker import MarketHistory, REGION_VALE_ID, REGION_FORGE_ID
+
+TEST_REGION_ID = 10000099
+
+
+def brute_rolling_mean(row: list, window: int) -> list:
+    res = []
+    for day in range(len(row)):
+        value_list = [value for value in row[max(0, day + 1 - window):day + 1] if not np.isnan(value)]
+        res.append(sum(value_list) / len(value_list) if value_list else np.nan)
+    return res
+
+
+def brute_forward_fill(row: list) -> list:
+    res = []
+    last = np.nan
+    for value in row:
+        if not np.isnan(value):
+            last = value
+        res.append(last)
+    return res
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(7)
+    matrix = rng.uniform(1, 100, size=(6, 40))
+    matrix[rng.uniform(size=matrix.shape) < 0.3] = np.nan
+    # 全空、开头为空与只有一个值的行
+    matrix[1] = np.nan
+    matrix[2, :10] = np.nan
+    matrix[3] = np.nan
+    matrix[3, 20] = 5
+    return matrix
+
+
+def test_forward_fill(matrix):
+    expect = np.array([brute_forward_fill(row) for row in matrix.tolist()])
+    np.testing.assert_array_equal(HistorySeries.forward_fill(matrix), expect)
+
+
+@pytest.mark.parametrize('window', [1, 3, 7, 30, 60])
+def test_rolling_mean(matrix, window):
+    expect = np.array([brute_rolling_mean(row, window) for row in matrix.tolist()])
+    np.testing.assert_allclose(HistorySeries.rolling_mean(matrix, window), expect, rtol=1e-12)
+
+
+def test_warm_up_builds_series(kahuna_world):
+    assert REGION_VALE_ID in HistorySeries.series_dict
+    assert REGION_FORGE_ID in HistorySeries.series_dict
+
+
+def test_refresh_replaces_series(kahuna_world):
+    anchor = HistorySummary.get_anchor_date()
+    old_series = HistorySeries.get(TEST_REGION_ID)
+    assert old_series.get_indicator_dict([34]) == {}
+
+    # 34每日上涨1，35只在最近两天有成交
+    row_list = [{'region_id': TEST_REGION_ID, 'type_id': 34, 'date': anchor - timedelta(days=day),
+                 'average': 100 - day, 'highest': 100 - day, 'lowest': 100 - day, 'order_count': 1, 'volume': 10}
+                for day in range(SERIES_DAYS)]
+    row_list += [{'region_id': TEST_REGION_ID, 'type_id': 35, 'date': anchor - timedelta(days=day),
+                  'average': 50 + day, 'highest': 50, 'lowest': 50, 'order_count': 1, 'volume': 10}
+                 for day in range(2)]
+    M_MarketHistory.insert_many(row_list).execute()
+    try:
+        series = HistorySeries.refresh(TEST_REGION_ID)
+        assert series is not old_series
+        assert HistorySeries.get(TEST_REGION_ID) is series
+
+        indicator_dict = MarketHistory.get_history_indicator([34, 35, 36], TEST_REGION_ID)
+        assert set(indicator_dict) == {34, 35}
+        assert indicator_dict[34]['last_price'] == 100
+        assert indicator_dict[34]['ma_short'] == pytest.approx(97)
+        assert indicator_dict[34]['ma_long'] == pytest.approx(85.5)
+        assert indicator_dict[34]['trend'] == pytest.approx(97 / 85.5 - 1)
+        assert indicator_dict[34]['change'] == pytest.approx(100 / 99 - 1)
+        assert indicator_dict[35]['change'] == pytest.approx(50 / 51 - 1)
+    finally:
+        M_MarketHistory.delete().where(M_MarketHistory.region_id == TEST_REGION_ID).execute()
+        HistorySeries.series_dict.pop(TEST_REGION_ID, None)
+
+
+def make_history(type_id: int, day_count: int, base: float) -> list:
+    anchor = HistorySummary.get_anchor_date()
+    return [{'region_id': TEST_REGION_ID, 'type_id': type_id, 'date': anchor - timedelta(days=day),
+             'average': base - day, 'highest': base, 'lowest': base, 'order_count': 1, 'volume': 10 + day}
+            for day in range(day_count)]
+
+
+def test_update_types_matches_refresh(kahuna_world):
+    M_MarketHistory.insert_many(make_history(34, 100, 200) + make_history(36, 30, 80)).execute()
+    try:
+        old_series = HistorySeries.refresh(TEST_REGION_ID)
+        old_36 = old_series.get_indicator_dict([36])
+
+        # 34新增更早的日期，35是新物品
+        M_MarketHistory.delete().where((M_MarketHistory.region_id == TEST_REGION_ID) &
+                                       (M_MarketHistory.type_id == 34)).execute()
+        M_MarketHistory.insert_many(make_history(34, 300, 400) + make_history(35, 10, 50)).execute()
+        series = HistorySeries.update_types(TEST_REGION_ID, [34, 35])
+        assert HistorySeries.get(TEST_REGION_ID) is series
+        assert old_series.get_indicator_dict([34])[34]['last_price'] == 200
+        assert series.type_ids.tolist() == [34, 35, 36]
+        assert series.get_indicator_dict([36]) == old_36
+
+        expect = HistorySeries(TEST_REGION_ID, series.anchor_date).load()
+        for attr in ['price', 'volume', 'ma_short', 'ma_long', 'ema', 'volatility', 'volume_pct', 'change']:
+            np.testing.assert_array_equal(getattr(series, attr), getattr(expect, attr))
+        assert series.get_indicator_dict([34, 35, 36]) == expect.get_indicator_dict([34, 35, 36])
+    finally:
+        M_MarketHistory.delete().where(M_MarketHistory.region_id == TEST_REGION_ID).execute()
+        HistorySeries.series_dict.pop(TEST_REGION_ID, None)
+
+
+def test_update_types_without_series(kahuna_world):
+    HistorySeries.series_dict.pop(TEST_REGION_ID, None)
+    assert HistorySeries.update_types(TEST_REGION_ID, [34]) is None
+    assert TEST_REGION_ID not in HistorySeries.series_dict
+
+
+def test_type_refresh_does_not_rebuild_region(kahuna_world, monkeypatch):
+    """ 交互查询下载单个物品的历史后只合并该物品，不重新建立整个区域 """
+    from src.service.market_server import marker
+
+    def rebuild(region_id):
+        raise AssertionError('region series rebuilt')
+
+    update_list = []
+    monkeypatch.setattr(marker.HistoryStore, 'refresh', lambda region_id, type_id_list: {34})
+    monkeypatch.setattr(marker.HistorySummary, 'update', lambda region_id, type_id_list: None)
+    monkeypatch.setattr(HistorySeries, 'refresh', rebuild)
+    monkeypatch.setattr(HistorySeries, 'update_types',
+                        lambda region_id, type_id_list: update_list.append((region_id, set(type_id_list))))
+    MarketHistory.refresh_type_history_in_region(34, REGION_FORGE_ID)
+    assert update_list == [(REGION_FORGE_ID, {34})]
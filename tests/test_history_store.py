@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.service.database_server.model import MarketHistory as M_MarketHistory, MarketHistoryState
+from src.service.market_server import history_store
+from src.service.market_server.history_store import HistoryStore
+
+TEST_REGION_ID = 10000098
+# 日更时间 utc 11:05
+ROLLOVER = datetime(2026, 3, 10, 11, 5)
+
+
+@pytest.fixture
+def region(kahuna_world, monkeypatch):
+    now = {'value': ROLLOVER + timedelta(minutes=30)}
+    monkeypatch.setattr(history_store, 'utc_now', lambda: now['value'])
+    yield now
+    M_MarketHistory.delete().where(M_MarketHistory.region_id == TEST_REGION_ID).execute()
+    MarketHistoryState.delete().where(MarketHistoryState.region_id == TEST_REGION_ID).execute()
+
+
+def make_result(last_date: datetime, day_count: int) -> list:
+    return [{'date': (last_date - timedelta(days=day)).strftime('%Y-%m-%d'), 'average': 100 + day,
+             'highest': 110, 'lowest': 90, 'order_count': 5, 'volume': 1000 + day}
+            for day in range(day_count)]
+
+
+@pytest.fixture
+def fake_esi(monkeypatch):
+    """ {type_id: 历史列表}，None表示请求失败 """
+    result_dict = dict()
+    request_list = []
+
+    def request_many(esi_request_list):
+        request_list.append(sorted(request.params['type_id'] for request in esi_request_list))
+        return [(result_dict.get(request.params['type_id'], None), 0) for request in esi_request_list]
+
+    monkeypatch.setattr(history_store.EsiTransport, 'request_many', request_many)
+    return result_dict, request_list
+
+
+@pytest.mark.parametrize('now, expect', [
+    (datetime(2026, 3, 10, 11, 4, 59), datetime(2026, 3, 9, 11, 5)),
+    (datetime(2026, 3, 10, 11, 5), datetime(2026, 3, 10, 11, 5)),
+    (datetime(2026, 3, 10, 23, 59), datetime(2026, 3, 10, 11, 5)),
+    (datetime(2026, 3, 11, 0, 1), datetime(2026, 3, 10, 11, 5)),
+])
+def test_rollover_time(now, expect):
+    assert HistoryStore.get_rollover_time(now) == expect
+
+
+def test_stale_type_around_rollover(region):
+    MarketHistoryState.insert_many([
+        {'region_id': TEST_REGION_ID, 'type_id': 34, 'last_date': None, 'fetch_time': None},
+        {'region_id': TEST_REGION_ID, 'type_id': 35, 'last_date': None, 'fetch_time': ROLLOVER - timedelta(minutes=1)},
+        {'region_id': TEST_REGION_ID, 'type_id': 36, 'last_date': None, 'fetch_time': ROLLOVER + timedelta(minutes=1)},
+    ]).execute()
+    # 日更之后：从未请求与日更前请求的物品需要刷新
+    assert set(HistoryStore.get_stale_type(TEST_REGION_ID)) == {34, 35}
+    assert set(HistoryStore.get_stale_type(TEST_REGION_ID, [35, 36])) == {35}
+
+    # 日更之前：以前一天的日更为界，35在前一天日更后已请求过
+    region['value'] = ROLLOVER - timedelta(minutes=2)
+    assert set(HistoryStore.get_stale_type(TEST_REGION_ID)) == {34}
+
+    # 第二天日更后全部需要刷新
+    region['value'] = ROLLOVER + timedelta(days=1, minutes=1)
+    assert set(HistoryStore.get_stale_type(TEST_REGION_ID)) == {34, 35, 36}
+
+
+def test_track_starts_from_stored_date(region):
+    last_date = datetime(2026, 3, 5)
+    M_MarketHistory.insert_many([dict(row, date=datetime.strptime(row['date'], '%Y-%m-%d'),
+                                      type_id=34, region_id=TEST_REGION_ID)
+                                 for row in make_result(last_date, 3)]).execute()
+    HistoryStore.track([34, 35, None], TEST_REGION_ID)
+    HistoryStore.track([34], TEST_REGION_ID)
+    state_dict = {state.type_id: state for state in
+                  MarketHistoryState.select().where(MarketHistoryState.region_id == TEST_REGION_ID)}
+    assert set(state_dict) == {34, 35}
+    assert state_dict[34].last_date == last_date
+    assert state_dict[35].last_date is None and state_dict[35].fetch_time is None
+
+
+def test_refresh_appends_new_days_only(region, fake_esi):
+    result_dict, request_list = fake_esi
+    stored_date = datetime(2026, 3, 7)
+    M_MarketHistory.insert_many([dict(row, date=datetime.strptime(row['date'], '%Y-%m-%d'),
+                                      type_id=34, region_id=TEST_REGION_ID)
+                                 for row in make_result(stored_date, 30)]).execute()
+    HistoryStore.track([34, 35, 36], TEST_REGION_ID)
+
+    # esi返回的历史与已入库的日期重叠，36请求失败
+    new_date = datetime(2026, 3, 9)
+    result_dict[34] = make_result(new_date, 10)
+    result_dict[35] = make_result(new_date, 4)
+    assert HistoryStore.refresh(TEST_REGION_ID) == {34, 35}
+    assert request_list == [[34, 35, 36]]
+
+    def get_dates(type_id):
+        return [row.date for row in M_MarketHistory.select(M_MarketHistory.date)
+                .where((M_MarketHistory.region_id == TEST_REGION_ID) & (M_MarketHistory.type_id == type_id))
+                .order_by(M_MarketHistory.date)]
+
+    dates_34 = get_dates(34)
+    assert len(dates_34) == len(set(dates_34)) == 32
+    assert dates_34[-2:] == [datetime(2026, 3, 8), new_date]
+    # 已入库的日期保留原值，不被esi返回的数据覆盖
+    stored = M_MarketHistory.get((M_MarketHistory.region_id == TEST_REGION_ID) & (M_MarketHistory.type_id == 34) &
+                                 (M_MarketHistory.date == stored_date))
+    assert stored.average == 100
+    assert len(get_dates(35)) == 4
+
+    state_dict = {state.type_id: state for state in
+                  MarketHistoryState.select().where(MarketHistoryState.region_id == TEST_REGION_ID)}
+    assert state_dict[34].last_date == new_date and state_dict[35].last_date == new_date
+    assert state_dict[34].fetch_time == region['value']
+    # 请求失败的物品不更新请求时间，下次刷新重试
+    assert state_dict[36].fetch_time is None
+
+    # 同一日更周期内只重试失败的物品
+    result_dict[36] = make_result(new_date, 2)
+    assert HistoryStore.refresh(TEST_REGION_ID) == {36}
+    assert request_list[-1] == [36]
+    assert HistoryStore.refresh(TEST_REGION_ID) == set()
+    assert len(request_list) == 2
+
+    # 下一次日更后再次请求，只追加新的一天
+    region['value'] += timedelta(days=1)
+    next_date = new_date + timedelta(days=1)
+    result_dict[34] = make_result(next_date, 10)
+    assert 34 in HistoryStore.refresh(TEST_REGION_ID, [34])
+    assert get_dates(34) == dates_34 + [next_date]
@@ -0,0 +1,51 @@
+import time
+from datetime import timedelta
+
+import pytest
+
+from src.service.database_server.model import MarketHistory as M_MarketHistory, MarketHistorySummary
+from src.service.database_server.writer import CacheWriter
+from src.service.market_server.history_summary import HistorySummary
+
+TEST_REGION_ID = 10000098
+
+
+@pytest.fixture
+def history(kahuna_world):
+    anchor = HistorySummary.get_anchor_date()
+    M_MarketHistory.insert_many([
+        {'region_id': TEST_REGION_ID, 'type_id': 34, 'date': anchor - timedelta(days=day), 'average': 10,
+         'highest': 12, 'lowest': 8, 'order_count': 1, 'volume': 100}
+        for day in range(40)]).execute()
+    yield anchor
+    M_MarketHistory.delete().where(M_MarketHistory.region_id == TEST_REGION_ID).execute()
+    MarketHistorySummary.delete().where(MarketHistorySummary.region_id == TEST_REGION_ID).execute()
+
+
+def get_saved():
+    return MarketHistorySummary.get_or_none((MarketHistorySummary.region_id == TEST_REGION_ID) &
+                                            (MarketHistorySummary.type_id == 34))
+
+
+def test_get_summary_does_not_wait_for_writer(history):
+    busy = CacheWriter.submit(time.sleep, 0.5)
+    start = time.perf_counter()
+    summary = HistorySummary.get_summary(TEST_REGION_ID, [34, 35])
+    assert time.perf_counter() - start < 0.4
+    assert get_saved() is None
+
+    # 窗口为(anchor-7, anchor]与(anchor-30, anchor]
+    assert summary[34]['week_volume'] == 700
+    assert summary[34]['weekflow'] == 7000
+    assert summary[34]['month_volume'] == 3000
+    assert summary[34]['month_highset_aver'] == 12
+    assert summary[35]['month_volume'] == 0
+
+    busy.result()
+    CacheWriter.run(lambda: None)
+    assert get_saved().month_volume == 3000
+
+
+def test_update_waits_for_save(history):
+    HistorySummary.update(TEST_REGION_ID, [34])
+    assert get_saved().anchor_date == history
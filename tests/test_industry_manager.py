@@ -0,0 +1,126 @@
+import pytest
+
+from src.service.database_server.model import AssetCache as M_AssetCache, IndustryJobsCache as M_IndustryJobsCache
+from src.service.industry_server.industry_analyse import IndustryAnalyser
+from src.service.industry_server.industry_manager import IndustryManager
+from src.service.market_server.marker import Market
+from src.utils import KahunaException
+from src.utils.refresh_signal import RefreshSignal
+
+from tests import world
+
+
+def test_create_plan_analyser_follows_plan_signature(kahuna_world, user, monkeypatch):
+    IndustryAnalyser.analyser_cache.clear()
+    analyser = IndustryManager.create_plan_analyser(user, world.PLAN_NAME)
+    assert analyser.analysed_status
+    assert IndustryManager.create_plan_analyser(user, world.PLAN_NAME) is analyser
+    assert IndustryAnalyser.get_analyser_by_plan(user, world.PLAN_NAME) is analyser
+
+    # 计划内容变化后不能继续使用旧的分析
+    plan_dict = user.user_data.plan[world.PLAN_NAME]
+    monkeypatch.setitem(plan_dict, 'plan', plan_dict['plan'] + [['Rifter', 3]])
+    changed = IndustryManager.create_plan_analyser(user, world.PLAN_NAME)
+    assert changed is not analyser
+    assert changed.plan_list[-1] == ['Rifter', 3]
+    assert ('root', 587) in {(father, child) for father, child, data in changed.bp_graph.out_edges('root', data=True)
+                             if data['index'] == 3}
+    IndustryAnalyser.analyser_cache.clear()
+
+
+def get_graph_state(analyser) -> dict:
+    state = dict()
+    for graph_name in ['work_graph', 'global_graph']:
+        for node, data in getattr(analyser, graph_name).nodes(data=True):
+            state[(graph_name, node)] = (
+                data.get('quantity'), data.get('index_quantity'), data.get('is_material'),
+                data.get('buy_cost'), data.get('eiv_cost'),
+                [(work.runs, work.mater_eff, work.avaliable) for work in data.get('work_list', [])])
+    return state
+
+
+@pytest.fixture
+def cached_analyser(kahuna_world, user, monkeypatch):
+    """ 已完成分析的缓存分析器，之后的刷新不能再完整分析 """
+    IndustryAnalyser.analyser_cache.clear()
+    analyser = IndustryManager.create_plan_analyser(user, world.PLAN_NAME)
+    monkeypatch.setattr(analyser, 'analyse_progress_work_type', None)
+    yield analyser
+    IndustryAnalyser.analyser_cache.clear()
+
+
+def check_refresh_matches_full(analyser, user):
+    bp_graph = analyser.bp_graph
+    before = get_graph_state(analyser)
+    analyser.refresh_analyse()
+    assert get_graph_state(analyser) != before
+    assert analyser.analysed_status and analyser.bp_graph is bp_graph
+    assert analyser.signal_version == RefreshSignal.snapshot()
+
+    fresh = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    fresh.analyse_progress_work_type(fresh.plan_list)
+    assert get_graph_state(analyser) == get_graph_state(fresh)
+
+
+def test_refresh_after_asset_change(cached_analyser, user):
+    asset = M_AssetCache.get(M_AssetCache.item_id == 8001)
+    M_AssetCache.update(quantity=5).where(M_AssetCache.item_id == 8001).execute()
+    try:
+        RefreshSignal.publish('asset', {asset.type_id})
+        check_refresh_matches_full(cached_analyser, user)
+        assert cached_analyser.asset_dict[asset.type_id] == 5
+    finally:
+        M_AssetCache.update(quantity=asset.quantity).where(M_AssetCache.item_id == 8001).execute()
+        RefreshSignal.publish('asset', {asset.type_id})
+
+
+def test_refresh_after_job_change(cached_analyser, user):
+    job = M_IndustryJobsCache.get(M_IndustryJobsCache.job_id == 1)
+    M_IndustryJobsCache.update(runs=job.runs + 5).where(M_IndustryJobsCache.job_id == 1).execute()
+    try:
+        RefreshSignal.publish('running_job', {job.product_type_id})
+        check_refresh_matches_full(cached_analyser, user)
+        assert cached_analyser.running_job[job.product_type_id] == job.runs + 5
+    finally:
+        M_IndustryJobsCache.update(runs=job.runs).where(M_IndustryJobsCache.job_id == 1).execute()
+        RefreshSignal.publish('running_job', {job.product_type_id})
+
+
+def test_refresh_after_market_change(cached_analyser, user, monkeypatch):
+    old_cost = cached_analyser.global_graph.nodes[34]['buy_cost']
+    get_rouge = Market.get_type_order_rouge
+
+    def double_tritanium(market, type_id):
+        bid, ask = get_rouge(market, type_id)
+        return (bid * 2, ask * 2) if type_id == 34 else (bid, ask)
+
+    monkeypatch.setattr(Market, 'get_type_order_rouge', double_tritanium)
+    RefreshSignal.publish('market', {34})
+    check_refresh_matches_full(cached_analyser, user)
+    assert cached_analyser.global_graph.nodes[34]['buy_cost'] == pytest.approx(old_cost * 2)
+
+
+def test_refresh_failure_cleans_analyser(cached_analyser, user, monkeypatch):
+    def fail(node, cache_dict):
+        raise KahunaException('refresh failed')
+
+    asset = M_AssetCache.get(M_AssetCache.item_id == 8001)
+    M_AssetCache.update(quantity=5).where(M_AssetCache.item_id == 8001).execute()
+    try:
+        monkeypatch.setattr(cached_analyser, 'calculate_work_bpnode_quantity', fail)
+        RefreshSignal.publish('asset', {asset.type_id})
+        with pytest.raises(KahunaException):
+            cached_analyser.refresh_analyse()
+        assert not cached_analyser.analysed_status
+        assert cached_analyser.bp_graph.number_of_nodes() == 0
+
+        # 下次使用时完整重新分析
+        monkeypatch.undo()
+        assert IndustryManager.create_plan_analyser(user, world.PLAN_NAME) is cached_analyser
+        assert cached_analyser.analysed_status
+        fresh = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+        fresh.analyse_progress_work_type(fresh.plan_list)
+        assert get_graph_state(cached_analyser) == get_graph_state(fresh)
+    finally:
+        M_AssetCache.update(quantity=asset.quantity).where(M_AssetCache.item_id == 8001).execute()
+        RefreshSignal.publish('asset', {asset.type_id})
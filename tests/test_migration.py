@@ -0,0 +1,63 @@
+from src.service.database_server.connect import DatabaseConectManager
+from src.service.database_server.migration import SchemaMigration
+from src.service.database_server.model import MarketOrderCache
+from src.service.database_server.query_audit import QueryPlanAudit
+
+from tests import world
+
+
+def get_schema(db) -> dict:
+    return {table_name: SchemaMigration.get_index_dict(db, table_name) for table_name in db.get_tables()}
+
+
+def test_migration_applies_to_old_database(kahuna_world):
+    db = DatabaseConectManager.cache_db()
+    latest = max(migration.version for migration in SchemaMigration.migration_list if migration.db_name == 'cache')
+    order_count = MarketOrderCache.select().count()
+
+    dropped = world.drop_secondary_index()
+    assert ('market_order_cache', ('location_id',)) in dropped
+    assert ('asset_cache', ('owner_id', 'asset_type')) in dropped
+    assert SchemaMigration.get_version(db) == 0
+    assert any(data['scan'] for data in QueryPlanAudit.audit(repeat=1))
+
+    # 启动时只执行非deferred迁移，建立索引留到预热
+    SchemaMigration.run()
+    assert SchemaMigration.get_version(db) == 0
+    assert ('location_id',) not in SchemaMigration.get_index_dict(db, 'market_order_cache')
+
+    SchemaMigration.run(deferred=True)
+    assert SchemaMigration.get_version(db) == latest
+    for table_name, columns in dropped:
+        assert columns in SchemaMigration.get_index_dict(db, table_name)
+    assert MarketOrderCache.select().count() == order_count
+    # 审计使用的只读连接在迁移前已打开，迁移后的计划也要使用新索引
+    assert not any(data['scan'] for data in QueryPlanAudit.audit(repeat=1))
+
+
+def test_migration_idempotent(kahuna_world):
+    db = DatabaseConectManager.cache_db()
+    SchemaMigration.run(deferred=True)
+    schema = get_schema(db)
+    version = SchemaMigration.get_version(db)
+
+    # 已是最新版本时不执行任何迁移
+    SchemaMigration.run(deferred=True)
+    assert get_schema(db) == schema
+    assert SchemaMigration.get_version(db) == version
+
+    # 版本号丢失时重新执行迁移也不重复建立索引
+    db.execute_sql('PRAGMA user_version = 0')
+    SchemaMigration.run(deferred=True)
+    assert get_schema(db) == schema
+    assert SchemaMigration.get_version(db) == version
+
+
+def test_warm_up_applies_deferred_migration(kahuna_world):
+    from src.service import warm_up
+
+    db = DatabaseConectManager.cache_db()
+    world.drop_secondary_index()
+    warm_up()
+    assert ('location_id',) in SchemaMigration.get_index_dict(db, 'market_order_cache')
+    assert SchemaMigration.get_version(db) > 0
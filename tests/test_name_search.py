@@ -0,0 +1,74 @@
+import pytest
+from thefuzz import fuzz, process
+
+from src.service.sde_service.name_search import NameSearch
+from src.service.sde_service.utils import SdeUtils
+
+
+@pytest.fixture(scope='module')
+def en_index(kahuna_world):
+    return NameSearch.get(False)
+
+
+@pytest.fixture(scope='module')
+def zh_index(kahuna_world):
+    return NameSearch.get(True)
+
+
+@pytest.fixture(scope='module')
+def pinyin(zh_index):
+    pytest.importorskip('pypinyin')
+    if zh_index.pinyin_index is None:
+        pytest.skip('拼音索引未建立')
+
+
+def test_search_exact_and_typo(en_index):
+    assert NameSearch.search('Tritanium')[0] == ('Tritanium', 100)
+    assert NameSearch.search('tritanum')[0][0] == 'Tritanium'
+    assert NameSearch.search('Water Heavy')[0][0] == 'Heavy Water'
+    assert NameSearch.search('三钛合金', zh=True)[0] == ('三钛合金', 100)
+    assert NameSearch.search('') == []
+
+
+def test_score_matches_full_extract(en_index, zh_index):
+    """ 候选筛选后的最高分与对全部名称打分的process.extract一致 """
+    query_list = [(query, False) for query in ['Tritanium', 'pyrite', 'nitrogen block', 'Fuel Block', 'Ozone liquid']]
+    query_list += [(query, True) for query in ['三钛合金', '燃料块', '液态', '碳氢']]
+    for query, zh in query_list:
+        index = zh_index if zh else en_index
+        expect = process.extract(query, index.name_list, scorer=fuzz.token_sort_ratio, limit=1)[0]
+        assert NameSearch.search(query, zh=zh)[0][1] == expect[1]
+
+
+def test_en_search_has_no_pinyin(pinyin):
+    for query in ['santaihejin', 'sthj', 'dan']:
+        for name, _ in NameSearch.search(query, limit=10):
+            assert name.isascii()
+        for name in NameSearch.complete(query, limit=10):
+            assert name.isascii()
+    assert SdeUtils.fuzz_type('santaihejin', 10) == SdeUtils.fuzz_en_type('santaihejin', 10)
+    assert all(name.isascii() for name in SdeUtils.fuzz_type('santaihejin', 10))
+
+
+def test_zh_pinyin_search(pinyin):
+    assert NameSearch.search('santaihejin', zh=True)[0][0] == '三钛合金'
+    assert NameSearch.search('sthj', zh=True)[0][0] == '三钛合金'
+    assert NameSearch.search('danranliaokuai', zh=True)[0][0] == '氮燃料块'
+
+
+def test_zh_pinyin_complete(pinyin):
+    assert NameSearch.complete('santai', zh=True) == ['三钛合金']
+    assert NameSearch.complete('sth', zh=True) == ['三钛合金']
+    assert SdeUtils.complete_type('santai', zh=True) == ['三钛合金']
+    assert SdeUtils.complete_type('santai') == []
+    assert SdeUtils.complete_type('三钛') == ['三钛合金']
+
+
+def test_complete_order(en_index):
+    res = NameSearch.complete('t', limit=50)
+    expect = sorted((name for name in en_index.name_list if name.lower().startswith('t')),
+                    key=lambda name: (len(name), name.lower()))
+    assert res == expect[:50]
+    assert NameSearch.complete('Trit') == ['Tritanium']
+    assert NameSearch.complete('zzzz') == []
+    assert len(NameSearch.complete('', limit=3)) == 0
@@ -0,0 +1,136 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from peewee import fn
+
+from src.service.database_server.model import MarketOrderCache
+from src.service.market_server.order_book import OrderBook
+
+from tests import world
+
+
+def brute_fill(level_list: list, quantity: int):
+    """ 逐档吃单的参考实现 level_list: [(price, volume)] 由优到劣 """
+    remain = quantity
+    cost = 0
+    marginal = 0
+    for price, volume in level_list:
+        if remain <= 0:
+            break
+        take = min(remain, volume)
+        cost += take * price
+        marginal = price
+        remain -= take
+    filled = quantity - remain
+    return cost / filled, marginal, filled
+
+
+def get_level_list(price: float, side: str):
+    volume = 100000 if price < 10000 else 50
+    if side == 'buy':
+        return [(round(price, 2), volume), (round(price * 1.05, 2), volume), (round(price * 1.25, 2), volume * 10)]
+    return [(round(price * 0.95, 2), volume), (round(price * 0.9, 2), volume)]
+
+
+@pytest.fixture(scope='module')
+def book(kahuna_world):
+    return OrderBook(world.JITA_LOCATION_ID).load()
+
+
+@pytest.mark.parametrize('side', ['buy', 'sell'])
+@pytest.mark.parametrize('ratio', [0.001, 0.5, 1, 1.5, 2, 7, 12, 13, 100])
+def test_fill_price_matches_level_walk(book, kahuna_world, side, ratio):
+    for type_id in [34, 4051, 11371]:
+        level_list = get_level_list(kahuna_world['price_dict'][type_id], side)
+        quantity = max(1, int(level_list[0][1] * ratio))
+        average, marginal, filled = book.fill_price(type_id, quantity, side)
+        expect_average, expect_marginal, expect_filled = brute_fill(level_list, quantity)
+        assert filled == expect_filled
+        assert average == pytest.approx(expect_average, rel=1e-12)
+        assert marginal == expect_marginal
+
+
+def test_fill_price_boundary(book, kahuna_world):
+    price_list = get_level_list(kahuna_world['price_dict'][34], 'buy')
+    volume = price_list[0][1]
+    # 恰好吃完第一档时边际价格仍为第一档
+    assert book.fill_price(34, volume, 'buy')[1] == price_list[0][0]
+    assert book.fill_price(34, volume + 1, 'buy')[1] == price_list[1][0]
+    # 深度不足，只成交全部挂单
+    total = sum(level_volume for _, level_volume in price_list)
+    assert book.fill_price(34, total * 2, 'buy')[2] == total
+    assert book.get_fill_cost(34, total * 2, 'buy') == pytest.approx(
+        brute_fill(price_list, total)[0] * total + price_list[-1][0] * total)
+
+
+def test_fill_price_invalid(book):
+    assert book.fill_price(34, 0) == (0, 0, 0)
+    assert book.fill_price(None, 10) == (0, 0, 0)
+    assert book.fill_price(-1, 10) == (0, 0, 0)
+    assert book.fill_price(book.size + 10, 10) == (0, 0, 0)
+    # 没有订单的type
+    assert book.fill_price(1, 10) == (0, 0, 0)
+
+
+def test_best_price_and_depth(book, kahuna_world):
+    price = kahuna_world['price_dict'][34]
+    assert book.get_rouge(34) == (round(price * 0.95, 2), round(price, 2))
+    assert book.get_depth(34) == (200000, 1200000, 2, 3)
+
+
+SIDE_LOCATION_ID = 60077777
+
+
+def db_rouge(location_id: int, type_id: int) -> tuple:
+    """ 订单簿之前逐物品查询数据库的最高收单价与最低出单价 """
+    query = MarketOrderCache.select().where((MarketOrderCache.type_id == type_id) &
+                                            (MarketOrderCache.location_id == location_id))
+    max_buy = query.where(MarketOrderCache.is_buy_order == True).select(fn.MAX(MarketOrderCache.price)).scalar()
+    min_sell = query.where(MarketOrderCache.is_buy_order == False).select(fn.MIN(MarketOrderCache.price)).scalar()
+    if not max_buy or not min_sell:
+        return 0, 0
+    return float(max_buy), float(min_sell)
+
+
+@pytest.fixture
+def side_book(kahuna_world):
+    """ 34双边、35与38只有收单、36只有出单、37没有订单 """
+    order_list = [(34, True, 4.5), (34, True, 4.8), (34, False, 5.5), (34, False, 5.2),
+                  (35, True, 9.0), (35, True, 9.5), (36, False, 20.0), (36, False, 19.0), (38, True, 1.0)]
+    MarketOrderCache.insert_many([
+        {'duration': 90, 'is_buy_order': is_buy, 'issued': datetime(2026, 1, 1), 'location_id': SIDE_LOCATION_ID,
+         'min_volume': 1, 'order_id': 7100000000 + index, 'price': price, 'range': 'region',
+         'system_id': 30000142, 'type_id': type_id, 'volume_remain': 10, 'volume_total': 10}
+        for index, (type_id, is_buy, price) in enumerate(order_list)]).execute()
+    yield OrderBook(SIDE_LOCATION_ID).load()
+    MarketOrderCache.delete().where(MarketOrderCache.location_id == SIDE_LOCATION_ID).execute()
+
+
+def test_rouge_one_side_and_missing(side_book):
+    assert side_book.get_rouge(34) == (4.8, 5.2)
+    # 任一方向无订单时与数据库查价一致返回(0, 0)
+    for type_id in [35, 36, 37, 38, 0, -1, side_book.size, side_book.size + 100, None]:
+        assert side_book.get_rouge(type_id) == (0, 0)
+    for type_id in [34, 35, 36, 37, 38, 39, 1]:
+        assert side_book.get_rouge(type_id) == db_rouge(SIDE_LOCATION_ID, type_id)
+    # 各自方向的最优价保留单边订单
+    bid, ask = side_book.get_best_array(np.array([34, 35, 36, 37, 1000]))
+    assert bid.tolist() == [4.8, 9.5, 0, 0, 0]
+    assert ask.tolist() == [5.2, 0, 19.0, 0, 0]
+
+
+def test_rouge_array_matches_single(side_book, book):
+    type_id_list = [36, 34, 35, 37, 34, -5, side_book.size + 3, 38]
+    bid, ask = side_book.get_rouge_array(type_id_list)
+    assert bid.dtype == ask.dtype == np.float64
+    assert list(zip(bid.tolist(), ask.tolist())) == [side_book.get_rouge(type_id) for type_id in type_id_list]
+    bid, ask = side_book.get_rouge_array([])
+    assert len(bid) == len(ask) == 0
+
+    # 吉他全部有订单的type与数据库查价一致
+    type_id_list = sorted({type_id for type_id, in MarketOrderCache.select(MarketOrderCache.type_id)
+                           .where(MarketOrderCache.location_id == world.JITA_LOCATION_ID).tuples()})
+    bid, ask = book.get_rouge_array(type_id_list)
+    assert list(zip(bid.tolist(), ask.tolist())) == [db_rouge(world.JITA_LOCATION_ID, type_id)
+                                                     for type_id in type_id_list]
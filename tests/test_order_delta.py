@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import pytest
+
+from src.service.database_server.model import MarketOrder, MarketOrderCache
+from src.service.industry_server.industry_analyse import IndustryAnalyser
+from src.service.market_server.marker import Market
+from src.service.market_server.market_manager import MarketManager
+from src.service.market_server.order_book import OrderBook
+from src.service.market_server.order_delta import OrderDeltaRefresh
+from src.utils.refresh_signal import RefreshSignal
+
+from tests import world
+
+TEST_LOCATION_ID = 60099999
+OTHER_LOCATION_ID = 60088888
+
+
+def make_order(order_id: int, type_id: int, price: float, volume: int, location_id: int = TEST_LOCATION_ID) -> dict:
+    return {'duration': 90, 'is_buy_order': False, 'issued': datetime(2026, 1, 1), 'location_id': location_id,
+            'min_volume': 1, 'order_id': order_id, 'price': price, 'range': 'region', 'system_id': 30000142,
+            'type_id': type_id, 'volume_remain': volume, 'volume_total': volume}
+
+
+def get_location_orders() -> dict:
+    return {int(row.order_id): (row.type_id, float(row.price), row.volume_remain)
+            for row in MarketOrderCache.select().where(MarketOrderCache.location_id == TEST_LOCATION_ID)}
+
+
+@pytest.fixture
+def location(kahuna_world):
+    """ 缓存表中的测试位置：1 不变，2 改价，3 改数量，4 已消失 """
+    MarketOrderCache.insert_many([make_order(1, 34, 5.0, 100), make_order(2, 35, 10.0, 100),
+                                  make_order(3, 36, 20.0, 100), make_order(4, 37, 30.0, 100)]).execute()
+    yield TEST_LOCATION_ID
+    MarketOrderCache.delete().where(MarketOrderCache.location_id == TEST_LOCATION_ID).execute()
+
+
+def get_pages() -> list:
+    return [[make_order(1, 34, 5.0, 100), make_order(2, 35, 9.5, 100)],
+            [make_order(3, 36, 20.0, 60), make_order(5, 38, 7.0, 10),
+             # 其他位置的订单不参与比对
+             make_order(6, 39, 1.0, 10, OTHER_LOCATION_ID)]]
+
+
+def test_diff_insert_update_delete(location):
+    delta = OrderDeltaRefresh(MarketOrderCache, location)
+    delta.load_snapshot()
+    delta.diff(iter(get_pages()), max_page=2)
+    assert [order['order_id'] for order in delta.insert_list] == [5]
+    snapshot = delta.snapshot
+    assert [(price, volume, row_id) for price, volume, _, row_id in delta.update_list] == \
+           [(9.5, 100, snapshot[2][0]), (20.0, 60, snapshot[3][0])]
+    assert delta.delete_list == [snapshot[4][0]]
+    assert delta.changed_type == {35, 36, 37, 38}
+
+    delta.apply()
+    assert get_location_orders() == {1: (34, 5.0, 100), 2: (35, 9.5, 100), 3: (36, 20.0, 60), 5: (38, 7.0, 10)}
+    assert not MarketOrderCache.select().where(MarketOrderCache.location_id == OTHER_LOCATION_ID).exists()
+
+
+def test_run_twice_is_stable(location):
+    assert OrderDeltaRefresh(MarketOrderCache, location).run(iter(get_pages()), 2) == {35, 36, 37, 38}
+    delta = OrderDeltaRefresh(MarketOrderCache, location)
+    assert delta.run(iter(get_pages()), 2) == set()
+    assert not delta.insert_list and not delta.update_list and not delta.delete_list
+
+
+def test_failed_page_skips_delete(location):
+    """ 有页面请求失败时无法判断订单是否已消失，只写入新增与变化 """
+    delta = OrderDeltaRefresh(MarketOrderCache, location)
+    changed = delta.run(iter(get_pages()), max_page=3)
+    assert delta.delete_list == []
+    assert changed == {35, 36, 38}
+    assert set(get_location_orders()) == {1, 2, 3, 4, 5}
+
+
+@pytest.fixture
+def delta_market(kahuna_world, monkeypatch):
+    """ 增量刷新时吉他34降价、35订单变化但最优价不变 """
+    MarketManager.ensure_init()
+    jita = MarketManager.get_market_by_type('jita')
+    best_ask = jita.get_type_order_rouge(34)[1]
+
+    def get_market_order_delta(market):
+        if market.market_type != 'jita':
+            return set()
+        MarketOrderCache.insert_many([make_order(7000000001, 34, best_ask - 1, 10, world.JITA_LOCATION_ID),
+                                      make_order(7000000002, 35, 1e9, 10, world.JITA_LOCATION_ID)]).execute()
+        return {34, 35}
+
+    monkeypatch.setattr(Market, 'get_market_order_delta', get_market_order_delta)
+    monkeypatch.setattr(MarketManager, 'delta_refresh', True)
+    yield best_ask
+    MarketOrderCache.delete().where(MarketOrderCache.order_id << [7000000001, 7000000002]).execute()
+    OrderBook.refresh([world.JITA_LOCATION_ID])
+    MarketManager.invalidate_price_cache(None)
+
+
+def test_refresh_market_delta(delta_market):
+    MarketOrder.insert_many([make_order(1, 34, 5.0, 100)]).execute()
+    IndustryAnalyser.cost_data_cache[('test', 'plan', '[]')] = dict()
+    version = RefreshSignal.get_version('market')
+
+    MarketManager.refresh_market(full=False)
+    # 只有最优价变化的物品通知分析器
+    assert RefreshSignal.changes_since('market', version) == {34}
+    assert MarketManager.get_market_by_type('jita').get_type_order_rouge(34)[1] == delta_market - 1
+    assert len(IndustryAnalyser.cost_data_cache) == 0
+    # 增量刷新不经过staging表，不保留过期快照
+    assert MarketOrder.select().count() == 0
+
+
+def test_refresh_market_delta_without_change(kahuna_world, monkeypatch):
+    MarketManager.ensure_init()
+    monkeypatch.setattr(Market, 'get_market_order_delta', lambda market: set())
+    monkeypatch.setattr(MarketManager, 'delta_refresh', True)
+    IndustryAnalyser.cost_data_cache[('test', 'plan', '[]')] = dict()
+    version = RefreshSignal.get_version('market')
+    MarketManager.refresh_market(full=False)
+    assert RefreshSignal.changes_since('market', version) == set()
+    assert ('test', 'plan', '[]') in IndustryAnalyser.cost_data_cache
+    IndustryAnalyser.cost_data_cache.clear()
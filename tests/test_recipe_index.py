@@ -0,0 +1,28 @@
+from src.service.industry_server.blueprint import BPManager
+from src.service.industry_server.recipe_index import RecipeIndex
+
+from tests import world
+from tests.benchmarks.bench_recipe_index import sql_get_bp_materials, sql_get_product_quantity
+
+
+def test_materials_match_sql(kahuna_world):
+    for product_id in kahuna_world['recipe']:
+        assert RecipeIndex.get_materials(product_id) == sql_get_bp_materials(product_id)
+        assert RecipeIndex.get_product_quantity(product_id) == sql_get_product_quantity(product_id)
+
+
+def test_blueprint_lookup(kahuna_world):
+    assert BPManager.get_bp_id_by_prod_typeid(11371) == 11371 + world.BP_OFFSET
+    assert RecipeIndex.get_product_id(11371 + world.BP_OFFSET) == 11371
+    assert RecipeIndex.is_blueprint(16654 + world.BP_OFFSET)
+    assert not RecipeIndex.has_product(34)
+    assert RecipeIndex.get_materials(34) == dict()
+    assert RecipeIndex.get_product_quantity(34) == 1
+
+
+def test_activity_and_limit(kahuna_world):
+    assert RecipeIndex.get_activity(16670) == (11, 10800)
+    assert RecipeIndex.get_activity(11371) == (1, 20000)
+    assert BPManager.get_production_time(11543) == 600
+    assert RecipeIndex.get_max_production_limit(19720 + world.BP_OFFSET) == 1
+    assert set(RecipeIndex.product_ids()) == set(kahuna_world['recipe'])
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.service.sde_service import snapshot as snapshot_module
+from src.service.sde_service import database as en_model, database_cn as zh_model
+from src.service.sde_service.snapshot import SdeSnapshot, NULL_ID
+
+
+@pytest.fixture(scope='module')
+def snapshot(kahuna_world, tmp_path_factory):
+    """ 重新编译到新文件并映射，检查写入与读取的往返 """
+    path = str(tmp_path_factory.mktemp('snapshot') / 'sde_snapshot_test.bin')
+    SdeSnapshot.build('test', path)
+    return SdeSnapshot(path)
+
+
+def test_types_round_trip(snapshot):
+    for model_module, zh in [(en_model, False), (zh_model, True)]:
+        for row in model_module.InvTypes.select():
+            assert snapshot.get_type_name(row.typeID, zh=zh) == row.typeName
+            record = snapshot.get_type(row.typeID)
+            assert int(record['group_id']) == row.groupID
+            assert int(record['market_group_id']) == (row.marketGroupID or NULL_ID)
+            assert int(record['meta_group_id']) == (row.metaGroupID or NULL_ID)
+            assert float(record['volume']) == row.volume
+    assert snapshot.get_type(999999999) is None
+    assert snapshot.get_type_name(None) is None
+
+
+def test_name_lookup(snapshot):
+    for model_module, zh in [(en_model, False), (zh_model, True)]:
+        expect = dict()
+        for row in model_module.InvTypes.select().order_by(model_module.InvTypes.typeID):
+            expect.setdefault(row.typeName, row.typeID)
+        for name, type_id in expect.items():
+            assert snapshot.get_type_id(name, zh=zh) == type_id
+        assert snapshot.get_type_id(next(iter(expect)) + ' ', zh=zh) is None
+    assert snapshot.get_type_id('') is None
+    assert snapshot.get_type_id('Tritanium', zh=True) is None
+
+
+def test_groups_round_trip(snapshot):
+    for model_module, zh in [(en_model, False), (zh_model, True)]:
+        for row in model_module.InvGroups.select():
+            assert snapshot.get_group_name(row.groupID, zh=zh) == row.groupName
+        for row in model_module.InvCategories.select():
+            assert snapshot.get_category_name(row.categoryID, zh=zh) == row.categoryName
+        for row in model_module.MarketGroups.select():
+            assert snapshot.get_market_group_name(row.marketGroupID, zh=zh) == row.nameID
+            assert snapshot.get_market_group_parent(row.marketGroupID) == (row.parentGroupID or None)
+    for row in en_model.MetaGroups.select():
+        assert snapshot.get_meta_name(row.metaGroupID) == row.nameID
+
+
+def test_recipe_round_trip(snapshot):
+    material_list = [(row.blueprintTypeID, row.activityID, row.materialTypeID, row.quantity)
+                     for row in en_model.IndustryActivityMaterials.select()]
+    assert snapshot.section['materials'].tolist() == material_list
+    product_list = [(row.blueprintTypeID, row.activityID, row.productTypeID, row.quantity)
+                    for row in en_model.IndustryActivityProducts.select()]
+    assert snapshot.section['products'].tolist() == product_list
+
+
+def test_market_name_list(snapshot):
+    expect = sorted(row.typeName for row in en_model.InvTypes.select().where(en_model.InvTypes.marketGroupID > 0))
+    assert sorted(snapshot.get_market_name_list()) == expect
+
+
+def test_load_reuses_snapshot(kahuna_world, monkeypatch):
+    loaded = SdeSnapshot.load()
+    assert loaded.path == SdeSnapshot.get().path
+    np.testing.assert_array_equal(loaded.type_ids, SdeSnapshot.get().type_ids)
+
+    # SDE文件未变化时不重新计算哈希，也不重新编译
+    def fail(*args, **kwargs):
+        raise AssertionError('snapshot rebuilt')
+    monkeypatch.setattr(snapshot_module, 'get_sde_hash', fail)
+    monkeypatch.setattr(SdeSnapshot, 'build', fail)
+    assert SdeSnapshot.load().path == loaded.path
+
+
+def test_reject_other_version(tmp_path, snapshot):
+    path = tmp_path / 'sde_snapshot_bad.bin'
+    data = bytearray(open(snapshot.path, 'rb').read())
+    data[len(snapshot_module.SNAPSHOT_MAGIC)] += 1
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        SdeSnapshot(str(path))
+    assert os.path.exists(snapshot.path)
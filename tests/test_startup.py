@@ -0,0 +1,119 @@
+import sys
+import time
+import multiprocessing
+
+import pytest
+
+from src.service.asset_server.asset_manager import AssetManager
+from src.service.industry_server.industry_config import IndustryConfigManager
+from src.service.market_server.market_manager import MarketManager
+from src.utils.startup_profiler import StartupProfiler
+
+from tests import world
+
+LAZY_MANAGER = ['AssetManager', 'IndustryConfigManager', 'MarketManager']
+
+
+def get_accessor_result() -> tuple:
+    return (sorted(container.asset_location_id for container in AssetManager.get_user_container(world.USER_QQ)),
+            IndustryConfigManager.get_matcher_of_user_by_name(world.BLOCK_MATCHER, world.USER_QQ).matcher_data,
+            MarketManager.get_market_by_type('jita').location_id)
+
+
+def check_lazy_init(conn):
+    """ 子进程中还原为未初始化状态，以lazy方式启动后直接使用各管理器 """
+    from src import service
+    warm_up_list = []
+    service.warm_up = lambda: warm_up_list.append('warm_up')
+    AssetManager.inited = AssetManager.init_asset_status = AssetManager.init_container_status = False
+    AssetManager.asset_dict, AssetManager.container_dict = dict(), dict()
+    IndustryConfigManager.inited = IndustryConfigManager.init_matcher_status = False
+    IndustryConfigManager.matcher_dict = dict()
+    MarketManager.inited = MarketManager.init_status = False
+    MarketManager.market_dict = dict()
+    StartupProfiler.init_time = dict()
+
+    service.init_server(log=False, lazy=True)
+    before = ([AssetManager.inited, IndustryConfigManager.inited, MarketManager.inited],
+              [name for name in LAZY_MANAGER if name in StartupProfiler.init_time])
+    result = get_accessor_result()
+    after = ([AssetManager.inited, IndustryConfigManager.inited, MarketManager.inited],
+             [name for name in LAZY_MANAGER if name in StartupProfiler.init_time])
+    conn.send((warm_up_list, service.init_flag, before, after, result))
+
+
+def test_lazy_server_serves_accessor(kahuna_world):
+    expect = get_accessor_result()
+    assert expect[0] and expect[1]['group']
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.get_context('fork').Process(target=check_lazy_init, args=(child_conn, ))
+    process.start()
+    assert parent_conn.poll(60)
+    warm_up_list, init_flag, before, after, result = parent_conn.recv()
+    process.join(timeout=10)
+    # 启动时不执行warm_up，延后的管理器在首次使用时初始化并计时
+    assert warm_up_list == [] and init_flag
+    assert before == ([False, False, False], [])
+    assert after == ([True, True, True], LAZY_MANAGER)
+    assert result == expect
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(StartupProfiler, 'import_time', dict())
+    monkeypatch.setattr(StartupProfiler, 'init_time', dict())
+    monkeypatch.setattr(StartupProfiler, 'start_time', None)
+    monkeypatch.setattr(StartupProfiler, 'load_time', None)
+    yield StartupProfiler
+    StartupProfiler.stop_import_trace()
+
+
+def test_profiler_records_phases(profiler):
+    with profiler.measure('phase_a'):
+        time.sleep(0.02)
+    # 同名阶段累计，异常时也记录耗时
+    with pytest.raises(ValueError):
+        with profiler.measure('phase_a'):
+            time.sleep(0.02)
+            raise ValueError()
+    with profiler.measure('phase_b'):
+        pass
+    assert list(profiler.init_time) == ['phase_a', 'phase_b']
+    assert profiler.init_time['phase_a'] >= 0.04
+    assert profiler.init_time['phase_b'] < profiler.init_time['phase_a']
+
+    report = profiler.get_report()
+    assert '初始化:' in report
+    assert 'phase_a' in report and 'phase_b' in report
+
+
+def test_profiler_traces_package_import(profiler, tmp_path, monkeypatch):
+    package = tmp_path / 'profiled_pkg'
+    package.mkdir()
+    (package / '__init__.py').write_text('import time\ntime.sleep(0.02)\nfrom . import child\n')
+    (package / 'child.py').write_text('import time\ntime.sleep(0.05)\n')
+    (tmp_path / 'other_pkg.py').write_text('')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    profiler.start_import_trace('profiled_pkg')
+    try:
+        import profiled_pkg
+        import other_pkg
+    finally:
+        profiler.stop_import_trace()
+    assert profiler.finder is None
+    assert profiled_pkg.child is not None and other_pkg is not None
+    # 只统计指定包内的模块，父模块的自身耗时扣除子模块
+    assert set(profiler.import_time) == {'profiled_pkg', 'profiled_pkg.child'}
+    total, own = profiler.import_time['profiled_pkg']
+    child_total, child_own = profiler.import_time['profiled_pkg.child']
+    assert child_total == child_own >= 0.05
+    assert own == pytest.approx(total - child_total)
+    assert own >= 0.02
+
+    profiler.mark_loaded()
+    assert profiler.load_time >= total
+    report = profiler.get_report()
+    assert '插件加载' in report and 'profiled_pkg.child' in report
+    for name in ['profiled_pkg', 'profiled_pkg.child', 'other_pkg']:
+        sys.modules.pop(name, None)
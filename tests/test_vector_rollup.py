@@ -0,0 +1,58 @@
+import pytest
+
+from src.service.industry_server import industry_analyse
+from src.service.industry_server.industry_analyse import IndustryAnalyser
+from src.service.industry_server.vector_rollup import VectorRollup
+from src.service.industry_server.industry_analyse import Work
+
+from tests import world
+
+
+def get_analyser(user, bp_block_level):
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    analyser.bp_block_level = bp_block_level
+    return analyser
+
+
+@pytest.mark.parametrize('bp_block_level', [1, 2])
+@pytest.mark.parametrize('plan_list', [world.PLAN, [['Wolf', 7], ['Hawk', 3], ['Wolf', 2]],
+                                       [['Naglfar', 2], ['Tungsten Carbide Armor Plate', 33]]])
+def test_global_graph_matches_work_type(kahuna_world, user, plan_list, bp_block_level):
+    work_analyser = get_analyser(user, bp_block_level)
+    work_analyser.analyse_progress_work_type(plan_list)
+    vector_analyser = get_analyser(user, bp_block_level)
+    vector_analyser.analyse_progress_vector(plan_list)
+
+    work_graph = work_analyser.global_graph
+    vector_graph = vector_analyser.global_graph
+    assert set(work_graph.nodes) == set(vector_graph.nodes)
+    for node, data in work_graph.nodes(data=True):
+        if node == 'root':
+            continue
+        vector_data = vector_graph.nodes[node]
+        assert vector_data['quantity'] == pytest.approx(data['quantity'], rel=1e-9, abs=1e-9), node
+        assert vector_data['is_material'] == data['is_material']
+        cost_key = 'buy_cost' if data['is_material'] else 'eiv_cost'
+        assert vector_data[cost_key] == pytest.approx(data[cost_key], rel=1e-9, abs=1e-9), node
+        if not data['is_material']:
+            assert [(w.runs, w.mater_eff) for w in vector_data['work_list']] == \
+                   [(w.runs, w.mater_eff) for w in data['work_list']]
+
+
+def test_runs_coefficient_uses_each_work_efficiency():
+    # 两个工作效率不同，超出部分按最后一个工作扣除
+    work_list = [Work(1, mater_eff=0.9, runs=2), Work(1, mater_eff=0.95, runs=5)]
+    eff_runs, plain_runs = VectorRollup.get_runs_coefficient(work_list, 650, 100)
+    assert eff_runs == pytest.approx(2 * 0.9 + 5 * 0.95 - 0.5 * 0.95)
+    assert plain_runs == pytest.approx(6.5)
+    assert VectorRollup.get_runs_coefficient(work_list, 0, 100) == (0, 0)
+
+
+def test_rollup_mode_selects_vector(kahuna_world, user, monkeypatch):
+    work_cost = IndustryAnalyser.signal_async_progress_work_type(user, world.PLAN_NAME, [['Revelation', 2]])
+    monkeypatch.setattr(industry_analyse, 'ROLLUP_MODE', 'vector')
+    monkeypatch.setattr(IndustryAnalyser, 'analyse_progress_work_type', None)
+    vector_cost = IndustryAnalyser.signal_async_progress_work_type(user, world.PLAN_NAME, [['Revelation', 2]])
+    assert vector_cost[1:] == pytest.approx(work_cost[1:], rel=1e-9)
+    detail = IndustryAnalyser.get_cost_detail(user, world.PLAN_NAME, 'Hawk')
+    assert detail['total_cost'] > 0
@@ -0,0 +1,76 @@
+import networkx as nx
+
+from src.service.industry_server.industry_analyse import IndustryAnalyser
+from src.service.sde_service.utils import SdeUtils
+
+from tests import world
+from tests.benchmarks.bench_work_tree import legacy_bfs_bp_tree
+
+
+def legacy_longest_path_dag(dg, node, memo):
+    """ 拓扑排序之前的递归最长路径 """
+    if node in memo:
+        return memo[node]
+    if dg.out_degree(node) == 0:
+        memo[node] = 1
+        dg.nodes[node]['depth'] = 1
+        return 1
+    max_depth = 0
+    for succ in dg.successors(node):
+        max_depth = max(max_depth, legacy_longest_path_dag(dg, succ, memo))
+    memo[node] = max_depth + 1
+    dg.nodes[node]['depth'] = memo[node]
+    return memo[node]
+
+
+def legacy_update_layer_depth(dg, node):
+    """ 拓扑排序之前按路径递归上提层级 """
+    if node != 'root' and dg.nodes[node]['depth'] != 1:
+        depth = 100
+        for pre in dg.predecessors(node):
+            depth = min(depth, dg.nodes[pre]['depth'])
+        dg.nodes[node]['depth'] = depth - 1
+    for succ in dg.successors(node):
+        legacy_update_layer_depth(dg, succ)
+
+
+def edge_set(dg):
+    return sorted((father, child, data['index'], data['quantity']) for father, child, data in dg.edges(data=True))
+
+
+def test_bfs_matches_legacy_expansion(kahuna_world, user):
+    plan_list = world.PLAN + [['Wolf', 1], ['Crystalline Carbonide', 5], ['Naglfar', 1]]
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    bfs_queue = [(index, SdeUtils.get_id_by_name(target), 1) for index, (target, _) in enumerate(plan_list)]
+    legacy_graph = nx.MultiDiGraph()
+    legacy_bfs_bp_tree(analyser, list(bfs_queue), legacy_graph)
+    graph = nx.MultiDiGraph()
+    analyser.bfs_bp_tree(list(bfs_queue), graph)
+    assert edge_set(graph) == edge_set(legacy_graph)
+
+
+def test_layer_depth(kahuna_world, user):
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    graph = analyser.get_work_tree([['Wolf', 1]], nx.MultiDiGraph())
+    # 材料为叶子，父节点总在子节点的上一层或更高
+    assert graph.nodes[34]['depth'] == 1
+    for father, child in graph.edges():
+        assert graph.nodes[father]['depth'] > graph.nodes[child]['depth']
+    # 燃料块在阻断等级2下作为材料，不展开
+    assert graph.out_degree(4051) == 0
+
+
+def test_layer_depth_matches_recursive(kahuna_world, user):
+    plan_list = world.PLAN + [['Crystalline Carbonide', 5], ['Naglfar', 1]]
+    analyser = IndustryAnalyser.create_analyser_by_plan(user, world.PLAN_NAME)
+    graph = analyser.get_work_tree(plan_list, nx.MultiDiGraph())
+    # 共享材料有多个父节点，需要上提层级
+    assert any(graph.in_degree(node) > 1 and graph.out_degree(node) > 0 for node in graph.nodes)
+
+    legacy_graph = graph.copy()
+    for node in legacy_graph.nodes:
+        legacy_graph.nodes[node].pop('depth')
+    legacy_longest_path_dag(legacy_graph, 'root', dict())
+    legacy_update_layer_depth(legacy_graph, 'root')
+    assert {node: legacy_graph.nodes[node]['depth'] for node in legacy_graph.nodes} == \
+           {node: graph.nodes[node]['depth'] for node in graph.nodes}
@@ -0,0 +1,424 @@
+"""
+测试与基准脚本共用的合成数据。
+
+configure() 在临时目录写入config.ini并设置KAHUNA_CONFIG，必须在导入src之前调用。
+build_world() 建立中英文SDE、配置库与缓存库：
+    SDE       矿物、卫星材料、燃料块、中级/合成反应、T2组件、旗舰组件、T1/T2护卫舰与无畏舰
+    配置库    用户与计划、角色、建筑、匹配器、仓库
+    缓存库    蓝图、库存、运行中工作、吉他订单、调整价格、星系成本
+之后以init_server初始化全部服务，与插件启动时相同。
+ship_count / capital_count / filler_count 生成额外的T2舰船、无畏舰与只用于名称搜索的物品，供基准脚本使用。
+"""
+import os
+import json
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+USER_QQ = 10001
+CHARACTER_ID = 2112000001
+PLAN_NAME = 'test'
+SOLAR_SYSTEM_ID = 30000001
+SOTIYO_ID = 1040000000001
+TATARA_ID = 1040000000002
+LOC_BP = 1100000000001
+LOC_MANU = 1100000000002
+LOC_REAC = 1100000000003
+JITA_LOCATION_ID = 60003760
+BP_OFFSET = 1000000
+
+BP_MATCHER = 'test_bp'
+ST_MATCHER = 'test_st'
+BLOCK_MATCHER = 'test_block'
+
+# (categoryID, en, zh)
+CATEGORY = [
+    (4, 'Material', '材料'), (6, 'Ship', '舰船'), (9, 'Blueprint', '蓝图'), (17, 'Commodity', '商品'),
+    (43, 'Planetary Commodities', '行星工业产品'), (65, 'Structure', '建筑'),
+]
+# (groupID, categoryID, en, zh)
+GROUP = [
+    (18, 4, 'Mineral', '矿物'), (427, 4, 'Moon Materials', '卫星材料'),
+    (428, 4, 'Intermediate Materials', '中级材料'), (429, 4, 'Composite', '合成材料'),
+    (423, 4, 'Ice Product', '冰矿产物'), (1136, 4, 'Fuel Block', '燃料块'),
+    (1042, 43, 'Basic Commodities - Tier 1', '基础商品'),
+    (334, 17, 'Construction Components', '建造组件'), (873, 17, 'Capital Construction Components', '旗舰建造组件'),
+    (25, 6, 'Frigate', '护卫舰'), (324, 6, 'Assault Frigate', '突击护卫舰'), (485, 6, 'Dreadnought', '无畏舰'),
+    (1404, 65, 'Engineering Complex', '工程复合体'), (1406, 65, 'Refinery', '精炼厂'),
+    (1001, 9, 'Ship Blueprint', '舰船蓝图'), (1002, 9, 'Component Blueprint', '组件蓝图'),
+    (1003, 9, 'Reaction Formulas', '反应配方'), (1004, 9, 'Fuel Block Blueprint', '燃料块蓝图'),
+    (2000, 4, 'Filler', '填充'),
+]
+# (metaGroupID, name)
+META = [(1, 'Tech I'), (2, 'Tech II')]
+# (marketGroupID, parentGroupID, en, zh)
+MARKET_GROUP = [
+    (1, 0, 'Manufacture & Research', '制造和研究'), (2, 1, 'Materials', '材料'), (3, 2, 'Minerals', '矿物'),
+    (4, 2, 'Raw Moon Materials', '原始卫星材料'), (5, 2, 'Reaction Materials', '反应材料'),
+    (6, 5, 'Intermediate Materials', '中级材料'), (7, 5, 'Composite', '合成材料'), (8, 2, 'Ice Products', '冰矿产物'),
+    (9, 2, 'Fuel Blocks', '燃料块'), (10, 2, 'Planetary Materials', '行星材料'),
+    (11, 1, 'Components', '组件'), (12, 11, 'Advanced Components', '高级组件'),
+    (13, 11, 'Capital Ship Components', '旗舰组件'),
+    (20, 0, 'Ships', '舰船'), (21, 20, 'Frigates', '护卫舰'), (22, 21, 'Standard Frigates', '标准护卫舰'),
+    (23, 21, 'Advanced Frigates', '高级护卫舰'), (24, 23, 'Assault Frigates', '突击护卫舰'),
+    (25, 20, 'Capital Ships', '旗舰'), (26, 25, 'Dreadnoughts', '无畏舰'),
+    (30, 0, 'Structures', '建筑'), (31, 30, 'Citadels', '堡垒'), (40, 0, 'Trade Goods', '贸易货物'),
+]
+# (typeID, en, zh, groupID, metaGroupID, marketGroupID, 单价)
+TYPE = [
+    (34, 'Tritanium', '三钛合金', 18, None, 3, 4), (35, 'Pyerite', '类晶体胶矿', 18, None, 3, 12),
+    (36, 'Mexallon', '类银超金属', 18, None, 3, 60), (37, 'Isogen', '同位聚合体', 18, None, 3, 90),
+    (38, 'Nocxium', '超新星诺克石', 18, None, 3, 700), (39, 'Zydrine', '晶状石英核岩', 18, None, 3, 900),
+    (40, 'Megacyte', '超噬矿', 18, None, 3, 1800), (11399, 'Morphite', '莫尔石', 18, None, 3, 9000),
+    (16633, 'Hydrocarbons', '碳氢化合物', 427, None, 4, 180), (16634, 'Atmospheric Gases', '标准大气', 427, None, 4, 150),
+    (16635, 'Evaporite Deposits', '蒸发岩沉积物', 427, None, 4, 160), (16636, 'Silicates', '硅酸盐', 427, None, 4, 140),
+    (16637, 'Tungsten', '钨', 427, None, 4, 420), (16638, 'Titanium', '钛', 427, None, 4, 380),
+    (16640, 'Cobalt', '钴', 427, None, 4, 300), (16641, 'Chromium', '铬', 427, None, 4, 520),
+    (16643, 'Cadmium', '镉', 427, None, 4, 610), (16644, 'Platinum', '铂', 427, None, 4, 560),
+    (16272, 'Heavy Water', '重水', 423, None, 8, 150), (16273, 'Liquid Ozone', '液态臭氧', 423, None, 8, 200),
+    (3683, 'Oxygen', '氧', 1042, None, 10, 300),
+    (4051, 'Nitrogen Fuel Block', '氮燃料块', 1136, None, 9, None),
+    (16654, 'Titanium Chromide', '钛铬化物', 428, None, 6, None),
+    (16655, 'Crystallite Alloy', '晶体合金', 428, None, 6, None),
+    (16656, 'Fernite Alloy', '铁素体合金', 428, None, 6, None),
+    (16657, 'Rolled Tungsten Alloy', '轧制钨合金', 428, None, 6, None),
+    (16670, 'Crystalline Carbonide', '晶状碳化物', 429, None, 7, None),
+    (16673, 'Tungsten Carbide', '碳化钨', 429, None, 7, None),
+    (16679, 'Fernite Carbide', '碳化铁素体', 429, None, 7, None),
+    (11543, 'Tungsten Carbide Armor Plate', '碳化钨装甲板', 334, 2, 12, None),
+    (11551, 'Fusion Thruster', '聚变推进器', 334, 2, 12, None),
+    (11537, 'Nanoelectrical Microprocessor', '纳米电子微处理器', 334, 2, 12, None),
+    (21009, 'Capital Armor Plates', '旗舰装甲板', 873, 1, 13, None),
+    (21017, 'Capital Propulsion Engine', '旗舰推进引擎', 873, 1, 13, None),
+    (21027, 'Capital Turret Hardpoint', '旗舰炮台挂点', 873, 1, 13, None),
+    (21039, 'Capital Siege Array', '旗舰攻城阵列', 873, 1, 13, None),
+    (587, 'Rifter', '裂谷级', 25, 1, 22, None), (603, 'Merlin', '灰背隼级', 25, 1, 22, None),
+    (11371, 'Wolf', '狼级', 324, 2, 24, None), (11379, 'Hawk', '鹰级', 324, 2, 24, None),
+    (19720, 'Revelation', '启示级', 485, 1, 26, None), (19722, 'Naglfar', '纳迦法级', 485, 1, 26, None),
+    (35827, 'Sotiyo', '索迪约', 1404, None, 31, None), (35836, 'Tatara', '塔塔拉', 1406, None, 31, None),
+]
+# {product_id: (activity_id, 单流程产出, 时间, 最大流程, {material_id: quantity})}
+RECIPE = {
+    4051: (1, 40, 900, 40000, {16272: 170, 16273: 350, 3683: 20}),
+    16654: (11, 200, 10800, 1000, {16641: 100, 16638: 100, 4051: 5}),
+    16655: (11, 200, 10800, 1000, {16640: 100, 16643: 100, 4051: 5}),
+    16656: (11, 200, 10800, 1000, {16638: 100, 16633: 100, 4051: 5}),
+    16657: (11, 200, 10800, 1000, {16637: 100, 16644: 100, 4051: 5}),
+    16670: (11, 10000, 10800, 1000, {16655: 100, 16656: 100, 4051: 5}),
+    16673: (11, 10000, 10800, 1000, {16657: 100, 16635: 100, 4051: 5}),
+    16679: (11, 10000, 10800, 1000, {16656: 100, 16654: 100, 4051: 5}),
+    11543: (1, 1, 600, 300, {16673: 44, 16679: 13, 11399: 1}),
+    11551: (1, 1, 600, 300, {16670: 22, 16679: 9}),
+    11537: (1, 1, 600, 300, {16670: 17, 16673: 11, 38: 1}),
+    21009: (1, 1, 12000, 100, {34: 90000, 35: 22000, 36: 8500, 37: 1300, 38: 360}),
+    21017: (1, 1, 12000, 100, {34: 70000, 35: 18000, 36: 7000, 37: 1000, 39: 220}),
+    21027: (1, 1, 12000, 100, {34: 60000, 35: 25000, 36: 6000, 38: 300, 40: 80}),
+    21039: (1, 1, 12000, 100, {34: 110000, 35: 30000, 36: 9000, 37: 2000, 39: 400, 40: 140}),
+    587: (1, 1, 6000, 30, {34: 32000, 35: 6000, 36: 2500, 37: 500}),
+    603: (1, 1, 6000, 30, {34: 28000, 35: 7000, 36: 2200, 37: 600}),
+    11371: (1, 1, 20000, 10, {587: 1, 11543: 60, 11551: 30, 11537: 20, 11399: 10}),
+    11379: (1, 1, 20000, 10, {603: 1, 11543: 40, 11551: 35, 11537: 25, 11399: 12}),
+    19720: (1, 1, 300000, 1, {21009: 40, 21017: 20, 21027: 45, 21039: 15, 40: 4000}),
+    19722: (1, 1, 300000, 1, {21009: 35, 21017: 25, 21027: 40, 21039: 15, 39: 3000}),
+}
+# 用户拥有的蓝图 (item_id, product_id, runs, material_efficiency, time_efficiency)，runs为-1的是原图
+BLUEPRINT = [
+    (9001, 11543, -1, 10, 20), (9002, 11543, -1, 8, 16),
+    (9003, 11551, 40, 5, 10), (9004, 11551, 10, 2, 4),
+    (9005, 11371, 3, 2, 4), (9006, 11371, 1, 4, 8), (9007, 11371, 5, 3, 6),
+    (9008, 587, -1, 10, 20),
+    (9010, 21009, -1, 10, 20), (9011, 19720, 2, 7, 12),
+    (9012, 16654, -1, 0, 0),
+]
+# 运行中工作占用的蓝图
+USING_BLUEPRINT = 9007
+# 仓库内资产 (location_id, type_id, quantity)
+ASSET = [(LOC_MANU, 34, 1000000), (LOC_MANU, 11543, 20), (LOC_MANU, 587, 2), (LOC_REAC, 4051, 500)]
+
+PLAN = [['Wolf', 10], ['Revelation', 1], ['Hawk', 4]]
+
+EN_SYLLABLE = ['ka', 'lo', 'ra', 'mi', 'ten', 'dor', 'vex', 'qua', 'zen', 'lith', 'or', 'ix', 'an', 'tor',
+               'pel', 'sha', 'gri', 'mon', 'bel', 'cor', 'dra', 'fen', 'hal', 'nor']
+ZH_CHAR = '铁铜银金晶石矿甲舰炮盾能量推进器合核心阵列板钢光电子磁场引擎星云暗影烈焰寒冰风暴雷霆'
+
+_state = dict()
+
+
+def get_tmp_dir() -> str:
+    if 'tmp_dir' not in _state:
+        _state['tmp_dir'] = tempfile.mkdtemp(prefix='kahuna_test_')
+    return _state['tmp_dir']
+
+
+def configure(tmp_dir: str = None) -> str:
+    """ 写入临时config.ini并设置KAHUNA_CONFIG，需要在导入src之前调用 """
+    tmp_dir = tmp_dir or get_tmp_dir()
+    _state['tmp_dir'] = tmp_dir
+    config_path = os.path.join(tmp_dir, 'config.ini')
+    with open(config_path, 'w', encoding='utf-8') as file:
+        file.write(
+            '[APP]\nDBTYPE = sqlite\nCOST_PLAN_USER =\nCOST_PLAN_NAME =\nCORP_ASSET_USER =\n'
+            'PIC_RENDER_PROXY =\nPROXY =\n'
+            '[FEISHU]\nAPP_ID = test\nSECRET_ID = test\nFOLDER_ROOT =\n'
+            '[SQLITEDB]\n'
+            f'CONFIG_DB = {os.path.join(tmp_dir, "config.db")}\n'
+            f'CACHE_DB = {os.path.join(tmp_dir, "cache.db")}\n'
+            f'SDEDB = {os.path.join(tmp_dir, "sde.db")}\n'
+            f'CN_SDEDB = {os.path.join(tmp_dir, "sde_cn.db")}\n'
+            '[EVE]\nCLIENT_ID = test\nSECRET_KEY = test\n'
+            f'MARKET_AC_CHARACTER_ID = {CHARACTER_ID}\n'
+            'ESI_BASE_URL = http://127.0.0.1:9\nESI_CONCURRENCY =\n'
+            '[ESI]\npublicData = true\n'
+        )
+    os.environ['KAHUNA_CONFIG'] = config_path
+    return config_path
+
+
+def get_extra_data(ship_count: int, capital_count: int, filler_count: int):
+    """ 基准使用的额外物品与配方，固定随机种子保证每次相同 """
+    rand = random.Random(20260101)
+    type_list = []
+    recipe = dict()
+    component_list = [11543, 11551, 11537]
+    capital_component_list = [21009, 21017, 21027, 21039]
+    for index in range(ship_count):
+        type_id = 200000 + index
+        type_list.append((type_id, f'Assault Frigate {index:03d}', f'突击护卫舰{index:03d}', 324, 2, 24, None))
+        materials = {rand.choice([587, 603]): 1, 11399: rand.randint(5, 15)}
+        for component_id in rand.sample(component_list, 2):
+            materials[component_id] = rand.randint(20, 60)
+        recipe[type_id] = (1, 1, 20000, 10, materials)
+    for index in range(capital_count):
+        type_id = 300000 + index
+        type_list.append((type_id, f'Dreadnought {index:03d}', f'无畏舰{index:03d}', 485, 1, 26, None))
+        materials = {component_id: rand.randint(10, 50) for component_id in capital_component_list}
+        materials[rand.choice([39, 40])] = rand.randint(2000, 5000)
+        recipe[type_id] = (1, 1, 300000, 1, materials)
+    for index in range(filler_count):
+        type_id = 400000 + index
+        word_list = [''.join(rand.choice(EN_SYLLABLE) for _ in range(rand.randint(2, 3))).capitalize()
+                     for _ in range(rand.randint(1, 3))]
+        zh_name = ''.join(rand.choice(ZH_CHAR) for _ in range(rand.randint(3, 6)))
+        type_list.append((type_id, f'{" ".join(word_list)} {index}', f'{zh_name}{index}', 2000, None, 40, 100))
+    return type_list, recipe
+
+
+def get_price_dict(type_list: list, recipe: dict) -> dict:
+    """ 材料使用给定单价，产品按材料价格加成 """
+    price_dict = {row[0]: row[6] for row in type_list if row[6] is not None}
+
+    def get_price(type_id):
+        if type_id not in price_dict:
+            activity_id, product_quantity, _, _, materials = recipe[type_id]
+            price_dict[type_id] = round(sum(get_price(child_id) * quantity
+                                            for child_id, quantity in materials.items()) / product_quantity * 1.15, 2)
+        return price_dict[type_id]
+    for type_id in recipe:
+        get_price(type_id)
+    return price_dict
+
+
+def insert_chunk(model, row_list: list, size: int = 500):
+    for start in range(0, len(row_list), size):
+        model.insert_many(row_list[start:start + size]).execute()
+
+
+def build_sde(type_list: list, recipe: dict):
+    from src.service.sde_service import database as en_model, database_cn as zh_model
+
+    for model_module, zh in [(en_model, False), (zh_model, True)]:
+        model_list = [model_module.InvTypes, model_module.InvGroups, model_module.InvCategories,
+                      model_module.MetaGroups, model_module.MarketGroups, model_module.IndustryActivityProducts,
+                      model_module.IndustryActivityMaterials, model_module.IndustryActivities,
+                      model_module.IndustryBlueprints, model_module.MapSolarSystems]
+        model_module.db.create_tables(model_list)
+        with model_module.db.atomic():
+            insert_chunk(model_module.InvCategories, [
+                {'categoryID': row[0], 'categoryName': row[2] if zh else row[1], 'published': 1} for row in CATEGORY])
+            insert_chunk(model_module.InvGroups, [
+                {'groupID': row[0], 'categoryID': row[1], 'groupName': row[3] if zh else row[2], 'published': 1}
+                for row in GROUP])
+            insert_chunk(model_module.MetaGroups, [{'metaGroupID': row[0], 'nameID': row[1]} for row in META])
+            insert_chunk(model_module.MarketGroups, [
+                {'marketGroupID': row[0], 'parentGroupID': row[1], 'nameID': row[3] if zh else row[2], 'hasTypes': 1}
+                for row in MARKET_GROUP])
+            insert_chunk(model_module.MapSolarSystems, [
+                {'solarSystemID': SOLAR_SYSTEM_ID, 'solarSystemName': 'TEST-1', 'regionID': 10000003}])
+
+            type_row_list = []
+            for type_id, en_name, zh_name, group_id, meta_id, market_group_id, _ in type_list:
+                type_row_list.append({'typeID': type_id, 'groupID': group_id, 'typeName': zh_name if zh else en_name,
+                                      'metaGroupID': meta_id, 'marketGroupID': market_group_id, 'portionSize': 1,
+                                      'volume': 1.0, 'packagedVolume': 1.0, 'published': 1})
+            name_dict = {row[0]: (row[1], row[2]) for row in type_list}
+            for product_id, (activity_id, _, _, _, _) in recipe.items():
+                en_name, zh_name = name_dict[product_id]
+                if activity_id == 11:
+                    bp_name = f'{zh_name}反应配方' if zh else f'{en_name} Reaction Formula'
+                    group_id = 1003
+                else:
+                    bp_name = f'{zh_name}蓝图' if zh else f'{en_name} Blueprint'
+                    group_id = 1004 if product_id == 4051 else 1001 if product_id in {
+                        row[0] for row in type_list if row[3] in {25, 324, 485}} else 1002
+                type_row_list.append({'typeID': product_id + BP_OFFSET, 'groupID': group_id, 'typeName': bp_name,
+                                      'portionSize': 1, 'volume': 0.01, 'published': 1})
+            insert_chunk(model_module.InvTypes, type_row_list)
+
+            insert_chunk(model_module.IndustryBlueprints, [
+                {'blueprintTypeID': product_id + BP_OFFSET, 'maxProductionLimit': data[3]}
+                for product_id, data in recipe.items()])
+            insert_chunk(model_module.IndustryActivities, [
+                {'blueprintTypeID': product_id + BP_OFFSET, 'activityID': data[0], 'time': data[2]}
+                for product_id, data in recipe.items()])
+            insert_chunk(model_module.IndustryActivityProducts, [
+                {'blueprintTypeID': product_id + BP_OFFSET, 'activityID': data[0], 'productTypeID': product_id,
+                 'quantity': data[1], 'probability': 1} for product_id, data in recipe.items()])
+            insert_chunk(model_module.IndustryActivityMaterials, [
+                {'blueprintTypeID': product_id + BP_OFFSET, 'activityID': data[0], 'materialTypeID': child_id,
+                 'quantity': quantity}
+                for product_id, data in recipe.items() for child_id, quantity in data[4].items()])
+
+
+def build_config_db(plan_list: list):
+    from src.service.database_server import model
+
+    now = datetime.now()
+    model.User.create(user_qq=USER_QQ, create_date=now, expire_date=now + timedelta(days=3650),
+                      main_character_id=CHARACTER_ID)
+    plan = {
+        PLAN_NAME: {
+            'bp_matcher': BP_MATCHER, 'st_matcher': ST_MATCHER, 'prod_block_matcher': BLOCK_MATCHER,
+            'manucycletime': 24, 'reaccycletime': 24, 'container_block': [], 'plan': plan_list,
+        }
+    }
+    model.UserData.create(user_qq=USER_QQ, user_data=json.dumps({'plan': plan, 'alias': {}, 'sell_data': {}}))
+    model.Character.create(character_id=CHARACTER_ID, character_name='Test Pilot', QQ=USER_QQ, create_date=now,
+                           token='token', refresh_token='refresh', expires_date=datetime(2099, 1, 1),
+                           corp_id=98000001, director=False)
+    for structure_id, name, type_id, rig_level in [(SOTIYO_ID, 'TEST-1 Sotiyo', 35827, 2),
+                                                   (TATARA_ID, 'TEST-1 Tatara', 35836, 1)]:
+        model.Structure.create(structure_id=structure_id, name=name, owner_id=98000001,
+                               solar_system_id=SOLAR_SYSTEM_ID, type_id=type_id, system=0,
+                               mater_rig_level=rig_level, time_rig_level=rig_level)
+    matcher_data = {
+        BP_MATCHER: ('bp', {}),
+        ST_MATCHER: ('structure', {'group': {'Fuel Block': SOTIYO_ID},
+                                   'category': {'Ship': SOTIYO_ID, 'Commodity': SOTIYO_ID, 'Material': TATARA_ID}}),
+        BLOCK_MATCHER: ('prod_block', {'group': {'Fuel Block': 1, 'Intermediate Materials': 2}}),
+    }
+    for matcher_name, (matcher_type, data) in matcher_data.items():
+        full_data = {key: dict() for key in ['bp', 'market_group', 'group', 'meta', 'category']}
+        full_data.update(data)
+        model.Matcher.create(matcher_name=matcher_name, user_qq=USER_QQ, matcher_type=matcher_type,
+                             matcher_data=json.dumps(full_data))
+    for location_id, tag in [(LOC_BP, 'bp'), (LOC_MANU, 'manu'), (LOC_REAC, 'reac')]:
+        model.AssetContainer.create(asset_location_id=location_id, asset_location_type='item',
+                                    structure_id=SOTIYO_ID, solar_system_id=SOLAR_SYSTEM_ID,
+                                    asset_name=f'{tag} container', asset_owner_id=CHARACTER_ID,
+                                    asset_owner_type='character', asset_owner_qq=USER_QQ, tag=tag)
+
+
+def get_order_list(price_dict: dict) -> list:
+    """ 每种物品三档出单、两档收单，深度计价测试使用 """
+    order_list = []
+    issued = datetime(2026, 1, 1)
+    order_id = 6000000000
+    for type_id, price in sorted(price_dict.items()):
+        volume = 100000 if price < 10000 else 50
+        for is_buy, ratio, order_volume in [(False, 1, volume), (False, 1.05, volume), (False, 1.25, volume * 10),
+                                            (True, 0.95, volume), (True, 0.9, volume)]:
+            order_id += 1
+            order_list.append({'duration': 90, 'is_buy_order': is_buy, 'issued': issued,
+                               'location_id': JITA_LOCATION_ID, 'min_volume': 1, 'order_id': order_id,
+                               'price': round(price * ratio, 2), 'range': 'region', 'system_id': 30000142,
+                               'type_id': type_id, 'volume_remain': order_volume, 'volume_total': order_volume})
+    return order_list
+
+
+def build_cache_db(price_dict: dict):
+    from src.service.database_server import model
+
+    with model.BlueprintAssetCache._meta.database.atomic():
+        insert_chunk(model.BlueprintAssetCache, [
+            {'item_id': item_id, 'location_flag': 'Hangar', 'location_id': LOC_BP, 'material_efficiency': me,
+             'quantity': -1 if runs < 0 else -2, 'runs': runs, 'time_efficiency': te,
+             'type_id': product_id + BP_OFFSET, 'owner_id': CHARACTER_ID, 'owner_type': 'character'}
+            for item_id, product_id, runs, me, te in BLUEPRINT])
+        insert_chunk(model.AssetCache, [
+            {'asset_type': 0, 'owner_id': CHARACTER_ID, 'is_blueprint_copy': False, 'is_singleton': False,
+             'item_id': 8000 + index, 'location_flag': 'Hangar', 'location_id': location_id,
+             'location_type': 'item', 'quantity': quantity, 'type_id': type_id}
+            for index, (location_id, type_id, quantity) in enumerate(ASSET)])
+        now = datetime.now()
+        model.IndustryJobsCache.create(
+            activity_id=1, blueprint_id=USING_BLUEPRINT, blueprint_location_id=LOC_BP,
+            blueprint_type_id=11371 + BP_OFFSET, duration=3600, end_date=now + timedelta(hours=1),
+            facility_id=SOTIYO_ID, installer_id=CHARACTER_ID, job_id=1, location_id=SOTIYO_ID,
+            output_location_id=LOC_MANU, product_type_id=11371, runs=2, start_date=now, status='active',
+            owner_id=CHARACTER_ID)
+        insert_chunk(model.MarketOrderCache, get_order_list(price_dict))
+        insert_chunk(model.MarketPriceCache, [
+            {'type_id': type_id, 'adjusted_price': max(1, round(price)), 'average_price': max(1, round(price))}
+            for type_id, price in price_dict.items()])
+        model.SystemCostCache.create(solar_system_id=SOLAR_SYSTEM_ID, manufacturing=0.05, reaction=0.04)
+
+
+def build_world(tmp_dir: str = None, ship_count: int = 0, capital_count: int = 0, filler_count: int = 0,
+                plan_list: list = None):
+    """ 建立合成数据并初始化服务，同一进程只建立一次 """
+    if 'world' in _state:
+        return _state['world']
+    tmp_dir = tmp_dir or get_tmp_dir()
+    if os.environ.get('KAHUNA_CONFIG') != os.path.join(tmp_dir, 'config.ini'):
+        configure(tmp_dir)
+
+    extra_type, extra_recipe = get_extra_data(ship_count, capital_count, filler_count)
+    type_list = TYPE + extra_type
+    recipe = {**RECIPE, **extra_recipe}
+    price_dict = get_price_dict(type_list, recipe)
+    build_sde(type_list, recipe)
+
+    from src.service.database_server.connect import DatabaseConectManager
+    from src.service.sde_service import snapshot
+    # 快照写入临时目录
+    snapshot.TMP_PATH = tmp_dir
+    snapshot.SNAPSHOT_META = os.path.join(tmp_dir, 'sde_snapshot.json')
+
+    DatabaseConectManager.init()
+    build_config_db(PLAN if plan_list is None else plan_list)
+    build_cache_db(price_dict)
+
+    from src.service import init_server
+    init_server(log=False)
+
+    _state['world'] = {
+        'tmp_dir': tmp_dir,
+        'type_list': type_list,
+        'recipe': recipe,
+        'price_dict': price_dict,
+    }
+    return _state['world']
+
+
+def get_user():
+    from src.service.user_server.user_manager import UserManager
+    return UserManager.get_user(USER_QQ)
+
+
+def drop_secondary_index() -> list:
+    """ 还原为迁移前的缓存库：删除模型声明的非唯一索引并将版本号置0，return: [(表, 列)] """
+    from src.service.database_server.connect import DatabaseConectManager
+    from src.service.database_server.migration import SchemaMigration
+
+    db = DatabaseConectManager.cache_db()
+    dropped = []
+    for model in DatabaseConectManager.get_model_list('cache'):
+        table_name = model._meta.table_name
+        if not db.table_exists(table_name):
+            continue
+        for columns, unique in SchemaMigration.get_model_index(model):
+            if not unique and columns in SchemaMigration.get_index_dict(db, table_name):
+                SchemaMigration.drop_index(db, table_name, columns)
+                dropped.append((table_name, columns))
+    db.execute_sql('PRAGMA user_version = 0')
+    return dropped